@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2020 Mikkel Schubert <MikkelSch@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Benchmark of the per-command overhead of running PALEOMIX commands.
+
+A number of small commands (by default 'paleomix depths' on a tiny BAM file) are
+run one after the other as AtomicCmds in a multiprocessing.Pool worker, similar to
+how nodes are run by the pipelines. This is done both by executing a new Python
+interpreter for each command and by running the commands in forks of the worker
+process, and the average wall-clock time per command is reported for each.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import pysam
+
+import paleomix.atomiccmd.command
+import paleomix.tools.factory as factory
+
+
+def build_bam(filename):
+    header = {
+        "HD": {"VN": "1.0", "SO": "coordinate"},
+        "SQ": [{"SN": "contig", "LN": 1000}],
+    }
+
+    with pysam.AlignmentFile(filename, "wb", header=header) as handle:
+        for pos in range(0, 900, 10):
+            record = pysam.AlignedSegment()
+            record.query_name = "read_%i" % (pos,)
+            record.query_sequence = "A" * 100
+            record.reference_id = 0
+            record.reference_start = pos
+            record.cigartuples = [(0, 100)]
+            handle.write(record)
+
+
+def build_command(command, bamfile):
+    builder = factory.new(command)
+    builder.add_value("%(IN_BAM)s")
+    builder.add_value("%(OUT_FILE)s")
+    builder.set_kwargs(IN_BAM=bamfile, OUT_FILE="output.txt")
+
+    return builder.finalize()
+
+
+def run_commands(args, root, bamfile, fork):
+    paleomix.atomiccmd.command.set_fork_paleomix_commands(fork)
+
+    start = time.time()
+    for idx in range(args.commands):
+        temp = os.path.join(root, "%s_%i" % ("fork" if fork else "exec", idx))
+        os.mkdir(temp)
+
+        command = build_command(args.command, bamfile)
+        command.run(temp)
+        if command.join() != [0]:
+            raise RuntimeError("Command failed: %s" % (command,))
+
+    return (time.time() - start) / args.commands
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--command",
+        default="depths",
+        choices=("coverage", "depths"),
+        help="PALEOMIX command to benchmark",
+    )
+    parser.add_argument(
+        "--commands", type=int, default=50, help="Number of commands to run"
+    )
+
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as root:
+        bamfile = os.path.join(root, "input.bam")
+        build_bam(bamfile)
+
+        print("Mode\tCommands\tSeconds per command")
+        with multiprocessing.Pool(1) as pool:
+            for fork in (False, True):
+                runtime = pool.apply(run_commands, (args, root, bamfile, fork))
+
+                print(
+                    "%s\t%i\t%.4f"
+                    % ("fork" if fork else "exec", args.commands, runtime)
+                )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
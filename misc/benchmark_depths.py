@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2020 Mikkel Schubert <MikkelSch@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Benchmark of 'paleomix depths' on synthetic BAM files.
+
+A coordinate sorted BAM file is generated with reads placed uniformly at random
+across one or more contigs, using a number of read-groups, and with a fraction
+of reads containing deletions and insertions. The time taken to build the depth
+histogram is reported. Optionally, the output may be compared to that of another
+implementation of the tool (e.g. an older version of 'paleomix/tools/depths.py'),
+in which case the two outputs are required to be identical.
+"""
+
+import argparse
+import filecmp
+import importlib.util
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pysam
+
+import paleomix.tools.depths
+
+
+def build_bam(filename, args):
+    rng = random.Random(args.seed)
+    contigs = [
+        ("contig_%i" % (idx,), args.contig_length) for idx in range(args.contigs)
+    ]
+    readgroups = [
+        {"ID": "RG%i" % (idx,), "SM": "Sample%i" % (idx % 2,), "LB": "Lib%i" % (idx,)}
+        for idx in range(args.readgroups)
+    ]
+
+    header = {
+        "HD": {"VN": "1.0", "SO": "coordinate"},
+        "SQ": [{"SN": name, "LN": length} for name, length in contigs],
+        "RG": readgroups,
+    }
+
+    nreads = args.coverage * args.contig_length // args.read_length
+    with pysam.AlignmentFile(filename, "wb", header=header) as handle:
+        for tid in range(args.contigs):
+            max_pos = args.contig_length - args.read_length
+            positions = sorted(rng.randrange(max_pos) for _ in range(nreads))
+            for idx, pos in enumerate(positions):
+                record = pysam.AlignedSegment()
+                record.query_name = "read_%i_%i" % (tid, idx)
+                record.reference_id = tid
+                record.reference_start = pos
+                record.mapping_quality = 30
+
+                length = args.read_length
+                if rng.random() < 0.05:
+                    record.cigartuples = [(0, length // 2), (2, 2), (0, length // 2)]
+                elif rng.random() < 0.05:
+                    record.cigartuples = [(0, length // 2), (1, 2), (0, length // 2)]
+                    length += 2
+                else:
+                    record.cigartuples = [(0, length)]
+
+                record.query_sequence = "A" * length
+                record.set_tag("RG", rng.choice(readgroups)["ID"])
+
+                handle.write(record)
+
+    return nreads * args.contigs
+
+
+def load_module(filename):
+    spec = importlib.util.spec_from_file_location("depths_reference", filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def run(module, bamfile, output):
+    start = time.time()
+    assert module.main([bamfile, output, "--overwrite-output"]) == 0
+
+    return time.time() - start
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--contigs",
+        type=int,
+        default=2,
+        help="Number of contigs in BAM file",
+    )
+    parser.add_argument(
+        "--contig-length",
+        type=int,
+        default=1000000,
+        help="Length of each contig",
+    )
+    parser.add_argument("--coverage", type=int, default=30, help="Average depth")
+    parser.add_argument("--read-length", type=int, default=100, help="Read length")
+    parser.add_argument("--readgroups", type=int, default=4, help="Read groups")
+    parser.add_argument("--seed", type=int, default=1234, help="Random seed")
+    parser.add_argument(
+        "--compare-with",
+        metavar="FILE",
+        help="Python file implementing an alternative 'paleomix depths' tool, "
+        "the output of which is compared to that of the current implementation",
+    )
+
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as root:
+        bamfile = os.path.join(root, "input.bam")
+        nreads = build_bam(bamfile, args)
+        nbases = args.contigs * args.contig_length
+
+        print("Implementation\tReads\tBases\tTime (s)\tBases per second")
+        implementations = [("current", paleomix.tools.depths)]
+        if args.compare_with:
+            implementations.append((args.compare_with, load_module(args.compare_with)))
+
+        for idx, (name, module) in enumerate(implementations):
+            output = os.path.join(root, "output_%i.txt" % (idx,))
+            runtime = run(module, bamfile, output)
+
+            print(
+                "%s\t%i\t%i\t%.2f\t%.0f"
+                % (name, nreads, nbases, runtime, nbases / runtime)
+            )
+
+        if args.compare_with:
+            if not filecmp.cmp(
+                os.path.join(root, "output_0.txt"),
+                os.path.join(root, "output_1.txt"),
+                shallow=False,
+            ):
+                print("ERROR: Output differs between implementations")
+                return 1
+
+            print("Outputs are identical")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,198 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2020 Mikkel Schubert <MikkelSch@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Benchmark of the scheduling overhead of the Pypeline class.
+
+Synthetic graphs of nodes are scheduled using a pool that completes every task
+immediately, so that the measured time is the overhead of the scheduler (and
+of NodeGraph state updates) rather than the time taken to run the nodes. The
+file-system is never touched when determining the state of nodes.
+
+Graphs are built from a number of independent "samples", each of which mimics
+the structure of the BAM pipeline: a number of lanes that are each processed
+by a short chain of nodes, followed by merging and a couple of final steps.
+Optionally, every lane may depend on a single shared node, similar to how every
+lane depends on the index of the reference sequence in the BAM pipeline. Deep
+graphs may be benchmarked using long chains (e.g. '--lanes 1 --chain-length
+10000').
+"""
+import argparse
+import logging
+import sys
+import time
+
+from paleomix.node import Node
+from paleomix.nodegraph import NodeGraph
+from paleomix.pipeline import Pypeline
+
+
+# Fake location of output files, all of which are considered missing
+_OUTPUT_ROOT = "/benchmark/"
+
+
+class _MissingFilesCache:
+    """FileStatusCache replacement for which every output file is missing."""
+
+    def files_exist(self, fpaths):
+        return not self.missing_files(fpaths)
+
+    def missing_files(self, fpaths):
+        return [fpath for fpath in fpaths if fpath.startswith(_OUTPUT_ROOT)]
+
+    def are_files_outdated(self, input_files, output_files):
+        return True
+
+    def set_completed(self, input_files, output_files):
+        pass
+
+
+class _ImmediateResult:
+    def get(self):
+        return None
+
+
+class _ImmediatePool:
+    """multiprocessing.Pool replacement that completes tasks immediately."""
+
+    def apply_async(self, func, args=(), callback=None, error_callback=None):
+        if callback is not None:
+            callback(None)
+
+        return _ImmediateResult()
+
+    def close(self):
+        pass
+
+    def join(self):
+        pass
+
+
+def build_nodes(nsamples, nlanes, chain_length, input_file, shared_dependency=False):
+    counter = [0]
+
+    def _new_node(dependencies):
+        counter[0] += 1
+        input_files = [input_file]
+        for node in dependencies:
+            input_files.extend(node.output_files)
+
+        return Node(
+            description="node_%i" % (counter[0],),
+            input_files=input_files,
+            output_files=["%snode_%i.out" % (_OUTPUT_ROOT, counter[0])],
+            dependencies=dependencies,
+        )
+
+    root = ()
+    if shared_dependency:
+        root = (_new_node(()),)
+
+    nodes = []
+    for _ in range(nsamples):
+        lanes = []
+        for _ in range(nlanes):
+            node = _new_node(root)
+            for _ in range(chain_length - 1):
+                node = _new_node((node,))
+            lanes.append(node)
+
+        node = _new_node(lanes)
+        for _ in range(chain_length - 1):
+            node = _new_node((node,))
+        nodes.append(node)
+
+    return nodes, counter[0]
+
+
+def benchmark(args, nsamples):
+    nodes, nnodes = build_nodes(
+        nsamples=nsamples,
+        nlanes=args.lanes,
+        chain_length=args.chain_length,
+        input_file=__file__,
+        shared_dependency=args.shared_dependency,
+    )
+
+    start = time.time()
+    nodegraph = NodeGraph(nodes, _MissingFilesCache)
+    graph_time = time.time() - start
+
+    pipeline = Pypeline(config=None)
+    pipeline._pool = _ImmediatePool()
+
+    start = time.time()
+    assert pipeline._run(nodegraph, max_threads=args.max_threads)
+    run_time = time.time() - start
+
+    states = nodegraph.get_state_counts()
+    assert states[NodeGraph.DONE] == nnodes, states
+
+    return nnodes, graph_time, run_time
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--nodes",
+        type=int,
+        nargs="+",
+        default=[10000, 50000, 100000, 200000],
+        help="Approximate number of nodes in each benchmarked graph",
+    )
+    parser.add_argument(
+        "--lanes", type=int, default=8, help="Number of lanes per sample",
+    )
+    parser.add_argument(
+        "--chain-length", type=int, default=4, help="Number of nodes per lane",
+    )
+    parser.add_argument(
+        "--max-threads", type=int, default=32, help="Simulated number of threads",
+    )
+    parser.add_argument(
+        "--shared-dependency",
+        action="store_true",
+        help="Make every lane depend on a single, shared node",
+    )
+
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    logging.disable(logging.INFO)
+
+    nodes_per_sample = (args.lanes + 1) * args.chain_length
+    print("Nodes\tGraph (s)\tScheduling (s)\tScheduling per node (us)")
+    for nnodes in args.nodes:
+        nsamples = max(1, nnodes // nodes_per_sample)
+        nnodes, graph_time, run_time = benchmark(args, nsamples)
+
+        print(
+            "%i\t%.2f\t%.2f\t%.1f"
+            % (nnodes, graph_time, run_time, run_time * 1e6 / nnodes)
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
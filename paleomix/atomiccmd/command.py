@@ -25,12 +25,14 @@ import os
 import re
 import signal
 import sys
+import time
 import weakref
 
 import paleomix.atomiccmd.pprint as atomicpp
 import paleomix.common.fileutils as fileutils
 import paleomix.common.procs as procs
 
+from paleomix.common.system import memory_size
 from paleomix.common.utilities import safe_coerce_to_tuple
 
 _PIPES = (("IN", "IN_STDIN"), ("OUT", "OUT_STDOUT"), ("OUT", "OUT_STDERR"))
@@ -62,7 +64,7 @@ class AtomicCmd:
     PIPE = procs.PIPE
     DEVNULL = procs.DEVNULL
 
-    def __init__(self, command, set_cwd=False, **kwargs):
+    def __init__(self, command, set_cwd=False, memory=None, **kwargs):
         """Takes a command and a set of files.
 
         The command is expected to be an iterable starting with the name of an
@@ -129,13 +131,19 @@ class AtomicCmd:
 
         If 'set_cwd' is True, the current working directory is set to the
         temporary directory before the command is executed. Input paths are
-        automatically turned into absolute paths in this case."""
+        automatically turned into absolute paths in this case.
+
+        'memory' specifies the (estimated) amount of memory used by the command in
+        bytes. If not set, the amount is estimated from the options used to limit
+        the memory usage of the JVM (-Xmx) and of 'samtools sort' (-m)."""
         self._proc = None
         self._temp = None
         self._running = False
         self._command = list(map(str, safe_coerce_to_tuple(command)))
         self._set_cwd = set_cwd
         self._terminated = False
+        self._start_time = None
+        self._usage = None
 
         if not self._command or not self._command[0]:
             raise ValueError("Empty command in AtomicCmd constructor")
@@ -154,6 +162,10 @@ class AtomicCmd:
             os.path.basename(path) for path in file_sets["OUT"]
         )
 
+        if memory is None:
+            memory = estimate_memory(self._command)
+        self.memory = memory
+
         # Dry-run, to catch errors early
         self._generate_call("/tmp")
 
@@ -169,6 +181,8 @@ class AtomicCmd:
         temp = fileutils.fspath(temp)
         self._temp = temp
         self._running = True
+        self._start_time = time.time()
+        self._usage = None
 
         # kwords for pipes are always built relative to the current directory,
         # since these are opened before (possibly) CD'ing to the temp
@@ -188,14 +202,26 @@ class AtomicCmd:
             if stdin is None:
                 stdin = self.DEVNULL
 
-            self._proc = procs.open_proc(
-                call,
-                stdin=stdin,
-                stdout=stdout,
-                stderr=stderr,
-                cwd=cwd,
-                preexec_fn=os.setsid,
-            )
+            if _is_paleomix_command(call):
+                # PALEOMIX commands are run in a fork of this process
+                self._proc = procs.fork_proc(
+                    call,
+                    _run_paleomix_command,
+                    call[2:],
+                    stdin=stdin,
+                    stdout=stdout,
+                    stderr=stderr,
+                    cwd=cwd,
+                )
+            else:
+                self._proc = procs.open_proc(
+                    call,
+                    stdin=stdin,
+                    stdout=stdout,
+                    stderr=stderr,
+                    cwd=cwd,
+                    start_new_session=True,
+                )
         except Exception as error:
             if not wrap_errors:
                 raise
@@ -214,7 +240,7 @@ class AtomicCmd:
     def ready(self):
         """Returns true if the command has been run to completion,
         regardless of wether or not an error occured."""
-        return self._proc and self._proc.poll() is not None
+        return self._proc and self._poll(block=False) is not None
 
     def join(self):
         """Similar to Popen.wait(), but returns the value wrapped in a list,
@@ -224,7 +250,7 @@ class AtomicCmd:
             return [None]
 
         self._running = False
-        return_code = self._proc.wait()
+        return_code = self._poll(block=True)
         if return_code < 0:
             return_code = signal.Signals(-return_code).name
         return [return_code]
@@ -238,13 +264,25 @@ class AtomicCmd:
     def terminate(self):
         """Sends SIGTERM to process if it is still running.
         Has no effect if the command has already finished."""
-        if self._proc and self._proc.poll() is None:
+        if self._proc and self._poll(block=False) is None:
             try:
                 os.killpg(self._proc.pid, signal.SIGTERM)
                 self._terminated = True
             except OSError:
                 pass  # Already dead / finished process
 
+    def resource_usage(self):
+        """Returns a list containing a dictionary describing the resources used by
+        the command, once it has finished running, or an empty list otherwise. See
+        'procs.wait_proc' for the keys of the dictionary; in addition, 'command'
+        contains the name of the command, 'start_time' the time at which it was
+        started, and 'wall_time' the number of seconds from the command was started
+        until it was found to have finished."""
+        if self._usage is None:
+            return []
+
+        return [dict(self._usage)]
+
     def commit(self, temp):
         temp = fileutils.fspath(temp)
         if not self.ready():
@@ -286,6 +324,18 @@ class AtomicCmd:
     def __str__(self):
         return atomicpp.pformat(self)
 
+    def _poll(self, block):
+        """Waits for the process to finish (if 'block' is true), and returns the
+        return-code of the process or None if it is still running."""
+        usage = procs.wait_proc(self._proc, block=block)
+        if usage is not None and self._usage is None:
+            usage["command"] = _command_name(self._command)
+            usage["start_time"] = self._start_time
+            usage["wall_time"] = time.time() - self._start_time
+            self._usage = usage
+
+        return self._proc.returncode
+
     def _generate_call(self, temp):
         kwords = self._generate_filenames(self._files, root=temp)
 
@@ -459,6 +509,108 @@ class AtomicCmd:
         return {key: frozenset(value) for key, value in file_sets.items()}
 
 
+# Default amount of memory used per thread by 'samtools sort'
+_SAMTOOLS_SORT_MEMORY = 768 * 2 ** 20
+
+
+def estimate_memory(call):
+    """Estimates the amount of memory (in bytes) used by a command, based on the
+    options used to limit the memory usage of the JVM (-Xmx) and 'samtools sort'
+    (-m and -@). Returns 0 if no estimate could be made.
+    """
+    executable = os.path.basename(call[0])
+
+    try:
+        if executable == "java":
+            memory = 0
+            for value in call:
+                if value.startswith("-Xmx"):
+                    memory = memory_size(value[4:])
+
+            return memory
+        elif executable == "samtools" and call[1:2] == ["sort"]:
+            memory = _SAMTOOLS_SORT_MEMORY
+            threads = 1
+
+            options = iter(call[2:])
+            for value in options:
+                if value == "-m":
+                    memory = memory_size(next(options, ""))
+                elif value.startswith("-m"):
+                    memory = memory_size(value[2:])
+                elif value == "-@":
+                    threads = max(1, int(next(options, "")))
+                elif value.startswith("-@"):
+                    threads = max(1, int(value[2:]))
+
+            return memory * threads
+    except ValueError:
+        # Options may contain templates (e.g. '%(...)s') or be otherwise invalid
+        pass
+
+    return 0
+
+
+# Run PALEOMIX commands (see paleomix.tools.factory) in forked processes instead of
+# starting a new interpreter for each command
+_FORK_PALEOMIX_COMMANDS = True
+
+
+def set_fork_paleomix_commands(enabled):
+    """Enables or disables running PALEOMIX commands in forks of the current process,
+    rather than by executing a new interpreter. Enabled by default. Forking should be
+    disabled while commands are run from multiple threads. Returns the previous
+    setting."""
+    global _FORK_PALEOMIX_COMMANDS
+
+    previous = _FORK_PALEOMIX_COMMANDS
+    _FORK_PALEOMIX_COMMANDS = bool(enabled)
+
+    return previous
+
+
+def _command_name(call):
+    """Returns a short name for a command, consisting of the name of the executable
+    and (if any) the sub-command, e.g. 'samtools sort' or 'paleomix cleanup'. For
+    Java programs, the name of the JAR is used instead of 'java'."""
+    import paleomix.main
+
+    if call[0] == sys.executable and call[1:2] == [paleomix.main.__file__]:
+        call = ["paleomix"] + call[2:]
+    elif os.path.basename(call[0]) == "java" and "-jar" in call[:-1]:
+        call = call[call.index("-jar") + 1 :]
+
+    name = os.path.basename(call[0])
+    if len(call) > 1 and re.match(r"^[A-Za-z][A-Za-z0-9_-]*$", call[1]):
+        return "%s %s" % (name, call[1])
+
+    return name
+
+
+def _is_paleomix_command(call):
+    if not _FORK_PALEOMIX_COMMANDS or len(call) < 3:
+        return False
+
+    import paleomix.main
+
+    if call[0] != sys.executable or call[1] != paleomix.main.__file__:
+        return False
+
+    # Modules are imported here, so that forks of long-lived processes (e.g. pipeline
+    # worker processes) do not need to import them again
+    return paleomix.main.import_command(call[2]) is not None
+
+
+def _run_paleomix_command(argv):
+    import paleomix.common.logging
+    import paleomix.main
+
+    # Logging is re-initialized in the child, as if it were a new process
+    paleomix.common.logging.reset()
+
+    return paleomix.main.main(argv)
+
+
 # The following ensures proper cleanup of child processes, for example in the
 # case where multiprocessing.Pool.terminate() is called.
 _PROCS = None
@@ -476,11 +628,18 @@ def _cleanup_children(signum, _frame):
     sys.exit(-signum)
 
 
-def _add_to_killlist(proc):
+def install_cleanup_handler():
+    """Installs a SIGTERM handler that terminates running commands. This is done
+    automatically when a command is first run, but must be done in the main thread
+    before commands are run in other threads."""
     global _PROCS
 
     if _PROCS is None:
         signal.signal(signal.SIGTERM, _cleanup_children)
         _PROCS = set()
 
+
+def _add_to_killlist(proc):
+    install_cleanup_handler()
+
     _PROCS.add(weakref.ref(proc, _PROCS.remove))
@@ -20,10 +20,10 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 #
-import time
 import collections
 
 import paleomix.atomiccmd.pprint as atomicpp
+import paleomix.common.procs as procs
 
 from paleomix.atomiccmd.command import AtomicCmd, CmdError
 from paleomix.common.utilities import safe_coerce_to_tuple
@@ -77,6 +77,13 @@ class _CommandSet:
         for command in self._commands:
             command.terminate()
 
+    def resource_usage(self):
+        usage = []
+        for command in self._commands:
+            usage.extend(command.resource_usage())
+
+        return usage
+
     def __str__(self):
         return atomicpp.pformat(self)
 
@@ -126,6 +133,11 @@ class ParallelCmds(_CommandSet):
                 )
         _CommandSet.__init__(self, commands)
 
+    @property
+    def memory(self):
+        """Commands are run concurrently, so memory usage is the sum of commands."""
+        return sum(command.memory for command in self._commands)
+
     def run(self, temp):
         for command in self._commands:
             command.run(temp)
@@ -135,7 +147,6 @@ class ParallelCmds(_CommandSet):
         return all(cmd.ready() for cmd in self._commands)
 
     def join(self):
-        sleep_time = 0.05
         commands = list(enumerate(self._commands))
         return_codes = [[None]] * len(commands)
         while commands and self._joinable:
@@ -143,17 +154,32 @@ class ParallelCmds(_CommandSet):
                 if command.ready():
                     return_codes[index] = command.join()
                     commands.remove((index, command))
-                    sleep_time = 0.05
                 elif any(any(codes) for codes in return_codes):
                     command.terminate()
                     return_codes[index] = command.join()
                     commands.remove((index, command))
-                    sleep_time = 0.05
 
-            time.sleep(sleep_time)
-            sleep_time = min(1, sleep_time * 2)
+            # Remaining commands are terminated immediately following a failure
+            if commands and not any(any(codes) for codes in return_codes):
+                running = self._running_procs(command for (_, command) in commands)
+                # Commands may have finished while collecting running processes
+                if not any(command.ready() for (_, command) in commands):
+                    procs.wait_any(running)
+
         return sum(return_codes, [])
 
+    @classmethod
+    def _running_procs(cls, commands):
+        """Returns the processes of (nested) commands that have not finished."""
+        running = []
+        for command in commands:
+            if isinstance(command, ParallelCmds):
+                running.extend(cls._running_procs(command._commands))
+            elif command._proc is not None and not command.ready():
+                running.append(command._proc)
+
+        return running
+
 
 class SequentialCmds(_CommandSet):
     """This class wraps a set of AtomicCmds, running them sequentially.
@@ -179,6 +205,11 @@ class SequentialCmds(_CommandSet):
                 )
         _CommandSet.__init__(self, commands)
 
+    @property
+    def memory(self):
+        """Commands are run one at a time, so memory usage is the max of commands."""
+        return max(command.memory for command in self._commands)
+
     def run(self, temp):
         self._ready = False
         for command in self._commands:
@@ -0,0 +1,179 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2020 Mikkel Schubert <MikkelSch@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Multi-threaded reading of BGZF compressed files.
+
+BGZF files (as produced by 'bgzip', 'samtools', etc.) consist of a series of
+small gzip members, each recording its compressed size in the gzip header. This
+allows blocks to be read without decompressing them, and to be decompressed in
+parallel; since zlib releases the GIL, this is done using a pool of threads.
+"""
+import collections
+import gzip
+import io
+import struct
+import zlib
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+
+# Gzip header (magic, compression method, flags, mtime, xflags, os, xlen)
+_HEADER = struct.Struct("<HBBIBBH")
+# Gzip footer (CRC32 and uncompressed size)
+_FOOTER = struct.Struct("<II")
+# Gzip flags indicating the presence of the 'extra' field
+_FEXTRA = 4
+
+_BadGzipFile = getattr(gzip, "BadGzipFile", OSError)
+
+
+class BGZFReader(io.RawIOBase):
+    """Raw, read-only file object that decompresses BGZF blocks using a pool of
+    threads. Members that are not BGZF blocks (e.g. data appended to the file
+    using 'gzip') are decompressed using the gzip module."""
+
+    def __init__(self, filename: str, threads: int) -> None:
+        io.RawIOBase.__init__(self)
+        if threads < 1:
+            raise ValueError("threads must be >= 1, not %r" % (threads,))
+
+        self._handle = open(filename, "rb")
+        self._executor = ThreadPoolExecutor(threads)
+        # Number of blocks being decompressed ahead of the current block
+        self._max_pending = threads * 4
+        self._pending = collections.deque()  # type: collections.deque
+        self._buffer = memoryview(b"")
+        self._fallback = None  # type: Optional[gzip.GzipFile]
+        self._eof = False
+
+    @classmethod
+    def is_bgzf(cls, filename: str) -> bool:
+        """Returns true if the first member of a file is a BGZF block."""
+        with open(filename, "rb") as handle:
+            return _read_block_size(handle) is not None
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buf) -> int:
+        while not self._buffer:
+            if not self._fill_buffer():
+                return 0
+
+        nbytes = min(len(buf), len(self._buffer))
+        buf[:nbytes] = self._buffer[:nbytes]
+        self._buffer = self._buffer[nbytes:]
+
+        return nbytes
+
+    def close(self) -> None:
+        if not self.closed:
+            for future in self._pending:
+                future.cancel()
+
+            self._pending.clear()
+            self._executor.shutdown(wait=True)
+            if self._fallback is not None:
+                self._fallback.close()
+            self._handle.close()
+
+        io.RawIOBase.close(self)
+
+    def _fill_buffer(self) -> bool:
+        while not self._eof and len(self._pending) < self._max_pending:
+            block = self._read_block()
+            if block is None:
+                self._eof = True
+                break
+
+            self._pending.append(self._executor.submit(_decompress_block, *block))
+
+        if self._pending:
+            self._buffer = memoryview(self._pending.popleft().result())
+        elif self._fallback is not None:
+            data = self._fallback.read(io.DEFAULT_BUFFER_SIZE)
+            if not data:
+                return False
+
+            self._buffer = memoryview(data)
+        else:
+            return False
+
+        return True
+
+    def _read_block(self) -> Optional[Tuple[bytes, int, int]]:
+        offset = self._handle.tell()
+        block_size = _read_block_size(self._handle)
+        if block_size is None:
+            self._handle.seek(offset)
+            if self._handle.peek(1):
+                # Remaining members are decompressed sequentially
+                self._fallback = gzip.GzipFile(fileobj=self._handle, mode="rb")
+
+            return None
+
+        remaining = block_size - (self._handle.tell() - offset)
+        data = self._handle.read(remaining)
+        if len(data) < remaining or remaining < _FOOTER.size:
+            raise EOFError(
+                "Compressed file ended before the end-of-stream marker was reached"
+            )
+
+        crc, size = _FOOTER.unpack(data[-_FOOTER.size :])
+
+        return data[: -_FOOTER.size], crc, size
+
+
+def _read_block_size(handle) -> Optional[int]:
+    """Reads the header of a gzip member, returning the total size of the member
+    if it is a BGZF block; returns None otherwise."""
+    header = handle.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+
+    magic, method, flags, _, _, _, xlen = _HEADER.unpack(header)
+    if magic != 0x8B1F or method != 8 or not (flags & _FEXTRA):
+        return None
+
+    extra = handle.read(xlen)
+    while len(extra) >= 4:
+        (si1, si2, slen) = struct.unpack("<BBH", extra[:4])
+        if (si1, si2, slen) == (66, 67, 2) and len(extra) >= 6:
+            (block_size,) = struct.unpack("<H", extra[4:6])
+
+            return block_size + 1
+
+        extra = extra[4 + slen :]
+
+    return None
+
+
+def _decompress_block(data: bytes, crc: int, size: int) -> bytes:
+    result = zlib.decompress(data, -15)
+    result_crc = zlib.crc32(result)
+    if result_crc != crc:
+        raise _BadGzipFile("CRC check failed %s != %s" % (hex(result_crc), hex(crc)))
+    elif len(result) != size:
+        raise _BadGzipFile("Incorrect length of data produced")
+
+    return result
@@ -20,19 +20,27 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 #
+import io
 import os
 import bz2
 import gzip
 import uuid
 import errno
 import shutil
+import subprocess
+import tempfile
 
 from pathlib import Path, PosixPath
 from typing import Any, Callable, IO, Iterable, List, Optional, Tuple, Union
 
+from .bgzf import BGZFReader
 from .utilities import safe_coerce_to_tuple
 
 
+# Executable used to decompress (non-BGZF) GZip files, if available
+_PARALLEL_GZIP = "pigz"
+
+
 try:
     import pathlib2
 
@@ -153,9 +161,16 @@ def copy_file(source: Union[str, Path], destination: Union[str, Path]) -> None:
     _sh_wrapper(shutil.copy, source, destination)
 
 
-def open_ro(filename: Union[str, Path], mode: str = "rt") -> IO[str]:
+def open_ro(
+    filename: Union[str, Path], mode: str = "rt", threads: int = 1
+) -> IO[str]:
     """Opens a file for reading, transparently handling
-    GZip and BZip2 compressed files. Returns a file handle."""
+    GZip and BZip2 compressed files. Returns a file handle.
+
+    BGZF compressed files are decompressed using up to 'threads' threads, while
+    other GZip files are decompressed using 'pigz', if available and if 'threads'
+    is greater than 1. By default, files are decompressed in the calling thread.
+    """
     filename = fspath(filename)
     if mode not in ("rt", "rb", "r"):
         raise ValueError(mode)
@@ -167,7 +182,7 @@ def open_ro(filename: Union[str, Path], mode: str = "rt") -> IO[str]:
         header = handle.read(2)
 
     if header == b"\x1f\x8b":
-        return gzip.open(filename, mode)
+        return _open_gzip(filename, mode, threads)
     elif header == b"BZ":
         return bz2.open(filename, mode)
     else:
@@ -278,6 +293,72 @@ def validate_filenames(filenames: Iterable[str]) -> Tuple[str, ...]:
     return tuple(fspath(filename) for filename in safe_coerce_to_tuple(filenames))
 
 
+def _open_gzip(filename: str, mode: str, threads: int) -> IO[Any]:
+    if threads > 1 and BGZFReader.is_bgzf(filename):
+        handle = io.BufferedReader(BGZFReader(filename, threads))
+    elif threads > 1 and shutil.which(_PARALLEL_GZIP) is not None:
+        handle = io.BufferedReader(_CommandReader([_PARALLEL_GZIP, "-dc", filename]))
+    else:
+        return gzip.open(filename, mode)
+
+    if mode == "rt":
+        return io.TextIOWrapper(handle)
+
+    return handle
+
+
+class _CommandReader(io.RawIOBase):
+    """Raw, read-only file object reading the output of a command. An OSError
+    is raised on EOF if the command terminated with a non-zero exit-code."""
+
+    def __init__(self, command: List[str]) -> None:
+        io.RawIOBase.__init__(self)
+        self._command = command
+        # STDERR is written to a file, since a full pipe would block the command
+        self._stderr = tempfile.TemporaryFile()
+        try:
+            self._proc = subprocess.Popen(
+                command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=self._stderr,
+                close_fds=True,
+            )
+        except BaseException:
+            self._stderr.close()
+            raise
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buf) -> int:
+        nbytes = self._proc.stdout.readinto(buf)
+        if not nbytes:
+            if self._proc.wait():
+                self._stderr.seek(0)
+                stderr = self._stderr.read()
+                raise OSError(
+                    "Error running %r: %s"
+                    % (
+                        " ".join(self._command),
+                        stderr.decode("utf-8", "replace").strip(),
+                    )
+                )
+
+        return nbytes
+
+    def close(self) -> None:
+        if not self.closed:
+            if self._proc.poll() is None:
+                self._proc.kill()
+
+            self._proc.stdout.close()
+            self._proc.wait()
+            self._stderr.close()
+
+        io.RawIOBase.close(self)
+
+
 def _sh_wrapper(
     func: Callable[[Union[str, Path], Union[str, Path]], Any],
     source: Union[str, Path],
@@ -159,6 +159,11 @@ class FASTQualities:
     def update(self, record):
         self._qualities.update(record.qualities)
 
+    def update_counts(self, counts):
+        """Updates the observed qualities from a sequence of counts, where the Nth
+        value is the number of times the character with ordinal N was observed."""
+        self._qualities.update(chr(idx) for (idx, count) in enumerate(counts) if count)
+
     def offsets(self):
         qualities = [False] * 256
         for quality in self._qualities:
@@ -23,6 +23,8 @@
 
 from collections import defaultdict
 
+import numpy
+
 from paleomix.common.sequences import split
 from paleomix.common.fileutils import open_ro
 from paleomix.common.formats.fasta import FASTA, FASTAError
@@ -227,3 +229,266 @@ class MSA(frozenset):
                 other = record
 
         return included, excluded, other
+
+
+# Bit-masks for (upper-case) nucleotides, used when filtering singletons; uncalled
+# bases ('N' and '-') are assigned the empty mask. Invalid bytes are flagged using
+# _INVALID_NT, corresponding to the KeyErrors raised by 'MSA.filter_singletons'.
+_INVALID_NT = 0x80
+_NT_MASKS = numpy.full(256, _INVALID_NT, dtype=numpy.uint8)
+_MASK_TO_NT = numpy.zeros(16, dtype=numpy.uint8)
+for (_code, _nts) in NT_CODES.items():
+    _mask = sum(1 << "ACGT".index(_nt) for _nt in _nts)
+    _MASK_TO_NT[_mask] = ord(encode_genotype(_nts))
+    _NT_MASKS[ord(_code)] = _mask
+_MASK_TO_NT[0] = ord("N")
+_NT_MASKS[ord("N")] = 0
+_NT_MASKS[ord("-")] = 0
+
+_UPPERCASE = numpy.arange(256, dtype=numpy.uint8)
+_UPPERCASE[ord("a") : ord("z") + 1] -= ord("a") - ord("A")
+_LOWERCASE = numpy.arange(256, dtype=numpy.uint8)
+_LOWERCASE[ord("A") : ord("Z") + 1] += ord("a") - ord("A")
+
+_UNCALLED = numpy.frombuffer(b"Nn-", dtype=numpy.uint8)
+
+
+class MSAMatrix:
+    """Represents a Multiple Sequence Alignment as a 2D matrix of bytes, with one
+    row per sequence (sorted by name). Supports the same operations as the MSA
+    class, but using vectorized operations on columns, and can be converted to
+    and from MSA objects without loss of information.
+    """
+
+    def __init__(self, names, metas, matrix):
+        self._names = tuple(names)
+        self._metas = tuple(metas)
+        self._matrix = matrix
+
+        if not self._names:
+            raise MSAError("MSA does not contain any sequences")
+        elif len(set(self._names)) != len(self._names):
+            raise MSAError("Duplicate name found in FASTA records")
+        elif list(self._names) != sorted(self._names):
+            raise ValueError("MSAMatrix names must be sorted")
+        elif matrix.ndim != 2 or matrix.shape[0] != len(self._names):
+            raise ValueError("MSAMatrix must have one row per sequence")
+
+    @classmethod
+    def from_records(cls, records):
+        """Builds a MSAMatrix from a sequence of FASTA records."""
+        records, names = list(records), set()
+        for record in records:
+            if record.name in names:
+                raise MSAError(
+                    "Duplicate name found in FASTA records: %r" % record.name
+                )
+            names.add(record.name)
+
+        if not records:
+            raise MSAError("MSA does not contain any sequences")
+        elif len(set(len(record.sequence) for record in records)) != 1:
+            raise MSAError("MSA contains sequences of differing lengths")
+
+        records.sort(key=lambda record: record.name)
+        matrix = numpy.empty((len(records), len(records[0].sequence)), numpy.uint8)
+        for (row, record) in zip(matrix, records):
+            row[:] = numpy.frombuffer(_encode(record.sequence), dtype=numpy.uint8)
+
+        return cls(
+            names=(record.name for record in records),
+            metas=(record.meta for record in records),
+            matrix=matrix,
+        )
+
+    @classmethod
+    def from_msa(cls, msa):
+        return cls.from_records(msa)
+
+    def to_msa(self):
+        return MSA(self.records())
+
+    def records(self):
+        """Returns the FASTA records in the MSA, sorted by name."""
+        for (name, meta, row) in zip(self._names, self._metas, self._matrix):
+            yield FASTA(name, meta or None, row.tobytes().decode("latin-1"))
+
+    def seqlen(self):
+        """Returns the length of the sequences in the MSA."""
+        return self._matrix.shape[1]
+
+    def names(self):
+        return set(self._names)
+
+    def exclude(self, names):
+        """Builds a new MSA that excludes the named set of records."""
+        _, excluded, _ = self._group(names)
+        return self._take_rows(excluded)
+
+    def select(self, names):
+        """Builds a new MSA that includes only the named set of records."""
+        included, _, _ = self._group(names)
+        return self._take_rows(included)
+
+    def reduce(self):
+        """Removes columns containing only uncalled bases ('N', 'n', and '-'),
+        returning None if no columns remain."""
+        called = ~numpy.isin(self._matrix, _UNCALLED)
+        columns = called.any(axis=0)
+        if not columns.any():
+            return None
+
+        return MSAMatrix(self._names, self._metas, self._matrix[:, columns])
+
+    def filter_singletons(self, to_filter, filter_using):
+        """See MSA.filter_singletons."""
+        included, _, to_filter = self._group(filter_using, to_filter)
+
+        sequence = self._matrix[to_filter]
+        current_nts = _UPPERCASE[sequence]
+        current_masks = _NT_MASKS[current_nts]
+        # Uncalled bases are left as is
+        uncalled = (current_nts == ord("N")) | (current_nts == ord("-"))
+
+        allowed_masks = numpy.bitwise_or.reduce(
+            _NT_MASKS[_UPPERCASE[self._matrix[included]]], axis=0
+        )
+
+        invalid = ((current_masks | allowed_masks) & _INVALID_NT).astype(bool)
+        invalid &= ~uncalled
+        if invalid.any():
+            column = invalid.nonzero()[0][0]
+            for value in (sequence[column],) + tuple(self._matrix[included, column]):
+                if _NT_MASKS[_UPPERCASE[value]] & _INVALID_NT:
+                    raise KeyError(chr(_UPPERCASE[value]))
+
+        genotypes = _MASK_TO_NT[current_masks & allowed_masks & 0xF]
+        changed = (genotypes != current_nts) & ~uncalled
+
+        matrix = self._matrix.copy()
+        matrix[to_filter, changed] = _LOWERCASE[genotypes[changed]]
+
+        return MSAMatrix(self._names, self._metas, matrix)
+
+    def split(self, split_by="123"):
+        """Splits a MSA and returns a dictionary of keys to MSAs, using the keys
+        in the 'split_by' parameter at the top level. Meta information is not
+        preserved. See also MSA.split."""
+        if not split_by:
+            raise TypeError("No partitions to split by specified")
+
+        keys = numpy.arange(self.seqlen()) % len(split_by)
+        metas = (None,) * len(self._names)
+
+        results = {}
+        for key in split_by:
+            if key not in results:
+                indices = [idx for (idx, value) in enumerate(split_by) if value == key]
+                columns = numpy.isin(keys, indices)
+
+                results[key] = MSAMatrix(self._names, metas, self._matrix[:, columns])
+
+        return results
+
+    @classmethod
+    def join(cls, *msas):
+        """Merge multiple MSAs into a single MSA, by concatenating sequences in
+        the order of the passed MSAs. Sequences are joined by name, and all MSAs
+        must therefore contain the same set of sequence names. Meta information
+        is not preserved."""
+        cls.validate(*msas)
+
+        names = msas[0]._names
+        matrix = numpy.concatenate([msa._matrix for msa in msas], axis=1)
+
+        return MSAMatrix(names, (None,) * len(names), matrix)
+
+    @classmethod
+    def from_lines(cls, lines):
+        """Parses a MSA from a file/list of lines. See MSA.from_lines."""
+        return cls.from_records(FASTA.from_lines(lines))
+
+    @classmethod
+    def from_file(cls, filename):
+        """Reads a MSA from the specified filename. See MSA.from_file."""
+        with open_ro(filename) as fasta_file:
+            try:
+                return cls.from_lines(fasta_file)
+            except MSAError as error:
+                raise MSAError("%s in file %r" % (error, filename))
+
+    def to_file(self, fileobj):
+        for record in self.records():
+            record.write(fileobj)
+
+    @classmethod
+    def validate(cls, *msas):
+        """Validates that one or more MSAs contain identical sets of names."""
+        if not msas:
+            raise TypeError("No MSAs given as arguments")
+
+        seqs_all = set()
+        seqs_common = set(msas[0]._names)
+        for msa in msas:
+            seqs_all.update(msa._names)
+            seqs_common &= set(msa._names)
+
+        if seqs_all != seqs_common:
+            raise MSAError(
+                "Some sequences not found in all MSAs: '%s'"
+                % ("', '".join(seqs_all - seqs_common),)
+            )
+
+    def __len__(self):
+        return len(self._names)
+
+    def __eq__(self, other):
+        if not isinstance(other, MSAMatrix):
+            return NotImplemented
+
+        return (
+            self._names == other._names
+            and self._metas == other._metas
+            and numpy.array_equal(self._matrix, other._matrix)
+        )
+
+    def __repr__(self):
+        return "MSAMatrix(%r)" % (self.to_msa(),)
+
+    def _group(self, selection, extra=None):
+        """Returns a tuple of (included, excluded, other) row indices, using the
+        same checks as 'MSA._group'."""
+        selection = safe_coerce_to_frozenset(selection)
+        if extra in selection:
+            raise MSAError("Key used for multiple selections: %r" % extra)
+        elif not selection:
+            raise ValueError("No FASTA names given")
+
+        missing_keys = selection - self.names()
+        if missing_keys:
+            raise KeyError("Key(s) not found: %r" % (", ".join(map(str, missing_keys))))
+
+        included, excluded, other = [], [], None
+        for (row, name) in enumerate(self._names):
+            if name in selection:
+                included.append(row)
+            elif name != extra:
+                excluded.append(row)
+            else:
+                other = row
+
+        return included, excluded, other
+
+    def _take_rows(self, rows):
+        return MSAMatrix(
+            names=(self._names[row] for row in rows),
+            metas=(self._metas[row] for row in rows),
+            matrix=self._matrix[rows],
+        )
+
+
+def _encode(sequence):
+    try:
+        return sequence.encode("latin-1")
+    except UnicodeEncodeError:
+        raise MSAError("MSA contains unsupported (non-latin-1) characters")
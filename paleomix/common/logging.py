@@ -52,6 +52,18 @@ def initialize_console_logging():
         _LOG_ENABLED = True
 
 
+def reset():
+    """Removes all handlers from the root logger, so that logging may be initialized
+    anew; this is intended for use in forked processes."""
+    global _LOG_ENABLED
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    _LOG_ENABLED = False
+
+
 def initialize(log_level="error", log_file=None, name="paleomix"):
     initialize_console_logging()
 
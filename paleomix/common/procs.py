@@ -23,15 +23,35 @@
 """
 Tools used for working with subprocesses.
 """
+import multiprocessing
 import os
+import selectors
+import signal
+import subprocess
 import sys
+import threading
 import time
+import traceback
 
 from subprocess import *
 
 
 DEVNULL = object()
 
+_STD_STREAMS = ("stdin", "stdout", "stderr")
+_STD_MODES = ("r", "w", "w")
+
+# Keys of dictionaries returned by 'wait_proc'
+_USAGE_KEYS = ("user_time", "system_time", "max_rss", "bytes_read", "bytes_written")
+_WAIT_LOCK = threading.Lock()
+
+# Set to false if pidfds are not supported by the kernel (requires Linux 5.3+)
+_PIDFD_SUPPORTED = hasattr(os, "pidfd_open")
+# Threads waiting for processes to terminate (see '_wait_any_threaded'); entries
+# are removed by the threads themselves, once the process has terminated
+_WAITERS = {}
+_WAITERS_CONDITION = threading.Condition()
+
 
 def open_proc(call, *args, **kwargs):
     """Wrapper around subprocess.Popen, which records the system call as a
@@ -64,13 +84,309 @@ def open_proc(call, *args, **kwargs):
             os.close(devnull)
 
 
+def fork_proc(call, func, args, stdin=DEVNULL, stdout=None, stderr=None, cwd=None):
+    """Similar to 'open_proc', but instead of executing 'call', 'func(args)' is run
+    in a forked copy of the current process, with the return value of 'func' used
+    as the exit-code. This avoids the cost of starting a new interpreter and of
+    re-importing modules. The child is run in a new session (c.f. os.setsid) and
+    the 'stdin', 'stdout', and 'stderr' arguments are handled as by 'open_proc',
+    except that only the fileno of file objects is used.
+
+    A Popen-like object is returned, supporting 'poll', 'wait', and 'terminate',
+    and with the properties 'pid', 'call', 'returncode', and 'stdout'.
+    """
+    return _ForkedProc(call, func, args, stdin, stdout, stderr, cwd)
+
+
+class _ForkedProc:
+    def __init__(self, call, func, args, stdin, stdout, stderr, cwd):
+        self.call = tuple(call)
+        self.pid = None
+        self.returncode = None
+        self.stdout = None
+
+        # File descriptors opened here and closed once the child has been forked
+        to_close = []
+        try:
+            fds = []
+            for (key, value) in zip(_STD_STREAMS, (stdin, stdout, stderr)):
+                if value is DEVNULL:
+                    value = os.open(os.devnull, os.O_RDWR)
+                    to_close.append(value)
+                elif value is subprocess.PIPE:
+                    if key != "stdout":
+                        raise ValueError("PIPE is only supported for STDOUT")
+
+                    (read_fd, value) = os.pipe()
+                    to_close.append(value)
+                    self.stdout = os.fdopen(read_fd, "rb")
+                elif value is not None and not isinstance(value, int):
+                    value = value.fileno()
+
+                fds.append(value)
+
+            # Used to wait for the child to create a new session; this ensures that
+            # the process group exists when 'terminate' is called
+            (sync_read_fd, sync_write_fd) = os.pipe()
+            to_close.append(sync_read_fd)
+            to_close.append(sync_write_fd)
+
+            # Prevent buffered output being written by both parent and child
+            sys.stdout.flush()
+            sys.stderr.flush()
+
+            self.pid = os.fork()
+            if not self.pid:
+                os.close(sync_read_fd)
+                os._exit(_run_forked_child(func, args, fds, cwd, sync_write_fd))
+
+            os.close(sync_write_fd)
+            to_close.remove(sync_write_fd)
+            os.read(sync_read_fd, 1)
+        except BaseException:
+            if self.stdout is not None:
+                self.stdout.close()
+            raise
+        finally:
+            for fd in to_close:
+                os.close(fd)
+
+    def poll(self):
+        if self.returncode is None:
+            (pid, status) = os.waitpid(self.pid, os.WNOHANG)
+            if pid:
+                self._set_returncode(status)
+
+        return self.returncode
+
+    def wait(self):
+        if self.returncode is None:
+            (_, status) = os.waitpid(self.pid, 0)
+            self._set_returncode(status)
+
+        return self.returncode
+
+    def terminate(self):
+        if self.returncode is None:
+            os.kill(self.pid, signal.SIGTERM)
+
+    def kill(self):
+        if self.returncode is None:
+            os.kill(self.pid, signal.SIGKILL)
+
+    def _set_returncode(self, status):
+        if os.WIFSIGNALED(status):
+            self.returncode = -os.WTERMSIG(status)
+        else:
+            self.returncode = os.WEXITSTATUS(status)
+
+
+def _run_forked_child(func, args, fds, cwd, sync_fd):
+    returncode = 1
+    try:
+        # Handlers installed by the parent process are not relevant to the child
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        os.setsid()
+        os.close(sync_fd)
+
+        for (std_fd, fd) in enumerate(fds):
+            if fd is not None:
+                os.dup2(fd, std_fd)
+                handle = open(std_fd, _STD_MODES[std_fd], closefd=False)
+                setattr(sys, _STD_STREAMS[std_fd], handle)
+
+        # Similar to Popen(close_fds=True); inherited pipes, e.g. those connecting
+        # other commands in a ParallelCmds, would otherwise prevent EOFs
+        os.closerange(3, _get_max_fd())
+
+        if cwd is not None:
+            os.chdir(cwd)
+
+        # Allow the use of multiprocessing in children of daemonic processes
+        multiprocessing.current_process().daemon = False
+
+        returncode = func(args)
+    except SystemExit as error:
+        returncode = error.code
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except BaseException:
+            returncode = returncode or 1
+
+    if returncode is None:
+        return 0
+    elif not isinstance(returncode, int):
+        sys.stderr.write("%s\n" % (returncode,))
+        sys.stderr.flush()
+        return 1
+
+    return returncode & 0xFF
+
+
+def _get_max_fd():
+    try:
+        return os.sysconf("SC_OPEN_MAX")
+    except (OSError, ValueError):
+        return 256
+
+
+def wait_proc(proc, block=True):
+    """Waits for a Popen-like process (see 'open_proc' and 'fork_proc') to terminate
+    and sets 'proc.returncode', similar to 'proc.wait()' (or 'proc.poll()' if 'block'
+    is false). Returns a dictionary describing the resources used by the process and
+    by any children it waited for, namely the CPU time in seconds ('user_time' and
+    'system_time'), the peak resident set size in bytes ('max_rss'), and the number
+    of bytes read and written ('bytes_read' and 'bytes_written'). Values that could
+    not be determined are None. Returns None if the process is still running.
+    """
+    if proc.returncode is None and hasattr(os, "waitid"):
+        # The process is left as a zombie, allowing the I/O statistics to be read
+        flags = os.WEXITED | os.WNOWAIT | (0 if block else os.WNOHANG)
+        if os.waitid(os.P_PID, proc.pid, flags) is None:
+            return None
+
+        # Prevents the process from being reaped by multiple threads
+        with _WAIT_LOCK:
+            if proc.returncode is None:
+                usage = _read_proc_io(proc.pid)
+                (_, status, rusage) = os.wait4(proc.pid, 0)
+                if os.WIFSIGNALED(status):
+                    proc.returncode = -os.WTERMSIG(status)
+                else:
+                    proc.returncode = os.WEXITSTATUS(status)
+
+                usage["user_time"] = rusage.ru_utime
+                usage["system_time"] = rusage.ru_stime
+                # Reported in kilobytes on Linux, but in bytes on OSX
+                usage["max_rss"] = rusage.ru_maxrss
+                if sys.platform != "darwin":
+                    usage["max_rss"] *= 1024
+
+                return usage
+
+    # Already reaped, or resource usage cannot be collected on this platform
+    if (proc.wait() if block else proc.poll()) is None:
+        return None
+
+    return dict.fromkeys(_USAGE_KEYS)
+
+
+def wait_any(procs, timeout=None):
+    """Blocks until at least one of a set of Popen-like processes (see 'open_proc'
+    and 'fork_proc') has terminated, or until 'timeout' seconds have passed. The
+    processes are not reaped, and 'wait_proc', 'proc.poll', or similar must be used
+    to collect return-codes. Returns a list of processes found to have terminated.
+    """
+    global _PIDFD_SUPPORTED
+
+    procs = [proc for proc in procs if proc.returncode is None]
+    if not procs:
+        return []
+
+    if _PIDFD_SUPPORTED:
+        try:
+            return _wait_any_pidfd(procs, timeout)
+        except OSError:
+            _PIDFD_SUPPORTED = False
+
+    if hasattr(os, "waitid"):
+        return _wait_any_threaded(procs, timeout)
+
+    # Fall back to polling, which reaps the processes
+    deadline = None if timeout is None else time.monotonic() + timeout
+    sleep_time = 0.05
+    while True:
+        finished = [proc for proc in procs if proc.poll() is not None]
+        if finished or (deadline is not None and time.monotonic() >= deadline):
+            return finished
+
+        time.sleep(sleep_time)
+        sleep_time = min(1, sleep_time * 2)
+
+
+def _wait_any_pidfd(procs, timeout):
+    """Waits for processes using pidfds, which become readable once the process
+    has terminated."""
+    fds = []
+    try:
+        with selectors.DefaultSelector() as selector:
+            for proc in procs:
+                try:
+                    fd = os.pidfd_open(proc.pid)
+                except ProcessLookupError:
+                    # Already reaped, e.g. by another thread
+                    return [proc]
+
+                fds.append(fd)
+                selector.register(fd, selectors.EVENT_READ, proc)
+
+            return [key.data for (key, _) in selector.select(timeout)]
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+
+def _wait_any_threaded(procs, timeout):
+    """Waits for processes using a thread per process blocking on 'os.waitid',
+    which (unlike a SIGCHLD handler) can be used from any thread."""
+    with _WAITERS_CONDITION:
+        for proc in procs:
+            if proc not in _WAITERS:
+                thread = threading.Thread(target=_waitid_thread, args=(proc,))
+                thread.daemon = True
+                _WAITERS[proc] = thread
+                thread.start()
+
+        def _any_finished():
+            return any(proc not in _WAITERS for proc in procs)
+
+        _WAITERS_CONDITION.wait_for(_any_finished, timeout)
+
+        return [proc for proc in procs if proc not in _WAITERS]
+
+
+def _waitid_thread(proc):
+    try:
+        # The process is left as a zombie, so that it may be reaped by the caller
+        os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+    except ChildProcessError:
+        pass  # Already reaped
+
+    with _WAITERS_CONDITION:
+        _WAITERS.pop(proc, None)
+        _WAITERS_CONDITION.notify_all()
+
+
+def _read_proc_io(pid):
+    """Returns the number of bytes read and written by a process (including any
+    I/O not involving the disk) as reported in /proc/<pid>/io, if available."""
+    usage = {"bytes_read": None, "bytes_written": None}
+
+    try:
+        with open("/proc/%i/io" % (pid,)) as handle:
+            for line in handle:
+                (key, value) = line.split(":", 1)
+                if key == "rchar":
+                    usage["bytes_read"] = int(value)
+                elif key == "wchar":
+                    usage["bytes_written"] = int(value)
+    except (OSError, ValueError):
+        pass
+
+    return usage
+
+
 def join_procs(procs, out=sys.stderr):
     """Joins a set of Popen processes. If a processes fail, the remaining
     processes are terminated. The function returns a list of return-code,
     containing the result of each call. Status messages are written to STDERR
     by default.
     """
-    sleep_time = 0.05
     commands = list(enumerate(procs))
     assert all(hasattr(cmd, "call") for (_, cmd) in commands)
 
@@ -81,7 +397,6 @@ def join_procs(procs, out=sys.stderr):
             if command.poll() is not None:
                 return_codes[index] = command.wait()
                 commands.remove((index, command))
-                sleep_time = 0.05
 
                 out.write(
                     "  - Command finished: %s\n"
@@ -96,10 +411,10 @@ def join_procs(procs, out=sys.stderr):
                 command.terminate()
                 return_codes[index] = command.wait()
                 commands.remove((index, command))
-                sleep_time = 0.05
 
-        time.sleep(sleep_time)
-        sleep_time = min(1, sleep_time * 2)
+        # Remaining processes are terminated immediately following a failure
+        if commands and not any(return_codes):
+            wait_any([command for (_, command) in commands])
 
     if any(return_codes):
         out.write("Errors occured during processing!\n")
@@ -21,6 +21,7 @@
 # SOFTWARE.
 #
 import os
+import re
 import sys
 import resource
 
@@ -52,3 +53,55 @@ def get_max_open_files():
         pass
 
     return soft_limit
+
+
+_MEMORY_SIZE_REGEX = re.compile(r"^(\d+)([kmgt]?)b?$", re.IGNORECASE)
+_MEMORY_SIZE_UNITS = {"": 1, "k": 2 ** 10, "m": 2 ** 20, "g": 2 ** 30, "t": 2 ** 40}
+
+
+def memory_size(value):
+    """Parses an amount of memory specified as an integer, optionally followed by
+    a K, M, G, or T suffix (e.g. '768M' or '4g'), as used by the JVM and samtools.
+    Values without a suffix are taken to be bytes. Returns the size in bytes.
+    """
+    if isinstance(value, int):
+        size = value
+    else:
+        match = _MEMORY_SIZE_REGEX.match(value.strip())
+        if match is None:
+            raise ValueError("invalid memory size %r" % (value,))
+
+        count, unit = match.groups()
+        size = int(count) * _MEMORY_SIZE_UNITS[unit.lower()]
+
+    if size < 0:
+        raise ValueError("memory size must be non-negative, not %r" % (value,))
+
+    return size
+
+
+def format_memory_size(size):
+    """Formats a size in bytes for use with 'memory_size', using the largest unit
+    that represents the size exactly. Sizes larger than 1M that cannot be
+    represented exactly are rounded down to whole megabytes. Returns None for None.
+    """
+    if not size:
+        return size
+
+    for unit in "tgmk":
+        if not size % _MEMORY_SIZE_UNITS[unit]:
+            return "%i%s" % (size // _MEMORY_SIZE_UNITS[unit], unit.upper())
+        elif unit == "m" and size > _MEMORY_SIZE_UNITS[unit]:
+            return "%iM" % (size // _MEMORY_SIZE_UNITS[unit],)
+
+    return str(size)
+
+
+def get_total_memory():
+    """Returns the total amount of physical memory in bytes, or None if this could
+    not be determined.
+    """
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
@@ -0,0 +1,149 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2020 Mikkel Schubert <MikkelSch@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Persistent cache of the results of validating input files.
+
+Results are stored in an SQLite database (see 'set_cache_filename'), keyed by
+the kind of validation and by the real path of the file, and are used as long as
+the size, mtime, and inode of the file, and a checksum of the first and last
+blocks of the file, are unchanged. Only successful validations are cached.
+
+SQLite handles locking of the database, allowing the cache to be shared by
+pipelines running concurrently; failure to read or update the cache is not
+fatal, and simply results in files being validated again.
+"""
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+
+from typing import Any, Callable, Optional, Tuple
+
+from .fileutils import fspath
+
+
+# Database in which validation results are cached; None if caching is disabled
+_CACHE_FILENAME = None  # type: Optional[str]
+
+# Number of bytes at the start and end of files included in checksums
+_CHECKSUM_BLOCK_SIZE = 64 * 1024
+
+
+def set_cache_filename(filename: Optional[str]) -> None:
+    """Enables caching of validation results in the specified (SQLite) database;
+    if filename is None, caching is disabled."""
+    global _CACHE_FILENAME
+
+    _CACHE_FILENAME = filename
+
+
+def cached(kind: str, filename: str, func: Callable[[str], Any]) -> Any:
+    """Returns the cached result of validating a file, if the file is unchanged
+    since it was validated, and otherwise returns the result of 'func(filename)'.
+    The result must be JSON serializable and is cached unless 'func' raises an
+    exception. The 'kind' should be changed if the validation itself changes.
+    """
+    filename = fspath(filename)
+    if _CACHE_FILENAME is None:
+        return func(filename)
+
+    log = logging.getLogger(__name__)
+    # The state of the file is collected before validation, so that any changes
+    # made during validation invalidate the cached result
+    path, state = _get_state(filename)
+
+    try:
+        row = _get_result(_CACHE_FILENAME, kind, path)
+    except (OSError, sqlite3.Error) as error:
+        log.debug("Could not read validation cache %r: %s", _CACHE_FILENAME, error)
+        row = None
+
+    if row is not None and tuple(row[:4]) == state:
+        log.debug("Using cached validation result for %r", filename)
+        return json.loads(row[4])
+
+    result = func(filename)
+
+    try:
+        _set_result(_CACHE_FILENAME, (kind, path) + state + (json.dumps(result),))
+    except (OSError, sqlite3.Error) as error:
+        log.debug("Could not update validation cache %r: %s", _CACHE_FILENAME, error)
+
+    return result
+
+
+def _get_result(cache_filename: str, kind: str, path: str) -> Optional[Tuple]:
+    with contextlib.closing(_connect(cache_filename)) as connection:
+        return connection.execute(
+            "SELECT size, mtime_ns, inode, checksum, result FROM results "
+            "WHERE kind = ? AND path = ?",
+            (kind, path),
+        ).fetchone()
+
+
+def _set_result(cache_filename: str, row: Tuple) -> None:
+    with contextlib.closing(_connect(cache_filename)) as connection:
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)", row
+            )
+
+
+def _connect(filename: str) -> sqlite3.Connection:
+    dirname = os.path.dirname(filename)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+
+    connection = sqlite3.connect(filename, timeout=60)
+    with connection:
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                kind TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                checksum TEXT NOT NULL,
+                result TEXT NOT NULL,
+                PRIMARY KEY (kind, path)
+            )
+            """
+        )
+
+    return connection
+
+
+def _get_state(filename: str) -> Tuple[str, Tuple[int, int, int, str]]:
+    with open(filename, "rb") as handle:
+        stats = os.fstat(handle.fileno())
+
+        checksum = hashlib.sha256(handle.read(_CHECKSUM_BLOCK_SIZE))
+        if stats.st_size > _CHECKSUM_BLOCK_SIZE:
+            handle.seek(max(_CHECKSUM_BLOCK_SIZE, stats.st_size - _CHECKSUM_BLOCK_SIZE))
+            checksum.update(handle.read(_CHECKSUM_BLOCK_SIZE))
+
+    state = (stats.st_size, stats.st_mtime_ns, stats.st_ino, checksum.hexdigest())
+
+    return os.path.realpath(filename), state
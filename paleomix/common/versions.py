@@ -42,9 +42,20 @@ For example, to check that the Java version is v1.7 or later:
         obj()
     except VersionRequirementError:
         pass  # requirements not met, or failure to determine version
+
+The output of system calls for requirements that were met may furthermore be
+cached on disk (see 'set_cache_filename'), keyed by the call and by the path,
+size and mtime of the executable and of any files passed to it. This avoids
+re-running version checks for tools that have not changed between runs.
 """
+import collections
+import json
 import operator
+import os
 import re
+import shutil
+import stat
+import threading
 
 from paleomix.common.utilities import TotallyOrdered, safe_coerce_to_tuple, try_cast
 
@@ -53,8 +64,13 @@ import paleomix.common.procs as procs
 
 # Cache used to store the output of cmd-line / function calls
 _CALL_CACHE = {}
+# Locks used to prevent the same call being made simultaneously in several threads
+_CALL_LOCKS = collections.defaultdict(threading.Lock)
+_CALL_LOCKS_LOCK = threading.Lock()
 # Cache used to store Requirement object
 _REQUIREMENT_CACHE = {}
+# On-disk cache of the output of system calls for requirements that were met
+_PERSISTENT_CACHE = None
 
 
 class VersionRequirementError(Exception):
@@ -171,6 +187,11 @@ class RequirementObj:
 
             self._done = True
 
+            cache = _PERSISTENT_CACHE
+            if cache is not None and not callable(self._call[0]):
+                if cache.get(self._call) is None:
+                    cache.set(self._call, _do_call(self._call))
+
     def _check_for_outdated_jre(self, output):
         """Checks for the error raised if the JRE is unable to run a JAR file.
         This happens if the JAR was built with a never version of the JRE, e.g.
@@ -359,6 +380,95 @@ class Or(Operator):
         Operator.__init__(self, " or ", _func_or, *checks)
 
 
+class _VersionCache:
+    """JSON file containing the output of system calls, keyed by the call and by
+    the path, size, and mtime of the executable and any other files in the call.
+    The file is re-read before being updated, to merge in changes made by other
+    processes, and is replaced atomically.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._cache = None
+
+    def get(self, call):
+        key = self._get_key(call)
+        if key is not None:
+            with self._lock:
+                if self._cache is None:
+                    self._cache = self._read()
+
+                return self._cache.get(key)
+
+    def set(self, call, output):
+        key = self._get_key(call)
+        if key is None:
+            return
+
+        if isinstance(output, bytes):
+            output = output.decode("utf-8", "replace")
+
+        with self._lock:
+            cache = self._read()
+            cache[key] = output
+            self._cache = cache
+
+            temp_filename = "%s.%i.tmp" % (self.filename, os.getpid())
+            try:
+                os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+                with open(temp_filename, "w") as handle:
+                    json.dump(cache, handle)
+                os.replace(temp_filename, self.filename)
+            except OSError:
+                # Failure to update the cache is not fatal
+                pass
+
+    def _read(self):
+        try:
+            with open(self.filename) as handle:
+                cache = json.load(handle)
+        except (OSError, ValueError):
+            return {}
+
+        return cache if isinstance(cache, dict) else {}
+
+    @classmethod
+    def _get_key(cls, call):
+        executable = shutil.which(call[0])
+        if executable is None:
+            return None
+
+        files = []
+        for filename in (executable,) + call[1:]:
+            if not isinstance(filename, str):
+                return None
+
+            try:
+                stats = os.stat(filename)
+            except (OSError, ValueError):
+                continue
+
+            # Only (executable) files are considered, to ignore e.g. temp folders
+            if not stat.S_ISREG(stats.st_mode):
+                continue
+
+            files.append([os.path.abspath(filename), stats.st_size, stats.st_mtime_ns])
+
+        return json.dumps([call, files])
+
+
+def set_cache_filename(filename):
+    """Enables caching of the output of system calls for requirements that were
+    met in the specified (JSON) file; if filename is None, caching is disabled.
+    """
+    global _PERSISTENT_CACHE
+
+    _PERSISTENT_CACHE = None
+    if filename is not None:
+        _PERSISTENT_CACHE = _VersionCache(filename)
+
+
 ###############################################################################
 ###############################################################################
 # Check functions; must be available for pickle
@@ -408,14 +518,23 @@ def _do_call(call):
     calls with the same signature (either a function call or system call). If
     the call raised an OSError, then the exception is returned as a value.
     """
-    try:
-        result = _CALL_CACHE[call]
-    except KeyError:
-        if callable(call[0]):
-            result = call[0](*call[1:])
-        else:
-            result = _run(call)
-        _CALL_CACHE[call] = result
+    with _CALL_LOCKS_LOCK:
+        lock = _CALL_LOCKS[call]
+
+    with lock:
+        try:
+            result = _CALL_CACHE[call]
+        except KeyError:
+            if callable(call[0]):
+                result = call[0](*call[1:])
+            else:
+                result = None
+                if _PERSISTENT_CACHE is not None:
+                    result = _PERSISTENT_CACHE.get(call)
+
+                if result is None:
+                    result = _run(call)
+            _CALL_CACHE[call] = result
 
     if isinstance(result, OSError):
         raise result
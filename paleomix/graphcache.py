@@ -0,0 +1,246 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2020 Mikkel Schubert <MikkelSch@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Cache of the nodes built by a pipeline.
+
+Building large pipelines involves parsing and validating makefiles, locating
+input files, and creating a large number of nodes and commands. The nodes built
+for a set of makefiles may therefore be cached (see '--graph-cache'), and are
+re-used as long as the makefiles, the command-line options, and the version of
+PALEOMIX are unchanged, and as long as the input files of the pipeline (and the
+folders containing them) are unchanged. Pipelines that read other files while
+building nodes must specify the folders containing these, in which case the
+cache is also invalidated if any file in those folders changes.
+
+Note that new files matching glob patterns in makefiles are only detected if
+they are placed in a folder that contained input files when the cache was
+written.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sys
+
+import paleomix
+
+
+# Options that affect how a pipeline is run, but not the nodes that are built
+_RUNTIME_OPTIONS = frozenset(
+    (
+        "command",
+        "dry_run",
+        "file_index",
+        "graph_cache",
+        "list_executables",
+        "list_input_files",
+        "list_output_files",
+        "log_file",
+        "log_level",
+        "max_memory",
+        "report_resources",
+        "timeline",
+    )
+)
+
+
+class GraphCache:
+    def __init__(self, filename, makefiles, options, folders=()):
+        """Cache of the nodes built from the makefiles, using a dictionary of
+        command-line options. Options in _RUNTIME_OPTIONS are ignored. Changes to
+        files in 'folders' (but not in sub-folders) also invalidate the cache."""
+        self.filename = filename
+        self._folders = tuple(folders)
+        self._log = logging.getLogger(__name__)
+
+        try:
+            self._key = _calculate_key(makefiles, options)
+        except OSError as error:
+            self._log.warning("Could not read makefiles: %s", error)
+            self._key = None
+
+    def load(self):
+        """Returns the cached list of nodes, or None if the cache does not exist,
+        could not be read, or is outdated."""
+        if self._key is None or not os.path.exists(self.filename):
+            return None
+
+        try:
+            with open(self.filename, "rb") as handle:
+                header = pickle.load(handle)
+                if not self._is_current(header):
+                    self._log.info("Pipeline graph cache is outdated")
+                    return None
+
+                self._log.info("Loading pipeline graph from %r", self.filename)
+                return _unpack_nodes(pickle.load(handle))
+        # Unpickling may fail in a multitude of ways, but failures are not fatal
+        except Exception as error:
+            self._log.warning("Could not read %r: %s", self.filename, error)
+
+        return None
+
+    def _is_current(self, header):
+        if header.get("key") != self._key:
+            return False
+
+        for filename, state in header["files"].items():
+            if _get_file_state(filename) != state:
+                return False
+
+        return True
+
+    def save(self, nodes):
+        """Writes the nodes to the cache, replacing any existing cache. The
+        cache is not updated if the makefiles could not be read."""
+        if self._key is None:
+            return
+
+        all_nodes = _list_nodes(nodes)
+        header = {
+            "key": self._key,
+            "files": _collect_file_states(all_nodes, self._folders),
+        }
+
+        temp_filename = "%s.%i.tmp" % (self.filename, os.getpid())
+        try:
+            dirname = os.path.dirname(self.filename)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+
+            with open(temp_filename, "wb") as handle:
+                pickle.dump(header, handle, pickle.HIGHEST_PROTOCOL)
+                data = _pack_nodes(nodes, all_nodes)
+                pickle.dump(data, handle, pickle.HIGHEST_PROTOCOL)
+
+            os.replace(temp_filename, self.filename)
+        except (OSError, TypeError, pickle.PicklingError) as error:
+            self._log.warning("Could not write %r: %s", self.filename, error)
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+
+
+def _calculate_key(makefiles, options):
+    hasher = hashlib.sha256()
+    hasher.update(
+        json.dumps(
+            {
+                "version": paleomix.__version__,
+                "python": list(sys.version_info[:2]),
+                "cwd": os.getcwd(),
+                "options": {
+                    key: value
+                    for key, value in options.items()
+                    if key not in _RUNTIME_OPTIONS
+                },
+            },
+            default=repr,
+            sort_keys=True,
+        ).encode("utf-8")
+    )
+
+    for filename in makefiles:
+        hasher.update(os.path.abspath(filename).encode("utf-8"))
+        with open(filename, "rb") as handle:
+            hasher.update(hashlib.sha256(handle.read()).digest())
+
+    return hasher.hexdigest()
+
+
+def _list_nodes(nodes):
+    """Returns all nodes in the graph."""
+    result = []
+    visited = set()
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        if node not in visited:
+            visited.add(node)
+            result.append(node)
+            stack.extend(node.dependencies)
+
+    return result
+
+
+def _pack_nodes(nodes, all_nodes):
+    """Node.__getstate__ excludes dependencies and requirements, in order to
+    minimize the cost of passing nodes to worker processes; these are therefore
+    recorded separately, with dependencies recorded as indices in 'all_nodes'."""
+    indices = {node: idx for idx, node in enumerate(all_nodes)}
+
+    return {
+        "nodes": all_nodes,
+        "top": [indices[node] for node in nodes],
+        "dependencies": [
+            [indices[dependency] for dependency in node.dependencies]
+            for node in all_nodes
+        ],
+        "requirements": [node.requirements for node in all_nodes],
+    }
+
+
+def _unpack_nodes(data):
+    nodes = data["nodes"]
+    for node, dependencies, requirements in zip(
+        nodes, data["dependencies"], data["requirements"]
+    ):
+        node.dependencies = frozenset(nodes[idx] for idx in dependencies)
+        node.requirements = requirements
+
+    return [nodes[idx] for idx in data["top"]]
+
+
+def _collect_file_states(nodes, folders):
+    """Returns the state of input and auxiliary files not generated by the
+    pipeline, of the folders containing them, and of files in 'folders'."""
+    input_files = set()
+    output_files = set()
+    for node in nodes:
+        input_files.update(map(os.path.abspath, node.input_files))
+        input_files.update(map(os.path.abspath, node.auxiliary_files))
+        output_files.update(map(os.path.abspath, node.output_files))
+
+    input_files -= output_files
+    input_files.update([os.path.dirname(filename) for filename in input_files])
+
+    for folder in map(os.path.abspath, folders):
+        input_files.add(folder)
+        try:
+            filenames = os.listdir(folder)
+        except OSError:
+            # The state of the (missing) folder is still recorded
+            filenames = ()
+
+        for filename in filenames:
+            input_files.add(os.path.join(folder, filename))
+
+    return {filename: _get_file_state(filename) for filename in input_files}
+
+
+def _get_file_state(filename):
+    try:
+        stats = os.stat(filename)
+    except OSError:
+        return None
+
+    return (stats.st_size, stats.st_mtime_ns, stats.st_ino)
@@ -20,12 +20,15 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import logging
+import os
 import sys
 
 import pysam
 
 import paleomix.common.system
 import paleomix.common.logging
+import paleomix.common.versions
+import paleomix.common.validationcache
 
 
 _COMMANDS = {
@@ -45,6 +48,7 @@ _COMMANDS = {
     # BAM file tools
     "cleanup": "paleomix.tools.cleanup",
     "coverage": "paleomix.tools.coverage",
+    "coverage_depths": "paleomix.tools.coverage_depths",
     "depths": "paleomix.tools.depths",
     "dupcheck": "paleomix.tools.dupcheck",
     # VCF/etc. tools
@@ -53,6 +57,7 @@ _COMMANDS = {
     "vcf_to_fasta": "paleomix.tools.vcf_to_fasta",
     # Misc tools
     ":bedtools": "paleomix.tools.bedtools",
+    ":split_fastq": "paleomix.tools.split_fastq",
     ":validate_fastq": "paleomix.tools.validate_fastq",
     ":validate_fasta": "paleomix.tools.validate_fasta",
 }
@@ -72,6 +77,8 @@ Pipelines:
 BAM/SAM tools:
     paleomix coverage         -- Calculate coverage across reference sequences
                                  or regions of interest.
+    paleomix coverage_depths  -- Calculate both coverage and depth histograms
+                                 in a single pass over a BAM file.
     paleomix depths           -- Calculate depth histograms across reference
                                  sequences or regions of interest.
     paleomix rmdup_collapsed  -- Filters PCR duplicates for collapsed paired-
@@ -98,6 +105,14 @@ def main(argv):
     paleomix.common.logging.initialize_console_logging()
     # Silence log-messages from HTSLIB
     pysam.set_verbosity(0)
+    # Cache the results of version checks for executables between runs
+    paleomix.common.versions.set_cache_filename(
+        os.path.expanduser("~/.paleomix/cache/versions.json")
+    )
+    # Cache the results of validating input files between runs
+    paleomix.common.validationcache.set_cache_filename(
+        os.path.expanduser("~/.paleomix/cache/validation.sqlite")
+    )
 
     if not argv or argv[0] in ("-h", "--help", "help"):
         print(_HELP.format(version=paleomix.__version__))
@@ -106,17 +121,25 @@ def main(argv):
         print("paleomix v{}".format(paleomix.__version__))
         return 0
 
-    command = _COMMANDS.get(argv[0])
-    if command is None:
+    module = import_command(argv[0])
+    if module is None:
         log = logging.getLogger(__name__)
         log.error("Unknown command %r", argv[0])
         return 1
 
-    module = __import__(command, fromlist=["main"])
-
     return module.main(argv[1:])
 
 
+def import_command(name):
+    """Imports and returns the module implementing a command, or None if the command
+    is unknown."""
+    command = _COMMANDS.get(name)
+    if command is None:
+        return None
+
+    return __import__(command, fromlist=["main"])
+
+
 def entry_point():
     return main(sys.argv[1:])
 
@@ -24,6 +24,8 @@ import logging
 import os
 import shutil
 import sys
+import threading
+import time
 import traceback
 
 from pathlib import Path
@@ -57,6 +59,7 @@ class Node:
         self,
         description=None,
         threads=1,
+        memory=0,
         input_files=(),
         output_files=(),
         executables=(),
@@ -79,7 +82,11 @@ class Node:
         self.requirements = self._validate_requirements(requirements)
 
         self.threads = self._validate_nthreads(threads)
+        self.memory = self._validate_memory(memory)
         self.dependencies = self._collect_nodes(dependencies)
+        # Output files that may be streamed to the node consuming them (see
+        # CommandNode); these need not be written to disk.
+        self.streamable_files = frozenset()
 
         # If there are no input files, the node cannot be re-run based on
         # changes to the input, and nodes with output but no input are not
@@ -97,9 +104,15 @@ class Node:
 
         Any non-NodeError exception raised in this function is wrapped in a
         NodeUnhandledException, which includes a full backtrace. This is needed
-        to allow showing these in the main process."""
+        to allow showing these in the main process.
+
+        Returns a dictionary containing the time at which the node was started
+        ('start_time'), the number of seconds spent running the node ('wall_time'),
+        and a list of the resources used by each command run by the node
+        ('commands'; see AtomicCmd.resource_usage)."""
 
         temp = None
+        start_time = time.time()
 
         try:
             # Generate directory name and create dir at temp_root
@@ -109,6 +122,12 @@ class Node:
             self._run(config, temp)
             self._teardown(config, temp)
             self._remove_temp_dir(temp)
+
+            return {
+                "start_time": start_time,
+                "wall_time": time.time() - start_time,
+                "commands": self._resource_usage(),
+            }
         except NodeError as error:
             self._write_error_log(temp, error)
             raise NodeError(
@@ -159,6 +178,10 @@ class Node:
     def _teardown(self, _config, _temp):
         self._check_for_missing_files(self.output_files, "output")
 
+    def _resource_usage(self):
+        """Returns a list of the resources used by commands run by this node."""
+        return []
+
     def __str__(self):
         """Returns the description passed to the constructor, or a default
         description if no description was passed to the constructor."""
@@ -190,6 +213,7 @@ class Node:
             "PATH             = %r" % (os.environ.get("PATH", ""),),
             "Node             = %s" % (str(self),),
             "Threads          = %i" % (self.threads,),
+            "Memory           = %i" % (self.memory,),
             "Input files      = %s" % (_fmt(self.input_files),),
             "Output files     = %s" % (_fmt(self.output_files),),
             "Auxiliary files  = %s" % (_fmt(self.auxiliary_files),),
@@ -258,6 +282,18 @@ class Node:
             )
         return threads
 
+    @classmethod
+    def _validate_memory(cls, memory):
+        if not isinstance(memory, int):
+            raise TypeError(
+                "'memory' must be a non-negative integer, not a %s" % (type(memory),)
+            )
+        elif memory < 0:
+            raise ValueError(
+                "'memory' must be a non-negative integer, not %i" % (memory,)
+            )
+        return memory
+
     @staticmethod
     def _collect_files(root):
         root = fileutils.fspath(root)
@@ -272,8 +308,46 @@ class Node:
         yield from _walk_dir(root)
 
 
+class NodeStreams:
+    """Named pipes connecting output files of one or more nodes to the input files
+    of a single consuming node, all of which are run concurrently. Each filename is
+    expected to be a symbolic link to the corresponding named pipe while the nodes
+    are running.
+    """
+
+    def __init__(self, pipes):
+        # Dictionary of filenames to paths of named pipes
+        self.pipes = dict(pipes)
+        self._finished = threading.Event()
+        self._success = False
+
+    def set_finished(self, success):
+        """Called once every node writing to the pipes has finished."""
+        self._success = bool(success)
+        self._finished.set()
+
+    def wait(self):
+        """Blocks until every node writing to the pipes has finished, returning
+        true if every such node completed successfully."""
+        self._finished.wait()
+
+        return self._success
+
+
 class CommandNode(Node):
-    def __init__(self, command, description=None, threads=1, dependencies=()):
+    def __init__(
+        self,
+        command,
+        description=None,
+        threads=1,
+        memory=None,
+        dependencies=(),
+        streamable_files=(),
+    ):
+        # The amount of memory (in bytes) is estimated from the command by default
+        if memory is None:
+            memory = command.memory
+
         Node.__init__(
             self,
             description=description,
@@ -283,10 +357,44 @@ class CommandNode(Node):
             executables=command.executables,
             requirements=command.requirements,
             threads=threads,
+            memory=memory,
             dependencies=dependencies,
         )
 
+        # Output files that may be written directly to the consuming node, which
+        # requires that the command writes these files sequentially
+        self.streamable_files = self._validate_files(streamable_files)
+        if not self.streamable_files.issubset(self.output_files):
+            raise NodeError(
+                "Streamable files are not output files of node %s: %s"
+                % (self, ", ".join(sorted(self.streamable_files - self.output_files)))
+            )
+
         self._command = command
+        self._streams = None
+
+    def run(self, config, streams=None):
+        """Runs the node as described in Node.run. If 'streams' (a NodeStreams
+        object) is set, output files found in the streams are written to named pipes
+        instead of to disk, and input files found in the streams are read from named
+        pipes. Output files of such nodes are only committed if every node writing
+        to those pipes completed successfully."""
+        self._streams = streams
+        try:
+            return Node.run(self, config)
+        finally:
+            self._streams = None
+
+    def terminate(self):
+        """Terminates the command run by this node, if it is running."""
+        self._command.terminate()
+
+    def _setup(self, config, temp):
+        Node._setup(self, config, temp)
+
+        # The command writes to the named pipe via the expected temporary file
+        for (filename, pipe) in self._get_streams(self.output_files).items():
+            os.symlink(pipe, fileutils.reroot_path(temp, filename))
 
     def _run(self, _config, temp):
         """Runs the command object provided in the constructor, and waits for it to
@@ -302,7 +410,14 @@ class CommandNode(Node):
             raise CmdNodeError(str(self._command))
 
     def _teardown(self, config, temp):
-        required_files = self._command.expected_temp_files
+        if self._get_streams(self.input_files) and not self._streams.wait():
+            raise CmdNodeError("Node(s) writing to streamed input files failed")
+
+        # Streamed files are symbolic links to named pipes in the temporary folder
+        streamed_files = self._get_streams(self.output_files)
+        required_files = self._command.expected_temp_files - set(
+            os.path.basename(filename) for filename in streamed_files
+        )
         current_files = set(self._collect_files(temp))
 
         missing_files = required_files - current_files
@@ -318,7 +433,25 @@ class CommandNode(Node):
 
         self._command.commit(temp)
 
-        Node._teardown(self, config, temp)
+        if streamed_files:
+            self._check_for_missing_files(
+                self.output_files - frozenset(streamed_files), "output"
+            )
+        else:
+            Node._teardown(self, config, temp)
+
+    def _resource_usage(self):
+        return self._command.resource_usage()
+
+    def _get_streams(self, filenames):
+        if self._streams is None:
+            return {}
+
+        pipes = self._streams.pipes
+
+        return {
+            filename: pipes[filename] for filename in filenames if filename in pipes
+        }
 
 
 # Types that are allowed for the 'description' property
@@ -21,16 +21,27 @@
 # SOFTWARE.
 #
 import collections
+import concurrent.futures
 import errno
+import hashlib
+import heapq
 import logging
 import os
+import sqlite3
+import stat
+import time
 
 import paleomix.common.versions as versions
 
+from paleomix.node import CommandNode
 from paleomix.common.fileutils import missing_executables, missing_files
 from paleomix.common.utilities import safe_coerce_to_frozenset
 
 
+# Max number of version checks to run simultaneously
+_MAX_VERSION_CHECKS = 16
+
+
 class FileStatusCache:
     """Cache used to avoid repeatedly checking the state (existance / mtime) of
     files required / generated by nodes. A new cache is generated for every
@@ -69,6 +80,11 @@ class FileStatusCache:
 
         return max(input_timestamps) > min(output_timestamps)
 
+    def set_completed(self, input_files, output_files):
+        """Called when a node with the given input and output files has completed;
+        the default implementation does nothing.
+        """
+
     def _get_states(self, filenames, dst):
         """Collects the mtimes for a set of filenames, returning true if all
         could be collected, and aborting early and returning false otherwise.
@@ -83,10 +99,12 @@ class FileStatusCache:
         return True
 
     def _get_state(self, fpath):
-        """Returns the mtime of a path, or None if the path does not exist."""
+        """Returns the mtime of a path, or None if the path does not exist. Named
+        pipes (e.g. left behind by streamed files) are treated as missing files."""
         if fpath not in self._stat_cache:
             try:
-                mtime = os.path.getmtime(fpath)
+                stats = os.stat(fpath)
+                mtime = None if stat.S_ISFIFO(stats.st_mode) else stats.st_mtime
             except OSError as error:
                 if error.errno != errno.ENOENT:
                     raise
@@ -95,6 +113,293 @@ class FileStatusCache:
         return self._stat_cache[fpath]
 
 
+class FileStatusIndex:
+    """Persistent index of the state (size / mtime / inode) of files required /
+    generated by nodes, stored in an SQLite database. Records are grouped by
+    directory and are trusted as long as the mtime of the directory is unchanged,
+    thereby avoiding calls to stat for every tracked file when a pipeline is
+    restarted. Directories that have changed are listed using 'os.scandir', and
+    files in those directories are re-examined when they are next requested.
+
+    Since changes to the content of a file do not change the mtime of the parent
+    directory, files that are modified in place (rather than being replaced)
+    will not be detected as having changed. Symbolic links are never indexed.
+
+    In addition, the index records the state of the input and output files of
+    completed nodes; a node is considered up-to-date if the state of its files
+    match those recorded when it completed, regardless of their timestamps.
+    """
+
+    # Directories modified this (or less) long before being listed may since have
+    # been modified again, without the change being reflected in their mtime
+    _RACY_INTERVAL_NS = 2 * 10 ** 9
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._connection = sqlite3.connect(filename, timeout=60)
+        with self._connection:
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS directories (
+                    path TEXT PRIMARY KEY,
+                    mtime_ns INTEGER NOT NULL,
+                    checked_ns INTEGER NOT NULL
+                );
+
+                CREATE TABLE IF NOT EXISTS files (
+                    directory TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    size INTEGER,
+                    mtime REAL,
+                    inode INTEGER,
+                    PRIMARY KEY (directory, name)
+                );
+
+                CREATE TABLE IF NOT EXISTS nodes (
+                    key TEXT PRIMARY KEY,
+                    signature TEXT NOT NULL
+                );
+                """)
+
+        self._directories = {}
+        self._completed = {}
+
+    @property
+    def filename(self):
+        return self._filename
+
+    def new_cache(self):
+        """Returns a FileStatusCache backed by this index."""
+        return IndexedFileStatusCache(self)
+
+    def get_directory(self, dirpath):
+        """Returns the _IndexedDirectory for an absolute path, re-listing the
+        directory if it has changed since it was indexed, or None if the directory
+        does not exist.
+        """
+        try:
+            mtime_ns = os.stat(dirpath).st_mtime_ns
+        except OSError as error:
+            if error.errno != errno.ENOENT:
+                raise
+            return None
+
+        directory = self._directories.get(dirpath)
+        if directory is None:
+            directory = self._load_directory(dirpath)
+
+        if (
+            directory is None
+            or directory.mtime_ns != mtime_ns
+            or directory.checked_ns - mtime_ns <= self._RACY_INTERVAL_NS
+        ):
+            checked_ns = int(time.time() * 10 ** 9)
+            names = frozenset(entry.name for entry in os.scandir(dirpath))
+
+            directory = _IndexedDirectory(mtime_ns, checked_ns, names)
+
+        self._directories[dirpath] = directory
+
+        return directory
+
+    def get_signature(self, key):
+        """Returns the signature recorded for a completed node, if any."""
+        if key not in self._completed:
+            row = self._connection.execute(
+                "SELECT signature FROM nodes WHERE key = ?", (key,)
+            ).fetchone()
+
+            self._completed[key] = [row and row[0], False]
+
+        return self._completed[key][0]
+
+    def set_signature(self, key, signature):
+        """Records the signature of the files of a completed node."""
+        self._completed[key] = [signature, True]
+
+    def flush(self):
+        """Writes any new or updated records to the database."""
+        with self._connection:
+            for dirpath, directory in self._directories.items():
+                if not directory.modified:
+                    continue
+
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO directories VALUES (?, ?, ?)",
+                    (dirpath, directory.mtime_ns, directory.checked_ns),
+                )
+                self._connection.execute(
+                    "DELETE FROM files WHERE directory = ?", (dirpath,)
+                )
+                self._connection.executemany(
+                    "INSERT INTO files VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (dirpath, name) + (record or (None, None, None))
+                        for name, record in directory.files.items()
+                    ),
+                )
+                directory.modified = False
+
+            for key, record in self._completed.items():
+                signature, modified = record
+                if modified:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO nodes VALUES (?, ?)", (key, signature)
+                    )
+                    record[1] = False
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    def _load_directory(self, dirpath):
+        row = self._connection.execute(
+            "SELECT mtime_ns, checked_ns FROM directories WHERE path = ?", (dirpath,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        directory = _IndexedDirectory(row[0], row[1], modified=False)
+        for name, size, mtime, inode in self._connection.execute(
+            "SELECT name, size, mtime, inode FROM files WHERE directory = ?",
+            (dirpath,),
+        ):
+            directory.files[name] = None if size is None else (size, mtime, inode)
+
+        return directory
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _type, _value, _traceback):
+        self.close()
+
+
+class _IndexedDirectory:
+    __slots__ = ("mtime_ns", "checked_ns", "names", "files", "modified")
+
+    def __init__(self, mtime_ns, checked_ns, names=None, modified=True):
+        self.mtime_ns = mtime_ns
+        self.checked_ns = checked_ns
+        # Names of entries in the directory, if it has been listed
+        self.names = names
+        # Maps names to (size, mtime, inode) or to None for missing files
+        self.files = {}
+        self.modified = modified
+
+
+class IndexedFileStatusCache(FileStatusCache):
+    """FileStatusCache using a FileStatusIndex to look up the state of files. As
+    with the FileStatusCache, a new cache should be created for every operation.
+    """
+
+    def __init__(self, index):
+        FileStatusCache.__init__(self)
+        self._index = index
+        self._directories = {}
+        self._records = {}
+
+    def are_files_outdated(self, input_files, output_files):
+        key = self._get_key(input_files, output_files)
+        signature = self._get_signature(input_files, output_files)
+        if signature is not None and self._index.get_signature(key) == signature:
+            return False
+
+        return FileStatusCache.are_files_outdated(self, input_files, output_files)
+
+    def set_completed(self, input_files, output_files):
+        # Output files may have been overwritten in place (e.g. when moved between
+        # file-systems), which does not change the mtime of the parent directory
+        for filename in output_files:
+            self._get_record(filename, refresh=True)
+
+        signature = self._get_signature(input_files, output_files)
+        if signature is not None:
+            key = self._get_key(input_files, output_files)
+            self._index.set_signature(key, signature)
+
+    def _get_state(self, fpath):
+        record = self._get_record(fpath)
+
+        return None if record is None else record[1]
+
+    def _get_record(self, fpath, refresh=False):
+        """Returns (size, mtime, inode) for a path, or None if it does not exist. If
+        'refresh' is set, the index is updated with the current state of the path.
+        """
+        if fpath in self._records and not refresh:
+            return self._records[fpath]
+
+        dirpath, name = os.path.split(os.path.abspath(fpath))
+        if dirpath in self._directories:
+            directory = self._directories[dirpath]
+        else:
+            directory = self._directories[dirpath] = self._index.get_directory(dirpath)
+
+        if directory is None:
+            record = None
+        elif refresh or name not in directory.files:
+            if refresh or directory.names is None or name in directory.names:
+                record, is_link = self._stat(fpath)
+            else:
+                record, is_link = None, False
+
+            if not is_link:
+                directory.files[name] = record
+                directory.modified = True
+        else:
+            record = directory.files[name]
+
+        self._records[fpath] = record
+
+        return record
+
+    def _get_signature(self, input_files, output_files):
+        records = []
+        for filenames in (input_files, output_files):
+            for filename in sorted(filenames):
+                record = self._get_record(filename)
+                if record is None:
+                    return None
+
+                records.append("%i:%r:%i" % record)
+
+        return ",".join(records)
+
+    @classmethod
+    def _get_key(cls, input_files, output_files):
+        hasher = hashlib.sha1()
+        for filenames in (input_files, output_files):
+            for filename in sorted(filenames):
+                hasher.update(
+                    os.path.abspath(filename).encode("utf-8", "surrogateescape")
+                )
+                hasher.update(b"\0")
+            hasher.update(b"\0")
+
+        return hasher.hexdigest()
+
+    @classmethod
+    def _stat(cls, fpath):
+        """Returns the (size, mtime, inode) for a path and whether or not the path
+        is a symbolic link. Symbolic links are followed. Named pipes are treated as
+        missing files.
+        """
+        try:
+            stats = os.lstat(fpath)
+            is_link = stat.S_ISLNK(stats.st_mode)
+            if is_link:
+                stats = os.stat(fpath)
+        except OSError as error:
+            if error.errno != errno.ENOENT:
+                raise
+            return None, False
+
+        if stat.S_ISFIFO(stats.st_mode):
+            return None, is_link
+
+        return (stats.st_size, stats.st_mtime, stats.st_ino), is_link
+
+
 class NodeGraphError(RuntimeError):
     pass
 
@@ -105,114 +410,172 @@ class NodeGraph:
 
     def __init__(self, nodes, cache_factory=FileStatusCache):
         self._cache_factory = cache_factory
-        self._states = {}
-        self._state_counts = [0] * self.NUMBER_OF_STATES
-
-        nodes = safe_coerce_to_frozenset(nodes)
-
         self._logger = logging.getLogger(__name__)
-        self._reverse_dependencies = collections.defaultdict(set)
-        self._collect_reverse_dependencies(nodes, self._reverse_dependencies, set())
-        self._intersections = {}
-        self._top_nodes = [
-            node
-            for (node, rev_deps) in self._reverse_dependencies.items()
-            if not rev_deps
+
+        # Nodes are identified by their index in this list, with the dependencies
+        # and dependents of each node stored as lists of such IDs
+        self._nodes = self._collect_nodes(safe_coerce_to_frozenset(nodes))
+        self._ids = {node: idx for (idx, node) in enumerate(self._nodes)}
+        self._dependencies = [
+            [self._ids[dependency] for dependency in node.dependencies]
+            for node in self._nodes
         ]
+        self._dependents = [[] for _ in self._nodes]
+        for (idx, dependencies) in enumerate(self._dependencies):
+            for dependency in dependencies:
+                self._dependents[dependency].append(idx)
+
+        # Topological ordering of nodes, with every node following its dependencies
+        self._order = self._topological_order(self._dependencies, self._dependents)
+        self._ranks = [0] * len(self._nodes)
+        for (rank, idx) in enumerate(self._order):
+            self._ranks[idx] = rank
+
+        self._states = [None] * len(self._nodes)
+        self._state_counts = [0] * self.NUMBER_OF_STATES
 
         self._logger.info("Checking file dependencies")
-        if not self._check_file_dependencies(self._reverse_dependencies):
+        if not self._check_file_dependencies(self._nodes):
             raise NodeGraphError("Aborting due to input/output file error")
 
         self._logger.info("Checking for auxiliary files")
-        if not self._check_auxiliary_files(self._reverse_dependencies):
+        if not self._check_auxiliary_files(self._nodes):
             raise NodeGraphError(
                 "Please refer to the PALEOMIX installation instructions at "
                 "https://paleomix.readthedocs.io/"
             )
 
         self._logger.info("Checking required software")
-        if not self._check_version_requirements(self._reverse_dependencies):
+        if not self._check_version_requirements(self._nodes):
             raise NodeGraphError(
                 "Please refer to the PALEOMIX installation instructions at "
                 "https://paleomix.readthedocs.io/"
             )
 
+        # Dictionary of output files that may be streamed to (producer, consumer)
+        self._streams = self._collect_streams(self._nodes)
+        self._stream_consumers = {}
+        self._stream_producers = collections.defaultdict(dict)
+        for (filename, (producer, consumer)) in self._streams.items():
+            self._stream_consumers[producer] = consumer
+            self._stream_producers[consumer][filename] = producer
+        # Producers of missing streamed files that are needed by outdated nodes
+        self._forced_nodes = set()
+
         self._logger.info("Determining states")
         self._refresh_states()
         self._logger.info("Ready")
 
     def get_node_state(self, node):
-        return self._states[node]
+        return self._states[self._ids[node]]
+
+    def get_dependents(self, node):
+        """Returns the set of nodes that directly depend on the given node."""
+        return frozenset(self._nodes[idx] for idx in self._dependents[self._ids[node]])
+
+    def get_stream_consumer(self, node):
+        """Returns the node to which output files of the given node may be streamed,
+        if the two nodes are run concurrently, or None if no files may be streamed.
+        """
+        return self._stream_consumers.get(node)
+
+    def get_streamed_inputs(self, node):
+        """Returns a dictionary of the input files of the given node that may be
+        streamed to it, and the nodes producing those files."""
+        return dict(self._stream_producers.get(node, {}))
 
     def set_node_state(self, node, state):
         if state not in (NodeGraph.RUNNING, NodeGraph.ERROR, NodeGraph.DONE):
             raise ValueError("Invalid state: %r" % (state,))
-        old_state = self._states[node]
+
+        idx = self._ids[node]
+        old_state = self._states[idx]
         if state == old_state:
             return
 
-        self._states[node] = state
-        self._state_counts[old_state] -= 1
-        self._state_counts[state] += 1
-
+        self._set_state(idx, state)
         self._log_node_changes(node, old_state, state)
 
-        intersections = self._calculate_intersections(node)
-
-        # Not all nodes may need to be updated, but we still need to
-        # traverse the "graph" (using the intersection counts) in order
-        # to ensure that all nodes that need to be updated are updated.
-        requires_update = dict.fromkeys(intersections, False)
-        for dependency in self._reverse_dependencies[node]:
-            requires_update[dependency] = True
-
         cache = self._cache_factory()
-        while any(requires_update.values()):
-            for (node, count) in tuple(intersections.items()):
-                if not count:
-                    has_changed = False
-                    if requires_update[node]:
-                        old_state = self._states.pop(node)
-                        new_state = self._update_node_state(node, cache)
-                        has_changed |= new_state != old_state
+        if state == NodeGraph.DONE:
+            self._forced_nodes.discard(node)
+            cache.set_completed(
+                self._get_input_files(node, cache), self._get_output_files(node, cache)
+            )
 
-                        self._state_counts[old_state] -= 1
-                        self._state_counts[new_state] += 1
+        # Dependents are updated in topological order, ensuring that each node is
+        # updated at most once, and only after any of its dependencies have changed
+        queued = set(self._dependents[idx])
+        queue = [(self._ranks[dependent], dependent) for dependent in queued]
+        heapq.heapify(queue)
 
-                    for dependency in self._reverse_dependencies[node]:
-                        intersections[dependency] -= 1
-                        requires_update[dependency] |= has_changed
+        while queue:
+            _, idx = heapq.heappop(queue)
+            # Consumers of streamed files run alongside their dependencies
+            if self._states[idx] == self.RUNNING:
+                continue
 
-                    intersections.pop(node)
-                    requires_update.pop(node)
+            new_state = self._get_node_state(idx, cache)
+            if new_state != self._states[idx]:
+                self._set_state(idx, new_state)
+
+                for dependent in self._dependents[idx]:
+                    if dependent not in queued:
+                        queued.add(dependent)
+                        heapq.heappush(queue, (self._ranks[dependent], dependent))
 
     def __iter__(self):
-        """Returns a graph of nodes."""
-        return iter(self._top_nodes)
+        """Returns an iterator over nodes that no other nodes depend on."""
+        return (
+            node for (idx, node) in enumerate(self._nodes) if not self._dependents[idx]
+        )
 
     def iterflat(self):
-        return iter(self._reverse_dependencies)
+        return iter(self._nodes)
 
     def get_state_counts(self):
         return list(self._state_counts)
 
     def _refresh_states(self):
-        states = {}
         cache = self._cache_factory()
-        for (node, state) in self._states.items():
-            if state in (self.ERROR, self.RUNNING):
-                states[node] = state
-        self._states = states
+        fixed_states = [
+            state if state in (self.ERROR, self.RUNNING) else None
+            for state in self._states
+        ]
 
-        for node in self._reverse_dependencies:
-            self._update_node_state(node, cache)
+        while True:
+            states = self._states = list(fixed_states)
+            for idx in self._order:
+                if states[idx] is None:
+                    states[idx] = self._get_node_state(idx, cache)
+
+            # Streamed files that were not kept must be re-created for consumers that
+            # are to be re-run, by also re-running the nodes producing those files
+            forced_nodes = set(self._forced_nodes)
+            for (filename, (producer, consumer)) in self._streams.items():
+                if (
+                    self.get_node_state(producer) == self.DONE
+                    and self.get_node_state(consumer)
+                    in (self.RUNABLE, self.QUEUED, self.OUTDATED)
+                    and not cache.files_exist((filename,))
+                ):
+                    forced_nodes.add(producer)
+
+            if forced_nodes == self._forced_nodes:
+                break
+
+            self._forced_nodes = forced_nodes
 
         state_counts = [0] * self.NUMBER_OF_STATES
-        for state in states.values():
+        for state in states:
             state_counts[state] += 1
         self._state_counts = state_counts
 
+    def _set_state(self, idx, state):
+        self._state_counts[self._states[idx]] -= 1
+        self._state_counts[state] += 1
+        self._states[idx] = state
+
     def _log_node_changes(self, node, old_state, new_state):
         if new_state in (self.RUNNING, self.DONE):
             running = self._state_counts[self.RUNNING]
@@ -227,43 +590,24 @@ class NodeGraph:
             elif new_state == self.DONE:
                 self._logger.info("[%i/%i] Finished %s", running, remaining, node)
 
-    def _calculate_intersections(self, for_node):
-        def count_nodes(node, counts):
-            for node in self._reverse_dependencies[node]:
-                if node in counts:
-                    counts[node] += 1
-                else:
-                    counts[node] = 1
-                    count_nodes(node, counts)
-            return counts
-
-        if for_node not in self._intersections:
-            counts = count_nodes(for_node, {})
-            for dependency in self._reverse_dependencies[for_node]:
-                counts[dependency] -= 1
-            self._intersections[for_node] = counts
-
-        return dict(self._intersections[for_node])
-
-    def _update_node_state(self, node, cache):
-        if node in self._states:
-            return self._states[node]
-
-        # Update sub-nodes before checking for fixed states
-        dependency_states = set((NodeGraph.DONE,))
-        for dependency in node.dependencies:
-            dependency_states.add(self._update_node_state(dependency, cache))
-
-        state = max(dependency_states)
+    def _get_node_state(self, idx, cache):
+        """Returns the current state of a node, based on the states of its
+        dependencies, all of which must have been determined."""
+        node = self._nodes[idx]
+        state = NodeGraph.DONE
+        for dependency in self._dependencies[idx]:
+            state = max(state, self._states[dependency])
+
         if state == NodeGraph.DONE:
-            if not self.is_done(node, cache):
+            input_files = self._get_input_files(node, cache)
+            if not self._is_done(node, cache):
                 state = NodeGraph.RUNABLE
-            elif not cache.files_exist(node.input_files):
+            elif not cache.files_exist(input_files):
                 # Somehow the input files have gone missing, despite the
                 # dependant nodes being done; this implies this node is
                 # outdated, since the input-files should be re-generated, but
                 # obviously it is not possible to run it at this point.
-                missing = cache.missing_files(node.input_files)
+                missing = cache.missing_files(input_files)
                 self._logger.error(
                     "Input file(s) missing for node; may have been moved while the "
                     "pipeline was running. Cannot proceed:\n"
@@ -272,17 +616,68 @@ class NodeGraph:
                     "\n            ".join(missing),
                 )
                 state = NodeGraph.ERROR
-            elif self.is_outdated(node, cache):
+            elif self._is_outdated(node, cache):
                 state = NodeGraph.RUNABLE
         elif state in (NodeGraph.RUNNING, NodeGraph.RUNABLE, NodeGraph.QUEUED):
-            if self.is_done(node, cache):
+            if self._is_done(node, cache):
                 state = NodeGraph.OUTDATED
             else:
                 state = NodeGraph.QUEUED
-        self._states[node] = state
 
         return state
 
+    def _is_done(self, node, cache):
+        """As 'is_done', except that streamed output files need not exist, provided
+        that the node consuming them is done and up-to-date.
+        """
+        if node in self._forced_nodes:
+            return False
+
+        for filename in cache.missing_files(node.output_files):
+            if filename not in self._streams:
+                return False
+
+            _, consumer = self._streams[filename]
+            if not self.is_done(consumer, cache) or self._is_outdated(consumer, cache):
+                return False
+
+        return True
+
+    def _is_outdated(self, node, cache):
+        """As 'is_outdated', except that missing, streamed files are ignored; the
+        input files of the node producing missing, streamed input files are used in
+        place of those files.
+        """
+        input_files = self._get_input_files(node, cache)
+        output_files = self._get_output_files(node, cache)
+        if not (input_files and output_files):
+            return False
+
+        return cache.are_files_outdated(input_files, output_files)
+
+    def _get_input_files(self, node, cache):
+        streamed_files = self._stream_producers.get(node)
+        if not streamed_files:
+            return node.input_files
+
+        input_files = set(node.input_files)
+        for (filename, producer) in streamed_files.items():
+            if not cache.files_exist((filename,)):
+                input_files.remove(filename)
+                input_files.update(producer.input_files)
+
+        return frozenset(input_files)
+
+    def _get_output_files(self, node, cache):
+        if node not in self._stream_consumers:
+            return node.output_files
+
+        return frozenset(
+            filename
+            for filename in node.output_files
+            if filename not in self._streams or cache.files_exist((filename,))
+        )
+
     @classmethod
     def is_done(cls, node, cache):
         """Returns true if the node itself is done; this only implies that the
@@ -335,25 +730,42 @@ class NodeGraph:
             # Sort priority in decreasing order, name in increasing order
             return (-reqobj.priority, reqobj.name)
 
-        any_errors = False
-        for requirement in sorted(exec_requirements, key=_key_func):
+        def _check_requirement(requirement):
+            """Returns the name and version of the requirement (if determined),
+            and the exception raised while checking the requirement (if any).
+            """
+            name = None
             try:
-                name = requirement.name
                 version = ".".join(str(value) for value in requirement.version)
+                name = requirement.name
                 if version:
                     name = "%s v%s" % (name, version)
 
-                self._logger.info(" - Found %s", name)
-
                 requirement()
-            except versions.VersionRequirementError as error:
-                any_errors = True
-                self._logger.error(error)
-            except OSError as error:
-                any_errors = True
-                self._logger.error(
-                    "Could not check version for %s:\n\t%s" % (requirement.name, error)
-                )
+            except (versions.VersionRequirementError, OSError) as error:
+                return name, error
+
+            return name, None
+
+        # Version checks mostly involve waiting for external processes
+        requirements = sorted(exec_requirements, key=_key_func)
+        with concurrent.futures.ThreadPoolExecutor(_MAX_VERSION_CHECKS) as executor:
+            results = executor.map(_check_requirement, requirements)
+
+            any_errors = False
+            for requirement, (name, error) in zip(requirements, results):
+                if name is not None:
+                    self._logger.info(" - Found %s", name)
+
+                if isinstance(error, versions.VersionRequirementError):
+                    any_errors = True
+                    self._logger.error(error)
+                elif isinstance(error, OSError):
+                    any_errors = True
+                    self._logger.error(
+                        "Could not check version for %s:\n\t%s"
+                        % (requirement.name, error)
+                    )
 
         return not any_errors
 
@@ -415,7 +827,7 @@ class NodeGraph:
         return not clobbered_files
 
     def _check_input_files(self, input_files, output_files, nodes, max_errors=10):
-        dependencies = self._collect_dependencies(nodes, {})
+        cache = self._cache_factory()
         any_errors = False
 
         for (filename, nodes) in sorted(input_files.items(), key=lambda v: v[0]):
@@ -423,7 +835,7 @@ class NodeGraph:
                 producers = output_files[filename]
                 bad_nodes = set()
                 for consumer in nodes:
-                    if not (producers & dependencies[consumer]):
+                    if not self._depends_on(consumer, producers):
                         bad_nodes.add(consumer)
 
                 if bad_nodes:
@@ -445,7 +857,7 @@ class NodeGraph:
                         "https://github.com/MikkelSchubert/paleomix/issues/new"
                     )
 
-            elif not os.path.exists(filename):
+            elif not cache.files_exist((filename,)):
                 any_errors = True
                 self._logger.error("Required input file does not exist: %r", filename)
                 for line in _summarize_nodes(nodes):
@@ -467,36 +879,96 @@ class NodeGraph:
         return not missing_aux_files
 
     @classmethod
-    def _collect_dependencies(cls, nodes, dependencies):
+    def _collect_streams(cls, nodes):
+        """Returns a dictionary of streamable output files to the nodes producing
+        and consuming them. Files are only streamed if consumed by a single node
+        depending directly on the producer, if every streamed file of the producer
+        is consumed by the same node, and if the producer does not itself consume
+        streamable files.
+        """
+        consumers = collections.defaultdict(list)
         for node in nodes:
-            if node not in dependencies:
-                subnodes = node.dependencies
-                if not subnodes:
-                    dependencies[node] = frozenset()
-                    continue
-
-                cls._collect_dependencies(subnodes, dependencies)
+            for filename in node.input_files:
+                consumers[filename].append(node)
 
-                collected = set(subnodes)
-                for subnode in subnodes:
-                    collected.update(dependencies[subnode])
-                dependencies[node] = frozenset(collected)
+        candidates = collections.defaultdict(dict)
+        for node in nodes:
+            if isinstance(node, CommandNode):
+                for filename in node.streamable_files:
+                    consumer = consumers.get(filename, ())
+                    if (
+                        len(consumer) == 1
+                        and isinstance(consumer[0], CommandNode)
+                        and node in consumer[0].dependencies
+                    ):
+                        candidates[node][filename] = consumer[0]
+
+        streamed_inputs = set()
+        for filenames in candidates.values():
+            streamed_inputs.update(filenames)
+
+        streams = {}
+        for (producer, filenames) in candidates.items():
+            if (
+                len(set(filenames.values())) == 1
+                and streamed_inputs.isdisjoint(producer.input_files)
+            ):
+                for (filename, consumer) in filenames.items():
+                    streams[filename] = (producer, consumer)
+
+        return streams
+
+    def _depends_on(self, node, dependencies):
+        """Returns true if the node (directly or indirectly) depends on any of the
+        given nodes."""
+        targets = frozenset(self._ids[dependency] for dependency in dependencies)
+        # Nodes ordered before every target cannot depend on any of them
+        min_rank = min(self._ranks[idx] for idx in targets)
+
+        visited = set()
+        stack = [self._ids[node]]
+        while stack:
+            for dependency in self._dependencies[stack.pop()]:
+                if dependency in targets:
+                    return True
+                elif dependency not in visited and self._ranks[dependency] > min_rank:
+                    visited.add(dependency)
+                    stack.append(dependency)
+
+        return False
 
-        return dependencies
+    @classmethod
+    def _collect_nodes(cls, nodes):
+        """Returns a list of the given nodes and of every node they depend on, in
+        the order in which they are found by a depth-first search."""
+        collected = {}
+        stack = [iter(nodes)]
+        while stack:
+            node = next(stack[-1], None)
+            if node is None:
+                stack.pop()
+            elif node not in collected:
+                collected[node] = None
+                stack.append(iter(node.dependencies))
+
+        return list(collected)
 
     @classmethod
-    def _collect_reverse_dependencies(cls, lst, rev_dependencies, processed):
-        for node in lst:
-            if node not in processed:
-                processed.add(node)
-
-                # Initialize default-dict
-                rev_dependencies[node]
-
-                subnodes = node.dependencies
-                for dependency in subnodes:
-                    rev_dependencies[dependency].add(node)
-                cls._collect_reverse_dependencies(subnodes, rev_dependencies, processed)
+    def _topological_order(cls, dependencies, dependents):
+        """Returns the IDs of nodes ordered such that each node follows all of its
+        dependencies, given the IDs of dependencies and dependents of each node."""
+        remaining = [len(values) for values in dependencies]
+        order = [idx for (idx, count) in enumerate(remaining) if not count]
+        for idx in order:
+            for dependent in dependents[idx]:
+                remaining[dependent] -= 1
+                if not remaining[dependent]:
+                    order.append(dependent)
+
+        if len(order) != len(dependencies):
+            raise NodeGraphError("Circular dependencies found between nodes")
+
+        return order
 
 
 def _summarize_nodes(nodes):
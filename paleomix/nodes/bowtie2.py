@@ -33,6 +33,7 @@ from paleomix.nodes.bwa import (
     _get_node_description,
     _new_cleanup_command,
     _get_max_threads,
+    _estimate_index_memory,
 )
 
 import paleomix.common.versions as versions
@@ -82,6 +83,7 @@ class Bowtie2Node(CommandNode):
         mapping_options={},
         cleanup_options={},
         dependencies=(),
+        streamable=False,
     ):
         # Setting IN_FILE_2 to None makes AtomicCmd ignore this key
         aln = _bowtie2_template(
@@ -133,12 +135,18 @@ class Bowtie2Node(CommandNode):
             description=description,
             threads=threads,
             dependencies=dependencies,
+            streamable_files=[output_file] if streamable else (),
         )
 
 
 def _bowtie2_template(call, prefix, iotype="IN", **kwargs):
+    index_files = []
     for postfix in ("1.bt2", "2.bt2", "3.bt2", "4.bt2", "rev.1.bt2", "rev.2.bt2"):
         key = "%s_PREFIX_%s" % (iotype, postfix.upper())
-        kwargs[key] = prefix + "." + postfix
+        index_files.append(prefix + "." + postfix)
+        kwargs[key] = index_files[-1]
+
+    if iotype == "IN":
+        kwargs["memory"] = _estimate_index_memory(prefix, tuple(index_files), 1.25)
 
     return AtomicCmdBuilder(call, **kwargs)
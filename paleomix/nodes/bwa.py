@@ -74,6 +74,7 @@ class BWABacktrack(CommandNode):
         threads=1,
         mapping_options={},
         dependencies=(),
+        streamable=False,
     ):
         threads = _get_max_threads(reference, threads)
 
@@ -100,6 +101,7 @@ class BWABacktrack(CommandNode):
             description=description,
             threads=threads,
             dependencies=dependencies,
+            streamable_files=[output_file] if streamable else (),
         )
 
 
@@ -208,6 +210,7 @@ class BWAAlgorithmNode(CommandNode):
         mapping_options={},
         cleanup_options={},
         dependencies=(),
+        streamable=False,
     ):
         if algorithm not in ("mem", "bwasw"):
             raise NotImplementedError("BWA algorithm %r not implemented" % (algorithm,))
@@ -251,11 +254,13 @@ class BWAAlgorithmNode(CommandNode):
             description=description,
             threads=threads,
             dependencies=dependencies,
+            streamable_files=[output_file] if streamable else (),
         )
 
 
 def _new_cleanup_command(stdin, output_file, reference, paired_end=False):
-    convert = factory.new("cleanup")
+    # 'paleomix cleanup' runs 'samtools sort', which uses up to 768M by default
+    convert = factory.new("cleanup", memory=768 * 2 ** 20)
     convert.set_option("--fasta", "%(IN_FASTA_REF)s")
     convert.set_option("--temp-prefix", "%(TEMP_OUT_PREFIX)s")
     convert.set_kwargs(
@@ -275,13 +280,34 @@ def _new_cleanup_command(stdin, output_file, reference, paired_end=False):
 def _new_bwa_command(call, prefix, iotype="IN", **kwargs):
     _check_bwa_prefix(prefix)
 
+    index_files = []
     kwargs["CHECK_BWA"] = BWA_VERSION
     for postfix in ("amb", "ann", "bwt", "pac", "sa"):
-        kwargs["%s_PREFIX_%s" % (iotype, postfix.upper())] = prefix + "." + postfix
+        index_files.append(prefix + "." + postfix)
+        kwargs["%s_PREFIX_%s" % (iotype, postfix.upper())] = index_files[-1]
+
+    if iotype == "IN":
+        kwargs["memory"] = _estimate_index_memory(prefix, tuple(index_files), 1.75)
 
     return AtomicCmdBuilder(call, **kwargs)
 
 
+@functools.lru_cache()
+def _estimate_index_memory(prefix, index_files, fasta_ratio):
+    """Estimates the amount of memory (in bytes) needed to load an index into
+    memory, based on the total size of the index files. If the index has not yet
+    been built, the estimate is instead based on the size of the FASTA file from
+    which the index is built (assumed to be the prefix), multiplied by the ratio
+    'fasta_ratio'. Returns 0 if neither index nor FASTA file exists.
+    """
+    if all(os.path.exists(filename) for filename in index_files):
+        return sum(os.path.getsize(filename) for filename in index_files)
+    elif os.path.isfile(prefix):
+        return int(os.path.getsize(prefix) * fasta_ratio)
+
+    return 0
+
+
 @functools.lru_cache()
 def _get_max_threads(reference, threads):
     """Returns the maximum number of threads to use when mapping against a
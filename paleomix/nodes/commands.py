@@ -27,13 +27,17 @@ Each node is equivalent to a particular command:
 """
 from paleomix.node import CommandNode, Node
 from paleomix.atomiccmd.command import AtomicCmd
-from paleomix.atomiccmd.sets import ParallelCmds
+from paleomix.atomiccmd.sets import ParallelCmds, SequentialCmds
 from paleomix.atomiccmd.builder import (
     AtomicCmdBuilder,
     apply_options,
 )
 from paleomix.common.fileutils import describe_files, reroot_path, move_file
-from paleomix.nodes.samtools import merge_bam_files_command, BCFTOOLS_VERSION
+from paleomix.nodes.samtools import (
+    merge_bam_files_command,
+    BCFTOOLS_VERSION,
+    SAMTOOLS_VERSION,
+)
 
 import paleomix.tools.bam_stats.coverage as coverage
 import paleomix.tools.factory as factory
@@ -41,12 +45,19 @@ import paleomix.tools.factory as factory
 
 class CoverageNode(CommandNode):
     def __init__(
-        self, target_name, input_file, output_file, regions_file=None, dependencies=()
+        self,
+        target_name,
+        input_file,
+        output_file,
+        regions_file=None,
+        threads=1,
+        dependencies=(),
     ):
         builder = factory.new("coverage")
         builder.add_value("%(IN_BAM)s")
         builder.add_value("%(OUT_FILE)s")
         builder.set_option("--target-name", target_name)
+        builder.set_option("--threads", threads)
         builder.set_kwargs(IN_BAM=input_file, OUT_FILE=output_file)
 
         if regions_file:
@@ -57,6 +68,7 @@ class CoverageNode(CommandNode):
             self,
             command=builder.finalize(),
             description="calculating coverage for %s" % (input_file,),
+            threads=threads,
             dependencies=dependencies,
         )
 
@@ -91,26 +103,71 @@ class DepthHistogramNode(CommandNode):
         output_file,
         prefix,
         regions_file=None,
+        threads=1,
         dependencies=(),
     ):
-        index_format = regions_file and prefix["IndexFormat"]
-
         builder = factory.new("depths")
         builder.add_value("%(IN_BAM)s")
         builder.add_value("%(OUT_FILE)s")
         builder.set_option("--target-name", target_name)
+        builder.set_option("--threads", threads)
         builder.set_kwargs(OUT_FILE=output_file, IN_BAM=input_file)
 
         if regions_file:
             builder.set_option("--regions-file", "%(IN_REGIONS)s")
-            builder.set_kwargs(
-                IN_REGIONS=regions_file, TEMP_IN_INDEX=input_file + index_format
-            )
+            builder.set_kwargs(IN_REGIONS=regions_file)
+
+        # The index is required for regions and for splitting work by contig
+        if regions_file or threads > 1:
+            builder.set_kwargs(TEMP_IN_INDEX=input_file + prefix["IndexFormat"])
 
         CommandNode.__init__(
             self,
             command=builder.finalize(),
             description="calculating depth histogram for %s" % (input_file,),
+            threads=threads,
+            dependencies=dependencies,
+        )
+
+
+class CoverageAndDepthHistogramNode(CommandNode):
+    """Equivalent to CoverageNode and DepthHistogramNode, but reads the BAM once."""
+
+    def __init__(
+        self,
+        target_name,
+        input_file,
+        coverage_file,
+        depths_file,
+        prefix,
+        regions_file=None,
+        threads=1,
+        dependencies=(),
+    ):
+        builder = factory.new("coverage_depths")
+        builder.add_value("%(IN_BAM)s")
+        builder.add_value("%(OUT_COVERAGE)s")
+        builder.add_value("%(OUT_DEPTHS)s")
+        builder.set_option("--target-name", target_name)
+        builder.set_option("--threads", threads)
+        builder.set_kwargs(
+            IN_BAM=input_file, OUT_COVERAGE=coverage_file, OUT_DEPTHS=depths_file
+        )
+
+        if regions_file:
+            builder.set_option("--regions-file", "%(IN_REGIONS)s")
+            builder.set_kwargs(IN_REGIONS=regions_file)
+
+        # The index is required for regions and for splitting work by contig
+        if regions_file or threads > 1:
+            builder.set_kwargs(TEMP_IN_INDEX=input_file + prefix["IndexFormat"])
+
+        CommandNode.__init__(
+            self,
+            command=builder.finalize(),
+            description="calculating coverage and depth histogram for %s"
+            % (input_file,),
+            threads=threads,
             dependencies=dependencies,
         )
 
@@ -119,19 +176,69 @@ class FilterCollapsedBAMNode(CommandNode):
     def __init__(
         self, config, input_bams, output_bam, keep_dupes=True, dependencies=()
     ):
-        merge = merge_bam_files_command(input_bams)
+        threads = max(1, config.rmdup_collapsed_max_threads)
 
         builder = factory.new("rmdup_collapsed")
-        builder.set_kwargs(IN_STDIN=merge, OUT_STDOUT=output_bam)
+        builder.set_option("--threads", threads)
+        builder.set_kwargs(OUT_STDOUT=output_bam)
+
+        if config.rmdup_collapsed_compression_level is not None:
+            builder.set_option(
+                "--compression-level", config.rmdup_collapsed_compression_level
+            )
 
         if not keep_dupes:
             builder.set_option("--remove-duplicates")
 
+        if threads > 1:
+            # Contigs are processed in parallel, which requires an indexed BAM file
+            merge = AtomicCmdBuilder(
+                ["samtools", "merge", "-l", "1", "-@", threads, "%(TEMP_OUT_BAM)s"],
+                TEMP_OUT_BAM="merged.bam",
+                CHECK_VERSION=SAMTOOLS_VERSION,
+            )
+            merge.add_multiple_values(input_bams)
+            merge = merge.finalize()
+
+            index = AtomicCmd(
+                ["samtools", "index", "-c", "%(TEMP_IN_BAM)s"],
+                TEMP_IN_BAM="merged.bam",
+                TEMP_OUT_INDEX="merged.bam.csi",
+                CHECK_VERSION=SAMTOOLS_VERSION,
+            )
+
+            builder.set_option("--temp-dir", "%(TEMP_DIR)s")
+            builder.add_value("%(TEMP_IN_BAM)s")
+            builder.set_kwargs(TEMP_IN_BAM="merged.bam", TEMP_IN_INDEX="merged.bam.csi")
+
+            command = SequentialCmds([merge, index, builder.finalize()])
+        else:
+            merge = merge_bam_files_command(input_bams)
+            builder.set_kwargs(IN_STDIN=merge)
+
+            command = ParallelCmds([merge, builder.finalize()])
+
         CommandNode.__init__(
             self,
-            command=ParallelCmds([merge, builder.finalize()]),
+            command=command,
             description="filtering collapsed PCR duplicates in %s"
             % (describe_files(merge.input_files),),
+            threads=threads,
+            dependencies=dependencies,
+        )
+
+
+class SplitFASTQNode(CommandNode):
+    def __init__(self, input_file, output_files, dependencies=()):
+        builder = factory.new(":split_fastq")
+        builder.add_value("%(IN_FASTQ)s")
+        builder.add_multiple_values(output_files, template="OUT_CHUNK_%03i")
+        builder.set_kwargs(IN_FASTQ=input_file)
+
+        CommandNode.__init__(
+            self,
+            command=builder.finalize(),
+            description="splitting %s into %i chunks" % (input_file, len(output_files)),
             dependencies=dependencies,
         )
 
@@ -24,7 +24,7 @@ import copy
 
 from paleomix.node import Node
 from paleomix.common.fileutils import move_file, reroot_path, describe_files
-from paleomix.common.formats.msa import MSA
+from paleomix.common.formats.msa import MSAMatrix
 from paleomix.common.formats.phylip import interleaved_phy
 
 from paleomix.common.utilities import safe_coerce_to_frozenset, safe_coerce_to_tuple
@@ -89,7 +89,7 @@ class FastaToPartitionedInterleavedPhyNode(Node):
             partitions = files_dd["partitions"]
             msas = dict((key, []) for key in partitions)
             for filename in files_dd["filenames"]:
-                msa = MSA.from_file(filename)
+                msa = MSAMatrix.from_file(filename)
                 if self._excluded:
                     msa = msa.exclude(self._excluded)
 
@@ -98,7 +98,7 @@ class FastaToPartitionedInterleavedPhyNode(Node):
 
             msas.pop("X", None)
             for (key, msa_parts) in sorted(msas.items()):
-                merged_msa = MSA.join(*msa_parts)
+                merged_msa = MSAMatrix.join(*msa_parts)
                 if self._reduce:
                     merged_msa = merged_msa.reduce()
 
@@ -107,8 +107,8 @@ class FastaToPartitionedInterleavedPhyNode(Node):
 
         out_fname_phy = reroot_path(temp, self._out_prefix + ".phy")
         with open(out_fname_phy, "w") as output_phy:
-            final_msa = MSA.join(*(msa for (_, msa) in merged_msas))
-            output_phy.write(interleaved_phy(final_msa))
+            final_msa = MSAMatrix.join(*(msa for (_, msa) in merged_msas))
+            output_phy.write(interleaved_phy(final_msa.to_msa()))
 
         partition_end = 0
         out_fname_parts = reroot_path(temp, self._out_prefix + ".partitions")
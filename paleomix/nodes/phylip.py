@@ -21,24 +21,33 @@
 # SOFTWARE.
 #
 import re
-import random
+
+import numpy
 
 from paleomix.node import Node, NodeError
 from paleomix.common.fileutils import move_file, reroot_path
+from paleomix.common.utilities import safe_coerce_to_tuple
 
 
 class PHYLIPBootstrapNode(Node):
-    """Generates a bootstrap alignment for a partition PHYLIP file;
+    """Generates bootstrap alignments for a partition PHYLIP file;
 
     Note that only the PHYLIP / partitions format produced by the Node
     FastaToPartitionedInterleavedPhyNode is supported, in addition to the
     formats produced by RAxMLReduceNode.
 
+    The alignment is read once, after which each replicate is generated by
+    sampling columns (with replacement) within each partition, and written
+    to the corresponding output file. Replicates are fully determined by the
+    seed and by the number/order of output files.
+
     Parameters:
       -- input_alignment  - The input alignment file in PHYLIP format
       -- input_partition  - The input partition file in RAxML format
-      -- output_alignment - The output alignment file in PHYLIP format
-                            The simple (RAxML like) sequential format is used.
+      -- output_alignment - One or more output alignment files in PHYLIP
+                            format; one bootstrap replicate is written per
+                            file. The simple (RAxML like) sequential format
+                            is used.
       -- seed             - RNG seed for selecting alignment columns."""
 
     def __init__(
@@ -51,50 +60,58 @@ class PHYLIPBootstrapNode(Node):
     ):
         self._input_phy = input_alignment
         self._input_part = input_partition
-        self._output_phy = output_alignment
+        self._output_phy = safe_coerce_to_tuple(output_alignment)
         self._seed = seed
 
+        if not self._output_phy:
+            raise ValueError("No output alignments specified for bootstraps")
+
+        description = "creating bootstraps from %s" % (input_alignment,)
+        if len(self._output_phy) > 1:
+            description = "creating %i bootstraps from %s" % (
+                len(self._output_phy),
+                input_alignment,
+            )
+
         Node.__init__(
             self,
-            description="creating bootstraps from %s" % (input_alignment,),
+            description=description,
             input_files=(input_alignment, input_partition),
-            output_files=(output_alignment,),
+            output_files=self._output_phy,
             dependencies=dependencies,
         )
 
     def _run(self, _config, temp):
-        if self._seed is not None:
-            rng = random.Random(self._seed)
+        rng = numpy.random.RandomState(self._seed)
         partitions = _read_partitions(self._input_part)
         header, names, sequences = _read_sequences(self._input_phy)
-        bootstraps = self._bootstrap_sequences(sequences, partitions, rng)
+        matrix = _to_matrix(sequences)
+        names = [("%s " % (name,)).encode("utf-8") for name in names]
 
-        temp_fpath = reroot_path(temp, self._output_phy)
-        with open(temp_fpath, "w") as output_phy:
-            output_phy.write(header)
+        for output_phy in self._output_phy:
+            columns = self._bootstrap_columns(partitions, rng)
 
-            for (name, fragments) in zip(names, bootstraps):
-                output_phy.write(name)
-                output_phy.write(" ")
-                for sequence in fragments:
-                    output_phy.write(sequence)
-                output_phy.write("\n")
+            temp_fpath = reroot_path(temp, output_phy)
+            with open(temp_fpath, "wb") as handle:
+                handle.write(header.encode("utf-8"))
 
-        move_file(temp_fpath, self._output_phy)
+                # Rows are selected one at a time to limit memory usage
+                for (name, row) in zip(names, matrix):
+                    handle.write(name)
+                    handle.write(row.take(columns).tobytes())
+                    handle.write(b"\n")
 
-    @classmethod
-    def _bootstrap_sequences(cls, sequences, partitions, rng):
-        final_partitions = [[] for _ in sequences]
-        for (start, end) in partitions:
-            # Convert alignment to columns, and randomly select among those
-            columns = list(zip(*(sequence[start:end] for sequence in sequences)))
-            bootstrap_partition = (rng.choice(columns) for _ in columns)
+            move_file(temp_fpath, output_phy)
 
-            # Convert randomly selected columns back into sequences
-            for (dest, partition) in zip(final_partitions, zip(*bootstrap_partition)):
-                dest.append("".join(partition))
+    @classmethod
+    def _bootstrap_columns(cls, partitions, rng):
+        """Returns the indices of columns for a single bootstrap replicate, with
+        columns drawn (with replacement) from within each partition."""
+        columns = [rng.randint(start, end, end - start) for (start, end) in partitions]
+        if not columns:
+            return numpy.zeros(0, dtype=numpy.intp)
 
-        return final_partitions
+        return numpy.concatenate(columns)
 
 
 _RE_PARTITION = re.compile(r"^[A-Z]+, [^ ]+ = (\d+)-(\d+)$")
@@ -183,3 +200,12 @@ def _read_sequences(filename):
             )
 
     return header, names, sequences
+
+
+def _to_matrix(sequences):
+    """Converts a list of equal length sequences to a uint8 matrix with one row per
+    sequence and one column per alignment column."""
+    ncolumns = len(sequences[0]) if sequences else 0
+    matrix = numpy.frombuffer("".join(sequences).encode("ascii"), dtype=numpy.uint8)
+
+    return matrix.reshape((len(sequences), ncolumns))
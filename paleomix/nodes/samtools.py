@@ -156,6 +156,25 @@ class BAMIndexNode(CommandNode):
         )
 
 
+class MergeBAMsNode(CommandNode):
+    """Merges coordinate sorted BAM files using 'samtools merge'; read-groups and
+    program records with identical IDs are assumed to be identical."""
+
+    def __init__(self, input_files, output_file, dependencies=()):
+        builder = AtomicCmdBuilder(["samtools", "merge", "-c", "-p"])
+        builder.add_value("%(OUT_BAM)s")
+        builder.add_multiple_values(input_files)
+        builder.set_kwargs(OUT_BAM=output_file, CHECK_SAM=SAMTOOLS_VERSION)
+
+        CommandNode.__init__(
+            self,
+            description="merging %i BAM file(s) into %s"
+            % (len(input_files), output_file),
+            command=builder.finalize(),
+            dependencies=dependencies,
+        )
+
+
 def merge_bam_files_command(input_files):
     merge = AtomicCmdBuilder(
         ["samtools", "merge", "-u", "-"],
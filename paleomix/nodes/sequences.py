@@ -31,7 +31,7 @@ import paleomix.common.fileutils as fileutils
 import paleomix.common.utilities as utilities
 
 from paleomix.common.formats.fasta import FASTA
-from paleomix.common.formats.msa import MSA
+from paleomix.common.formats.msa import MSAMatrix
 from paleomix.node import NodeError, Node
 
 
@@ -132,7 +132,7 @@ class FilterSingletonsNode(Node):
         )
 
     def _run(self, _config, temp):
-        alignment = MSA.from_file(self._input_file)
+        alignment = MSAMatrix.from_file(self._input_file)
         for (to_filter, groups) in self._filter_by.items():
             alignment = alignment.filter_singletons(to_filter, groups)
 
@@ -24,10 +24,17 @@ class DetectInputDuplicationNode(CommandNode):
 
 class ValidateFASTQFilesNode(CommandNode):
     def __init__(
-        self, input_files, output_file, offset, collapsed=False, dependencies=()
+        self,
+        input_files,
+        output_file,
+        offset,
+        collapsed=False,
+        threads=1,
+        dependencies=(),
     ):
         command = factory.new(":validate_fastq")
         command.set_option("--offset", offset)
+        command.set_option("--threads", threads)
         if collapsed:
             command.set_option("--collapsed")
         command.add_multiple_values(input_files)
@@ -37,6 +44,7 @@ class ValidateFASTQFilesNode(CommandNode):
             self,
             description="validating %s" % (describe_files(input_files),),
             command=command.finalize(),
+            threads=threads,
             dependencies=dependencies,
         )
 
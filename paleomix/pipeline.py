@@ -20,32 +20,55 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 #
-import errno
+import concurrent.futures
+import heapq
 import logging
 import multiprocessing
 import os
+import queue
+import shutil
 import signal
+import statistics
+import threading
 import traceback
 
-from queue import Empty
-
+import paleomix.atomiccmd.command
+import paleomix.common.fileutils as fileutils
 import paleomix.common.logging
 
-from paleomix.node import Node, NodeError, NodeUnhandledException
-from paleomix.nodegraph import FileStatusCache, NodeGraph, NodeGraphError
+from paleomix.node import Node, NodeError, NodeStreams, NodeUnhandledException
+from paleomix.nodegraph import (
+    _MAX_VERSION_CHECKS,
+    FileStatusCache,
+    FileStatusIndex,
+    NodeGraph,
+    NodeGraphError,
+)
+from paleomix.resourcelog import ResourceLog
+from paleomix.timeline import Timeline
 from paleomix.common.text import padded_table
 from paleomix.common.utilities import safe_coerce_to_tuple
 from paleomix.common.versions import VersionRequirementError
 
 
 class Pypeline:
-    def __init__(self, config):
+    def __init__(self, config, file_index=None, resource_log=None, timeline=None):
         self._nodes = []
         self._config = config
+        # Optional path to persistent index of file states (see FileStatusIndex)
+        self._file_index = file_index
+        # Optional log of resources used by nodes (see ResourceLog)
+        self._resource_log = None
+        if resource_log is not None:
+            self._resource_log = ResourceLog(resource_log)
+        # Optional path to timeline of the run, in the Trace Event Format
+        self._timeline_file = timeline
+        self._timeline = None
         self._logger = logging.getLogger(__name__)
         # Set if a keyboard-interrupt (SIGINT) has been caught
         self._interrupted = False
-        self._queue = multiprocessing.Queue()
+        # Keys of nodes that have finished running; filled by pool callbacks
+        self._finished = queue.Queue()
         self._pool = None
 
     def add_nodes(self, *nodes):
@@ -55,16 +78,38 @@ class Pypeline:
                     raise TypeError("Node object expected, recieved %s" % repr(node))
                 self._nodes.append(node)
 
-    def run(self, max_threads=1, dry_run=False):
+    def run(self, max_threads=1, max_memory=None, dry_run=False):
+        """Runs the pipeline using at most 'max_threads' threads, and (if set) at
+        most 'max_memory' bytes of memory, as estimated by the nodes themselves.
+        Tasks that exceed either limit are only run when no other tasks are running.
+        """
         if max_threads < 1:
             raise ValueError("Max threads must be >= 1")
+        elif max_memory is not None and max_memory < 1:
+            raise ValueError("Max memory must be >= 1")
+
+        index = self._open_file_index()
+        try:
+            result = self._run_pipeline(index, max_threads, max_memory, dry_run)
+        finally:
+            if index is not None:
+                index.close()
+
+        for filename in paleomix.common.logging.get_logfiles():
+            self._logger.info("Log-file written to %r", filename)
+
+        return result
 
+    def _run_pipeline(self, index, max_threads, max_memory, dry_run):
         try:
-            nodegraph = NodeGraph(self._nodes)
+            nodegraph = NodeGraph(self._nodes, self._get_cache_factory(index))
         except NodeGraphError as error:
             self._logger.error(error)
             return False
 
+        if index is not None:
+            index.flush()
+
         for node in nodegraph.iterflat():
             if node.threads > max_threads:
                 self._logger.warn(
@@ -74,125 +119,289 @@ class Pypeline:
                 )
                 break
 
+        if max_memory is not None:
+            for node in nodegraph.iterflat():
+                if node.memory > max_memory:
+                    self._logger.warning(
+                        "One or more tasks require more memory than the user-defined "
+                        "maximum; these tasks will only be run when no other tasks "
+                        "are running."
+                    )
+                    break
+
         if dry_run:
             self._summarize_pipeline(nodegraph)
             self._logger.info("Dry run done")
 
             result = True
         else:
-            self._pool = multiprocessing.Pool(max_threads, _init_worker, (self._queue,))
+            self._pool = multiprocessing.Pool(max_threads, _init_worker)
             old_handler = signal.signal(signal.SIGINT, self._sigint_handler)
 
             try:
-                result = self._run(nodegraph, max_threads)
+                if self._timeline_file is not None:
+                    self._logger.info("Writing timeline to %r", self._timeline_file)
+                    self._timeline = Timeline(self._timeline_file)
+
+                result = self._run(nodegraph, max_threads, max_memory)
             finally:
                 signal.signal(signal.SIGINT, old_handler)
-
-        for filename in paleomix.common.logging.get_logfiles():
-            self._logger.info("Log-file written to %r", filename)
+                if self._timeline is not None:
+                    self._timeline.close()
+                    self._timeline = None
 
         return result
 
-    def _run(self, nodegraph, max_threads):
-        # Dictionary of nodes -> async-results
+    def _run(self, nodegraph, max_threads, max_memory=None):
+        # Dictionary of keys -> (nodes, async-results)
         running = {}
-        # Set of remaining nodes to be run
-        remaining = set(nodegraph.iterflat())
+        # Number of unfinished dependencies for nodes that cannot yet be run
+        waiting = {}
+        # Nodes for which all dependencies have been completed
+        runable = _RunableQueue(
+            _calculate_priorities(nodegraph, self._get_runtimes(nodegraph))
+        )
 
-        is_ok = True
-        while running or (remaining and not self._interrupted):
-            is_ok &= self._poll_running_nodes(running, nodegraph, self._queue)
+        for node in nodegraph.iterflat():
+            state = nodegraph.get_node_state(node)
+            if state == nodegraph.RUNABLE:
+                runable.push(node)
+            elif state in (nodegraph.QUEUED, nodegraph.OUTDATED):
+                waiting[node] = sum(
+                    nodegraph.get_node_state(dependency) != nodegraph.DONE
+                    for dependency in node.dependencies
+                )
 
+        is_ok = True
+        while running or (runable and not self._interrupted):
             if not self._interrupted:  # Prevent starting of new nodes
                 self._start_new_tasks(
-                    remaining, running, nodegraph, max_threads, self._pool
+                    runable,
+                    running,
+                    waiting,
+                    nodegraph,
+                    max_threads,
+                    max_memory,
+                    self._pool,
                 )
 
+            self._update_timeline(running, runable)
+            if running:
+                is_ok &= self._wait_for_running_nodes(
+                    running, waiting, runable, nodegraph
+                )
+
+        self._update_timeline(running, runable)
+
         self._pool.close()
         self._pool.join()
         self._summarize_pipeline(nodegraph)
 
         return is_ok
 
-    def _start_new_tasks(self, remaining, running, nodegraph, max_threads, pool):
-        started_nodes = []
-        idle_processes = max_threads - sum(
-            node.threads for (node, _) in running.values()
-        )
+    def _start_new_tasks(
+        self, runable, running, waiting, nodegraph, max_threads, max_memory, pool
+    ):
+        running_nodes = [node for (nodes, _) in running.values() for node in nodes]
+        idle_threads = max_threads - sum(node.threads for node in running_nodes)
+        # Memory is not limited if no maximum has been set
+        idle_memory = float("inf")
+        if max_memory is not None:
+            idle_memory = max_memory - sum(node.memory for node in running_nodes)
+
+        skipped_nodes = []
+        while runable and idle_threads > 0 and idle_memory > 0:
+            node = runable.pop()
+            nodes, filenames = self._get_streamed_nodes(
+                node, runable, waiting, nodegraph
+            )
 
-        if not idle_processes:
-            return False
+            threads = sum(node.threads for node in nodes)
+            memory = sum(node.memory for node in nodes)
+            if len(nodes) > 1 and (idle_threads < threads or idle_memory < memory):
+                # Output is written to disk if the nodes cannot be run concurrently
+                nodes, filenames = (node,), ()
+                threads, memory = node.threads, node.memory
 
-        for node in remaining:
-            if not running or (idle_processes >= node.threads):
-                state = nodegraph.get_node_state(node)
-                if state == nodegraph.RUNABLE:
-                    key = id(node)
-                    proc_args = (key, node, self._config)
-                    running[key] = (node, pool.apply_async(_call_run, args=proc_args))
-                    started_nodes.append(node)
-
-                    nodegraph.set_node_state(node, nodegraph.RUNNING)
-                    idle_processes -= node.threads
-                elif state in (nodegraph.DONE, nodegraph.ERROR):
-                    started_nodes.append(node)
-            elif idle_processes <= 0:
-                break
+            if running and (idle_threads < threads or idle_memory < memory):
+                skipped_nodes.append(node)
+                continue
 
-        for node in started_nodes:
-            remaining.remove(node)
+            key = id(node)
+            if filenames:
+                producers, consumer = nodes[:-1], nodes[-1]
+                for producer in producers:
+                    if producer is not node:
+                        runable.remove(producer)
+                waiting.pop(consumer)
 
-    def _poll_running_nodes(self, running, nodegraph, queue):
-        error_happened = False
-        blocking = False
+                func = _call_run_streamed
+                proc_args = (producers, consumer, filenames, self._config)
+            else:
+                func = _call_run
+                proc_args = (node, self._config)
+
+            running[key] = (
+                nodes,
+                pool.apply_async(
+                    func,
+                    args=proc_args,
+                    callback=self._on_node_finished(key),
+                    error_callback=self._on_node_finished(key),
+                ),
+            )
 
-        while running and not error_happened:
-            node, proc = self._get_finished_node(queue, running, blocking)
-            if not node:
-                if blocking:
-                    break
+            for node in nodes:
+                nodegraph.set_node_state(node, nodegraph.RUNNING)
+                if self._timeline is not None:
+                    self._timeline.node_started(node)
+            idle_threads -= threads
+            idle_memory -= memory
 
-                blocking = True
-                continue
+        # Nodes that could not be started retain their place in the queue
+        for node in skipped_nodes:
+            runable.push(node)
+
+    @classmethod
+    def _get_streamed_nodes(cls, node, runable, waiting, nodegraph):
+        """Returns the nodes to run in order to stream output files of the given
+        node to the node consuming them, with the consumer listed last, and the
+        files to be streamed. If this is not possible, because the consumer depends
+        on other unfinished nodes, the node itself and no files are returned.
+        """
+        consumer = nodegraph.get_stream_consumer(node)
+        if consumer is None or consumer not in waiting:
+            return (node,), ()
+
+        producers = {}
+        streamed_files = nodegraph.get_streamed_inputs(consumer)
+        for dependency in consumer.dependencies:
+            if dependency is node or dependency in runable:
+                if dependency in streamed_files.values():
+                    producers[dependency] = None
+                    continue
+
+            if nodegraph.get_node_state(dependency) != nodegraph.DONE:
+                return (node,), ()
+
+        filenames = frozenset(
+            filename
+            for (filename, producer) in streamed_files.items()
+            if producer in producers
+        )
+
+        return tuple(producers) + (consumer,), filenames
 
+    def _wait_for_running_nodes(self, running, waiting, runable, nodegraph):
+        """Blocks until at least one running node has finished, and then processes
+        every node that has finished so far. Nodes that become runable as a result
+        are added to the 'runable' queue. Returns false if any node failed.
+        """
+        error_happened = False
+        finished = [self._finished.get()]
+        while True:
+            try:
+                finished.append(self._finished.get_nowait())
+            except queue.Empty:
+                break
+
+        for key in finished:
+            nodes, proc = running.pop(key)
+
+            records = [None] * len(nodes)
             try:
                 # Re-raise exceptions from the node-process
-                proc.get()
+                if len(nodes) > 1:
+                    # Streamed nodes report errors per node, with the consumer last
+                    errors, records = proc.get()
+                else:
+                    errors, records = [None], [proc.get()]
             except (KeyboardInterrupt, SystemExit):
                 raise
-            except Exception as errors:
-                error_happened = True
-                nodegraph.set_node_state(node, nodegraph.ERROR)
+            except Exception as error:
+                errors = [error] * len(nodes)
+
+            for (node, error, record) in zip(nodes, errors, records):
+                if self._timeline is not None:
+                    self._timeline.node_finished(node, record, error)
+
+                if error is not None:
+                    error_happened = True
+                    nodegraph.set_node_state(node, nodegraph.ERROR)
 
-                self._logger.error("%s while %s:", type(errors).__name__, node)
-                for line in str(errors).strip().split("\n"):
-                    self._logger.error("    %s", line)
+                    self._logger.error("%s while %s:", type(error).__name__, node)
+                    for line in str(error).strip().split("\n"):
+                        self._logger.error("    %s", line)
+                else:
+                    if record is not None and self._resource_log is not None:
+                        self._resource_log.add(node, record)
 
-            if not error_happened:
-                nodegraph.set_node_state(node, nodegraph.DONE)
+                    nodegraph.set_node_state(node, nodegraph.DONE)
+                    self._update_waiting_nodes(node, waiting, runable, nodegraph)
 
         return not error_happened
 
+    def _update_timeline(self, running, runable):
+        if self._timeline is not None:
+            self._timeline.set_counters(
+                running_threads=sum(
+                    node.threads for (nodes, _) in running.values() for node in nodes
+                ),
+                queued_nodes=len(runable),
+            )
+
+    @classmethod
+    def _update_waiting_nodes(cls, node, waiting, runable, nodegraph):
+        """Decrements the dependency counters of nodes depending on a finished node,
+        queuing those nodes once all of their dependencies have been completed.
+        """
+        finished = [node]
+        while finished:
+            for dependent in nodegraph.get_dependents(finished.pop()):
+                if dependent not in waiting:
+                    # Nodes in an error state are never run
+                    continue
+
+                waiting[dependent] -= 1
+                if not waiting[dependent]:
+                    waiting.pop(dependent)
+
+                    state = nodegraph.get_node_state(dependent)
+                    if state == nodegraph.RUNABLE:
+                        runable.push(dependent)
+                    elif state == nodegraph.DONE:
+                        # Outdated nodes may be up-to-date once dependencies are done
+                        finished.append(dependent)
+
+    def _on_node_finished(self, key):
+        """Returns a callback for multiprocessing.Pool.apply_async, which records
+        that the node with the given key has finished (or failed).
+        """
+
+        def _callback(_result):
+            self._finished.put(key)
+
+        return _callback
+
     @property
     def nodes(self):
         return set(self._nodes)
 
     def walk_nodes(self, func):
+        """Calls 'func' once for every node in the pipeline, in depth-first order,
+        stopping if 'func' returns false."""
         skip_nodes = set()
-
-        def _walk_nodes(nodes):
-            for node in nodes:
-                if node in skip_nodes:
-                    continue
-                elif not func(node):
-                    return False
+        stack = [iter(self._nodes)]
+        while stack:
+            node = next(stack[-1], None)
+            if node is None:
+                stack.pop()
+            elif node not in skip_nodes:
+                if not func(node):
+                    return
 
                 skip_nodes.add(node)
-                if not _walk_nodes(node.dependencies):
-                    return False
-            return True
-
-        _walk_nodes(self._nodes)
+                stack.append(iter(node.dependencies))
 
     def list_input_files(self):
         """Returns a set containing the absolute path of all input files
@@ -216,16 +425,25 @@ class Pypeline:
         return input_files - output_files
 
     def list_output_files(self):
-        cache = FileStatusCache()
-        nodegraph = NodeGraph(self._nodes, lambda: cache)
+        index = self._open_file_index()
+        try:
+            return self._list_output_files(index)
+        finally:
+            if index is not None:
+                index.close()
+
+    def _list_output_files(self, index):
+        # The states of nodes are determined without building a NodeGraph, as this
+        # involves validating the entire pipeline and checking required executables
+        cache = self._get_cache_factory(index)()
         output_files = {}
 
         def collect_output_files(node):
             state = None
-            if nodegraph.is_done(node, cache):
-                state = nodegraph.DONE
-                if nodegraph.is_outdated(node, cache):
-                    state = nodegraph.OUTDATED
+            if NodeGraph.is_done(node, cache):
+                state = NodeGraph.DONE
+                if NodeGraph.is_outdated(node, cache):
+                    state = NodeGraph.OUTDATED
 
             for filename in node.output_files:
                 output_files[os.path.abspath(filename)] = state
@@ -281,27 +499,67 @@ class Pypeline:
         for filename in sorted(input_files):
             print_func("%s" % (filename,))
 
+    def print_resource_usage(self, print_func=print):
+        """Prints a summary of the resources used by the commands run by the
+        current pipeline, as recorded in the resource log (if any)."""
+        if self._resource_log is None:
+            self._logger.error("Resource usage is not recorded for this pipeline")
+            return False
+        elif not self._resource_log.read():
+            self._logger.warning(
+                "No resource usage recorded in %r", self._resource_log.filename
+            )
+            return True
+
+        for line in self._resource_log.summarize():
+            print_func(line)
+
+        return True
+
     def print_required_executables(self, print_func=print):
         template = "{: <40s} {: <11s} {}"
         pipeline_executables = self.list_required_executables()
-        print_func(template.format("Executable", "Version", "Required version"))
 
+        requirements = set()
+        for values in pipeline_executables.values():
+            requirements.update(values)
+
+        # Determining versions mostly involves waiting for external processes
+        with concurrent.futures.ThreadPoolExecutor(_MAX_VERSION_CHECKS) as executor:
+            versions = dict(
+                zip(requirements, executor.map(_format_version, requirements))
+            )
+
+        print_func(template.format("Executable", "Version", "Required version"))
         for (name, requirements) in sorted(pipeline_executables.items()):
             if not requirements:
                 print_func(template.format(name, "-", "any version"))
                 continue
 
             for requirement in requirements:
-                try:
-                    if requirement.version:
-                        version = "v" + ".".join(map(str, requirement.version))
-                    else:
-                        version = "NA"
-                except VersionRequirementError:
-                    version = "UNKNOWN"
-
+                version = versions[requirement]
                 print_func(template.format(name, version, requirement.checks))
 
+    def _open_file_index(self):
+        if self._file_index is None:
+            return None
+
+        self._logger.info("Using file index at %r", self._file_index)
+        return FileStatusIndex(self._file_index)
+
+    def _get_runtimes(self, nodegraph):
+        if self._resource_log is None:
+            return {}
+
+        return self._resource_log.runtimes(list(nodegraph.iterflat()))
+
+    @classmethod
+    def _get_cache_factory(cls, index):
+        if index is None:
+            return FileStatusCache
+
+        return index.new_cache
+
     def _sigint_handler(self, signum, frame):
         """Signal handler; see signal.signal."""
         if not self._interrupted:
@@ -314,26 +572,6 @@ class Pypeline:
             self._pool.terminate()
             raise signal.default_int_handler(signum, frame)
 
-    @classmethod
-    def _get_finished_node(cls, queue, running, blocking):
-        """Returns a tuple containing a node that has finished running
-        and it's async-result, or None for both if no such node could
-        be found (and blocking is False), or if an interrupt occured
-        while waiting for a node to finish.
-
-        If blocking is True, the function will timeout after 0.1s.
-        """
-        try:
-            key = queue.get(blocking, 0.1)
-            return running.pop(key)
-        except IOError as error:
-            # User pressed ctrl-c (SIGINT), or similar event
-            if error.errno != errno.EINTR:
-                raise
-        except Empty:
-            pass
-        return None, None
-
     def _summarize_pipeline(self, nodegraph):
         states = nodegraph.get_state_counts()
 
@@ -355,24 +593,109 @@ class Pypeline:
             self._logger.info("Pipeline completed successfully")
 
 
-def _init_worker(queue):
+class _RunableQueue:
+    """Priority queue of runable nodes. Nodes with the highest priority are
+    returned first, with ties broken by the order in which nodes were (first)
+    added to the queue.
+    """
+
+    def __init__(self, priorities):
+        self._priorities = priorities
+        self._order = {}
+        self._heap = []
+        self._queued = set()
+        # Nodes removed from the queue, but not (yet) from the heap
+        self._removed = set()
+
+    def push(self, node):
+        order = self._order.setdefault(node, len(self._order))
+        heapq.heappush(self._heap, (-self._priorities[node], order, node))
+        self._queued.add(node)
+
+    def pop(self):
+        while True:
+            node = heapq.heappop(self._heap)[-1]
+            if node in self._removed:
+                self._removed.remove(node)
+            else:
+                self._queued.remove(node)
+
+                return node
+
+    def remove(self, node):
+        self._queued.remove(node)
+        self._removed.add(node)
+
+    def __contains__(self, node):
+        return node in self._queued
+
+    def __len__(self):
+        return len(self._queued)
+
+
+def _calculate_priorities(nodegraph, runtimes=None):
+    """Calculates the priority of each node as the length of the longest path from
+    that node to the end of the pipeline, as measured by the sum of the weights of
+    the nodes on that path. Nodes are weighted by the number of threads used and,
+    if given, by their expected runtime (a dict of nodes to seconds). Nodes with no
+    expected runtime are assumed to take the median of the expected runtimes.
+    """
+    runtimes = runtimes or {}
+    default_runtime = statistics.median(runtimes.values()) if runtimes else 1.0
+
+    # Nodes are processed once every node depending on them has been processed
+    remaining = {}
+    processable = []
+    for node in nodegraph.iterflat():
+        remaining[node] = len(nodegraph.get_dependents(node))
+        if not remaining[node]:
+            processable.append(node)
+
+    priorities = {}
+    while processable:
+        node = processable.pop()
+        downstream = max(
+            (priorities[dependent] for dependent in nodegraph.get_dependents(node)),
+            default=0,
+        )
+
+        runtime = runtimes.get(node, default_runtime)
+        priorities[node] = node.threads * runtime + downstream
+
+        for dependency in node.dependencies:
+            remaining[dependency] -= 1
+            if not remaining[dependency]:
+                processable.append(dependency)
+
+    return priorities
+
+
+def _format_version(requirement):
+    try:
+        if requirement.version:
+            return "v" + ".".join(map(str, requirement.version))
+
+        return "NA"
+    except VersionRequirementError:
+        return "UNKNOWN"
+
+
+def _init_worker():
     """Init function for subprocesses created by multiprocessing.Pool: Ensures
     that KeyboardInterrupts only occur in the main process, allowing us to do
     proper cleanup.
     """
     signal.signal(signal.SIGINT, signal.SIG_IGN)
-    # This is a workaround to avoid having to use multiprocessing.Manager
-    # to create the Queue objects; this is needed because the Manager class
-    # creates it own process, which inherits the signal-handlers of the main
-    # process, causing some rather odd behavior when the user causes a SIGINT.
-    _call_run.queue = queue
 
 
-def _call_run(key, node, config):
+def _call_run(node, config, streams=None):
     """Wrapper function, required in order to call Node.run()
     in subprocesses, since it is not possible to pickle
     bound functions (e.g. self.run)"""
     try:
+        if streams is not None:
+            return node.run(config, streams)
+
         return node.run(config)
     except NodeError:
         raise
@@ -380,6 +703,108 @@ def _call_run(key, node, config):
         message = "Unhandled error running Node:\n\n%s" % (traceback.format_exc(),)
 
         raise NodeUnhandledException(message)
+
+
+# Interval (in seconds) between attempts at unblocking commands waiting on pipes
+_STREAM_POLL_INTERVAL = 0.1
+
+
+def _call_run_streamed(producers, consumer, filenames, config):
+    """Runs one or more nodes concurrently with a node consuming (some of) their
+    output files, with the given files replaced by named pipes connecting the nodes.
+    Nodes are run in separate threads, and if any node fails, the remaining nodes
+    are terminated. Returns a list containing the exception raised by each node (or
+    None if it completed successfully) and a list of the values returned by each
+    node (see Node.run), with the consumer listed last in both lists.
+    """
+    # SIGTERM handlers can only be installed in the main thread
+    paleomix.atomiccmd.command.install_cleanup_handler()
+    # Forking is unsafe in the presence of multiple threads
+    fork_commands = paleomix.atomiccmd.command.set_fork_paleomix_commands(False)
+
+    pipes = {}
+    root = os.path.abspath(fileutils.create_temp_dir(config.temp_root))
+    try:
+        for (idx, filename) in enumerate(sorted(filenames)):
+            pipe = pipes[filename] = os.path.join(root, "stream_%i" % (idx,))
+            os.mkfifo(pipe)
+
+            dirname = os.path.dirname(filename)
+            if dirname:
+                fileutils.make_dirs(dirname)
+            if os.path.lexists(filename):
+                os.remove(filename)
+            os.symlink(pipe, filename)
+
+        return _run_streamed_nodes(producers, consumer, NodeStreams(pipes), config)
     finally:
-        # See comment in _init_worker
-        _call_run.queue.put(key)
+        for (filename, pipe) in pipes.items():
+            if os.path.islink(filename) and os.readlink(filename) == pipe:
+                os.remove(filename)
+
+        shutil.rmtree(root)
+        paleomix.atomiccmd.command.set_fork_paleomix_commands(fork_commands)
+
+
+def _run_streamed_nodes(producers, consumer, streams, config):
+    nodes = tuple(producers) + (consumer,)
+    errors = [None] * len(nodes)
+    records = [None] * len(nodes)
+    finished = queue.Queue()
+
+    def _run_node(idx):
+        try:
+            records[idx] = _call_run(nodes[idx], config, streams)
+        except Exception as error:
+            errors[idx] = error
+        finally:
+            finished.put(idx)
+
+    threads = []
+    for idx in range(len(nodes)):
+        # Threads blocked on pipes must not prevent the worker from exiting
+        threads.append(threading.Thread(target=_run_node, args=(idx,), daemon=True))
+        threads[-1].start()
+
+    running = set(range(len(nodes)))
+    running_producers = set(range(len(producers)))
+    while running:
+        try:
+            idx = finished.get(timeout=_STREAM_POLL_INTERVAL)
+        except queue.Empty:
+            pass
+        else:
+            threads[idx].join()
+            running.remove(idx)
+            running_producers.discard(idx)
+            if not running_producers:
+                streams.set_finished(not any(errors[: len(producers)]))
+
+        if any(errors):
+            for idx in running:
+                nodes[idx].terminate()
+
+            # Commands blocked opening either end of a pipe can only be terminated
+            # once the pipe has been opened; any data written is discarded
+            for pipe in streams.pipes.values():
+                _unblock_pipe(pipe, os.O_RDONLY)
+                _unblock_pipe(pipe, os.O_WRONLY)
+        elif running_producers != set(range(len(producers))):
+            # Allow the consumer to finish reading pipes that were never opened by
+            # producers that have since completed
+            for (idx, producer) in enumerate(producers):
+                if idx not in running_producers:
+                    for filename in producer.output_files & frozenset(streams.pipes):
+                        _unblock_pipe(streams.pipes[filename], os.O_WRONLY)
+
+    return errors, records
+
+
+def _unblock_pipe(filename, mode):
+    """Opens and closes one end of a named pipe without blocking, in order to
+    unblock any process waiting to open the other end of the pipe."""
+    try:
+        os.close(os.open(filename, mode | os.O_NONBLOCK))
+    except OSError:
+        # Opening a pipe for writing fails if it has not been opened for reading
+        pass
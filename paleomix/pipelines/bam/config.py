@@ -28,6 +28,7 @@ import paleomix.common.logging
 
 from paleomix.resources import add_copy_example_command
 from paleomix.common.argparse import ArgumentParser, SUPPRESS
+from paleomix.common.system import format_memory_size, get_total_memory, memory_size
 
 
 _DEFAULT_CONFIG_FILES = [
@@ -96,6 +97,15 @@ def add_run_command(subparsers):
         default=max(2, multiprocessing.cpu_count()),
         help="Max number of threads to use in total",
     )
+    group.add_argument(
+        "--max-memory",
+        type=memory_size,
+        default=format_memory_size(get_total_memory()),
+        help="Max amount of memory to use in total (e.g. '64G'), based on the "
+        "estimated memory usage of each task; defaults to the amount of physical "
+        "memory. Tasks requiring more memory are only run when no other tasks are "
+        "running",
+    )
     group.add_argument(
         "--adapterremoval-max-threads",
         type=int,
@@ -114,6 +124,29 @@ def add_run_command(subparsers):
         default=1,
         help="Max number of threads to use per BWA instance",
     )
+    group.add_argument(
+        "--mapping-chunks",
+        type=int,
+        default=1,
+        help="Split the trimmed reads for each lane into this number of chunks, "
+        "which are mapped separately and merged afterwards, allowing the mapping "
+        "of large lanes to be spread across more tasks than the number of threads "
+        "used per BWA / Bowtie2 instance. The default (1) disables splitting",
+    )
+    group.add_argument(
+        "--depths-max-threads",
+        type=int,
+        default=1,
+        help="Max number of threads to use per instance of 'paleomix depths'",
+    )
+    group.add_argument(
+        "--rmdup-collapsed-max-threads",
+        type=int,
+        default=1,
+        help="Max number of threads to use per instance of 'paleomix "
+        "rmdup_collapsed'. If greater than 1, the input BAMs are merged into a "
+        "temporary, indexed BAM file, allowing contigs to be processed in parallel",
+    )
 
     group = parser.add_argument_group("Required paths")
     group.add_argument(
@@ -153,6 +186,46 @@ def add_run_command(subparsers):
         help="List all executables required by the pipeline, "
         "with version requirements (if any).",
     )
+    group.add_argument(
+        "--timeline",
+        metavar="FILE",
+        help="Write a timeline of the nodes and commands run by the pipeline to "
+        "FILE in the Trace Event Format (JSON), for viewing in Perfetto "
+        "(ui.perfetto.dev) or Chrome (chrome://tracing)",
+    )
+    group.add_argument(
+        "--report-resources",
+        action="store_true",
+        default=False,
+        help="Summarize the CPU time, memory, and I/O used by commands run by "
+        "the pipeline, as recorded in 'paleomix.resources.jsonl' in the "
+        "destination folder.",
+    )
+    group.add_argument(
+        "--file-index",
+        metavar="FILE",
+        help="Path to an SQLite database used to record the state of input and "
+        "output files between runs, e.g. in the destination folder. When set, only "
+        "files in folders that have changed since the last run are re-examined. "
+        "Note that files modified in place may not be detected",
+    )
+    group.add_argument(
+        "--graph-cache",
+        metavar="FILE",
+        help="Path to a file in which the tasks built for the makefile(s) are "
+        "cached, e.g. in the destination folder. The cached tasks are re-used as "
+        "long as the makefiles, command-line options, and input files are unchanged, "
+        "avoiding the cost of building large pipelines when re-running them",
+    )
+
+    group.add_argument(
+        "--index-cache",
+        metavar="DIR",
+        help="Folder in which BWA and Bowtie2 indices are stored, named using the "
+        "SHA256 hash of the reference FASTA files. Indices in this folder are "
+        "shared between projects and pipelines using identical reference files, "
+        "instead of being built next to each reference FASTA file",
+    )
 
     group = parser.add_argument_group("Misc")
     group.add_argument(
@@ -166,6 +239,15 @@ def add_run_command(subparsers):
         "to the JRE (Jave Runtime Environment); e.g. to change the "
         "maximum amount of memory (default is -Xmx4g)",
     )
+    group.add_argument(
+        "--rmdup-collapsed-compression-level",
+        type=int,
+        choices=range(10),
+        metavar="N",
+        help="Compression level for BAM files written by 'paleomix rmdup_collapsed', "
+        "from 0 (uncompressed) to 9 (best compression); uses the htslib default if "
+        "not set",
+    )
 
     # Removed options
     parser.add_argument("--gatk-max-threads", help=SUPPRESS)
@@ -20,6 +20,12 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 #
+import fcntl
+import os
+import shutil
+
+from paleomix.node import Node, NodeError
+from paleomix.common.fileutils import make_dirs, move_file, reroot_path
 from paleomix.nodes.picard import ValidateBAMNode
 from paleomix.nodes.samtools import BAMIndexNode
 
@@ -62,3 +68,72 @@ def _get_input_files(node, index_format):
             input_filename = filename
 
     return input_filename, index_filename
+
+
+class CopyReferenceNode(Node):
+    """Copies a reference FASTA file to a shared index folder, for use as the
+    prefix of shared BWA / Bowtie2 indices. The file is copied rather than linked,
+    since changes made to the original in-place would otherwise affect the copy.
+    """
+
+    def __init__(self, input_file, output_file, dependencies=()):
+        self._input_file = input_file
+        self._output_file = output_file
+
+        Node.__init__(
+            self,
+            description="copying %s to shared index folder" % (input_file,),
+            input_files=(input_file,),
+            output_files=(output_file,),
+            dependencies=dependencies,
+        )
+
+    def _run(self, _config, temp):
+        shutil.copyfile(self._input_file, reroot_path(temp, self._output_file))
+
+    def _teardown(self, config, temp):
+        move_file(reroot_path(temp, self._output_file), self._output_file)
+
+        Node._teardown(self, config, temp)
+
+
+class SharedIndexNode(Node):
+    """Runs a node that writes to a folder shared between pipelines (see
+    '--index-cache'). An exclusive lock is held while the node is run, and the node
+    is skipped if its output files were created by another pipeline while waiting
+    for the lock. Locks are taken per type of node, so that different indices of
+    the same reference may be built concurrently."""
+
+    def __init__(self, node, folder):
+        self._node = node
+        self._folder = folder
+        self._lock_file = os.path.join(folder, ".%s.lock" % (type(node).__name__,))
+
+        Node.__init__(
+            self,
+            description=str(node),
+            threads=node.threads,
+            memory=node.memory,
+            input_files=node.input_files,
+            output_files=node.output_files,
+            executables=node.executables,
+            auxiliary_files=node.auxiliary_files,
+            requirements=node.requirements,
+            dependencies=node.dependencies,
+        )
+
+    def run(self, config):
+        try:
+            make_dirs(self._folder)
+            handle = open(self._lock_file, "a")
+        except OSError as error:
+            raise NodeError(
+                "Could not lock shared folder %r: %s" % (self._folder, error)
+            )
+
+        # The lock is released when the handle is closed
+        with handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+
+            if not all(os.path.exists(fpath) for fpath in self.output_files):
+                return self._node.run(config)
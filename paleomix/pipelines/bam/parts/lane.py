@@ -29,6 +29,8 @@ from paleomix.common.makefile import MakefileError
 
 from paleomix.nodes.bwa import BWAAlgorithmNode, BWABacktrack, BWASampe, BWASamse
 from paleomix.nodes.bowtie2 import Bowtie2Node
+from paleomix.nodes.commands import SplitFASTQNode
+from paleomix.nodes.samtools import MergeBAMsNode
 
 from paleomix.pipelines.bam.parts import Reads
 from paleomix.pipelines.bam.nodes import index_and_validate_bam
@@ -76,18 +78,26 @@ class Lane:
             # Common parameters between BWA / Bowtie2
             output_filename = os.path.join(self.folder, "%s.bam" % (key.lower(),))
 
-            alignment_node = self._build_alignment_node(
-                config=config,
-                record=record,
-                prefix=prefix,
-                parameters={
-                    "input_file": input_filename,
-                    "output_file": output_filename,
-                    "prefix": prefix["Path"],
-                    "reference": prefix["Reference"],
-                    "dependencies": self.reads.nodes + prefix[prefix_key],
-                },
-            )
+            parameters = {
+                "input_file": input_filename,
+                "output_file": output_filename,
+                "prefix": prefix["IndexPrefix"],
+                "reference": prefix["Reference"],
+                "dependencies": self.reads.nodes + prefix[prefix_key],
+            }
+
+            if config.mapping_chunks > 1:
+                alignment_node = self._build_chunked_alignment_node(
+                    config=config,
+                    record=record,
+                    prefix=prefix,
+                    key=key,
+                    parameters=parameters,
+                )
+            else:
+                alignment_node = self._build_alignment_node(
+                    config=config, record=record, prefix=prefix, parameters=parameters
+                )
 
             self.bams[key] = {
                 output_filename: self._finalize_nodes(
@@ -95,6 +105,60 @@ class Lane:
                 )
             }
 
+    def _build_chunked_alignment_node(self, config, record, prefix, key, parameters):
+        """Splits the reads into chunks that are mapped separately, after which the
+        resulting (coordinate sorted) BAMs are merged into the final BAM file."""
+        input_template = parameters.pop("input_file")
+        output_file = parameters.pop("output_file")
+        dependencies = parameters.pop("dependencies")
+
+        paired_end = paths.is_paired_end(input_template)
+        chunk_prefixes = []
+        for idx in range(config.mapping_chunks):
+            filename = "%s.chunk%03i" % (key.lower(), idx)
+            chunk_prefixes.append(os.path.join(self.folder, "chunks", filename))
+
+        fastq_postfix = ".pair{Pair}.fastq.gz" if paired_end else ".fastq.gz"
+        chunk_fastqs = [value + fastq_postfix for value in chunk_prefixes]
+
+        # Mate 1 and mate 2 files are split separately, but identically
+        split_nodes = []
+        for pair in (1, 2) if paired_end else (1,):
+            split_nodes.append(
+                SplitFASTQNode(
+                    input_file=input_template.format(Pair=pair),
+                    output_files=[tmpl.format(Pair=pair) for tmpl in chunk_fastqs],
+                    dependencies=self.reads.nodes,
+                )
+            )
+
+        chunk_bams = []
+        alignment_nodes = []
+        for (chunk_prefix, chunk_fastq) in zip(chunk_prefixes, chunk_fastqs):
+            chunk_bams.append(chunk_prefix + ".bam")
+
+            chunk_parameters = dict(parameters)
+            chunk_parameters["input_file"] = chunk_fastq
+            chunk_parameters["output_file"] = chunk_bams[-1]
+            chunk_parameters["dependencies"] = tuple(split_nodes) + tuple(dependencies)
+            # Chunks may be streamed directly to the merging node
+            chunk_parameters["streamable"] = True
+
+            alignment_nodes.append(
+                self._build_alignment_node(
+                    config=config,
+                    record=record,
+                    prefix=prefix,
+                    parameters=chunk_parameters,
+                )
+            )
+
+        return MergeBAMsNode(
+            input_files=chunk_bams,
+            output_file=output_file,
+            dependencies=alignment_nodes,
+        )
+
     def _build_alignment_node(self, config, record, prefix, parameters):
         if self.options["Aligners"]["Program"] == "BWA":
             algorithm = self.options["Aligners"]["BWA"]["Algorithm"].lower()
@@ -151,6 +215,8 @@ class Lane:
             reference=parameters["reference"],
             mapping_options=self.options["Aligners"]["BWA"],
             dependencies=parameters["dependencies"],
+            # The .sai files are only used as input for 'bwa samse/sampe'
+            streamable=True,
         )
 
     def _build_bwa_backtrack_se(self, config, prefix, record, parameters):
@@ -49,7 +49,7 @@ class Reads:
         if lane_type == "Raw":
             self._init_raw_reads(config, record)
         elif lane_type == "Trimmed":
-            self._init_pretrimmed_reads(record)
+            self._init_pretrimmed_reads(config, record)
         else:
             assert False, "Unexpected data type in Reads(): %s" % (repr(lane_type))
 
@@ -57,7 +57,7 @@ class Reads:
             if value:
                 self.files.pop(name, None)
 
-    def _init_pretrimmed_reads(self, record):
+    def _init_pretrimmed_reads(self, config, record):
         self.files.update(record["Data"])
 
         nodes = []
@@ -77,6 +77,7 @@ class Reads:
                 output_file=output_file,
                 offset=self.quality_offset,
                 collapsed=("Collapsed" in key),
+                threads=min(len(input_files), config.max_threads),
             )
 
             nodes.append(node)
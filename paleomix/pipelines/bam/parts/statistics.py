@@ -25,20 +25,31 @@ import collections
 
 from paleomix.common.fileutils import swap_ext
 
-from paleomix.nodes.commands import CoverageNode, MergeCoverageNode, DepthHistogramNode
+from paleomix.nodes.commands import (
+    CoverageAndDepthHistogramNode,
+    CoverageNode,
+    MergeCoverageNode,
+    DepthHistogramNode,
+)
 from paleomix.pipelines.bam.parts.summary import SummaryTableNode
 
 
 def add_statistics_nodes(config, makefile, target):
     features = makefile["Options"]["Features"]
+    # Coverage is calculated for final BAMs if either feature is enabled
+    prefix_coverage = features["Summary"] or features["Coverage"]
 
     nodes = []
     if features["Depths"]:
-        nodes.extend(_build_depth(config, target, makefile["Prefixes"]))
+        nodes.extend(
+            _build_depth(config, target, makefile["Prefixes"], prefix_coverage)
+        )
 
-    if features["Summary"] or features["Coverage"]:
+    if prefix_coverage:
         make_summary = features["Summary"]
-        coverage = _build_coverage(config, target, make_summary)
+        coverage = _build_coverage(
+            config, target, make_summary, merge_coverage=not features["Depths"]
+        )
         if make_summary:
             summary_node = _build_summary_node(config, makefile, target, coverage)
             nodes.append(summary_node)
@@ -61,25 +72,40 @@ def _build_summary_node(config, makefile, target, coverage):
     )
 
 
-def _build_depth(config, target, prefixes):
+def _build_depth(config, target, prefixes, with_coverage=False):
+    """Builds nodes for depth histograms of final BAMs; if 'with_coverage' is set,
+    the coverage tables for these BAMs are calculated at the same time."""
     nodes = []
     for prefix in target.prefixes:
         for (roi_name, roi_filename) in _get_roi(prefix, name_prefix="."):
             ((input_file, dependencies),) = prefix.bams.items()
 
-            output_filename = "%s.%s%s.depths" % (target.name, prefix.name, roi_name)
+            output_filename = "%s.%s%s" % (target.name, prefix.name, roi_name)
             output_fpath = os.path.join(config.destination, output_filename)
 
-            nodes.append(
-                DepthHistogramNode(
+            if with_coverage:
+                node = CoverageAndDepthHistogramNode(
                     target_name=target.name,
                     input_file=input_file,
                     prefix=prefixes[prefix.name],
                     regions_file=roi_filename,
-                    output_file=output_fpath,
+                    coverage_file=output_fpath + ".coverage",
+                    depths_file=output_fpath + ".depths",
+                    threads=config.depths_max_threads,
+                    dependencies=dependencies,
+                )
+            else:
+                node = DepthHistogramNode(
+                    target_name=target.name,
+                    input_file=input_file,
+                    prefix=prefixes[prefix.name],
+                    regions_file=roi_filename,
+                    output_file=output_fpath + ".depths",
+                    threads=config.depths_max_threads,
                     dependencies=dependencies,
                 )
-            )
+
+            nodes.append(node)
 
     return nodes
 
@@ -93,9 +119,36 @@ def _aggregate_for_prefix(cov, prefix, roi_name=None, into=None):
     return results
 
 
-def _build_coverage(config, target, make_summary):
+def _build_coverage(config, target, make_summary, merge_coverage=True):
+    """Builds nodes for coverage of lane/library BAMs as required for the summary,
+    and nodes merging library coverage into tables for final BAMs, unless these
+    are generated by the nodes for depth histograms ('merge_coverage' is False).
+    """
     merged_nodes = []
     coverage = _build_coverage_nodes(target)
+    if merge_coverage:
+        merged_nodes = _build_merged_coverage_nodes(config, target, coverage)
+
+    files_and_nodes = {}
+    if merge_coverage or make_summary:
+        files_and_nodes = _aggregate_for_prefix(coverage["Libraries"], None)
+
+    if make_summary:
+        files_and_nodes = _aggregate_for_prefix(
+            coverage["Lanes"], None, into=files_and_nodes
+        )
+
+    all_nodes = []
+    all_nodes.extend(files_and_nodes.values())
+    all_nodes.extend(merged_nodes)
+
+    coverage["Nodes"] = tuple(all_nodes)
+
+    return coverage
+
+
+def _build_merged_coverage_nodes(config, target, coverage):
+    merged_nodes = []
     for prefix in target.prefixes:
         for (roi_name, _) in _get_roi(prefix):
             label = _get_prefix_label(prefix.name, roi_name)
@@ -116,19 +169,7 @@ def _build_coverage(config, target, make_summary):
 
             merged_nodes.append(merged)
 
-    files_and_nodes = _aggregate_for_prefix(coverage["Libraries"], None)
-    if make_summary:
-        files_and_nodes = _aggregate_for_prefix(
-            coverage["Lanes"], None, into=files_and_nodes
-        )
-
-    all_nodes = []
-    all_nodes.extend(files_and_nodes.values())
-    all_nodes.extend(merged_nodes)
-
-    coverage["Nodes"] = tuple(all_nodes)
-
-    return coverage
+    return merged_nodes
 
 
 def _build_coverage_nodes(target):
@@ -23,13 +23,17 @@
 
 
 import os
+import hashlib
 import logging
+import functools
 
 import paleomix
 import paleomix.common.logging
+import paleomix.common.validationcache as validationcache
 import paleomix.resources
 import paleomix.yaml
 
+from paleomix.graphcache import GraphCache
 from paleomix.pipeline import Pypeline
 from paleomix.nodes.samtools import FastaIndexNode
 from paleomix.nodes.bwa import BWAIndexNode
@@ -37,6 +41,7 @@ from paleomix.nodes.bowtie2 import Bowtie2IndexNode
 from paleomix.nodes.validation import ValidateFASTAFilesNode
 
 from paleomix.pipelines.bam.makefile import MakefileError, read_makefiles
+from paleomix.pipelines.bam.nodes import CopyReferenceNode, SharedIndexNode
 
 from paleomix.pipelines.bam.parts import Reads
 
@@ -148,24 +153,105 @@ def index_references(config, makefiles):
                 # Indexing of FASTA file using 'samtools faidx'
                 faidx_node = FastaIndexNode(reference)
 
-                # Indexing of FASTA file using 'bwa index'
-                bwa_node = BWAIndexNode(
-                    input_file=reference, dependencies=(valid_node,)
-                )
-                # Indexing of FASTA file using ''
-                bowtie2_node = Bowtie2IndexNode(
-                    input_file=reference, dependencies=(valid_node,)
+                index_prefix, index_nodes = _build_index_nodes(
+                    config, reference, valid_node
                 )
+                bwa_node, bowtie2_node = index_nodes
 
-                references[reference] = (valid_node, faidx_node)
+                references[reference] = (index_prefix, (valid_node, faidx_node))
                 references_bwa[reference] = (valid_node, faidx_node, bwa_node)
                 references_bowtie2[reference] = (valid_node, faidx_node, bowtie2_node)
 
-            subdd["Nodes"] = references[reference]
+            subdd["IndexPrefix"], subdd["Nodes"] = references[reference]
             subdd["Nodes:BWA"] = references_bwa[reference]
             subdd["Nodes:Bowtie2"] = references_bowtie2[reference]
 
 
+def _build_index_nodes(config, reference, valid_node):
+    """Returns the prefix of BWA / Bowtie2 indices for a reference, and the nodes
+    building these. Indices are built next to the reference, unless an index
+    cache has been specified, in which case indices are built in (or re-used
+    from) a folder in the cache named using the SHA256 hash of the reference.
+    """
+    prefix = reference
+    dependencies = (valid_node,)
+    folder = _get_shared_index_folder(config, reference)
+    if folder is not None:
+        # A fixed name is used, since identical references may be named differently
+        prefix = os.path.join(folder, "reference.fasta")
+        dependencies = SharedIndexNode(
+            CopyReferenceNode(
+                input_file=reference, output_file=prefix, dependencies=dependencies
+            ),
+            folder=folder,
+        )
+
+    nodes = []
+    # Indexing of FASTA file using 'bwa index' and 'bowtie2-build'
+    for node_class in (BWAIndexNode, Bowtie2IndexNode):
+        node = node_class(input_file=prefix, dependencies=dependencies)
+        if folder is not None:
+            node = SharedIndexNode(node, folder=folder)
+
+        nodes.append(node)
+
+    return prefix, nodes
+
+
+def _get_shared_index_folder(config, reference):
+    if not config.index_cache:
+        return None
+    elif not os.path.isfile(reference):
+        # Missing references are reported when the makefiles are validated
+        return None
+
+    log = logging.getLogger(__name__)
+    log.info("Calculating checksum of reference %r", reference)
+    # Checksums are cached, to avoid re-reading large genomes on every run
+    checksum = validationcache.cached("sha256", reference, _calculate_sha256)
+
+    return os.path.join(config.index_cache, checksum)
+
+
+def _calculate_sha256(filename):
+    checksum = hashlib.sha256()
+    with open(filename, "rb") as handle:
+        for block in iter(functools.partial(handle.read, 1024 * 1024), b""):
+            checksum.update(block)
+
+    return checksum.hexdigest()
+
+
+def _build_nodes(config, pipeline_variant):
+    logger = logging.getLogger(__name__)
+
+    try:
+        makefiles = read_makefiles(config.makefiles, pipeline_variant)
+    except (MakefileError, paleomix.yaml.YAMLError, IOError) as error:
+        logger.error("Error reading makefiles: %s", error)
+        return None
+
+    pipeline_func = build_pipeline_trimming
+    if pipeline_variant == "bam":
+        # Build .fai files for reference .fasta files
+        index_references(config, makefiles)
+
+        pipeline_func = build_pipeline_full
+
+    nodes = []
+    for makefile in makefiles:
+        logger.info("Building BAM pipeline for %r", makefile["Filename"])
+        try:
+            nodes.extend(pipeline_func(config, makefile))
+        except paleomix.node.NodeError as error:
+            logger.error(
+                "Error while building pipeline for %r:\n%s", makefile["Filename"], error
+            )
+            return None
+
+    return nodes
+
+
 def run(config, pipeline_variant):
     paleomix.common.logging.initialize(
         log_level=config.log_level, log_file=config.log_file, name="bam_pipeline"
@@ -176,6 +262,10 @@ def run(config, pipeline_variant):
         logger.critical("Unexpected BAM pipeline variant %r", pipeline_variant)
         return 1
 
+    if config.mapping_chunks < 1:
+        logger.error("--mapping-chunks must be at least 1")
+        return 1
+
     if not os.path.exists(config.temp_root):
         try:
             os.makedirs(config.temp_root)
@@ -188,32 +278,31 @@ def run(config, pipeline_variant):
         return 1
 
     # Init worker-threads before reading in any more data
-    pipeline = Pypeline(config)
-
-    try:
-        makefiles = read_makefiles(config.makefiles, pipeline_variant)
-    except (MakefileError, paleomix.yaml.YAMLError, IOError) as error:
-        logger.error("Error reading makefiles: %s", error)
-        return 1
+    pipeline = Pypeline(
+        config,
+        file_index=config.file_index,
+        resource_log=os.path.join(config.destination, "paleomix.resources.jsonl"),
+        timeline=config.timeline,
+    )
 
-    pipeline_func = build_pipeline_trimming
-    if pipeline_variant == "bam":
-        # Build .fai files for reference .fasta files
-        index_references(config, makefiles)
+    if config.report_resources:
+        logger.info("Printing resource usage")
+        return 0 if pipeline.print_resource_usage() else 1
 
-        pipeline_func = build_pipeline_full
+    graph_cache = nodes = None
+    if config.graph_cache:
+        options = dict(vars(config), pipeline_variant=pipeline_variant)
+        graph_cache = GraphCache(config.graph_cache, config.makefiles, options)
+        nodes = graph_cache.load()
 
-    for makefile in makefiles:
-        logger.info("Building BAM pipeline for %r", makefile["Filename"])
-        try:
-            nodes = pipeline_func(config, makefile)
-        except paleomix.node.NodeError as error:
-            logger.error(
-                "Error while building pipeline for %r:\n%s", makefile["Filename"], error
-            )
+    if nodes is None:
+        nodes = _build_nodes(config, pipeline_variant)
+        if nodes is None:
             return 1
+        elif graph_cache is not None:
+            graph_cache.save(nodes)
 
-        pipeline.add_nodes(*nodes)
+    pipeline.add_nodes(*nodes)
 
     if config.list_input_files:
         logger.info("Printing output files")
@@ -229,7 +318,11 @@ def run(config, pipeline_variant):
         return 0
 
     logger.info("Running BAM pipeline")
-    if not pipeline.run(dry_run=config.dry_run, max_threads=config.max_threads):
+    if not pipeline.run(
+        dry_run=config.dry_run,
+        max_threads=config.max_threads,
+        max_memory=config.max_memory,
+    ):
         return 1
 
     return 0
@@ -27,6 +27,7 @@ import paleomix
 import paleomix.common.logging
 
 from paleomix.common.argparse import ArgumentParser, SUPPRESS
+from paleomix.common.system import format_memory_size, get_total_memory, memory_size
 
 _DEFAULT_CONFIG_FILES = [
     "/etc/paleomix/phylo_pipeline.ini",
@@ -63,6 +64,15 @@ def build_parser():
         default=max(2, multiprocessing.cpu_count()),
         help="Max number of threads to use in total",
     )
+    group.add_argument(
+        "--max-memory",
+        type=memory_size,
+        default=format_memory_size(get_total_memory()),
+        help="Max amount of memory to use in total (e.g. '64G'), based on the "
+        "estimated memory usage of each task; defaults to the amount of physical "
+        "memory. Tasks requiring more memory are only run when no other tasks are "
+        "running",
+    )
     group.add_argument(
         "--dry-run",
         default=False,
@@ -121,6 +131,37 @@ def build_parser():
         help="List all executables required by the pipeline, "
         "with version requirements (if any).",
     )
+    group.add_argument(
+        "--timeline",
+        metavar="FILE",
+        help="Write a timeline of the nodes and commands run by the pipeline to "
+        "FILE in the Trace Event Format (JSON), for viewing in Perfetto "
+        "(ui.perfetto.dev) or Chrome (chrome://tracing)",
+    )
+    group.add_argument(
+        "--report-resources",
+        action="store_true",
+        default=False,
+        help="Summarize the CPU time, memory, and I/O used by commands run by "
+        "the pipeline, as recorded in 'paleomix.resources.jsonl' in the "
+        "destination folder.",
+    )
+    group.add_argument(
+        "--file-index",
+        metavar="FILE",
+        help="Path to an SQLite database used to record the state of input and "
+        "output files between runs, e.g. in the destination folder. When set, only "
+        "files in folders that have changed since the last run are re-examined. "
+        "Note that files modified in place may not be detected",
+    )
+    group.add_argument(
+        "--graph-cache",
+        metavar="FILE",
+        help="Path to a file in which the tasks built for the makefile(s) are "
+        "cached, e.g. in the destination folder. The cached tasks are re-used as "
+        "long as the makefiles, command-line options, and input files are unchanged, "
+        "avoiding the cost of building large pipelines when re-running them",
+    )
 
     # Removed options
     parser.add_argument("--refseq-root", help=SUPPRESS)
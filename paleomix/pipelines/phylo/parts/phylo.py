@@ -142,21 +142,29 @@ def _build_examl_replicates(
 def _build_examl_bootstraps(
     options, phylo, destination, input_alignment, input_partition, dependencies
 ):
-    bootstraps = []
     num_bootstraps = phylo["ExaML"]["Bootstraps"]
+    if not num_bootstraps:
+        return None
+
     bootstrap_destination = os.path.join(destination, "bootstraps")
     bootstrap_template = os.path.join(bootstrap_destination, "bootstrap.%04i.phy")
 
-    for bootstrap_num in range(num_bootstraps):
-        bootstrap_alignment = bootstrap_template % (bootstrap_num,)
-        bootstrap = PHYLIPBootstrapNode(
-            input_alignment=input_alignment,
-            input_partition=input_partition,
-            output_alignment=bootstrap_alignment,
-            seed=random.randint(1, 2 ** 32 - 1),
-            dependencies=dependencies,
-        )
+    bootstrap_alignments = [
+        bootstrap_template % (bootstrap_num,) for bootstrap_num in range(num_bootstraps)
+    ]
+
+    # All bootstrap alignments are generated by a single node, since the (large)
+    # supermatrix then only has to be read once
+    bootstrap = PHYLIPBootstrapNode(
+        input_alignment=input_alignment,
+        input_partition=input_partition,
+        output_alignment=bootstrap_alignments,
+        seed=random.randint(1, 2 ** 32 - 1),
+        dependencies=dependencies,
+    )
 
+    bootstraps = []
+    for bootstrap_alignment in bootstrap_alignments:
         bootstrap_binary = swap_ext(bootstrap_alignment, ".binary")
         bootstrap_final = swap_ext(bootstrap_alignment, ".%s")
         bs_binary = ExaMLParserNode(
@@ -178,10 +186,7 @@ def _build_examl_bootstraps(
             )
         )
 
-    if bootstraps:
-        return _build_rerooted_trees(bootstraps, phylo["RootTreesOn"])
-
-    return None
+    return _build_rerooted_trees(bootstraps, phylo["RootTreesOn"])
 
 
 def add_bootstrap_support(destination, replicate, bootstrap):
@@ -31,6 +31,7 @@ import paleomix.pipelines.phylo.parts.msa as msa
 import paleomix.pipelines.phylo.parts.phylo as phylo
 import paleomix.yaml
 
+from paleomix.graphcache import GraphCache
 from paleomix.pipeline import Pypeline
 from paleomix.pipelines.phylo.config import build_parser
 from paleomix.pipelines.phylo.makefile import MakefileError, read_makefiles
@@ -86,21 +87,45 @@ def main(argv):
         return 1
 
     # Init worker-threads before reading in any more data
-    pipeline = Pypeline(config)
+    pipeline = Pypeline(
+        config,
+        file_index=config.file_index,
+        resource_log=os.path.join(config.destination, "paleomix.resources.jsonl"),
+        timeline=config.timeline,
+    )
 
-    try:
-        makefiles = read_makefiles(config, commands)
-    except (MakefileError, paleomix.yaml.YAMLError, IOError) as error:
-        log.error("Error reading makefiles:\n%s", error)
-        return 1
+    if config.report_resources:
+        log.info("Printing resource usage")
+        return 0 if pipeline.print_resource_usage() else 1
+
+    graph_cache = nodes = None
+    if config.graph_cache:
+        # Files in these folders are read while building the pipeline
+        folders = (config.samples_root, config.regions_root, config.prefix_root)
+        graph_cache = GraphCache(
+            config.graph_cache, config.files, vars(config), folders
+        )
+        nodes = graph_cache.load()
+
+    if nodes is None:
+        try:
+            makefiles = read_makefiles(config, commands)
+        except (MakefileError, paleomix.yaml.YAMLError, IOError) as error:
+            log.error("Error reading makefiles:\n%s", error)
+            return 1
+
+        for (command_key, command_func) in commands:
+            log.info("Building %s pipeline", command_key)
+            command_func(pipeline, config, makefiles)
+
+        nodes = []
+        for makefile in makefiles:
+            nodes.extend(makefile.get("Nodes", ()))
 
-    for (command_key, command_func) in commands:
-        log.info("Building %s pipeline", command_key)
-        command_func(pipeline, config, makefiles)
+        if graph_cache is not None:
+            graph_cache.save(nodes)
 
-    for makefile in makefiles:
-        if "Nodes" in makefile:
-            pipeline.add_nodes(makefile["Nodes"])
+    pipeline.add_nodes(*nodes)
 
     if config.list_input_files:
         log.info("Printing output files")
@@ -115,7 +140,11 @@ def main(argv):
         pipeline.print_required_executables()
         return 0
 
-    if not pipeline.run(max_threads=config.max_threads, dry_run=config.dry_run):
+    if not pipeline.run(
+        max_threads=config.max_threads,
+        max_memory=config.max_memory,
+        dry_run=config.dry_run,
+    ):
         return 1
 
     return 0
@@ -30,6 +30,7 @@ from paleomix.common.sequences import NT_CODES
 import paleomix.common.argparse as argparse
 import paleomix.common.fileutils as fileutils
 import paleomix.pipelines.zonkey.common as common
+import paleomix.pipelines.zonkey.genotypes as genotypes
 
 
 _CHUNK_SIZE = 1000000
@@ -89,7 +90,7 @@ then
 fi
 
 FILENAME="zonkey{REVISION}.tar"
-SOURCES="settings.yaml contigs.txt samples.txt ${MITO_FA} ${SIM_TXT} ${EXAMPLES} genotypes.txt build.sh"
+SOURCES="settings.yaml contigs.txt samples.txt ${MITO_FA} ${SIM_TXT} ${EXAMPLES} genotypes.bin build.sh"
 
 rm -vf "${FILENAME}"
 
@@ -174,6 +175,18 @@ def _write_genotypes(args, data, filename):
             sys.stderr.write("  - %s: 100%%\n" % (contig,))
 
 
+def _write_binary_genotypes(args, source, filename):
+    sys.stderr.write("Writing %r\n" % (filename,))
+    if os.path.exists(filename) and not args.overwrite:
+        sys.stderr.write("  File exists; skipping.\n")
+        return
+
+    with open(source) as handle:
+        store = genotypes.GenotypeStore.from_text(handle, source)
+
+    genotypes.write_genotypes(store, filename)
+
+
 def _write_settings(args, contigs, filename):
     sys.stderr.write("Writing %r\n" % (filename,))
     if os.path.exists(filename) and not args.overwrite:
@@ -336,6 +349,11 @@ def main(argv):
     _write_samples(args, data["samples"], os.path.join(args.root, "samples.txt"))
     _write_settings(args, data["contigs"], os.path.join(args.root, "settings.yaml"))
     _write_genotypes(args, data, os.path.join(args.root, "genotypes.txt"))
+    _write_binary_genotypes(
+        args,
+        os.path.join(args.root, "genotypes.txt"),
+        os.path.join(args.root, "genotypes.bin"),
+    )
     _write_build_sh(args, os.path.join(args.root, "build.sh"))
 
 
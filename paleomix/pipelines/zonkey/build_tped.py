@@ -20,14 +20,11 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import collections
-import itertools
 import os
 import random
 import sys
-import tarfile
-
-from io import TextIOWrapper
 
+import numpy
 import pysam
 
 from paleomix.common.sequences import NT_CODES
@@ -37,6 +34,7 @@ import paleomix.common.argparse as argparse
 import paleomix.common.bamfiles as bamtools
 import paleomix.common.fileutils as fileutils
 import paleomix.pipelines.zonkey.database as database
+import paleomix.pipelines.zonkey.genotypes as genotypes
 
 
 _TRANSITIONS = frozenset((("C", "T"), ("T", "C"), ("G", "A"), ("A", "G")))
@@ -75,94 +73,83 @@ class DownsampledBAM:
 
 
 class GenotypeSites:
-    def __init__(self, records):
-        last_chrom = None
-        sites = []
-
-        # chrom, pos, ref, ..., nucleotides
-        for chrom, pos, line in records:
-            # Convert pos from 1-based to 0-based (same as BAM.pos)
-            sites.append((int(pos) - 1, line, []))
-
-            assert last_chrom is None or chrom == last_chrom, (chrom, last_chrom)
-            last_chrom = chrom
-
-        sites.sort()
-        self._sites = collections.deque(sites)
+    def __init__(self, store, chrom):
+        self._store = store
+        # Convert pos from 1-based to 0-based (same as BAM.pos)
+        self._positions = store.positions(chrom).astype(numpy.int64) - 1
+        self._offset = store.rows(chrom).start
 
     def process(self, records, statistics):
+        """Collects the nucleotides observed at each site in the (sorted) records,
+        and yields (pos, line, nucleotides) for each site with observations, where
+        line contains the reference nucleotide and the genotypes at that site.
+        Sites overlapping a record are found using binary searches.
+        """
         count_used = 0
         count_total = 0
-        sites = self._sites
+        positions = self._positions
+        nucleotides_by_site = {}
         for record_id, record in enumerate(records):
             count_total += 1
 
             # TODO: Check sorted
-            while sites and sites[0][0] < record.pos:
-                yield sites.popleft()
+            first_site = int(positions.searchsorted(record.pos))
+            if nucleotides_by_site:
+                yield from self._finalize_sites(nucleotides_by_site, first_site)
+
+            if first_site >= len(positions):
+                break
+
+            last_site = int(positions.searchsorted(record.aend))
+            if first_site == last_site:
+                continue
 
+            sites = positions[first_site:last_site].tolist()
+            sites = dict(zip(sites, range(first_site, last_site)))
             sequence = record.seq
-            sites_iter = iter(sites).__next__
-            alignment_iter = iter(record.get_aligned_pairs()).__next__
-            alignment_end = record.aend
-
-            try:
-                read_used = False
-                site_pos, _, nucleotides = sites_iter()
-                query_pos, ref_pos = alignment_iter()
-
-                while alignment_end > site_pos:
-                    if ref_pos is None or query_pos is None or site_pos > ref_pos:
-                        query_pos, ref_pos = alignment_iter()
-                    elif site_pos < ref_pos:
-                        site_pos, _, nucleotides = sites_iter()
-                    else:
-                        assert ref_pos == site_pos, (ref_pos, site_pos)
-                        nucleotide = sequence[query_pos]
-                        if nucleotide != "N":
-                            nucleotides.append((record_id, nucleotide))
-                            read_used = True
-
-                        query_pos, ref_pos = alignment_iter()
-                        site_pos, _, nucleotides = sites_iter()
-            except StopIteration:
-                if not sites:
-                    break
-            finally:
-                if read_used:
-                    count_used += 1
-
-        while sites:
-            yield sites.popleft()
+
+            read_used = False
+            for query_pos, ref_pos in record.get_aligned_pairs(matches_only=True):
+                site = sites.get(ref_pos)
+                if site is not None:
+                    nucleotide = sequence[query_pos]
+                    if nucleotide != "N":
+                        nucleotides = nucleotides_by_site.setdefault(site, [])
+                        nucleotides.append((record_id, nucleotide))
+                        read_used = True
+
+            if read_used:
+                count_used += 1
+
+        yield from self._finalize_sites(nucleotides_by_site, len(positions))
 
         statistics["n_reads"] += count_total
         statistics["n_reads_used"] += count_used
 
+    def _finalize_sites(self, nucleotides_by_site, end):
+        """Yields and removes sites before 'end', in order."""
+        for site in sorted(site for site in nucleotides_by_site if site < end):
+            row = self._offset + site
+            line = "%s\t%s" % (self._store.reference(row), self._store.genotypes(row))
+
+            yield int(self._positions[site]), line, nucleotides_by_site.pop(site)
+
 
 class GenotypeReader:
     def __init__(self, filename):
-        self._tar_handle = tarfile.open(filename)
-        self._handle = TextIOWrapper(self._tar_handle.extractfile("genotypes.txt"))
-        self._header = self._handle.readline().rstrip("\r\n").split("\t")
-        self.samples = self._header[-1].split(";")
+        self._store = genotypes.open_genotypes(filename)
+        self.samples = list(self._store.samples)
 
     def __iter__(self):
-        for chrom, records in itertools.groupby(
-            self._read_records(), lambda rec: rec[0]
-        ):
+        for chrom in self._store.contigs:
             sys.stderr.write("Reading contig %r information\n" % (chrom,))
-            yield chrom, GenotypeSites(records)
-
-    def _read_records(self):
-        for line in self._handle:
-            yield line.rstrip().split("\t", 2)
+            yield chrom, GenotypeSites(self._store, chrom)
 
     def __enter__(self):
         return self
 
     def __exit__(self, type, value, traceback):
-        self._handle.close()
-        self._tar_handle.close()
+        self._store.close()
 
 
 def process_record(
@@ -26,6 +26,7 @@ import paleomix
 import paleomix.common.logging
 
 from paleomix.common.argparse import ArgumentParser, SUPPRESS
+from paleomix.common.system import format_memory_size, get_total_memory, memory_size
 
 
 _RUN_USAGE = """%(prog)s [..] <database.tar> <samples.txt> [destination]
@@ -151,6 +152,15 @@ def add_run_command(subparsers):
         default=max(2, multiprocessing.cpu_count()),
         help="Maximum number of threads to use",
     )
+    group.add_argument(
+        "--max-memory",
+        type=memory_size,
+        default=format_memory_size(get_total_memory()),
+        help="Max amount of memory to use in total (e.g. '64G'), based on the "
+        "estimated memory usage of each task; defaults to the amount of physical "
+        "memory. Tasks requiring more memory are only run when no other tasks are "
+        "running",
+    )
     group.add_argument(
         "--list-input-files",
         action="store_true",
@@ -172,6 +182,14 @@ def add_run_command(subparsers):
         help="List all executables required by the pipeline, "
         "with version requirements (if any).",
     )
+    group.add_argument(
+        "--file-index",
+        metavar="FILE",
+        help="Path to an SQLite database used to record the state of input and "
+        "output files between runs, e.g. in the destination folder. When set, only "
+        "files in folders that have changed since the last run are re-examined. "
+        "Note that files modified in place may not be detected",
+    )
 
     # Removed options
     parser.add_argument("--progress-ui", help=SUPPRESS)
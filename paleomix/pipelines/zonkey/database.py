@@ -32,6 +32,7 @@ import pysam
 import paleomix.yaml
 from paleomix.common.formats.fasta import FASTA
 from paleomix.pipelines.zonkey.common import contig_name_to_plink_name, get_sample_names
+from paleomix.pipelines.zonkey.genotypes import GenotypeError, read_samples
 
 _SETTINGS_KEYS = (
     "Format",
@@ -114,8 +115,8 @@ class ZonkeyDB:
                 log.info("Reading emperical admixture distribution")
                 self.simulations = self._read_simulations(tar_handle, "simulations.txt")
                 log.info("Determining sample order")
-                self.sample_order = self._read_sample_order(tar_handle, "genotypes.txt")
-        except (OSError, tarfile.TarError) as error:
+                self.sample_order = self._read_sample_order(tar_handle)
+        except (OSError, tarfile.TarError, GenotypeError) as error:
             raise ZonkeyDBError(str(error))
 
         self._cross_validate()
@@ -258,17 +259,8 @@ class ZonkeyDB:
         return samples, groups
 
     @classmethod
-    def _read_sample_order(cls, tar_handle, filename):
-        cls._check_required_file(tar_handle, filename)
-
-        handle = TextIOWrapper(tar_handle.extractfile(filename))
-        header = handle.readline().rstrip("\r\n").split("\t")
-        sample_order = tuple(header[-1].split(";"))
-
-        if len(sample_order) != len(set(sample_order)):
-            raise ZonkeyDBError("Duplicate sample names in %r" % (filename,))
-
-        return sample_order
+    def _read_sample_order(cls, tar_handle):
+        return read_samples(tar_handle)
 
     def _read_mitochondria(self, tar_handle, filename):
         try:
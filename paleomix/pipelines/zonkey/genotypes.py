@@ -0,0 +1,418 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2020 Mikkel Schubert <MikkelSch@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Binary, contig-indexed storage of the genotypes in Zonkey databases.
+
+Genotypes are stored in 'genotypes.bin' using the following layout, with all
+integers stored in little-endian byte order:
+
+  1. The magic string b'ZONKEYGT'
+  2. The format version (uint32) and the size of the header (uint32)
+  3. A JSON header listing the samples and the number of sites per contig,
+     padded to a multiple of 8 bytes
+  4. The 1-based position of each site (uint32), sorted by position per contig
+  5. The reference nucleotide of each site (uint8; ASCII)
+  6. A row-major matrix of genotypes (uint8; ASCII IUPAC codes), with one row
+     per site and one column per sample
+
+Since Zonkey databases are uncompressed tar files, the arrays in 'genotypes.bin'
+are memory-mapped directly from the database until the store is closed. Databases
+containing only the text based 'genotypes.txt' table are converted on first use,
+and the converted table is saved in a cache folder (see 'set_cache_dir'), keyed by
+the path, size, and mtime of the database.
+"""
+import collections
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tarfile
+import tempfile
+
+from io import TextIOWrapper
+
+import numpy
+
+import paleomix.common.fileutils as fileutils
+
+
+_MAGIC = b"ZONKEYGT"
+_VERSION = 1
+_PREFIX = struct.Struct("<8sII")
+
+BINARY_FILENAME = "genotypes.bin"
+TEXT_FILENAME = "genotypes.txt"
+
+# Folder in which converted text-based genotype tables are cached
+_CACHE_DIR = os.path.expanduser("~/.paleomix/cache/zonkey")
+
+
+class GenotypeError(RuntimeError):
+    pass
+
+
+class GenotypeStore:
+    """Genotypes for a set of samples at sites on one or more contigs. Sites are
+    stored in (1-based) position order for each contig, allowing lookups by
+    position in O(log n) time.
+    """
+
+    def __init__(self, samples, contigs, positions, references, genotypes):
+        self.samples = tuple(samples)
+        if len(self.samples) != len(set(self.samples)):
+            raise GenotypeError("Duplicate sample names in genotypes table")
+
+        # Mapping of contig names to the range of rows containing their sites
+        self._contigs = collections.OrderedDict()
+        start = 0
+        for (name, nsites) in contigs:
+            self._contigs[name] = (start, start + nsites)
+            start += nsites
+
+        if not (start == len(positions) == len(references) == len(genotypes)):
+            raise GenotypeError("Mismatch between number of sites and arrays")
+        elif genotypes.shape[1:] != (len(self.samples),):
+            raise GenotypeError("Mismatch between number of samples and genotypes")
+
+        self._positions = positions
+        self._references = references
+        self._genotypes = genotypes
+        # Memory map backing the arrays, if read using 'from_file'
+        self._mapping = None
+
+    @property
+    def contigs(self):
+        """Returns the names of contigs in the order they were added."""
+        return tuple(self._contigs)
+
+    def rows(self, contig):
+        """Returns the range of rows containing the sites on the contig."""
+        return range(*self._contigs[contig])
+
+    def positions(self, contig):
+        """Returns the sorted (1-based) positions of sites on the contig."""
+        start, end = self._contigs[contig]
+
+        return self._positions[start:end]
+
+    def find(self, contig, position):
+        """Returns the row of the site at the (1-based) position on the contig, or
+        None if no site is found at that position."""
+        start, end = self._contigs.get(contig, (0, 0))
+        row = start + int(self._positions[start:end].searchsorted(position))
+        if row < end and self._positions[row] == position:
+            return row
+
+        return None
+
+    def reference(self, row):
+        """Returns the reference nucleotide for the site at the specified row."""
+        return chr(self._references[row])
+
+    def genotypes(self, row):
+        """Returns the IUPAC encoded genotypes for the site at the specified row, as
+        a string with one character per sample."""
+        return self._genotypes[row].tobytes().decode("ascii")
+
+    def __len__(self):
+        return len(self._positions)
+
+    @classmethod
+    def from_text(cls, handle, filename=TEXT_FILENAME):
+        """Reads a 'genotypes.txt' table with the columns chromosome, position,
+        reference nucleotide, and genotypes, the latter of which is named using
+        the names of samples separated by semi-colons."""
+        header = handle.readline().rstrip("\r\n").split("\t")
+        samples = header[-1].split(";")
+
+        contigs = []
+        positions = []
+        references = bytearray()
+        genotypes = bytearray()
+
+        last_contig = None
+        for linenum, line in enumerate(handle, start=2):
+            fields = line.rstrip("\r\n").split("\t")
+            if [len(field) for field in fields[2:]] != [1, len(samples)]:
+                raise GenotypeError(
+                    "Malformed line %i in %r; expected chromosome, position, "
+                    "reference, and %i genotypes" % (linenum, filename, len(samples))
+                )
+
+            contig, position, reference, row = fields
+            if contig != last_contig:
+                if contig in (name for (name, _) in contigs):
+                    raise GenotypeError(
+                        "Sites on contig %r are not grouped together in %r"
+                        % (contig, filename)
+                    )
+
+                contigs.append((contig, 0))
+                last_contig = contig
+
+            try:
+                positions.append(int(position))
+            except ValueError:
+                raise GenotypeError(
+                    "Invalid position at line %i in %r: %r"
+                    % (linenum, filename, position)
+                )
+
+            contigs[-1] = (contig, contigs[-1][1] + 1)
+            references.extend(reference.encode("ascii"))
+            genotypes.extend(row.encode("ascii"))
+
+        positions = numpy.array(positions, dtype=numpy.uint32)
+        references = numpy.frombuffer(references, dtype=numpy.uint8)
+        genotypes = numpy.frombuffer(genotypes, dtype=numpy.uint8)
+        genotypes = genotypes.reshape((len(positions), len(samples)))
+
+        # Sites are sorted by position for each contig
+        start = 0
+        order = []
+        for (_, nsites) in contigs:
+            end = start + nsites
+            order.append(start + positions[start:end].argsort(kind="stable"))
+            start = end
+
+        if order:
+            order = numpy.concatenate(order)
+            positions = positions[order]
+            references = references[order]
+            genotypes = genotypes[order]
+
+        return cls(samples, contigs, positions, references, genotypes)
+
+    @classmethod
+    def from_file(cls, filename, offset=0):
+        """Memory-maps a binary table, located at the given offset in the file. The
+        memory map is released when the store is closed."""
+        with open(filename, "rb") as handle:
+            handle.seek(offset)
+            header_size, header = _read_header(handle, filename)
+
+            samples = header["samples"]
+            contigs = [tuple(contig) for contig in header["contigs"]]
+            nsites = sum(count for (_, count) in contigs)
+
+            # The file handle is not needed once the file has been mapped
+            mapping = None
+            if nsites and samples:
+                mapping = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        offset += _PREFIX.size + header_size
+        arrays = []
+        for dtype, shape in (
+            (numpy.uint32, (nsites,)),
+            (numpy.uint8, (nsites,)),
+            (numpy.uint8, (nsites, len(samples))),
+        ):
+            if mapping is not None:
+                count = numpy.prod(shape)
+                array = numpy.frombuffer(mapping, dtype, count, offset)
+                array = array.reshape(shape)
+            else:
+                array = numpy.zeros(shape, dtype=dtype)
+
+            arrays.append(array)
+            offset += array.nbytes
+
+        store = cls(samples, contigs, *arrays)
+        store._mapping = mapping
+
+        return store
+
+    def close(self):
+        """Releases the memory map (if any) backing the arrays of the store; the
+        store cannot be used after it has been closed."""
+        self._positions = self._references = self._genotypes = None
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _type, _value, _traceback):
+        self.close()
+
+    def to_file(self, handle):
+        """Writes the table in the binary format described above."""
+        contigs = []
+        for (name, (start, end)) in self._contigs.items():
+            contigs.append([name, end - start])
+
+        header = {"samples": list(self.samples), "contigs": contigs}
+
+        header = json.dumps(header).encode("utf-8")
+        # Pad header so that the following arrays are aligned
+        header += b" " * (-(_PREFIX.size + len(header)) % 8)
+
+        handle.write(_PREFIX.pack(_MAGIC, _VERSION, len(header)))
+        handle.write(header)
+        handle.write(self._positions.astype("<u4").tobytes())
+        handle.write(self._references.tobytes())
+        handle.write(self._genotypes.tobytes())
+
+
+def set_cache_dir(dirname):
+    """Sets the folder in which text-based genotype tables are cached after being
+    converted to the binary format; if dirname is None, caching is disabled.
+    """
+    global _CACHE_DIR
+
+    _CACHE_DIR = dirname
+
+
+def open_genotypes(filename):
+    """Returns the GenotypeStore for a Zonkey database (tar file). Binary tables
+    are memory-mapped from the database, while text tables are converted (and
+    cached, if a cache folder has been set)."""
+    with tarfile.open(filename, "r:") as tar_handle:
+        member = _get_member(tar_handle, BINARY_FILENAME)
+        if member is not None:
+            return GenotypeStore.from_file(filename, member.offset_data)
+
+        cache_filename = _get_cache_filename(filename)
+        if cache_filename is not None and os.path.exists(cache_filename):
+            try:
+                return GenotypeStore.from_file(cache_filename)
+            except (GenotypeError, ValueError, KeyError):
+                pass  # Corrupt cache entries are simply replaced
+
+        member = _get_member(tar_handle, TEXT_FILENAME)
+        if member is None:
+            raise GenotypeError(
+                "Database does not contain required file %r or %r; please ensure "
+                "that this is a valid Zonkey database file!"
+                % (BINARY_FILENAME, TEXT_FILENAME)
+            )
+
+        with TextIOWrapper(tar_handle.extractfile(member)) as handle:
+            store = GenotypeStore.from_text(handle)
+
+    if cache_filename is not None:
+        try:
+            write_genotypes(store, cache_filename)
+        except OSError as error:
+            log = logging.getLogger(__name__)
+            log.warning("Could not cache genotypes in %r: %s", cache_filename, error)
+
+    return store
+
+
+def read_samples(tar_handle):
+    """Returns the names of the samples in the genotypes table of an open Zonkey
+    database (tar file), reading only the header of the table."""
+    member = _get_member(tar_handle, BINARY_FILENAME)
+    if member is not None:
+        with tar_handle.extractfile(member) as handle:
+            _, header = _read_header(handle, BINARY_FILENAME)
+
+        samples = header["samples"]
+    else:
+        member = _get_member(tar_handle, TEXT_FILENAME)
+        if member is None:
+            raise GenotypeError(
+                "Database does not contain required file %r or %r; please ensure "
+                "that this is a valid Zonkey database file!"
+                % (BINARY_FILENAME, TEXT_FILENAME)
+            )
+
+        with TextIOWrapper(tar_handle.extractfile(member)) as handle:
+            header = handle.readline().rstrip("\r\n").split("\t")
+
+        samples = header[-1].split(";")
+
+    if len(samples) != len(set(samples)):
+        raise GenotypeError("Duplicate sample names in genotypes table")
+
+    return tuple(samples)
+
+
+def write_genotypes(store, filename):
+    """Atomically writes a GenotypeStore to a binary table."""
+    dirname = os.path.dirname(filename) or "."
+    fileutils.make_dirs(dirname)
+
+    handle = tempfile.NamedTemporaryFile(dir=dirname, suffix=".tmp", delete=False)
+    try:
+        with handle:
+            store.to_file(handle)
+
+        os.replace(handle.name, filename)
+    except BaseException:
+        fileutils.try_remove(handle.name)
+        raise
+
+
+def _read_header(handle, filename):
+    """Reads the prefix and JSON header of a binary table, returning the size of
+    the (padded) header and the decoded header."""
+    prefix = handle.read(_PREFIX.size)
+    if len(prefix) != _PREFIX.size:
+        raise GenotypeError("%r is not a binary genotypes table" % (filename,))
+
+    magic, version, header_size = _PREFIX.unpack(prefix)
+    if magic != _MAGIC:
+        raise GenotypeError("%r is not a binary genotypes table" % (filename,))
+    elif version != _VERSION:
+        raise GenotypeError(
+            "Unsupported genotypes table format v%i in %r" % (version, filename)
+        )
+
+    try:
+        header = json.loads(handle.read(header_size).decode("utf-8"))
+    except ValueError as error:
+        raise GenotypeError(
+            "Malformed header in genotypes table %r: %s" % (filename, error)
+        )
+
+    return header_size, header
+
+
+def _get_member(tar_handle, filename):
+    try:
+        member = tar_handle.getmember(filename)
+    except KeyError:
+        return None
+
+    if not member.isfile():
+        raise GenotypeError(
+            "Object %r in Zonkey database is not a file; please ensure that this "
+            "is a valid Zonkey database file!" % (filename,)
+        )
+
+    return member
+
+
+def _get_cache_filename(filename):
+    if _CACHE_DIR is None:
+        return None
+
+    stats = os.stat(filename)
+    key = json.dumps([os.path.realpath(filename), stats.st_size, stats.st_mtime_ns])
+    key = hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    return os.path.join(_CACHE_DIR, key + ".genotypes.bin")
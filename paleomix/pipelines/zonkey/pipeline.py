@@ -47,7 +47,7 @@ from paleomix.pipeline import Pypeline
 
 
 def run_pipeline(config, nodes, msg):
-    pipeline = Pypeline(config)
+    pipeline = Pypeline(config, file_index=config.file_index)
     pipeline.add_nodes(nodes)
 
     paleomix.common.logging.initialize(
@@ -67,7 +67,11 @@ def run_pipeline(config, nodes, msg):
         pipeline.print_input_files()
         return True
 
-    return pipeline.run(max_threads=config.max_threads, dry_run=config.dry_run)
+    return pipeline.run(
+        max_threads=config.max_threads,
+        max_memory=config.max_memory,
+        dry_run=config.dry_run,
+    )
 
 
 def build_plink_nodes(config, data, root, bamfile, dependencies=()):
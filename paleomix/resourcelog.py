@@ -0,0 +1,187 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2020 Mikkel Schubert <MikkelSch@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Log of the resources used by nodes run by a pipeline.
+
+A JSON record is appended to the log every time a node completes successfully,
+containing the wall time of the node and the CPU time, peak memory usage, and I/O
+of each command run by the node (see AtomicCmd.resource_usage). The log is used to
+summarize the resources used by a pipeline (see '--report-resources'), and the
+wall times of previous runs are used to prioritize nodes in subsequent runs.
+"""
+import collections
+import json
+import logging
+import os
+import statistics
+import time
+
+from paleomix.common.system import format_memory_size
+from paleomix.common.text import padded_table
+
+
+class ResourceLog:
+    def __init__(self, filename):
+        self.filename = filename
+        self._log = logging.getLogger(__name__)
+
+    def add(self, node, record):
+        """Appends a record returned by Node.run to the log."""
+        record = {
+            "node": str(node),
+            "class": type(node).__name__,
+            "threads": node.threads,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "wall_time": record["wall_time"],
+            "commands": record["commands"],
+        }
+
+        try:
+            dirname = os.path.dirname(self.filename)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+
+            with open(self.filename, "a") as handle:
+                handle.write(json.dumps(record, sort_keys=True))
+                handle.write("\n")
+        except OSError as error:
+            self._log.warning("Could not write to %r: %s", self.filename, error)
+
+    def read(self):
+        """Returns the most recent record for each node in the log, keyed by the
+        class and description of the node. Malformed records are ignored."""
+        records = {}
+
+        try:
+            with open(self.filename) as handle:
+                for line in handle:
+                    try:
+                        record = json.loads(line)
+                        records[(record["class"], record["node"])] = record
+                    except (ValueError, TypeError, KeyError):
+                        pass
+        except FileNotFoundError:
+            pass
+        except OSError as error:
+            self._log.warning("Could not read %r: %s", self.filename, error)
+
+        return records
+
+    def runtimes(self, nodes):
+        """Returns a dictionary of nodes to the expected runtime of each node in
+        seconds, based on previous runs. Nodes that have not previously been run are
+        assumed to take the median time of nodes of the same class that have, or the
+        median time of all nodes that have. Returns an empty dictionary if the log is
+        empty."""
+        records = self.read()
+        runtimes = {}
+        runtimes_by_class = collections.defaultdict(list)
+        for node in nodes:
+            record = records.get((type(node).__name__, str(node)))
+            if record is not None:
+                runtimes[node] = record["wall_time"]
+                runtimes_by_class[type(node)].append(record["wall_time"])
+
+        if not runtimes:
+            return {}
+
+        median = statistics.median(runtimes.values())
+        for node in nodes:
+            if node not in runtimes:
+                class_runtimes = runtimes_by_class.get(type(node))
+                if class_runtimes:
+                    runtimes[node] = statistics.median(class_runtimes)
+                else:
+                    runtimes[node] = median
+
+        return runtimes
+
+    def summarize(self):
+        """Returns a table summarizing the resources used by each kind of command,
+        using the most recent record for each node in the log."""
+        commands = collections.defaultdict(_new_summary)
+        total = _new_summary()
+        for record in self.read().values():
+            for usage in record["commands"]:
+                for summary in (commands[usage["command"]], total):
+                    summary["runs"] += 1
+                    for key in _SUMMARY_KEYS:
+                        if key == "max_rss":
+                            summary[key] = max(summary[key], usage.get(key) or 0)
+                        else:
+                            summary[key] += usage.get(key) or 0
+
+        rows = [_SUMMARY_HEADER]
+        for (name, summary) in sorted(commands.items()):
+            rows.append(_summary_row(summary, name))
+        rows.append(_summary_row(total, "*"))
+
+        return padded_table(rows)
+
+
+_SUMMARY_HEADER = (
+    "Runs",
+    "Wall",
+    "User",
+    "System",
+    "MaxRSS",
+    "Read",
+    "Written",
+    "Command",
+)
+
+
+_SUMMARY_KEYS = (
+    "wall_time",
+    "user_time",
+    "system_time",
+    "max_rss",
+    "bytes_read",
+    "bytes_written",
+)
+
+
+def _new_summary():
+    summary = dict.fromkeys(_SUMMARY_KEYS, 0)
+    summary["runs"] = 0
+
+    return summary
+
+
+def _summary_row(summary, name):
+    return (
+        summary["runs"],
+        _format_time(summary["wall_time"]),
+        _format_time(summary["user_time"]),
+        _format_time(summary["system_time"]),
+        format_memory_size(summary["max_rss"]) or "0",
+        format_memory_size(summary["bytes_read"]) or "0",
+        format_memory_size(summary["bytes_written"]) or "0",
+        name,
+    )
+
+
+def _format_time(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return "%i:%02i:%02i" % (hours, minutes, seconds)
@@ -0,0 +1,178 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2020 Mikkel Schubert <MikkelSch@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Timeline of pipeline runs in the Trace Event Format.
+
+The resulting JSON files may be viewed using https://ui.perfetto.dev/ or the
+'chrome://tracing' page in Chrome/Chromium. Each thread slot used by the pipeline
+is shown as a process; every node run in a slot is shown as a span on the first
+track of that process, and each command run by the node on a separate track.
+Counters record the number of threads in use and the number of runable nodes
+waiting to be run. Events are written as they happen, and the file can be loaded
+even if the pipeline was terminated before the trace could be completed.
+"""
+import json
+import logging
+import time
+
+
+# Process ID used for events related to the pipeline as a whole
+_PIPELINE_PID = 0
+
+
+class Timeline:
+    def __init__(self, filename):
+        self.filename = filename
+        self._log = logging.getLogger(__name__)
+        self._start_time = time.time()
+        # Running nodes -> (slot, start time)
+        self._running = {}
+        # Slots that are not currently in use
+        self._free_slots = []
+        self._num_slots = 0
+        # Number of tracks (for commands) created for each slot
+        self._tracks = {}
+
+        self._handle = open(filename, "w")
+        self._handle.write("[")
+        self._separator = "\n"
+        self._write_metadata(_PIPELINE_PID, 0, "process_name", "Pipeline")
+
+    def node_started(self, node):
+        """Records that a node has been started; each running node is assigned a
+        slot, which is re-used once the node has finished."""
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            self._num_slots += 1
+            slot = self._num_slots
+            self._tracks[slot] = 0
+            self._write_metadata(slot, 0, "process_name", "Slot %i" % (slot,))
+            self._write_metadata(slot, 0, "process_sort_index", slot)
+            self._write_metadata(slot, 0, "thread_name", "Nodes")
+
+        self._running[node] = (slot, time.time())
+
+    def node_finished(self, node, record=None, error=None):
+        """Records that a node has finished, given the record returned by Node.run
+        (if any) and the error raised by the node (if any)."""
+        slot, start_time = self._running.pop(node)
+        end_time = time.time()
+
+        args = {"threads": node.threads, "memory": node.memory}
+        if error is not None:
+            args["error"] = "%s: %s" % (type(error).__name__, error)
+
+        commands = ()
+        if record is not None:
+            start_time = record["start_time"]
+            end_time = start_time + record["wall_time"]
+            commands = record["commands"]
+
+        self._write_span(slot, 0, str(node), start_time, end_time, args)
+
+        for (track, usage) in enumerate(commands, start=1):
+            if track > self._tracks[slot]:
+                self._tracks[slot] = track
+                self._write_metadata(slot, track, "thread_name", "Command %i" % track)
+
+            self._write_span(
+                slot,
+                track,
+                usage["command"],
+                usage["start_time"],
+                usage["start_time"] + usage["wall_time"],
+                {
+                    key: value
+                    for (key, value) in usage.items()
+                    if key not in ("command", "start_time")
+                },
+            )
+
+        self._free_slots.append(slot)
+        # Lower numbered slots are re-used first, to keep the timeline compact
+        self._free_slots.sort(reverse=True)
+
+    def set_counters(self, running_threads, queued_nodes):
+        """Records the number of threads in use, and the number of nodes that are
+        ready to be run, but waiting for resources to become available."""
+        self._write_event(
+            {
+                "name": "Threads",
+                "ph": "C",
+                "ts": self._timestamp(time.time()),
+                "pid": _PIPELINE_PID,
+                "args": {"running": running_threads},
+            }
+        )
+        self._write_event(
+            {
+                "name": "Nodes",
+                "ph": "C",
+                "ts": self._timestamp(time.time()),
+                "pid": _PIPELINE_PID,
+                "args": {"queued": queued_nodes},
+            }
+        )
+
+    def close(self):
+        if not self._handle.closed:
+            self._handle.write("\n]\n")
+            self._handle.close()
+
+    def _write_span(self, pid, tid, name, start_time, end_time, args):
+        self._write_event(
+            {
+                "name": name,
+                "ph": "X",
+                "ts": self._timestamp(start_time),
+                "dur": max(0, int((end_time - start_time) * 1e6)),
+                "pid": pid,
+                "tid": tid,
+                "args": args,
+            }
+        )
+
+    def _write_metadata(self, pid, tid, name, value):
+        key = "sort_index" if name.endswith("sort_index") else "name"
+        self._write_event(
+            {"name": name, "ph": "M", "pid": pid, "tid": tid, "args": {key: value}}
+        )
+
+    def _write_event(self, event):
+        try:
+            self._handle.write(self._separator)
+            self._handle.write(json.dumps(event, sort_keys=True))
+            self._handle.flush()
+            self._separator = ",\n"
+        except OSError as error:
+            self._log.warning("Could not write to %r: %s", self.filename, error)
+
+    def _timestamp(self, value):
+        """Returns a timestamp in microseconds relative to the start of the run."""
+        return int((value - self._start_time) * 1e6)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _exc_type, _exc_value, _traceback):
+        self.close()
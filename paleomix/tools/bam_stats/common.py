@@ -21,6 +21,7 @@
 # SOFTWARE.
 #
 import collections
+import multiprocessing
 import os
 import logging
 
@@ -28,7 +29,7 @@ import pysam
 
 import paleomix.common.argparse as argparse
 
-from paleomix.common.bedtools import read_bed_file, sort_bed_by_bamfile
+from paleomix.common.bedtools import BEDRecord, read_bed_file, sort_bed_by_bamfile
 from paleomix.common.fileutils import swap_ext
 
 
@@ -80,9 +81,19 @@ def collect_bed_regions(filename):
     return regions
 
 
-def parse_arguments(argv, ext):
+def parse_arguments(argv, ext, outputs=None):
+    """Parses command-line arguments for BAM statistics tools. By default a single
+    output table is written to 'args.outfile', but multiple output tables may be
+    specified as a list of (attribute, extension) tuples using 'outputs'.
+    """
+    if outputs is None:
+        outputs = (("outfile", ext),)
+
     prog = "paleomix %s" % (ext.strip("."),)
-    usage = "%s [options] sorted.bam [out%s]" % (prog, ext)
+    usage = "%s [options] sorted.bam %s" % (
+        prog,
+        " ".join("[out%s]" % (output_ext,) for (_, output_ext) in outputs),
+    )
     parser = argparse.ArgumentParser(prog=prog, usage=usage)
 
     parser.add_argument(
@@ -91,14 +102,15 @@ def parse_arguments(argv, ext):
         help="Filename of a sorted BAM file. If set to '-' "
         "the file is read from STDIN.",
     )
-    parser.add_argument(
-        "outfile",
-        metavar="OUTPUT",
-        nargs="?",
-        help="Filename of output table; defaults to name of "
-        "the input BAM with a '%s' extension. If "
-        "set to '-' the table is printed to STDOUT." % (ext,),
-    )
+    for (key, output_ext) in outputs:
+        parser.add_argument(
+            key,
+            metavar="OUTPUT",
+            nargs="?",
+            help="Filename of output table; defaults to name of "
+            "the input BAM with a '%s' extension. If "
+            "set to '-' the table is printed to STDOUT." % (output_ext,),
+        )
     parser.add_argument(
         "--target-name",
         default=None,
@@ -133,6 +145,14 @@ def parse_arguments(argv, ext):
         "provide aggregated statistics; this is required "
         "if readgroup information is missing or partial",
     )
+    parser.add_argument(
+        "--threads",
+        default=1,
+        type=int,
+        help="Number of worker processes to use. Work is split by contig, or by "
+        "region if --regions-file is used, and requires that the BAM file is "
+        "indexed; unindexed BAM files are processed using a single thread.",
+    )
     parser.add_argument(
         "--overwrite-output",
         default=False,
@@ -143,8 +163,9 @@ def parse_arguments(argv, ext):
     )
 
     args = parser.parse_args(argv)
-    if not args.outfile:
-        args.outfile = swap_ext(args.infile, ext)
+    for (key, output_ext) in outputs:
+        if not getattr(args, key):
+            setattr(args, key, swap_ext(args.infile, output_ext))
 
     if args.ignore_readgroups:
         args.get_readgroup_func = _get_readgroup_ignored
@@ -157,18 +178,23 @@ def parse_arguments(argv, ext):
         else:
             args.target_name = os.path.basename(args.infile)
 
-    if os.path.exists(args.outfile) and not args.overwrite_output:
-        parser.error(
-            "Destination filename already exists (%r); use option "
-            "--overwrite-output to allow overwriting of this file." % (args.outfile,)
-        )
+    if args.threads < 1:
+        parser.error("--threads must be 1 or greater, not %i" % (args.threads,))
+
+    for (key, _) in outputs:
+        filename = getattr(args, key)
+        if os.path.exists(filename) and not args.overwrite_output:
+            parser.error(
+                "Destination filename already exists (%r); use option "
+                "--overwrite-output to allow overwriting of this file." % (filename,)
+            )
 
     return args
 
 
-def main_wrapper(process_func, argv, ext):
+def main_wrapper(process_func, argv, ext, outputs=None):
     log = logging.getLogger(__name__)
-    args = parse_arguments(argv, ext)
+    args = parse_arguments(argv, ext, outputs)
     args.regions = None
     if args.regions_fpath:
         try:
@@ -194,6 +220,85 @@ def main_wrapper(process_func, argv, ext):
         return process_func(handle, args)
 
 
+def map_regions(func, handle, args, timer):
+    """Calls 'func(handle, args, regions, timer)' for the regions of interest, or
+    for all contigs if no regions were specified, and yields the results. If more
+    than one thread is requested and the BAM file is indexed, the regions are split
+    into shards that are processed by worker processes, and one result is yielded
+    per shard; the timer is not used in this case.
+    """
+    shards = _split_into_shards(handle, args)
+    if len(shards) <= 1:
+        yield func(handle, args, args.regions, timer)
+        return
+
+    tasks = [(func, args, shard) for shard in shards]
+    pool = multiprocessing.Pool(min(args.threads, len(shards)))
+    try:
+        yield from pool.imap(_map_regions_worker, tasks)
+    finally:
+        # Workers are shut down gracefully, since Pool.terminate() may hang if a
+        # SIGTERM handler has been installed (see paleomix.atomiccmd.command).
+        # This includes when the caller stops iterating early (e.g. on errors).
+        pool.close()
+        pool.join()
+
+
+def _map_regions_worker(task):
+    func, args, regions = task
+    with pysam.AlignmentFile(args.infile) as handle:
+        return func(handle, args, regions, _NullTimer())
+
+
+def _split_into_shards(handle, args):
+    if args.threads <= 1:
+        return ()
+    elif args.infile == "-" or not handle.has_index():
+        log = logging.getLogger(__name__)
+        log.warning("BAM file %r is not indexed; using 1 thread", args.infile)
+        return ()
+
+    regions = args.regions
+    if not regions:
+        regions = []
+        for (contig, length) in zip(handle.references, handle.lengths):
+            region = BEDRecord()
+            region.contig = contig
+            region.start = 0
+            region.end = length
+            region.name = contig
+            regions.append(region.freeze())
+
+    # Oversplit to even out differences in the amount of work per shard. Regions
+    # are never split, and shards contain consecutive regions in BAM order
+    total_size = sum(region.end - region.start for region in regions)
+    shard_size = total_size / (args.threads * 4)
+
+    shards = []
+    shard = []
+    current_size = 0
+    for region in regions:
+        shard.append(region)
+        current_size += region.end - region.start
+        if current_size >= shard_size:
+            shards.append(shard)
+            shard = []
+            current_size = 0
+
+    if shard:
+        shards.append(shard)
+
+    return shards
+
+
+class _NullTimer:
+    def increment(self, count=1, read=None):
+        pass
+
+    def finalize(self):
+        pass
+
+
 def _get_readgroup(record):
     try:
         return record.get_tag("RG")
@@ -31,6 +31,7 @@ from paleomix.tools.bam_stats.common import (
     collect_readgroups,
     collect_references,
     main_wrapper,
+    map_regions,
 )
 from paleomix.tools.bam_stats.coverage import ReadGroup, write_table
 
@@ -98,9 +99,9 @@ def build_table(args, handle, counts):
     return table
 
 
-def print_table(args, handle, counts):
+def print_table(args, handle, counts, filename=None):
     table = build_table(args, handle, counts)
-    write_table(table, args.outfile)
+    write_table(table, args.outfile if filename is None else filename)
 
 
 ##############################################################################
@@ -139,13 +140,13 @@ def process_record(subtable, record, flags, region):
             position += num
 
 
-def process_file(handle, args):
-    timer = BAMTimer(handle, step=1000000)
-
+def count_regions(handle, args, regions, timer):
+    """Returns a dict of {region name: {readgroup: ReadGroup}} for the given
+    regions, or None if the BAM file was found to be unsorted."""
     counts = {}
     last_tid = 0
     region_template = build_region_template(args, handle)
-    for region in BAMRegionsIter(handle, args.regions):
+    for region in BAMRegionsIter(handle, regions):
         if region.name is None:
             # Trailing unmapped reads
             break
@@ -169,11 +170,34 @@ def process_file(handle, args):
 
             if (region.tid, position) < (last_tid, last_pos):
                 sys.stderr.write("ERROR: Input BAM file is unsorted\n")
-                return 1
+                return None
 
             last_pos = position
             last_tid = region.tid
 
+    return counts
+
+
+def merge_counts(counts, other):
+    for (name, other_table) in other.items():
+        region_table = counts.get(name)
+        if region_table is None:
+            counts[name] = other_table
+            continue
+
+        for (readgroup, statistics) in other_table.items():
+            region_table[readgroup].add(statistics)
+
+
+def process_file(handle, args):
+    timer = BAMTimer(handle, step=1000000)
+
+    counts = {}
+    for shard_counts in map_regions(count_regions, handle, args, timer):
+        if shard_counts is None:
+            return 1
+
+        merge_counts(counts, shard_counts)
     timer.finalize()
 
     print_table(args, handle, counts)
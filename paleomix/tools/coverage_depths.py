@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2020 Mikkel Schubert <MikkelSch@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Calculates both coverage and depth histograms for a BAM file in a single pass;
+the output is identical to that of 'paleomix coverage' and 'paleomix depths'.
+"""
+import sys
+
+from paleomix.common.timer import BAMTimer
+from paleomix.common.bamfiles import BAMRegionsIter
+
+from paleomix.tools.bam_stats.common import main_wrapper, map_regions
+
+import paleomix.tools.coverage as coverage
+import paleomix.tools.depths as depths
+
+
+def count_regions(handle, args, regions, timer):
+    """Returns a tuple of coverage counts (see 'paleomix.tools.coverage') and a
+    totals dict of depths (see 'paleomix.tools.depths') for the given regions, or
+    None if the BAM file was found to be unsorted."""
+    last_tid = 0
+    counts = {}
+    region_template = coverage.build_region_template(args, handle)
+    totals = depths.build_totals_dict(args, handle)
+    rg_to_smlbid, smlbid_to_smlb = depths.build_rg_to_smlbid_keys(args, handle)
+    get_readgroup = args.get_readgroup_func
+
+    for region in BAMRegionsIter(handle, regions):
+        if region.name is None:
+            # Trailing unmapped reads
+            break
+        elif not args.regions and (handle.nreferences > args.max_contigs):
+            region.name = "<Genome>"
+
+        last_pos = 0
+        region_table = coverage.get_region_table(counts, region.name, region_template)
+        mapping = depths.MappingToTotals(totals, region, smlbid_to_smlb)
+        for (position, records) in region:
+            mapping.process_counts(position)
+
+            for record in records:
+                timer.increment(read=record)
+
+                readgroup = get_readgroup(record)
+                readgroup_table = region_table.get(readgroup)
+                if readgroup_table is None:
+                    # Unknown readgroups are treated as missing readgroups
+                    readgroup_table = region_table[None]
+
+                key = rg_to_smlbid.get(readgroup)
+                if key is None:
+                    key = rg_to_smlbid[None]
+
+                coverage.process_record(readgroup_table, record, record.flag, region)
+                mapping.add_read(record, key)
+
+            if (region.tid, position) < (last_tid, last_pos):
+                sys.stderr.write("ERROR: Input BAM file is unsorted\n")
+                return None
+
+            last_pos = position
+            last_tid = region.tid
+
+        # Process columns in region after last read
+        mapping.finalize()
+
+    return counts, totals
+
+
+def process_file(handle, args):
+    timer = BAMTimer(handle, step=1000000)
+
+    counts = {}
+    totals = depths.build_totals_dict(args, handle)
+    for result in map_regions(count_regions, handle, args, timer):
+        if result is None:
+            return 1
+
+        shard_counts, shard_totals = result
+        coverage.merge_counts(counts, shard_counts)
+        depths.merge_totals(totals, shard_totals)
+    timer.finalize()
+
+    depths.exclude_missing_readgroups(args, totals)
+
+    coverage.print_table(args, handle, counts, args.coverage_file)
+    depths.print_table(handle, args, totals, args.depths_file)
+
+    return 0
+
+
+def main(argv):
+    outputs = (("coverage_file", ".coverage"), ("depths_file", ".depths"))
+
+    return main_wrapper(process_file, argv, ".coverage_depths", outputs)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
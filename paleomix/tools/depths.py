@@ -20,9 +20,10 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 #
-import sys
-import itertools
 import collections
+import sys
+
+import numpy
 
 from paleomix.common.timer import BAMTimer
 from paleomix.common.bamfiles import BAMRegionsIter
@@ -31,6 +32,7 @@ from paleomix.tools.bam_stats.common import (
     collect_references,
     collect_readgroups,
     main_wrapper,
+    map_regions,
 )
 
 
@@ -40,9 +42,15 @@ from paleomix.tools.bam_stats.common import (
 
 # Maximum depth to record, and hence the number of columns in output table
 _MAX_DEPTH = 200
-# Maximum number of count patterns (numbers of bases per library for a given
-# site) to cache for bulk processing; see MappingsToTotals for implementation
-_MAX_CACHE_SIZE = 10000
+# Maximum number of aligned blocks to buffer before calculating depths
+_MAX_BUFFERED_BLOCKS = 2 ** 16
+# Maximum number of positions for which depths are calculated at once
+_WINDOW_SIZE = 2 ** 16
+
+# CIGAR operations that count towards depths (M, =, X)
+_CIGAR_ALIGNED = frozenset((0, 7, 8))
+# CIGAR operations that are skipped (D, N, P)
+_CIGAR_SKIPPED = frozenset((2, 3, 6))
 
 
 # Header prepended to output tables
@@ -68,55 +76,176 @@ _HEADER = """# Columns:
 
 
 class MappingToTotals:
+    """Counts the depth of each sample/library in a region and adds these to the
+    depth histograms of every totals (sample, library, contig) they belong to.
+
+    Aligned blocks are recorded as +1/-1 at their start/end coordinates. Once all
+    reads covering a range of positions have been seen, per-position depths are
+    calculated for windows of positions using cumulative sums, and binned for
+    each set of totals.
+    """
+
     def __init__(self, totals, region, smlbid_to_smlb):
-        self._region = region
-        self._map_by_smlbid, self._totals_src_and_dst = self._build_mappings(
+        self._start = region.start
+        self._end = region.end
+
+        map_by_smlbid, totals_src_and_dst = self._build_mappings(
             totals, region.name, smlbid_to_smlb
         )
-        self._cache = collections.defaultdict(int)
-
-    def process_counts(self, counts, last_pos, cur_pos):
-        start = self._region.start
-        end = self._region.end
-
-        # Pileups tends to contain identical stretches, so
-        # try to avoid repeated lookups by aggregating these
-        repeats = 1
-        last_count = None
-        while counts and (last_pos < cur_pos):
-            count = counts.popleft()
-            if start <= last_pos < end:
-                if count == last_count:
-                    repeats += 1
-                else:
-                    if last_count is not None:
-                        self._cache[tuple(last_count)] += repeats
-                    last_count = count
-                    repeats = 1
-            last_pos += 1
-
-        if last_count is not None:
-            self._cache[tuple(last_count)] += repeats
-
-        if len(self._cache) > _MAX_CACHE_SIZE:
-            self.finalize()
+
+        # Matrix mapping depths per sample/library to depths per totals
+        self._totals = []
+        self._mapping = numpy.zeros(
+            (len(totals_src_and_dst), len(smlbid_to_smlb)), dtype=numpy.int64
+        )
+        for (index, (dst_counts, src_count)) in enumerate(totals_src_and_dst):
+            self._totals.append(dst_counts)
+            for (smlbid, accumulators) in enumerate(map_by_smlbid):
+                if any(src_count is accumulator for accumulator in accumulators):
+                    self._mapping[index, smlbid] = 1
+
+        # Depths per sample/library at the first unprocessed position
+        self._depths = numpy.zeros(len(smlbid_to_smlb), dtype=numpy.int64)
+        self._position = None
+        # Furthest position covered by reads processed so far
+        self._max_end = 0
+
+        # Aligned blocks not yet converted to start/end deltas
+        self._block_starts = []
+        self._block_ends = []
+        self._block_smlbids = []
+
+        # Start/end deltas past the last processed position
+        self._coordinates = numpy.zeros(0, dtype=numpy.int64)
+        self._smlbids = numpy.zeros(0, dtype=numpy.int64)
+        self._deltas = numpy.zeros(0, dtype=numpy.int64)
+
+    def add_read(self, record, smlbid):
+        position = record.pos
+        # Blocks past the end of the read (possible due to padding) are only
+        # counted if they overlap positions covered by previous reads
+        max_end = position + record.alen
+        if max_end > self._max_end:
+            self._max_end = max_end
+        else:
+            max_end = self._max_end
+
+        for (cigar, count) in record.cigartuples or ():
+            if cigar in _CIGAR_ALIGNED:
+                end = position + count
+                if end > max_end:
+                    end = max_end
+                    if position >= end:
+                        break
+
+                self._block_starts.append(position)
+                self._block_ends.append(end)
+                self._block_smlbids.append(smlbid)
+                position += count
+            elif cigar in _CIGAR_SKIPPED:
+                position += count
+
+    def process_counts(self, position):
+        """Called before adding reads starting at 'position'; depths are calculated
+        for preceding positions once enough aligned blocks have been buffered.
+        """
+        if len(self._block_starts) >= _MAX_BUFFERED_BLOCKS:
+            self._process_blocks(position)
 
     def finalize(self):
-        """Process cached counts."""
-        for (count, multiplier) in self._cache.items():
-            self._update_totals(count, multiplier)
-        self._cache.clear()
-
-    def _update_totals(self, count, multiplier=1):
-        for (smlbid, count) in enumerate(count):
-            if count:
-                for lst in self._map_by_smlbid[smlbid]:
-                    lst[0] += count
-
-        for (dst_counts, src_count) in self._totals_src_and_dst:
-            if src_count[0]:
-                dst_counts[src_count[0]] += multiplier
-                src_count[0] = 0
+        """Process remaining counts."""
+        self._process_blocks(None)
+
+    def _process_blocks(self, until):
+        """Calculates depths for all positions before 'until', or for all
+        positions covered by reads if 'until' is None.
+        """
+        smlbids = numpy.array(self._block_smlbids, dtype=numpy.int64)
+        coordinates = numpy.concatenate(
+            (
+                self._coordinates,
+                numpy.array(self._block_starts, dtype=numpy.int64),
+                numpy.array(self._block_ends, dtype=numpy.int64),
+            )
+        )
+        smlbids = numpy.concatenate((self._smlbids, smlbids, smlbids))
+        deltas = numpy.concatenate(
+            (
+                self._deltas,
+                numpy.ones(len(self._block_starts), dtype=numpy.int64),
+                numpy.full(len(self._block_ends), -1, dtype=numpy.int64),
+            )
+        )
+
+        self._block_starts = []
+        self._block_ends = []
+        self._block_smlbids = []
+
+        if until is None:
+            until = coordinates.max() + 1 if len(coordinates) else 0
+            selection = numpy.ones(len(coordinates), dtype=bool)
+        else:
+            selection = coordinates < until
+
+        # Deltas past 'until' may be affected by reads not yet seen
+        self._coordinates = coordinates[~selection]
+        self._smlbids = smlbids[~selection]
+        self._deltas = deltas[~selection]
+
+        order = numpy.argsort(coordinates[selection], kind="mergesort")
+        coordinates = coordinates[selection][order]
+        smlbids = smlbids[selection][order]
+        deltas = deltas[selection][order]
+
+        position = self._position
+        if position is None:
+            position = coordinates[0] if len(coordinates) else until
+
+        index = 0
+        while index < len(coordinates) or (self._depths.any() and position < until):
+            if not self._depths.any():
+                # Skip positions not covered by any reads
+                position = max(position, coordinates[index])
+
+            window_end = min(position + _WINDOW_SIZE, until)
+            next_index = numpy.searchsorted(coordinates, window_end)
+            self._process_window(
+                position,
+                window_end,
+                coordinates[index:next_index],
+                smlbids[index:next_index],
+                deltas[index:next_index],
+            )
+
+            index = next_index
+            position = window_end
+
+        self._position = max(position, until)
+
+    def _process_window(self, start, end, coordinates, smlbids, deltas):
+        length = end - start
+        nsmlbids = len(self._depths)
+
+        counts = numpy.bincount(
+            smlbids * length + (coordinates - start),
+            weights=deltas,
+            minlength=nsmlbids * length,
+        )
+
+        depths = counts.astype(numpy.int64).reshape((nsmlbids, length))
+        depths = depths.cumsum(axis=1)
+        depths += self._depths[:, None]
+        self._depths = depths[:, -1].copy()
+
+        # Only positions inside the region are counted
+        region_start = max(start, self._start) - start
+        region_end = min(end, self._end) - start
+        if region_start < region_end:
+            depths = self._mapping.dot(depths[:, region_start:region_end])
+            for (dst_counts, row) in zip(self._totals, depths):
+                histogram = numpy.bincount(row)
+                for depth in numpy.flatnonzero(histogram[1:]) + 1:
+                    dst_counts[int(depth)] += int(histogram[depth])
 
     @classmethod
     def _build_mappings(cls, totals, name, smlbid_to_smlb):
@@ -185,13 +314,16 @@ def calc_max_depth(counts):
     return "NA"
 
 
-def print_table(handle, args, totals):
+def print_table(handle, args, totals, filename=None):
     lengths = collect_references(args, handle)
 
-    if args.outfile == "-":
+    if filename is None:
+        filename = args.outfile
+
+    if filename == "-":
         output_handle = sys.stdout
     else:
-        output_handle = open(args.outfile, "w")
+        output_handle = open(filename, "w")
 
     with output_handle:
         rows = build_table(args.target_name, totals, lengths)
@@ -296,25 +428,6 @@ def build_totals_dict(args, handle):
     return totals
 
 
-def count_bases(args, counts, record, rg_to_smlbid, template):
-    for _ in range(record.alen - len(counts)):
-        counts.append(list(template))
-
-    key = rg_to_smlbid.get(args.get_readgroup_func(record))
-    if key is None:
-        # Unknown readgroups are treated as missing readgroups
-        key = rg_to_smlbid[None]
-
-    index = 0
-    for (cigar, count) in record.cigar:
-        if cigar in (0, 7, 8):
-            for counter in itertools.islice(counts, index, index + count):
-                counter[key] += 1
-            index += count
-        elif cigar in (2, 3, 6):
-            index += count
-
-
 def build_rg_to_smlbid_keys(args, handle):
     """Returns a dictionary which maps a readgroup ID to an index value,
     as well as a list containing a tuple (samples, library) corresponding
@@ -338,15 +451,15 @@ def build_rg_to_smlbid_keys(args, handle):
     return rg_to_lbsmid, lbsmid_to_smlb
 
 
-def process_file(handle, args):
-    timer = BAMTimer(handle, step=1000000)
-
+def count_regions(handle, args, regions, timer):
+    """Returns a totals dict for the given regions (see 'build_totals_dict'), or
+    None if the BAM file was found to be unsorted."""
     last_tid = 0
     totals = build_totals_dict(args, handle)
     rg_to_smlbid, smlbid_to_smlb = build_rg_to_smlbid_keys(args, handle)
-    template = [0] * len(smlbid_to_smlb)
+    get_readgroup = args.get_readgroup_func
 
-    for region in BAMRegionsIter(handle, args.regions):
+    for region in BAMRegionsIter(handle, regions):
         if region.name is None:
             # Trailing unmapped reads
             break
@@ -354,29 +467,50 @@ def process_file(handle, args):
             region.name = "<Genome>"
 
         last_pos = 0
-        counts = collections.deque()
         mapping = MappingToTotals(totals, region, smlbid_to_smlb)
         for (position, records) in region:
-            mapping.process_counts(counts, last_pos, position)
+            mapping.process_counts(position)
 
             for record in records:
                 timer.increment(read=record)
-                count_bases(args, counts, record, rg_to_smlbid, template)
+
+                key = rg_to_smlbid.get(get_readgroup(record))
+                if key is None:
+                    # Unknown readgroups are treated as missing readgroups
+                    key = rg_to_smlbid[None]
+
+                mapping.add_read(record, key)
 
             if (region.tid, position) < (last_tid, last_pos):
                 sys.stderr.write("ERROR: Input BAM file is unsorted\n")
-                return 1
+                return None
 
             last_pos = position
             last_tid = region.tid
 
         # Process columns in region after last read
-        mapping.process_counts(counts, last_pos, float("inf"))
         mapping.finalize()
-    timer.finalize()
 
+    return totals
+
+
+def merge_totals(totals, other):
+    """Adds the counts in one totals dict to another; both dicts must have been
+    created using the same arguments, so that they share the same structure."""
+    merged = set()
+    for (key, counts) in other.items():
+        # Dicts are shared between keys when there is only one sample, etc.
+        if id(counts) not in merged:
+            merged.add(id(counts))
+
+            dst_counts = totals[key]
+            for (depth, count) in counts.items():
+                dst_counts[depth] += count
+
+
+def exclude_missing_readgroups(args, totals):
+    """Removes counts for reads with no read-groups, if none such were seen."""
     if not args.ignore_readgroups:
-        # Exclude counts for reads with no read-groups, if none such were seen
         for (key, _, _), value in totals.items():
             if key == "<NA>" and value:
                 break
@@ -385,6 +519,19 @@ def process_file(handle, args):
                 if key[0] == "<NA>":
                     totals.pop(key)
 
+
+def process_file(handle, args):
+    timer = BAMTimer(handle, step=1000000)
+
+    totals = build_totals_dict(args, handle)
+    for shard_totals in map_regions(count_regions, handle, args, timer):
+        if shard_totals is None:
+            return 1
+
+        merge_totals(totals, shard_totals)
+    timer.finalize()
+
+    exclude_missing_readgroups(args, totals)
     print_table(handle, args, totals)
 
     return 0
@@ -19,10 +19,17 @@ using the BAM record flags, are not filtered, but simply written to the output.
 By default, filtered reads are flagged using the "duplicate" flag (0x400), and
 written to the output. Use the --remove-duplicates command-line option to
 instead remove these records from the output.
+
+If the input is an indexed BAM file and --threads is greater than 1, contigs are
+processed in parallel and the resulting BAM files are concatenated in order.
 """
 import collections
+import multiprocessing
+import os
 import random
+import shutil
 import sys
+import tempfile
 
 import pysam
 
@@ -38,6 +45,12 @@ _FILTERED_FLAGS |= 0x800  # Chimeric alignment
 _CIGAR_SOFTCLIP = 4
 _CIGAR_HARDCLIP = 5
 
+# The empty BGZF block that terminates BAM files
+_BGZF_EOF = (
+    b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43\x02\x00"
+    b"\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+)
+
 
 def read_quality(read):
     qualities = read.query_alignment_qualities
@@ -93,10 +106,10 @@ def mark_duplicate_reads(reads):
         read.is_duplicate = read is not best_read
 
 
-def write_read(args, out, read_and_alignment, duplicates_by_alignment):
-    read, alignment = read_and_alignment
-    if alignment is not None:
-        duplicates = duplicates_by_alignment.pop(alignment)
+def write_read(args, out, read_and_key, duplicates_by_key):
+    read, key, _ = read_and_key
+    if key is not None:
+        duplicates = duplicates_by_key.pop(key)
 
         if len(duplicates) > 1:
             # Select the best read and mark the others as duplicates.
@@ -109,20 +122,16 @@ def write_read(args, out, read_and_alignment, duplicates_by_alignment):
         out.write(read)
 
 
-def can_write_read(read_and_alignment, current_position):
+def can_write_read(read_and_key, current_start):
     """Returns true if the first read in the cache can safely be written. This
     will be the case if the read was not the first in a set of reads with the
     same alignment, or if the current position has gone beyond the last base
-    covered in that alignment.
+    covered in that alignment. The cache is flushed whenever the contig changes,
+    and all reads in the cache are therefore located on the current contig.
     """
-    _, alignment = read_and_alignment
-    if alignment is None:
-        return True
+    _, key, alignment_end = read_and_key
 
-    current_ref_id, current_ref_start = current_position
-    alignment_ref_id, _, _, alignment_ref_end = alignment
-
-    return alignment_ref_id != current_ref_id or alignment_ref_end < current_ref_start
+    return key is None or alignment_end < current_start
 
 
 def clipped_bases_at_front(cigartuples):
@@ -138,41 +147,55 @@ def clipped_bases_at_front(cigartuples):
 
 
 def unclipped_alignment_coordinates(read):
-    """Returns tuple describing the alignment, with external coordinates
-    modified to account for clipped bases, assuming an ungapped alignment to
-    the reference. This is equivalent to the behavior of Picard MarkDuplicates.
+    """Returns tuple of (key, end) describing the alignment, with external
+    coordinates modified to account for clipped bases, assuming an ungapped
+    alignment to the reference. This is equivalent to the behavior of Picard
+    MarkDuplicates. The key is a single integer encoding the start, end, and
+    strand of the alignment, and is unique for alignments on the same contig.
     """
     cigartuples = read.cigartuples
     start = read.reference_start - clipped_bases_at_front(cigartuples)
     end = read.reference_end + clipped_bases_at_front(reversed(cigartuples))
 
-    return (read.reference_id, read.is_reverse, start, end)
+    # BAM positions are limited to 2^31 - 1, so the end position is always in the
+    # range [0; 2^32) and the (possibly negative) start fits in the upper bits
+    return ((start << 33) | (end << 1) | read.is_reverse, end)
 
 
-def process_aligned_read(cache, duplicates_by_alignment, read):
+def process_aligned_read(cache, duplicates_by_key, read):
     """Processes an aligned read, either pairing it with an existing read, or
     creating a new alignment block to track copies of this copies.
     """
-    alignment = unclipped_alignment_coordinates(read)
+    key, end = unclipped_alignment_coordinates(read)
 
-    try:
-        duplicates_by_alignment[alignment].append(read)
-        cache.append((read, None))
-    except KeyError:
+    duplicates = duplicates_by_key.get(key)
+    if duplicates is not None:
+        duplicates.append(read)
+        cache.append((read, None, end))
+    else:
         # No previous reads with matching alignment; this read will
         # serve to track any other reads with the same alignment.
-        duplicates_by_alignment[alignment] = [read]
-        cache.append((read, alignment))
+        duplicates_by_key[key] = [read]
+        cache.append((read, key, end))
 
 
 def is_trailing_unmapped_read(read):
     return read.is_unmapped and read.reference_id == -1 and read.reference_start == -1
 
 
+def seed_random(args, contig):
+    """Seeds the RNG used to select among reads without quality scores. Seeds are
+    derived per contig, so that the output does not depend on whether contigs are
+    processed sequentially or in parallel.
+    """
+    random.seed(None if args.seed is None else "%s:%s" % (args.seed, contig))
+
+
 def process(args, infile, outfile):
     cache = collections.deque()
-    duplicates_by_alignment = {}
+    duplicates_by_key = {}
     last_position = (0, 0)
+    last_contig = None
     read_num = 1
 
     for read_num, read in enumerate(infile, start=read_num):
@@ -186,21 +209,30 @@ def process(args, infile, outfile):
                 )
                 return 1
 
-            cache.append((read, None))
+            cache.append((read, None, None))
             break
-        elif read.flag & _FILTERED_FLAGS:
-            cache.append((read, None))
+        elif current_position[0] != last_contig:
+            # Alignment keys are only unique within a contig
+            while cache:
+                write_read(args, outfile, cache.popleft(), duplicates_by_key)
+
+            seed_random(args, read.reference_name)
+            last_contig = current_position[0]
+
+        if read.flag & _FILTERED_FLAGS:
+            cache.append((read, None, None))
         else:
-            process_aligned_read(cache, duplicates_by_alignment, read)
+            process_aligned_read(cache, duplicates_by_key, read)
 
         last_position = current_position
-        while cache and can_write_read(cache[0], current_position):
-            write_read(args, outfile, cache.popleft(), duplicates_by_alignment)
+        current_start = current_position[1]
+        while cache and can_write_read(cache[0], current_start):
+            write_read(args, outfile, cache.popleft(), duplicates_by_key)
 
     while cache:
-        write_read(args, outfile, cache.popleft(), duplicates_by_alignment)
+        write_read(args, outfile, cache.popleft(), duplicates_by_key)
 
-    assert not duplicates_by_alignment, duplicates_by_alignment
+    assert not duplicates_by_key, duplicates_by_key
 
     for read_num, read in enumerate(infile, start=read_num + 1):
         if not is_trailing_unmapped_read(read):
@@ -215,6 +247,105 @@ def process(args, infile, outfile):
     return 0
 
 
+def _open_output(args, filename, template, threads=1):
+    format_options = None
+    if args.compression_level is not None:
+        format_options = ["level=%i" % (args.compression_level,)]
+
+    return pysam.AlignmentFile(
+        filename,
+        "wb",
+        template=template,
+        threads=threads,
+        format_options=format_options,
+    )
+
+
+def _collect_tasks(infile):
+    """Returns list of contigs containing reads, with trailing unmapped reads
+    represented by the contig name '*'.
+    """
+    contigs = [stats.contig for stats in infile.get_index_statistics() if stats.total]
+    contigs.append("*")
+
+    return contigs
+
+
+def _process_contig(task):
+    args, tmp_dir, idx, contig = task
+
+    filename = os.path.join(tmp_dir, "%06i.bam" % (idx,))
+    with pysam.AlignmentFile(args.input, "rb") as infile:
+        with _open_output(args, filename, infile) as out:
+            returncode = process(args, infile.fetch(contig), out)
+
+    return returncode, filename
+
+
+def _read_bgzf_blocks(filename, header):
+    """Returns the BGZF blocks containing alignments in a BAM file written by
+    '_process_contig', excluding the header blocks and the EOF marker block.
+    """
+    with open(filename, "rb") as handle:
+        data = handle.read()
+
+    if not (data.startswith(header) and data.endswith(_BGZF_EOF)):
+        raise ValueError("unexpected BGZF blocks in %r" % (filename,))
+
+    return data[len(header) : -len(_BGZF_EOF)]
+
+
+def process_parallel(args, infile):
+    """Processes contigs in parallel, writing each to a temporary BAM file. As
+    these files are written using the same template and compression level, the
+    output is produced by concatenating the BGZF blocks containing alignments.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix="paleomix_rmdup_", dir=args.temp_dir)
+    try:
+        filename = os.path.join(tmp_dir, "header.bam")
+        with _open_output(args, filename, infile):
+            pass
+
+        with open(filename, "rb") as handle:
+            header = handle.read()
+
+        if not header.endswith(_BGZF_EOF):
+            raise ValueError("unexpected BGZF blocks in %r" % (filename,))
+        header = header[: -len(_BGZF_EOF)]
+
+        tasks = [
+            (args, tmp_dir, idx, contig)
+            for idx, contig in enumerate(_collect_tasks(infile))
+        ]
+
+        output = sys.stdout.buffer
+        output.write(header)
+
+        returncode = 0
+        with multiprocessing.Pool(args.threads) as pool:
+            for returncode, filename in pool.imap(_process_contig, tasks):
+                if returncode:
+                    break
+
+                output.write(_read_bgzf_blocks(filename, header))
+                os.remove(filename)
+
+            # Workers are shut down gracefully, since Pool.terminate() may hang if a
+            # SIGTERM handler has been installed (see paleomix.atomiccmd.command)
+            pool.close()
+            pool.join()
+
+        if returncode:
+            return returncode
+
+        output.write(_BGZF_EOF)
+        output.flush()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    return 0
+
+
 def parse_args(argv):
     parser = ArgumentParser(prog="paleomix rmdup_collapsed", usage=__doc__)
     parser.add_argument(
@@ -235,18 +366,43 @@ def parse_args(argv):
         default=None,
         type=int,
         help="Seed used for randomly selecting representative reads, when reads do not "
-        "have quality scores assigned. Is initialized using system time by default.",
+        "have quality scores assigned. The RNG is seeded per contig using this value, "
+        "and is initialized using system time by default.",
     )
+    parser.add_argument(
+        "--threads",
+        default=1,
+        type=int,
+        help="Number of threads used for compressing/decompressing BAM files. If the "
+        "input is an indexed BAM file, contigs are instead processed in parallel "
+        "using this number of worker processes.",
+    )
+    parser.add_argument(
+        "--temp-dir",
+        default=None,
+        help="Folder in which temporary files are placed when contigs are processed "
+        "in parallel; defaults to the system temporary folder.",
+    )
+    parser.add_argument(
+        "--compression-level",
+        default=None,
+        type=int,
+        choices=range(10),
+        metavar="N",
+        help="Compression level for the output BAM file, from 0 (uncompressed) to 9 "
+        "(best compression); uses the htslib default if not set.",
+    )
+
+    args = parser.parse_args(argv)
+    if args.threads < 1:
+        parser.error("--threads must be 1 or greater, not %i" % (args.threads,))
 
-    return parser.parse_args(argv)
+    return args
 
 
 def main(argv):
     args = parse_args(argv)
 
-    # Initialize seed used when selecting among reads without quality scores
-    random.seed(args.seed)
-
     if args.input == "-" and sys.stdin.isatty():
         sys.stderr.write("STDIN is a terminal, terminating!\n")
         return 1
@@ -254,8 +410,11 @@ def main(argv):
         sys.stderr.write("STDOUT is a terminal, terminating!\n")
         return 1
 
-    with pysam.AlignmentFile(args.input, "rb") as infile:
-        with pysam.AlignmentFile("-", "wb", template=infile) as outfile:
+    with pysam.AlignmentFile(args.input, "rb", threads=args.threads) as infile:
+        if args.threads > 1 and args.input != "-" and infile.has_index():
+            return process_parallel(args, infile)
+
+        with _open_output(args, "-", infile, args.threads) as outfile:
             return process(args, infile, outfile)
 
     return 0
@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2020 Mikkel Schubert <MikkelSch@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Splits a (optionally compressed) FASTQ file into a number of chunks.
+
+Blocks of consecutive records are distributed round-robin between the output
+files, so that paired FASTQ files with the same number of records (e.g. the
+mate 1 and mate 2 reads produced by AdapterRemoval) are split identically when
+the files are split separately. Output files are GZip compressed.
+"""
+import gzip
+import itertools
+import sys
+
+from paleomix.common.argparse import ArgumentParser
+from paleomix.common.fileutils import open_ro
+
+
+def split_fastq_file(filename, output_files, block_size=4096, compression_level=1):
+    """Writes blocks of 'block_size' records from 'filename' to each output file in
+    turn, returning the number of records written per output file."""
+    if block_size < 1:
+        raise ValueError("block_size must be >= 1, not %r" % (block_size,))
+
+    handles = []
+    counts = [0] * len(output_files)
+    try:
+        for output_file in output_files:
+            handle = gzip.open(output_file, "wb", compresslevel=compression_level)
+            handles.append(handle)
+
+        with open_ro(filename, "rb") as handle:
+            for idx in itertools.cycle(range(len(handles))):
+                lines = list(itertools.islice(handle, block_size * 4))
+                if not lines:
+                    break
+
+                handles[idx].writelines(lines)
+                counts[idx] += (len(lines) + 3) // 4
+    finally:
+        for handle in handles:
+            handle.close()
+
+    return counts
+
+
+def parse_args(argv):
+    parser = ArgumentParser("paleomix :split_fastq")
+    parser.add_argument("input_file", help="FASTQ file to be split into chunks")
+    parser.add_argument(
+        "output_files",
+        nargs="+",
+        help="One or more output files, with one chunk written to each file",
+    )
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        default=4096,
+        help="Number of consecutive records written to each output file in turn",
+    )
+    parser.add_argument(
+        "--compression-level",
+        type=int,
+        default=1,
+        choices=range(10),
+        help="GZip compression level used for output files",
+    )
+
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    if args.block_size < 1:
+        print("ERROR: --block-size must be at least 1", file=sys.stderr)
+        return 1
+
+    split_fastq_file(
+        filename=args.input_file,
+        output_files=args.output_files,
+        block_size=args.block_size,
+        compression_level=args.compression_level,
+    )
+
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main(sys.argv[1:]))
@@ -5,6 +5,8 @@ import sys
 
 from pathlib import Path
 
+import paleomix.common.validationcache as validationcache
+
 from paleomix.common.formats import FormatError
 from paleomix.common.argparse import ArgumentParser
 
@@ -107,14 +109,21 @@ def parse_args(argv):
     return parser.parse_args(argv)
 
 
+def _check_fasta_filename(filename):
+    with open(filename, "rb") as handle:
+        check_fasta_file(handle)
+
+    return True
+
+
 def main(argv):
     args = parse_args(argv)
-    with args.fasta.open("rb") as handle:
-        try:
-            check_fasta_file(handle)
-        except FormatError as error:
-            print(error)
-            return 1
+    try:
+        # Results for files validated by previous runs are re-used, if available
+        validationcache.cached("fasta", args.fasta, _check_fasta_filename)
+    except FormatError as error:
+        print(error)
+        return 1
 
     print("No errors found.")
     return 0
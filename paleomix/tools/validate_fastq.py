@@ -20,19 +20,193 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 #
-import sys
+"""Validates one or more (optionally compressed) FASTQ files.
+
+Files are read in large, binary blocks, each containing a number of complete
+records, which are validated using vectorized (NumPy) operations. Blocks that
+cannot be validated this way (e.g. blocks containing malformed records, non-ASCII
+characters, or carriage returns) are instead passed to FASTQ.from_lines, which
+ensures that results and error messages are identical to those of the parser.
+"""
+import functools
+import itertools
 import json
+import multiprocessing
+import sys
+
+import numpy
+
+import paleomix.common.validationcache as validationcache
 
 from paleomix.common.argparse import ArgumentParser
+from paleomix.common.fileutils import open_ro
 from paleomix.common.formats.fastq import FASTQ, FASTQualities
 
 
+# Number of (uncompressed) bytes read per block
+_BLOCK_SIZE = 16 * 1024 * 1024
+
+# ASCII characters that may be handled without decoding the text; carriage returns
+# are excluded, since these are treated as newlines when reading files in text mode
+_SUPPORTED_BYTES = bytes(value for value in range(128) if value != ord("\r"))
+
+# Characters stripped by str.rstrip / str.split (ASCII only)
+_WHITESPACE = numpy.zeros(256, dtype=bool)
+_WHITESPACE[[ord(char) for char in "\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f "]] = True
+
+
+def validate_fastq_file(filename, threads=1):
+    """Validates a FASTQ file, returning the number of reads, the number of
+    nucleotides, and a FASTQualities object for the qualities in the file.
+    Raises FASTQError if the file contains invalid records. Compressed files are
+    decompressed using up to 'threads' threads."""
+    qualities = FASTQualities()
+    nreads = nnts = 0
+
+    with open_ro(filename, "rb", threads=threads) as handle:
+        block = b""
+        while True:
+            data = handle.read(_BLOCK_SIZE)
+            if not data:
+                break
+
+            block += data
+            newlines = numpy.flatnonzero(numpy.frombuffer(block, numpy.uint8) == 10)
+            # Only complete records (4 lines each) are validated
+            newlines = newlines[: len(newlines) - len(newlines) % 4]
+            if not len(newlines):
+                continue
+
+            result = _validate_block(block, newlines)
+            if result is None:
+                break
+
+            block_reads, block_nts, counts = result
+            nreads += block_reads
+            nnts += block_nts
+            qualities.update_counts(counts)
+
+            block = block[newlines[-1] + 1 :]
+
+    if block:
+        # Remaining lines (partial records, trailing empty lines, etc.) and blocks
+        # that could not be validated above are processed using the FASTQ parser
+        with open_ro(filename) as handle:
+            lines = itertools.islice(handle, nreads * 4, None)
+            for record in FASTQ.from_lines(lines):
+                qualities.update(record)
+
+                nreads += 1
+                nnts += len(record.sequence)
+
+    return nreads, nnts, qualities
+
+
+def _validate_block(block, newlines):
+    """Validates the complete records in a block, given the positions of newlines
+    terminating each line. Returns the number of reads, the number of nucleotides,
+    and counts of quality characters, or None if the block must be validated using
+    the FASTQ parser."""
+    if block.translate(None, _SUPPORTED_BYTES):
+        return None
+
+    data = numpy.frombuffer(block, dtype=numpy.uint8)
+    starts = numpy.zeros_like(newlines)
+    starts[1:] = newlines[:-1] + 1
+    lengths = newlines - starts
+
+    # Headers must start with '@' followed by a non-empty name
+    headers = starts[0::4]
+    if (lengths[0::4] < 2).any():
+        return None
+    elif (data[headers] != ord("@")).any() or _WHITESPACE[data[headers + 1]].any():
+        return None
+
+    separators = starts[2::4]
+    if (lengths[2::4] < 1).any() or (data[separators] != ord("+")).any():
+        return None
+
+    sequence_lengths = lengths[1::4]
+    if (sequence_lengths != lengths[3::4]).any():
+        return None
+
+    # Trailing whitespace is stripped by the parser, and requires special handling
+    for line in (1, 3):
+        line_ends = newlines[line::4][lengths[line::4] > 0]
+        if _WHITESPACE[data[line_ends - 1]].any():
+            return None
+
+    # Mask of characters in quality lines (including the trailing newlines)
+    is_quality_line = numpy.zeros(len(newlines), dtype=bool)
+    is_quality_line[3::4] = True
+    mask = numpy.repeat(is_quality_line, lengths + 1)
+
+    counts = numpy.bincount(data[: len(mask)][mask], minlength=256)
+    counts[ord("\n")] = 0
+
+    return len(headers), int(sequence_lengths.sum()), counts
+
+
+def _collect_statistics(filename, threads=1):
+    nreads, nnts, qualities = validate_fastq_file(filename, threads)
+
+    return nreads, nnts, qualities.offsets()
+
+
+def _get_statistics(filename, threads=1):
+    # Results for files validated by previous runs are re-used, if available
+    nreads, nnts, offsets = validationcache.cached(
+        "fastq", filename, functools.partial(_collect_statistics, threads=threads)
+    )
+
+    return nreads, nnts, offsets
+
+
+def _try_get_statistics(args):
+    try:
+        return _get_statistics(*args)
+    except Exception as error:
+        return error
+
+
+def _validate_fastq_files(filenames, threads):
+    if threads <= 1 or len(filenames) <= 1:
+        # Remaining threads are used to decompress the file being validated
+        for filename in filenames:
+            yield _get_statistics(filename, max(1, threads))
+    else:
+        processes = min(threads, len(filenames))
+        # Threads not used to validate files are used to decompress them
+        args = [(filename, threads // processes) for filename in filenames]
+        with multiprocessing.Pool(processes) as pool:
+            results = list(pool.imap(_try_get_statistics, args))
+
+            # Workers are shut down gracefully, since Pool.terminate() may hang if a
+            # SIGTERM handler has been installed (see paleomix.atomiccmd.command)
+            pool.close()
+            pool.join()
+
+        # Errors are raised in the order that files were specified
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+            yield result
+
+
 def parse_args(argv):
     parser = ArgumentParser("paleomix :validate_fastq")
     parser.add_argument("files", nargs="+")
     parser.add_argument("--collapsed", action="store_true")
     parser.add_argument("--no-empty", action="store_true")
     parser.add_argument("--offset", type=int, choices=(33, 64), default=33)
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="Number of threads used to validate and decompress files; multiple "
+        "files are validated in parallel",
+    )
 
     return parser.parse_args(argv)
 
@@ -43,15 +217,10 @@ def main(argv):
     seq_retained_nts = 0
     seq_retained_reads = 0
 
-    for filename in args.files:
-        qualities = FASTQualities()
-        for record in FASTQ.from_file(filename):
-            qualities.update(record)
-
-            seq_retained_reads += 1
-            seq_retained_nts += len(record.sequence)
+    for (nreads, nnts, offsets) in _validate_fastq_files(args.files, args.threads):
+        seq_retained_reads += nreads
+        seq_retained_nts += nnts
 
-        offsets = qualities.offsets()
         if offsets == FASTQualities.BOTH:
             print(
                 "FASTQ file(s) contains quality scores with both quality offsets (33 "
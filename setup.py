@@ -69,6 +69,7 @@ setup(
     install_requires=[
         "coloredlogs>=10.0",
         "configargparse>=0.13.0",
+        "numpy>=1.13.0",
         "pysam>=0.10.0",
         "ruamel.yaml>=0.16.0",
         "setproctitle>=1.1.0",
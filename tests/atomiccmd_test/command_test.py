@@ -22,6 +22,9 @@
 #
 import os
 import signal
+import sys
+import time
+import types
 import weakref
 
 from unittest.mock import call, Mock, patch
@@ -30,6 +33,8 @@ import pytest
 
 import paleomix.atomiccmd.command
 import paleomix.common.fileutils as fileutils
+import paleomix.common.procs as procs
+import paleomix.main
 
 from paleomix.common.versions import RequirementObj
 from paleomix.atomiccmd.command import AtomicCmd, CmdError
@@ -334,6 +339,37 @@ def test_atomiccmd__exec__invalid(obj):
         AtomicCmd("true", EXEC_FOO=obj)
 
 
+###############################################################################
+###############################################################################
+# Memory
+
+
+def test_atomiccmd__memory__default():
+    assert AtomicCmd("true").memory == 0
+
+
+def test_atomiccmd__memory__explicit():
+    assert AtomicCmd(("java", "-Xmx4g"), memory=1024).memory == 1024
+
+
+@pytest.mark.parametrize(
+    "call, expected",
+    (
+        (("java", "-Xmx4g", "-jar", "picard.jar"), 4 * 2 ** 30),
+        (("java", "-Xmx4g", "-Xmx512m", "-jar", "picard.jar"), 512 * 2 ** 20),
+        (("java", "-jar", "picard.jar"), 0),
+        (("java", "-Xmx%(TEMP_DIR)s"), 0),
+        (("samtools", "sort"), 768 * 2 ** 20),
+        (("samtools", "sort", "-m", "1G"), 2 ** 30),
+        (("samtools", "sort", "-m2G", "-@", "4"), 8 * 2 ** 30),
+        (("samtools", "sort", "-@4"), 4 * 768 * 2 ** 20),
+        (("samtools", "view", "-m", "1G"), 0),
+    ),
+)
+def test_atomiccmd__memory__estimated(call, expected):
+    assert AtomicCmd(call).memory == expected
+
+
 ###############################################################################
 ###############################################################################
 # AUX
@@ -511,6 +547,64 @@ def test_atomiccmd__wait(tmp_path, call, after):
     assert cmd.wait() == after
 
 
+###############################################################################
+###############################################################################
+# Resource usage
+
+
+def test_atomiccmd__resource_usage(tmp_path):
+    cmd = AtomicCmd(
+        ("head", "-c", "100000", "%(IN_FILE)s"),
+        IN_FILE="/dev/zero",
+        OUT_STDOUT="output.txt",
+    )
+    assert cmd.resource_usage() == []
+    cmd.run(tmp_path)
+    assert cmd.resource_usage() == []
+    assert cmd.join() == [0]
+
+    (usage,) = cmd.resource_usage()
+    assert usage["command"] == "head"
+    assert usage["wall_time"] >= 0
+    assert usage["user_time"] >= 0
+    assert usage["system_time"] >= 0
+    assert usage["max_rss"] > 0
+    if os.path.exists("/proc/self/io"):
+        assert usage["bytes_read"] >= 100000
+        assert usage["bytes_written"] == 100000
+
+
+def test_atomiccmd__resource_usage__already_reaped(tmp_path):
+    cmd = AtomicCmd("true")
+    cmd.run(tmp_path)
+    while cmd._proc.poll() is None:
+        pass
+
+    assert cmd.join() == [0]
+    (usage,) = cmd.resource_usage()
+    assert usage["command"] == "true"
+    assert usage["max_rss"] is None
+
+
+@pytest.mark.parametrize(
+    "call, expected",
+    (
+        (("samtools", "sort", "-o", "out.bam"), "samtools sort"),
+        (("/usr/bin/gzip", "-c", "%(IN_FILE)s"), "gzip"),
+        (
+            ("java", "-Xmx4g", "-jar", "/opt/picard.jar", "MarkDuplicates"),
+            "picard.jar MarkDuplicates",
+        ),
+        (
+            (sys.executable, paleomix.main.__file__, "cleanup", "--x"),
+            "paleomix cleanup",
+        ),
+    ),
+)
+def test_atomiccmd__resource_usage__command_name(call, expected):
+    assert paleomix.atomiccmd.command._command_name(list(call)) == expected
+
+
 ###############################################################################
 ###############################################################################
 # Terminate
@@ -826,3 +920,126 @@ def test_atomiccmd__cleanup_sigterm__dead_weakrefs():
                 paleomix.atomiccmd.command._cleanup_children(signal.SIGTERM, None)
 
                 assert patches.mock_calls == [call.exit(-signal.SIGTERM)]
+
+
+###############################################################################
+###############################################################################
+# PALEOMIX commands run in forked processes
+
+
+def _paleomix_command(*args):
+    return (sys.executable, paleomix.main.__file__, "test_command") + args
+
+
+def _test_command_main(argv):
+    if argv[0] == "cat":
+        sys.stdout.write(sys.stdin.read())
+    elif argv[0] == "cwd":
+        sys.stdout.write(os.getcwd())
+    elif argv[0] == "write":
+        with open(argv[1], "w") as handle:
+            handle.write("written!")
+    elif argv[0] == "stderr":
+        sys.stderr.write("STDERR!")
+    elif argv[0] == "exit":
+        sys.exit(int(argv[1]))
+    elif argv[0] == "raise":
+        raise RuntimeError("failed!")
+    elif argv[0] == "sleep":
+        time.sleep(10)
+
+    return 0
+
+
+@pytest.fixture
+def test_command(monkeypatch):
+    def _import_command(name):
+        if name == "test_command":
+            return types.SimpleNamespace(main=_test_command_main)
+
+    monkeypatch.setattr(paleomix.main, "import_command", _import_command)
+
+
+def test_atomiccmd__paleomix__forked(tmp_path, test_command):
+    cmd = AtomicCmd(_paleomix_command("cat"), IN_STDIN=AtomicCmd.DEVNULL)
+    cmd.run(tmp_path)
+    assert isinstance(cmd._proc, procs._ForkedProc)
+    assert cmd.join() == [0]
+
+
+def test_atomiccmd__paleomix__disabled(tmp_path, test_command):
+    paleomix.atomiccmd.command.set_fork_paleomix_commands(False)
+    try:
+        cmd = AtomicCmd(_paleomix_command("cat"))
+        cmd.run(tmp_path)
+        assert not isinstance(cmd._proc, procs._ForkedProc)
+        # The test command does not exist in a new interpreter
+        assert cmd.join() == [1]
+    finally:
+        paleomix.atomiccmd.command.set_fork_paleomix_commands(True)
+
+
+def test_atomiccmd__paleomix__stdin_and_stdout(tmp_path, test_command):
+    (tmp_path / "input.txt").write_text("foo\nbar\n")
+
+    cmd = AtomicCmd(
+        _paleomix_command("cat"),
+        IN_STDIN=str(tmp_path / "input.txt"),
+        OUT_STDOUT="output.txt",
+    )
+    cmd.run(tmp_path)
+    assert cmd.join() == [0]
+    assert (tmp_path / "output.txt").read_text() == "foo\nbar\n"
+
+
+def test_atomiccmd__paleomix__stderr(tmp_path, test_command):
+    cmd = AtomicCmd(_paleomix_command("stderr"), OUT_STDERR="stderr.txt")
+    cmd.run(tmp_path)
+    assert cmd.join() == [0]
+    assert (tmp_path / "stderr.txt").read_text() == "STDERR!"
+
+
+def test_atomiccmd__paleomix__piping(tmp_path, test_command):
+    cmd_1 = AtomicCmd(["echo", "-n", "#@!$^"], OUT_STDOUT=AtomicCmd.PIPE)
+    cmd_2 = AtomicCmd(_paleomix_command("cat"), IN_STDIN=cmd_1, OUT_STDOUT=cmd_1.PIPE)
+    cmd_3 = AtomicCmd(["cat"], IN_STDIN=cmd_2, OUT_STDOUT="piped.txt")
+    cmd_1.run(tmp_path)
+    cmd_2.run(tmp_path)
+    cmd_3.run(tmp_path)
+    assert cmd_1.join() == [0]
+    assert cmd_2.join() == [0]
+    assert cmd_3.join() == [0]
+    assert (tmp_path / "piped.txt").read_text() == "#@!$^"
+
+
+@pytest.mark.parametrize("set_cwd", (True, False))
+def test_atomiccmd__paleomix__set_cwd(tmp_path, test_command, set_cwd):
+    cwd = os.getcwd()
+    cmd = AtomicCmd(_paleomix_command("cwd"), OUT_STDOUT="result.txt", set_cwd=set_cwd)
+    cmd.run(tmp_path)
+    assert cmd.join() == [0]
+    assert cwd == os.getcwd()
+
+    expected = str(tmp_path) if set_cwd else cwd
+    assert os.path.samefile(expected, (tmp_path / "result.txt").read_text())
+
+
+def test_atomiccmd__paleomix__temp_files(tmp_path, test_command):
+    cmd = AtomicCmd(_paleomix_command("write", "%(OUT_FILE)s"), OUT_FILE="out.txt")
+    cmd.run(tmp_path)
+    assert cmd.join() == [0]
+    assert (tmp_path / "out.txt").read_text() == "written!"
+
+
+@pytest.mark.parametrize("args, expected", ((("exit", "3"), 3), (("raise",), 1)))
+def test_atomiccmd__paleomix__errors(tmp_path, test_command, args, expected):
+    cmd = AtomicCmd(_paleomix_command(*args), OUT_STDERR="stderr.txt")
+    cmd.run(tmp_path)
+    assert cmd.join() == [expected]
+
+
+def test_atomiccmd__paleomix__terminate(tmp_path, test_command):
+    cmd = AtomicCmd(_paleomix_command("sleep"))
+    cmd.run(tmp_path)
+    cmd.terminate()
+    assert cmd.join() == ["SIGTERM"]
@@ -20,6 +20,8 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 #
+import time
+
 from unittest.mock import call, Mock
 
 import pytest
@@ -81,6 +83,7 @@ _NO_CLOBBERING_KWARGS = (
     ({"OUT_A": "/foo/out.txt"}, {"TEMP_OUT_STDERR": "out.txt"}),
 )
 
+
 # Ensure that commands in a set doesn't clobber eachothers OUT files
 @pytest.mark.parametrize("cls", _SET_CLASSES)
 @pytest.mark.parametrize("kwargs_1, kwargs_2", _NO_CLOBBERING_KWARGS)
@@ -166,6 +169,18 @@ def test_atomicsets__terminate(cls):
     ]
 
 
+@pytest.mark.parametrize("cls", _SET_CLASSES)
+def test_atomicsets__resource_usage(cls, tmp_path):
+    cmds = cls([AtomicCmd(["true"]), AtomicCmd(["ls"])])
+    assert cmds.resource_usage() == []
+
+    cmds.run(tmp_path)
+    assert cmds.join() == [0, 0]
+
+    usage = cmds.resource_usage()
+    assert [record["command"] for record in usage] == ["true", "ls"]
+
+
 @pytest.mark.parametrize("cls", _SET_CLASSES)
 def test_atomicsets__str__(cls):
     cmds = cls([AtomicCmd("ls")])
@@ -292,6 +307,31 @@ def test_parallel_commands__join_failure_3(tmp_path):
     assert cmds.join() == ["SIGTERM", "SIGTERM", 1]
 
 
+def test_parallel_commands__join_failure_is_immediate(tmp_path):
+    cmds = ParallelCmds(
+        [
+            AtomicCmd(("sleep", 10)),
+            AtomicCmd(("sh", "-c", "sleep 0.8; exit 1")),
+        ]
+    )
+    start_time = time.time()
+    cmds.run(str(tmp_path))
+    assert cmds.join() == ["SIGTERM", 1]
+    # Sleep-polling with back-off would not detect the failure before 1.55s
+    assert time.time() - start_time < 1.3
+
+
+def test_parallel_commands__join_nested(tmp_path):
+    cmds = ParallelCmds(
+        [
+            ParallelCmds([AtomicCmd(("sleep", "0.2")), AtomicCmd("true")]),
+            AtomicCmd(("sleep", "0.1")),
+        ]
+    )
+    cmds.run(str(tmp_path))
+    assert cmds.join() == [0, 0, 0]
+
+
 def test_parallel_commands__reject_sequential():
     command = AtomicCmd(["ls"])
     seqcmd = SequentialCmds([command])
@@ -315,6 +355,13 @@ def test_parallel_commands__reject_empty_commandset():
         ParallelCmds([])
 
 
+def test_parallel_commands__memory():
+    cmd_1 = AtomicCmd("true", memory=1024)
+    cmd_2 = AtomicCmd("false", memory=2048)
+
+    assert ParallelCmds([cmd_1, cmd_2]).memory == 3072
+
+
 ###############################################################################
 ###############################################################################
 # Sequential commands
@@ -401,3 +448,10 @@ def test_sequential_commands__reject_noncommand():
 def test_sequential_commands__reject_empty_commandset():
     with pytest.raises(CmdError):
         SequentialCmds([])
+
+
+def test_sequential_commands__memory():
+    cmd_1 = AtomicCmd("true", memory=1024)
+    cmd_2 = AtomicCmd("false", memory=2048)
+
+    assert SequentialCmds([cmd_1, cmd_2]).memory == 2048
@@ -31,6 +31,7 @@ from pathlib import Path
 from typing import Any
 from unittest.mock import ANY, call, DEFAULT, Mock, patch
 
+import pysam
 import pytest
 
 from paleomix.common.testing import SetWorkingDirectory
@@ -51,6 +52,7 @@ from paleomix.common.fileutils import (
     describe_files,
     describe_paired_files,
     fspath,
+    _CommandReader,
 )
 
 
@@ -635,6 +637,126 @@ def test_open_ro__close_handle_on_error() -> None:
     )
 
 
+def _write_bgzf(filename, data):
+    with pysam.BGZFile(fspath(filename), "wb") as handle:
+        handle.write(data)
+
+
+def _bgzf_text(nlines=50000):
+    return "".join("line %i: %s\n" % (idx, "ACGT" * (idx % 7)) for idx in range(nlines))
+
+
+@pytest.mark.parametrize("threads", (1, 2, 4))
+def test_open_ro__bgzf(tmp_path, threads) -> None:
+    filename = tmp_path / "file.txt.gz"
+    text = _bgzf_text()
+    _write_bgzf(filename, text.encode("utf-8"))
+
+    with open_ro(filename, threads=threads) as handle:
+        assert handle.read() == text
+
+    with open_ro(filename, threads=threads) as handle:
+        assert list(handle) == text.splitlines(True)
+
+    with open_ro(filename, "rb", threads=threads) as handle:
+        assert handle.read() == text.encode("utf-8")
+
+
+def test_open_ro__bgzf__single_thread_by_default(tmp_path) -> None:
+    filename = tmp_path / "file.txt.gz"
+    text = _bgzf_text()
+    _write_bgzf(filename, text.encode("utf-8"))
+
+    with patch("paleomix.common.fileutils.BGZFReader") as mock:
+        with open_ro(filename) as handle:
+            assert handle.read() == text
+
+    assert not mock.called
+
+
+def test_open_ro__bgzf_with_gzip_members(tmp_path) -> None:
+    filename = tmp_path / "file.txt.gz"
+    text = _bgzf_text()
+    _write_bgzf(filename, text.encode("utf-8"))
+
+    data = filename.read_bytes()
+    filename.write_bytes(data + gzip.compress(b"gzip member\n") + data)
+
+    with open_ro(filename, threads=2) as handle:
+        assert handle.read() == text + "gzip member\n" + text
+
+
+@pytest.mark.parametrize("threads", (1, 2))
+def test_open_ro__bgzf_truncated(tmp_path, threads) -> None:
+    filename = tmp_path / "file.txt.gz"
+    _write_bgzf(filename, _bgzf_text().encode("utf-8"))
+    filename.write_bytes(filename.read_bytes()[:-100])
+
+    with pytest.raises(EOFError):
+        with open_ro(filename, threads=threads) as handle:
+            handle.read()
+
+
+@pytest.mark.parametrize("threads", (1, 2))
+def test_open_ro__bgzf_corrupt(tmp_path, threads) -> None:
+    filename = tmp_path / "file.txt.gz"
+    _write_bgzf(filename, b"ACGT" * 10000)
+    data = bytearray(filename.read_bytes())
+    # Corrupt the CRC32 of the first block, which precedes the uncompressed size
+    block_size = int.from_bytes(data[16:18], "little") + 1
+    data[block_size - 8] ^= 0xFF
+    filename.write_bytes(bytes(data))
+
+    with pytest.raises(OSError, match="CRC check failed"):
+        with open_ro(filename, threads=threads) as handle:
+            handle.read()
+
+
+def test_open_ro__gzip_with_command(tmp_path) -> None:
+    filename = tmp_path / "file.txt.gz"
+    filename.write_bytes(gzip.compress(_FASTA_BYTES))
+
+    # The 'gzip' command is used in place of 'pigz', since they share arguments
+    with patch("paleomix.common.fileutils._PARALLEL_GZIP", "gzip"):
+        with open_ro(filename, threads=1) as handle:
+            assert handle.read() == _FASTA_TEXT
+
+        with open_ro(filename, threads=2) as handle:
+            assert handle.read() == _FASTA_TEXT
+
+        with open_ro(filename, "rb", threads=2) as handle:
+            assert handle.read() == _FASTA_BYTES
+
+
+def test_open_ro__gzip_with_command__error(tmp_path) -> None:
+    filename = tmp_path / "file.txt.gz"
+    filename.write_bytes(gzip.compress(_FASTA_BYTES * 100)[:-20])
+
+    with patch("paleomix.common.fileutils._PARALLEL_GZIP", "gzip"):
+        with pytest.raises(OSError, match="Error running 'gzip -dc"):
+            with open_ro(filename, threads=2) as handle:
+                handle.read()
+
+
+def test_open_ro__gzip_with_command__default(tmp_path) -> None:
+    filename = tmp_path / "file.txt.gz"
+    filename.write_bytes(gzip.compress(_FASTA_BYTES))
+
+    with patch("paleomix.common.fileutils._CommandReader") as mock:
+        with open_ro(filename) as handle:
+            assert handle.read() == _FASTA_TEXT
+
+    assert not mock.called
+
+
+def test_command_reader__large_stderr() -> None:
+    # Output to STDERR exceeding the capacity of a pipe must not block the command
+    command = ["sh", "-c", "head -c 1000000 /dev/zero >&2; echo foo"]
+
+    with _CommandReader(command) as handle:
+        assert handle.read() == b"foo\n"
+
+
 ###############################################################################
 ###############################################################################
 # Tests for 'try_remove'
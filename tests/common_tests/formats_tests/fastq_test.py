@@ -265,6 +265,20 @@ def test_fastqualities__phred_both():
     assert quals.offsets() == FASTQualities.BOTH
 
 
+@pytest.mark.parametrize("read", (_33_READ, _64_READ, _AMBIGIOUS_read))
+def test_fastqualities__update_counts(read):
+    counts = [0] * 256
+    for char in read.qualities:
+        counts[ord(char)] += 1
+
+    expected = FASTQualities()
+    expected.update(read)
+    quals = FASTQualities()
+    quals.update_counts(counts)
+
+    assert quals.offsets() == expected.offsets()
+
+
 ###############################################################################
 ###############################################################################
 
@@ -24,6 +24,7 @@ import bz2
 import copy
 import gzip
 import io
+import random
 
 from unittest.mock import patch
 
@@ -31,7 +32,7 @@ import pytest
 
 from paleomix.common.fileutils import fspath
 from paleomix.common.formats.fasta import FASTA
-from paleomix.common.formats.msa import MSA, FASTAError, MSAError
+from paleomix.common.formats.msa import MSA, MSAMatrix, FASTAError, MSAError
 
 
 ###############################################################################
@@ -467,3 +468,141 @@ def test_msa_repr():
 
 def test_msa_repr__same_as_str():
     assert str(_JOIN_MSA_1) == repr(_JOIN_MSA_1)
+
+
+###############################################################################
+###############################################################################
+# Tests for MSAMatrix
+
+_MATRIX_NUCLEOTIDES = "ACGTNRYKMSWBDHVacgtnrykmswbdhv-"
+
+
+def _random_msa(rng, nseqs, length):
+    records = []
+    for idx in range(nseqs):
+        sequence = "".join(rng.choice(_MATRIX_NUCLEOTIDES) for _ in range(length))
+        records.append(FASTA("seq%i" % (idx,), rng.choice((None, "meta")), sequence))
+
+    return MSA(records)
+
+
+def test_msa_matrix__lossless_conversion():
+    assert MSAMatrix.from_msa(_FILTER_MSA_1).to_msa() == _FILTER_MSA_1
+
+
+def test_msa_matrix__len_and_seqlen():
+    matrix = MSAMatrix.from_msa(_FILTER_MSA_1)
+
+    assert len(matrix) == 3
+    assert matrix.seqlen() == 10
+    assert matrix.names() == _FILTER_MSA_1.names()
+
+
+def test_msa_matrix__duplicate_names():
+    records = [FASTA("Foo", None, "ACGT"), FASTA("Foo", None, "GTCA")]
+    with pytest.raises(MSAError):
+        MSAMatrix.from_records(records)
+
+
+def test_msa_matrix__empty_msa():
+    with pytest.raises(MSAError):
+        MSAMatrix.from_records([])
+
+
+def test_msa_matrix__differing_lengths():
+    records = [FASTA("Foo", None, "ACGT"), FASTA("Bar", None, "GTC")]
+    with pytest.raises(MSAError):
+        MSAMatrix.from_records(records)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_msa_matrix__reduce(seed):
+    rng = random.Random(seed)
+    msa = _random_msa(rng, 3, 20)
+    # Add columns consisting entirely of uncalled bases
+    msa = MSA.join(msa, MSA(FASTA(name, None, "N-n") for name in msa.names()))
+
+    assert MSAMatrix.from_msa(msa).reduce().to_msa() == msa.reduce()
+
+
+def test_msa_matrix__reduce__only_empty_columns():
+    msa = MSA([FASTA("Name_A", None, "---Nn"), FASTA("Name_B", None, "Nn--N")])
+
+    assert MSAMatrix.from_msa(msa).reduce() is None
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_msa_matrix__filter_singletons(seed):
+    rng = random.Random(seed)
+    msa = _random_msa(rng, 4, 50)
+    filter_by = rng.sample(["seq1", "seq2", "seq3"], rng.randint(1, 3))
+
+    expected = msa.filter_singletons("seq0", filter_by)
+    result = MSAMatrix.from_msa(msa).filter_singletons("seq0", filter_by)
+
+    assert result.to_msa() == expected
+
+
+def test_msa_matrix__filter_singletons__filter_by_itself():
+    matrix = MSAMatrix.from_msa(_FILTER_MSA_1)
+    with pytest.raises(MSAError):
+        matrix.filter_singletons("Seq1", ["Seq1", "Seq2"])
+
+
+@pytest.mark.parametrize("split_by", ("123", "112", "1"))
+@pytest.mark.parametrize("length", (0, 2, 10))
+def test_msa_matrix__split(split_by, length):
+    msa = _random_msa(random.Random(length), 3, length)
+
+    expected = msa.split(split_by)
+    result = MSAMatrix.from_msa(msa).split(split_by)
+
+    assert {key: value.to_msa() for (key, value) in result.items()} == expected
+
+
+def test_msa_matrix__split__no_split_by():
+    with pytest.raises(TypeError):
+        MSAMatrix.from_msa(_FILTER_MSA_1).split(split_by="")
+
+
+def test_msa_matrix__join():
+    matrices = [MSAMatrix.from_msa(msa) for msa in (_JOIN_MSA_1, _JOIN_MSA_2)]
+
+    assert MSAMatrix.join(*matrices).to_msa() == MSA.join(_JOIN_MSA_1, _JOIN_MSA_2)
+
+
+def test_msa_matrix__join__missing_names():
+    matrix_1 = MSAMatrix.from_msa(_JOIN_MSA_1)
+    matrix_2 = MSAMatrix.from_msa(_JOIN_MSA_2).exclude(["nc"])
+
+    with pytest.raises(MSAError):
+        MSAMatrix.join(matrix_1, matrix_2)
+
+
+def test_msa_matrix__exclude_and_select():
+    matrix = MSAMatrix.from_msa(_JOIN_MSA_1)
+
+    assert matrix.exclude(["nc"]).to_msa() == _JOIN_MSA_1.exclude(["nc"])
+    assert matrix.select(["nc"]).to_msa() == _JOIN_MSA_1.select(["nc"])
+
+    with pytest.raises(KeyError):
+        matrix.exclude(["foo"])
+    with pytest.raises(ValueError):
+        matrix.select([])
+
+
+def test_msa_matrix__from_file_and_to_file(tmp_path):
+    msa = _random_msa(random.Random(12345), 5, 150)
+    filename = tmp_path / "test.fasta"
+    with filename.open("w") as handle:
+        msa.to_file(handle)
+
+    matrix = MSAMatrix.from_file(fspath(filename))
+    assert matrix.to_msa() == msa
+
+    expected = io.StringIO()
+    msa.to_file(expected)
+    result = io.StringIO()
+    matrix.to_file(result)
+
+    assert result.getvalue() == expected.getvalue()
@@ -20,11 +20,15 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 #
+from types import SimpleNamespace
 from unittest.mock import patch
 
+import pytest
+
 from paleomix.common.formats.fasta import FASTA
 from paleomix.common.formats.msa import MSA
 from paleomix.common.formats.phylip import interleaved_phy
+from paleomix.nodes.phylip import PHYLIPBootstrapNode
 
 _MSA_SHORT_SEQUENCES = MSA(
     [FASTA("seq1", None, "ACGTTGATAACCAGG"), FASTA("seq2", None, "TGCAGAGTACGACGT")]
@@ -167,3 +171,125 @@ def test_interleaved_phy__different_lengths():
         interleaved_phy(_MSA_MEDIUM_NAMES)
 
     assert len(mock.mock_calls) == 1
+
+
+###############################################################################
+# Tests of 'PHYLIPBootstrapNode'
+
+
+@pytest.fixture
+def bootstrap_input(tmp_path):
+    alignment = tmp_path / "input.phy"
+    alignment.write_text("2 9\n\nseq1 ABCDEFGHI\nseq2 abcdefghi\n")
+    partitions = tmp_path / "input.partitions"
+    partitions.write_text("DNA, p1 = 1-4\nDNA, p2 = 5-8\nDNA, p3 = 9\n")
+    (tmp_path / "temp").mkdir()
+
+    return str(alignment), str(partitions)
+
+
+def _run_bootstrap(tmp_path, bootstrap_input, outputs, seed=1234):
+    if isinstance(outputs, str):
+        filenames = str(tmp_path / outputs)
+    else:
+        filenames = [str(tmp_path / filename) for filename in outputs]
+
+    alignment, partitions = bootstrap_input
+    node = PHYLIPBootstrapNode(
+        input_alignment=alignment,
+        input_partition=partitions,
+        output_alignment=filenames,
+        seed=seed,
+    )
+    node.run(SimpleNamespace(temp_root=str(tmp_path / "temp")))
+
+    return node
+
+
+def _read_bootstrap(filename):
+    with open(filename) as handle:
+        header = handle.readline()
+        rows = dict(line.split() for line in handle)
+
+    return header, rows
+
+
+def test_bootstrap__same_seed_gives_identical_output(tmp_path, bootstrap_input):
+    outputs = ["rep_%i.phy" % (idx,) for idx in range(3)]
+    _run_bootstrap(tmp_path / "run_1", bootstrap_input, outputs)
+    _run_bootstrap(tmp_path / "run_2", bootstrap_input, outputs)
+
+    for filename in outputs:
+        run_1 = (tmp_path / "run_1" / filename).read_bytes()
+        run_2 = (tmp_path / "run_2" / filename).read_bytes()
+
+        assert run_1 == run_2
+
+
+def test_bootstrap__different_seed_gives_different_output(tmp_path, bootstrap_input):
+    outputs = ["rep_%i.phy" % (idx,) for idx in range(3)]
+    _run_bootstrap(tmp_path / "run_1", bootstrap_input, outputs, seed=1234)
+    _run_bootstrap(tmp_path / "run_2", bootstrap_input, outputs, seed=4321)
+
+    run_1 = [(tmp_path / "run_1" / filename).read_bytes() for filename in outputs]
+    run_2 = [(tmp_path / "run_2" / filename).read_bytes() for filename in outputs]
+
+    assert run_1 != run_2
+
+
+def test_bootstrap__columns_sampled_within_partitions(tmp_path, bootstrap_input):
+    outputs = ["rep_%i.phy" % (idx,) for idx in range(10)]
+    _run_bootstrap(tmp_path, bootstrap_input, outputs)
+
+    for filename in outputs:
+        header, rows = _read_bootstrap(str(tmp_path / filename))
+
+        assert header == "2 9\n"
+        assert sorted(rows) == ["seq1", "seq2"]
+        # Columns are kept intact across sequences
+        assert rows["seq2"] == rows["seq1"].lower()
+        assert set(rows["seq1"][:4]) <= set("ABCD")
+        assert set(rows["seq1"][4:8]) <= set("EFGH")
+
+
+def test_bootstrap__single_column_partition(tmp_path, bootstrap_input):
+    outputs = ["rep_%i.phy" % (idx,) for idx in range(10)]
+    _run_bootstrap(tmp_path, bootstrap_input, outputs)
+
+    for filename in outputs:
+        _, rows = _read_bootstrap(str(tmp_path / filename))
+
+        assert rows["seq1"][8] == "I"
+        assert rows["seq2"][8] == "i"
+
+
+def test_bootstrap__distinct_replicates(tmp_path, bootstrap_input):
+    outputs = ["rep_%i.phy" % (idx,) for idx in range(5)]
+    node = _run_bootstrap(tmp_path, bootstrap_input, outputs)
+
+    assert node.output_files == frozenset(str(tmp_path / name) for name in outputs)
+
+    replicates = set()
+    for filename in outputs:
+        replicates.add((tmp_path / filename).read_bytes())
+
+    assert len(replicates) == len(outputs)
+
+
+def test_bootstrap__single_output_filename(tmp_path, bootstrap_input):
+    node = _run_bootstrap(tmp_path, bootstrap_input, "rep.phy")
+
+    assert node.output_files == frozenset([str(tmp_path / "rep.phy")])
+
+    _, rows = _read_bootstrap(str(tmp_path / "rep.phy"))
+    assert sorted(rows) == ["seq1", "seq2"]
+    assert len(rows["seq1"]) == 9
+
+
+def test_bootstrap__no_outputs(bootstrap_input):
+    alignment, partitions = bootstrap_input
+
+    with pytest.raises(ValueError):
+        PHYLIPBootstrapNode(
+            input_alignment=alignment, input_partition=partitions, output_alignment=()
+        )
@@ -0,0 +1,161 @@
+import io
+import os
+import signal
+import time
+
+import pytest
+
+import paleomix.common.procs as procs
+
+
+@pytest.fixture(params=("pidfd", "threaded", "polling"))
+def wait_method(request, monkeypatch):
+    if request.param == "pidfd":
+        if not procs._PIDFD_SUPPORTED:
+            pytest.skip("pidfds not supported")
+    else:
+        monkeypatch.setattr(procs, "_PIDFD_SUPPORTED", False)
+        if request.param == "polling":
+            monkeypatch.delattr(os, "waitid")
+
+    return request.param
+
+
+def _cleanup(*processes):
+    for proc in processes:
+        if proc.poll() is None:
+            proc.terminate()
+        proc.wait()
+
+
+###############################################################################
+###############################################################################
+# fork_proc
+
+
+def _is_fd_open(fd):
+    try:
+        os.fstat(fd)
+    except OSError:
+        return 0
+
+    return 1
+
+
+def test_fork_proc__inherited_fds_are_closed():
+    read_fd, write_fd = os.pipe()
+    try:
+        proc = procs.fork_proc(("func",), _is_fd_open, write_fd)
+        assert proc.wait() == 0
+
+        # The parent still holds its own copy
+        assert _is_fd_open(write_fd)
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+def test_fork_proc__pipe_to_stdout():
+    proc = procs.fork_proc(("func",), _is_fd_open, 1, stdout=procs.PIPE)
+
+    assert proc.stdout.read() == b""
+    assert proc.wait() == 1
+    proc.stdout.close()
+
+
+###############################################################################
+###############################################################################
+# wait_any
+
+
+def test_wait_any__no_processes():
+    assert procs.wait_any([]) == []
+
+
+def test_wait_any__finished_process(wait_method):
+    proc_1 = procs.open_proc(("sleep", "10"))
+    proc_2 = procs.open_proc(("true",))
+
+    try:
+        assert procs.wait_any([proc_1, proc_2]) == [proc_2]
+        assert proc_1.returncode is None
+        # Processes are not reaped, except when falling back to polling
+        assert (proc_2.returncode is None) == (wait_method != "polling")
+    finally:
+        _cleanup(proc_1, proc_2)
+
+    assert proc_2.returncode == 0
+
+
+def test_wait_any__timeout(wait_method):
+    proc = procs.open_proc(("sleep", "10"))
+
+    try:
+        start_time = time.monotonic()
+        assert procs.wait_any([proc], timeout=0.1) == []
+        assert time.monotonic() - start_time < 5
+    finally:
+        _cleanup(proc)
+
+
+def test_wait_any__resource_usage_after_wait(wait_method):
+    proc = procs.open_proc(("true",))
+
+    assert procs.wait_any([proc]) == [proc]
+    assert procs.wait_proc(proc) is not None
+    assert proc.returncode == 0
+
+
+def test_wait_any__reaped_process(wait_method):
+    proc = procs.open_proc(("true",))
+    proc.wait()
+
+    assert procs.wait_any([proc]) == []
+
+
+def test_wait_any__forked_process(wait_method):
+    proc = procs.fork_proc(("func",), lambda args: 3, ())
+
+    assert procs.wait_any([proc]) == [proc]
+    assert proc.wait() == 3
+
+
+def test_wait_any__threaded_waiters_are_removed(monkeypatch):
+    monkeypatch.setattr(procs, "_PIDFD_SUPPORTED", False)
+    proc_1 = procs.open_proc(("sleep", "0.5"))
+    proc_2 = procs.open_proc(("true",))
+
+    try:
+        assert procs.wait_any([proc_1, proc_2]) == [proc_2]
+        # Processes are reaped without calling 'wait_any' again
+        assert procs.wait_proc(proc_1) is not None
+        assert procs.wait_proc(proc_2) is not None
+    finally:
+        _cleanup(proc_1, proc_2)
+
+    deadline = time.monotonic() + 5
+    while procs._WAITERS and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert not procs._WAITERS
+
+
+###############################################################################
+###############################################################################
+# join_procs
+
+
+def test_join_procs__success(wait_method):
+    processes = [procs.open_proc(("true",)), procs.open_proc(("sleep", "0.1"))]
+
+    assert procs.join_procs(processes, out=io.StringIO()) == [0, 0]
+
+
+def test_join_procs__failure_terminates_processes(wait_method):
+    processes = [procs.open_proc(("sleep", "10")), procs.open_proc(("false",))]
+    out = io.StringIO()
+
+    start_time = time.monotonic()
+    assert procs.join_procs(processes, out=out) == [-signal.SIGTERM, 1]
+    assert time.monotonic() - start_time < 5
+    assert "Errors occured during processing!" in out.getvalue()
@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2020 Mikkel Schubert <MikkelSch@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+import pytest
+
+from paleomix.common.system import format_memory_size, memory_size
+
+
+###############################################################################
+###############################################################################
+# memory_size
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    (
+        (0, 0),
+        (1024, 1024),
+        ("0", 0),
+        ("100", 100),
+        ("1k", 2 ** 10),
+        ("768M", 768 * 2 ** 20),
+        ("4g", 4 * 2 ** 30),
+        ("4GB", 4 * 2 ** 30),
+        ("2T", 2 * 2 ** 40),
+        (" 8G ", 8 * 2 ** 30),
+    ),
+)
+def test_memory_size(value, expected):
+    assert memory_size(value) == expected
+
+
+@pytest.mark.parametrize("value", ("", "G", "1.5G", "4X", "-1G", "four"))
+def test_memory_size__invalid_values(value):
+    with pytest.raises(ValueError):
+        memory_size(value)
+
+
+def test_memory_size__negative_value():
+    with pytest.raises(ValueError):
+        memory_size(-1)
+
+
+###############################################################################
+###############################################################################
+# format_memory_size
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    (
+        (None, None),
+        (0, 0),
+        (1000, "1000"),
+        (2 ** 10, "1K"),
+        (768 * 2 ** 20, "768M"),
+        (4 * 2 ** 30, "4G"),
+        (4 * 2 ** 30 + 1, "4096M"),
+        (2 ** 40, "1T"),
+    ),
+)
+def test_format_memory_size(value, expected):
+    assert format_memory_size(value) == expected
+
+
+@pytest.mark.parametrize("value", (0, 1000, 2 ** 10, 768 * 2 ** 20, 4 * 2 ** 30))
+def test_format_memory_size__round_trip(value):
+    assert memory_size(format_memory_size(value)) == value
@@ -0,0 +1,140 @@
+import multiprocessing
+import os
+
+from unittest.mock import Mock
+
+import pytest
+
+import paleomix.common.validationcache as validationcache
+
+
+@pytest.fixture
+def cache_filename(tmp_path, monkeypatch):
+    filename = str(tmp_path / "cache" / "validation.sqlite")
+    monkeypatch.setattr(validationcache, "_CACHE_FILENAME", filename)
+
+    return filename
+
+
+@pytest.fixture
+def input_file(tmp_path):
+    filename = tmp_path / "input.txt"
+    filename.write_text("ACGT\n")
+
+    return str(filename)
+
+
+def test_cached__disabled(monkeypatch, input_file):
+    monkeypatch.setattr(validationcache, "_CACHE_FILENAME", None)
+    func = Mock(return_value=[1, 2])
+
+    assert validationcache.cached("test", input_file, func) == [1, 2]
+    assert validationcache.cached("test", input_file, func) == [1, 2]
+    assert func.call_count == 2
+
+
+def test_cached__reuses_results(cache_filename, input_file):
+    func = Mock(return_value=[1, "MISSING"])
+
+    assert validationcache.cached("test", input_file, func) == [1, "MISSING"]
+    assert validationcache.cached("test", input_file, func) == [1, "MISSING"]
+    func.assert_called_once_with(input_file)
+    assert os.path.exists(cache_filename)
+
+
+def test_cached__results_per_kind(cache_filename, input_file):
+    assert validationcache.cached("kind_1", input_file, Mock(return_value=1)) == 1
+    assert validationcache.cached("kind_2", input_file, Mock(return_value=2)) == 2
+    assert validationcache.cached("kind_1", input_file, Mock(return_value=3)) == 1
+
+
+def test_cached__symlinks_share_results(cache_filename, input_file, tmp_path):
+    link = tmp_path / "link.txt"
+    link.symlink_to(input_file)
+    func = Mock(return_value=True)
+
+    assert validationcache.cached("test", input_file, func)
+    assert validationcache.cached("test", str(link), func)
+    assert func.call_count == 1
+
+
+@pytest.mark.parametrize("change", ("content", "size", "mtime"))
+def test_cached__changed_file(cache_filename, input_file, change):
+    assert validationcache.cached("test", input_file, Mock(return_value=1)) == 1
+
+    stats = os.stat(input_file)
+    if change == "content":
+        with open(input_file, "w") as handle:
+            handle.write("TGCA\n")
+        os.utime(input_file, ns=(stats.st_atime_ns, stats.st_mtime_ns))
+    elif change == "size":
+        with open(input_file, "a") as handle:
+            handle.write("A\n")
+        os.utime(input_file, ns=(stats.st_atime_ns, stats.st_mtime_ns))
+    else:
+        os.utime(input_file, ns=(stats.st_atime_ns, stats.st_mtime_ns + 10 ** 9))
+
+    assert validationcache.cached("test", input_file, Mock(return_value=2)) == 2
+
+
+def test_cached__large_file_checksum(cache_filename, tmp_path, monkeypatch):
+    monkeypatch.setattr(validationcache, "_CHECKSUM_BLOCK_SIZE", 4)
+    filename = tmp_path / "input.txt"
+    filename.write_text("AAAACCCCGGGG")
+    stats = os.stat(str(filename))
+
+    assert validationcache.cached("test", filename, Mock(return_value=1)) == 1
+
+    # Changes to the last block are detected
+    filename.write_text("AAAACCCCGGGT")
+    os.utime(str(filename), ns=(stats.st_atime_ns, stats.st_mtime_ns))
+    assert validationcache.cached("test", filename, Mock(return_value=2)) == 2
+
+
+def test_cached__errors_are_not_cached(cache_filename, input_file):
+    with pytest.raises(ValueError):
+        validationcache.cached("test", input_file, Mock(side_effect=ValueError))
+
+    assert validationcache.cached("test", input_file, Mock(return_value=1)) == 1
+
+
+def test_cached__unusable_cache(tmp_path, monkeypatch, input_file):
+    filename = tmp_path / "cache.sqlite"
+    filename.write_text("this is not a database")
+    monkeypatch.setattr(validationcache, "_CACHE_FILENAME", str(filename))
+    func = Mock(return_value=1)
+
+    assert validationcache.cached("test", input_file, func) == 1
+    assert validationcache.cached("test", input_file, func) == 1
+    assert func.call_count == 2
+
+
+def _cached_in_process(args):
+    cache_filename, filename = args
+    validationcache.set_cache_filename(cache_filename)
+
+    return validationcache.cached("test", filename, os.path.basename)
+
+
+def test_cached__concurrent_processes(cache_filename, tmp_path):
+    filenames = []
+    for idx in range(20):
+        filename = tmp_path / ("input_%i.txt" % (idx,))
+        filename.write_text("ACGT" * idx)
+        filenames.append(str(filename))
+
+    args = [(cache_filename, filename) for filename in filenames * 2]
+    with multiprocessing.Pool(4) as pool:
+        results = pool.map(_cached_in_process, args)
+        pool.close()
+        pool.join()
+
+    expected = [os.path.basename(filename) for filename in filenames * 2]
+    assert results == expected
+
+    func = Mock(return_value=None)
+    for filename in filenames:
+        assert validationcache.cached("test", filename, func) == os.path.basename(
+            filename
+        )
+    assert not func.called
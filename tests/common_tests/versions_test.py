@@ -784,3 +784,75 @@ def test_requirement_highest_priority_retained():
     obj2 = versions.Requirement("echo", "", versions.LT(1), priority=0)
     assert obj1 is obj2
     assert obj2.priority == 5
+
+
+###############################################################################
+###############################################################################
+# Persistent cache
+
+
+@pytest.fixture
+def version_cache(tmp_path, monkeypatch):
+    filename = tmp_path / "cache" / "versions.json"
+    monkeypatch.setattr(versions, "_CALL_CACHE", {})
+    versions.set_cache_filename(str(filename))
+    yield filename
+    versions.set_cache_filename(None)
+
+
+def _new_script(tmp_path, version):
+    filename = tmp_path / "script.py"
+    filename.write_text("print(%r)\n" % (version,))
+
+    return (sys.executable, str(filename))
+
+
+def _new_requirement(call, checks=versions.Any()):
+    return versions.RequirementObj(call=call, search=r"v(\d+)\.(\d+)", checks=checks)
+
+
+def test_version_cache__met_requirement_is_cached(version_cache, monkeypatch):
+    call = _echo_version("v1.2\n")
+    _new_requirement(call)()
+    assert version_cache.exists()
+
+    monkeypatch.setattr(versions, "_CALL_CACHE", {})
+    monkeypatch.setattr(versions, "_run", pytest.fail)
+    versions.set_cache_filename(str(version_cache))
+
+    obj = _new_requirement(call)
+    obj()
+    assert obj.version == (1, 2)
+
+
+def test_version_cache__unmet_requirement_is_not_cached(version_cache):
+    obj = _new_requirement(_echo_version("v1.2\n"), checks=versions.GE(2, 0))
+    with pytest.raises(versions.VersionRequirementError):
+        obj()
+
+    assert not version_cache.exists()
+
+
+def test_version_cache__function_calls_not_cached(version_cache):
+    _new_requirement(lambda: "v1.2")()
+    assert not version_cache.exists()
+
+
+def test_version_cache__changed_files_not_used(version_cache, tmp_path, monkeypatch):
+    _new_requirement(_new_script(tmp_path, "v1.2"))()
+
+    monkeypatch.setattr(versions, "_CALL_CACHE", {})
+    versions.set_cache_filename(str(version_cache))
+
+    obj = _new_requirement(_new_script(tmp_path, "v2.10"))
+    obj()
+    assert obj.version == (2, 10)
+
+
+def test_version_cache__invalid_cache_file(version_cache):
+    version_cache.parent.mkdir()
+    version_cache.write_text("not JSON")
+
+    obj = _new_requirement(_echo_version("v1.2\n"))
+    obj()
+    assert obj.version == (1, 2)
@@ -0,0 +1,179 @@
+import os
+
+import pytest
+
+import paleomix.common.versions as versions
+
+from paleomix.graphcache import GraphCache
+from paleomix.node import Node
+
+
+_REQUIREMENT = versions.Requirement(
+    call=("true",), search=r"(\d+)", checks=versions.Any(), name="test"
+)
+
+
+@pytest.fixture
+def makefile(tmp_path):
+    filename = tmp_path / "makefile.yaml"
+    filename.write_text("Project: foo\n")
+
+    return str(filename)
+
+
+@pytest.fixture
+def input_file(tmp_path):
+    (tmp_path / "data").mkdir()
+    filename = tmp_path / "data" / "input.txt"
+    filename.write_text("ACGT\n")
+
+    return str(filename)
+
+
+def _new_nodes(tmp_path, input_file):
+    node_1 = Node(
+        description="node_1",
+        input_files=[input_file],
+        output_files=[str(tmp_path / "output_1.txt")],
+        requirements=[_REQUIREMENT],
+    )
+    node_2 = Node(
+        description="node_2",
+        input_files=[str(tmp_path / "output_1.txt")],
+        output_files=[str(tmp_path / "output_2.txt")],
+        dependencies=[node_1],
+    )
+
+    return [node_2]
+
+
+def _new_cache(tmp_path, makefile, options=None, folders=()):
+    filename = str(tmp_path / "cache" / "graph.pickle")
+    if options is None:
+        options = {"destination": str(tmp_path)}
+
+    return GraphCache(filename, [makefile], options, folders)
+
+
+def _describe(nodes):
+    result = []
+    for node in nodes:
+        result.append(
+            (
+                str(node),
+                sorted(node.input_files),
+                sorted(node.output_files),
+                sorted(req.name for req in node.requirements),
+                _describe(node.dependencies),
+            )
+        )
+
+    return sorted(result)
+
+
+def test_graphcache__empty(tmp_path, makefile):
+    assert _new_cache(tmp_path, makefile).load() is None
+
+
+def test_graphcache__save_and_load(tmp_path, makefile, input_file):
+    nodes = _new_nodes(tmp_path, input_file)
+    _new_cache(tmp_path, makefile).save(nodes)
+
+    cached_nodes = _new_cache(tmp_path, makefile).load()
+    assert cached_nodes is not None
+    assert _describe(cached_nodes) == _describe(nodes)
+
+
+def test_graphcache__long_chain(tmp_path, makefile, input_file):
+    nodes = [Node(description="node_0", input_files=[input_file])]
+    for idx in range(1, 5000):
+        nodes = [Node(description="node_%i" % (idx,), dependencies=nodes)]
+
+    _new_cache(tmp_path, makefile).save(nodes)
+    (node,) = _new_cache(tmp_path, makefile).load()
+
+    depth = 1
+    while node.dependencies:
+        (node,) = node.dependencies
+        depth += 1
+
+    assert depth == 5000
+    assert str(node) == "node_0"
+
+
+def test_graphcache__makefile_changed(tmp_path, makefile, input_file):
+    _new_cache(tmp_path, makefile).save(_new_nodes(tmp_path, input_file))
+
+    with open(makefile, "a") as handle:
+        handle.write("Options: bar\n")
+
+    assert _new_cache(tmp_path, makefile).load() is None
+
+
+def test_graphcache__makefile_missing(tmp_path, input_file):
+    makefile = str(tmp_path / "makefile.yaml")
+    cache = _new_cache(tmp_path, makefile)
+    cache.save(_new_nodes(tmp_path, input_file))
+
+    assert not os.path.exists(cache.filename)
+    assert cache.load() is None
+
+
+def test_graphcache__options_changed(tmp_path, makefile, input_file):
+    options = {"destination": str(tmp_path), "max_memory": 1}
+    _new_cache(tmp_path, makefile, options).save(_new_nodes(tmp_path, input_file))
+
+    # Options that only affect how the pipeline is run are ignored
+    options["max_memory"] = 2
+    assert _new_cache(tmp_path, makefile, options).load() is not None
+
+    options["destination"] = str(tmp_path / "other")
+    assert _new_cache(tmp_path, makefile, options).load() is None
+
+
+def test_graphcache__input_file_changed(tmp_path, makefile, input_file):
+    _new_cache(tmp_path, makefile).save(_new_nodes(tmp_path, input_file))
+
+    with open(input_file, "a") as handle:
+        handle.write("TGCA\n")
+
+    assert _new_cache(tmp_path, makefile).load() is None
+
+
+def test_graphcache__output_file_changed(tmp_path, makefile, input_file):
+    _new_cache(tmp_path, makefile).save(_new_nodes(tmp_path, input_file))
+
+    (tmp_path / "output_1.txt").write_text("ACGT\n")
+
+    assert _new_cache(tmp_path, makefile).load() is not None
+
+
+def test_graphcache__new_file_in_input_folder(tmp_path, makefile, input_file):
+    _new_cache(tmp_path, makefile).save(_new_nodes(tmp_path, input_file))
+
+    (tmp_path / "data" / "input_2.txt").touch()
+
+    assert _new_cache(tmp_path, makefile).load() is None
+
+
+def test_graphcache__file_in_folder_changed(tmp_path, makefile, input_file):
+    folder = tmp_path / "regions"
+    folder.mkdir()
+    (folder / "regions.bed").write_text("chr1\t0\t100\n")
+
+    nodes = _new_nodes(tmp_path, input_file)
+    _new_cache(tmp_path, makefile, folders=[str(folder)]).save(nodes)
+    assert _new_cache(tmp_path, makefile, folders=[str(folder)]).load() is not None
+
+    (folder / "regions.bed").write_text("chr1\t0\t200\n")
+    assert _new_cache(tmp_path, makefile, folders=[str(folder)]).load() is None
+
+
+def test_graphcache__corrupt_cache(tmp_path, makefile, input_file):
+    cache = _new_cache(tmp_path, makefile)
+    cache.save(_new_nodes(tmp_path, input_file))
+
+    with open(cache.filename, "r+b") as handle:
+        handle.truncate(os.path.getsize(cache.filename) // 2)
+
+    assert cache.load() is None
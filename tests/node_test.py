@@ -89,6 +89,7 @@ def _build_cmd_mock(
         requirements=frozenset(requirements),
         expected_temp_files=frozenset(map(os.path.basename, output_files)),
         optional_temp_files=frozenset(optional_temp_files),
+        memory=0,
     )
     cmd.join.return_value = return_codes
 
@@ -239,6 +240,36 @@ def test_constructor__threads_invalid_type(cls, nthreads):
         cls(threads=nthreads)
 
 
+###############################################################################
+###############################################################################
+# *Node: Constructor tests: memory
+
+
+@pytest.mark.parametrize("cls", _NODE_TYPES)
+@pytest.mark.parametrize("memory", (0, 1, 2 ** 32))
+def test_constructor__memory(cls, memory):
+    node = cls(memory=memory)
+    assert node.memory == memory
+
+
+@pytest.mark.parametrize("cls", _NODE_TYPES)
+def test_constructor__memory_invalid_range(cls):
+    with pytest.raises(ValueError):
+        cls(memory=-1)
+
+
+@pytest.mark.parametrize("cls", _NODE_TYPES)
+@pytest.mark.parametrize("memory", ("1", {}, 2.7))
+def test_constructor__memory_invalid_type(cls, memory):
+    with pytest.raises(TypeError):
+        cls(memory=memory)
+
+
+def test_commandnode__memory__default_from_command():
+    node = CommandNode(command=AtomicCmd("true", memory=1024))
+    assert node.memory == 1024
+
+
 ###############################################################################
 ###############################################################################
 # Node: Run
@@ -270,6 +301,18 @@ def test_run__order():
     ]
 
 
+def test_run__resource_usage():
+    node = Node()
+    node._create_temp_dir = Mock(return_value=_DUMMY_TEMP)
+    node._remove_temp_dir = Mock()
+
+    result = node.run(Mock(temp_root=_DUMMY_TEMP_ROOT))
+
+    assert sorted(result) == ["commands", "start_time", "wall_time"]
+    assert result["commands"] == []
+    assert result["wall_time"] >= 0
+
+
 _EXCEPTIONS = (
     (TypeError("The castle AAARGH!"), NodeUnhandledException),
     (NodeError("He's a very naughty boy!"), NodeError),
@@ -466,6 +509,7 @@ _SIMPLE_CMD_MOCK = Mock(
     executables=_EXEC_FILES,
     auxiliary_files=_AUX_FILES,
     requirements=_REQUIREMENTS,
+    memory=0,
 )
 _SIMPLE_CMD_NODE = CommandNode(command=_SIMPLE_CMD_MOCK, dependencies=_SIMPLE_DEPS)
 
@@ -499,6 +543,17 @@ def test_commandnode_constructor__dependencies__default():
     assert cmd_mock.dependencies == frozenset()
 
 
+def test_commandnode_constructor__streamable_files():
+    node = CommandNode(command=_SIMPLE_CMD_MOCK, streamable_files=_OUT_FILES)
+    assert node.streamable_files == _OUT_FILES
+    assert CommandNode(command=_SIMPLE_CMD_MOCK).streamable_files == frozenset()
+
+
+def test_commandnode_constructor__streamable_files__not_output_files():
+    with pytest.raises(NodeError):
+        CommandNode(command=_SIMPLE_CMD_MOCK, streamable_files=_IN_FILES)
+
+
 ###############################################################################
 ###############################################################################
 # CommandNode: run
@@ -514,8 +569,9 @@ def test_command_node__run():
     node_mock._setup = mock._test_node_._setup
     node_mock._teardown = mock._test_node_._teardown
     node_mock._remove_temp_dir = mock._test_node_._remove_temp_dir
+    mock.resource_usage.return_value = [{"command": "foo"}]
 
-    node_mock.run(cfg_mock)
+    result = node_mock.run(cfg_mock)
 
     assert mock.mock_calls == [
         call._test_node_._create_temp_dir(cfg_mock),
@@ -524,7 +580,10 @@ def test_command_node__run():
         call.join(),
         call._test_node_._teardown(cfg_mock, _DUMMY_TEMP),
         call._test_node_._remove_temp_dir(_DUMMY_TEMP),
+        call.resource_usage(),
     ]
+    assert result["commands"] == [{"command": "foo"}]
+    assert result["wall_time"] >= 0
 
 
 ###############################################################################
@@ -21,11 +21,21 @@
 # SOFTWARE.
 #
 import os
+import sys
 
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
+import pytest
+
+from paleomix.atomiccmd.command import AtomicCmd
 from paleomix.common.fileutils import fspath
-from paleomix.nodegraph import NodeGraph, FileStatusCache
+from paleomix.node import CommandNode, Node
+from paleomix.nodegraph import (
+    FileStatusCache,
+    FileStatusIndex,
+    NodeGraph,
+    NodeGraphError,
+)
 
 
 _TIMESTAMP_1 = 1000190760
@@ -117,3 +127,347 @@ def test_nodegraph_is_outdated__updates(tmp_path):
     assert not NodeGraph.is_outdated(my_node, FileStatusCache())
     my_node = Mock(input_files=(younger_file,), output_files=(older_file,),)
     assert NodeGraph.is_outdated(my_node, FileStatusCache())
+
+
+def test_file_status_cache__named_pipes_are_missing(tmp_path):
+    filename = str(tmp_path / "pipe")
+    os.mkfifo(filename)
+
+    assert FileStatusCache().missing_files((filename,)) == [filename]
+
+
+###############################################################################
+###############################################################################
+# NodeGraph: States
+
+
+class _MissingOutputCache(FileStatusCache):
+    """Cache for which every output file (in /missing/) is missing."""
+
+    def _get_state(self, fpath):
+        if fpath.startswith("/missing/"):
+            return None
+
+        return FileStatusCache._get_state(self, fpath)
+
+
+def _new_chain(tmp_path, length, dependencies=(), prefix="node"):
+    input_file = create_test_file(_TIMESTAMP_1, tmp_path, "input")
+
+    nodes = []
+    for idx in range(length):
+        input_files = [input_file]
+        for dependency in dependencies:
+            input_files.extend(dependency.output_files)
+
+        dependencies = [
+            Node(
+                description="%s_%i" % (prefix, idx),
+                input_files=input_files,
+                output_files=["/missing/%s_%i" % (prefix, idx)],
+                dependencies=dependencies,
+            )
+        ]
+        nodes.extend(dependencies)
+
+    return nodes
+
+
+def test_nodegraph__states__deep_chain(tmp_path):
+    nodes = _new_chain(tmp_path, sys.getrecursionlimit() * 2)
+    nodegraph = NodeGraph(nodes[-1:], _MissingOutputCache)
+
+    assert list(nodegraph) == nodes[-1:]
+    assert len(list(nodegraph.iterflat())) == len(nodes)
+    assert nodegraph.get_node_state(nodes[0]) == nodegraph.RUNABLE
+    assert nodegraph.get_state_counts()[nodegraph.QUEUED] == len(nodes) - 1
+
+    nodegraph.set_node_state(nodes[0], nodegraph.RUNNING)
+    nodegraph.set_node_state(nodes[0], nodegraph.ERROR)
+    assert nodegraph.get_state_counts()[nodegraph.ERROR] == len(nodes)
+
+
+def test_nodegraph__states__propagation(tmp_path):
+    (root,) = _new_chain(tmp_path, 1, prefix="root")
+    chain_1 = _new_chain(tmp_path, 3, [root], prefix="a")
+    chain_2 = _new_chain(tmp_path, 2, [root], prefix="b")
+    (final,) = _new_chain(tmp_path, 1, [chain_1[-1], chain_2[-1]], prefix="final")
+
+    nodegraph = NodeGraph([final], _MissingOutputCache)
+    assert nodegraph.get_node_state(root) == nodegraph.RUNABLE
+    assert nodegraph.get_dependents(root) == frozenset((chain_1[0], chain_2[0]))
+
+    nodegraph.set_node_state(root, nodegraph.RUNNING)
+    assert nodegraph.get_node_state(chain_1[0]) == nodegraph.QUEUED
+
+    with patch.object(
+        nodegraph, "_get_node_state", wraps=nodegraph._get_node_state
+    ) as get_node_state:
+        nodegraph.set_node_state(root, nodegraph.DONE)
+
+    # Nodes are examined at most once, and only if a dependency changed state
+    updated = [nodegraph._nodes[args[0]] for (args, _) in get_node_state.call_args_list]
+    assert sorted(map(str, updated)) == ["a_0", "a_1", "b_0", "b_1"]
+
+    assert nodegraph.get_node_state(chain_1[0]) == nodegraph.RUNABLE
+    assert nodegraph.get_node_state(chain_2[0]) == nodegraph.RUNABLE
+    assert nodegraph.get_node_state(final) == nodegraph.QUEUED
+
+    nodegraph.set_node_state(chain_2[0], nodegraph.RUNNING)
+    nodegraph.set_node_state(chain_2[0], nodegraph.ERROR)
+    assert nodegraph.get_node_state(chain_2[1]) == nodegraph.ERROR
+    assert nodegraph.get_node_state(final) == nodegraph.ERROR
+    assert nodegraph.get_node_state(chain_1[1]) == nodegraph.QUEUED
+
+
+def test_nodegraph__states__indirect_dependency_on_producer(tmp_path):
+    nodes = _new_chain(tmp_path, 3)
+    node = Node(
+        input_files=nodes[0].output_files,
+        output_files=["/missing/final"],
+        dependencies=nodes[-1:],
+    )
+
+    nodegraph = NodeGraph([node], _MissingOutputCache)
+    assert nodegraph.get_node_state(node) == nodegraph.QUEUED
+
+
+def test_nodegraph__states__missing_dependency_on_producer(tmp_path):
+    nodes = _new_chain(tmp_path, 3)
+    node = Node(input_files=nodes[1].output_files, dependencies=nodes[:1])
+
+    with pytest.raises(NodeGraphError, match="input/output file error"):
+        NodeGraph([nodes[-1], node], _MissingOutputCache)
+
+
+###############################################################################
+###############################################################################
+# NodeGraph: Streamed files
+
+
+def _new_cat_node(input_files, output_file, streamable=False, dependencies=()):
+    command = AtomicCmd(
+        ["cat"] + ["%%(IN_FILE_%i)s" % (idx,) for idx in range(len(input_files))],
+        OUT_STDOUT=output_file,
+        **{"IN_FILE_%i" % (idx,): value for (idx, value) in enumerate(input_files)}
+    )
+
+    return CommandNode(
+        command,
+        description=os.path.basename(output_file),
+        streamable_files=[output_file] if streamable else (),
+        dependencies=dependencies,
+    )
+
+
+def test_nodegraph__streams__multiple_producers(tmp_path):
+    input_file = create_test_file(_TIMESTAMP_1, tmp_path, "input")
+    producer_1 = _new_cat_node([input_file], str(tmp_path / "a"), True)
+    producer_2 = _new_cat_node([input_file], str(tmp_path / "b"), True)
+    consumer = _new_cat_node(
+        [str(tmp_path / "a"), str(tmp_path / "b")],
+        str(tmp_path / "c"),
+        dependencies=[producer_1, producer_2],
+    )
+
+    nodegraph = NodeGraph([consumer])
+
+    assert nodegraph.get_stream_consumer(producer_1) is consumer
+    assert nodegraph.get_stream_consumer(producer_2) is consumer
+    assert nodegraph.get_stream_consumer(consumer) is None
+    assert nodegraph.get_streamed_inputs(consumer) == {
+        str(tmp_path / "a"): producer_1,
+        str(tmp_path / "b"): producer_2,
+    }
+
+
+def test_nodegraph__streams__not_streamed_to_multiple_consumers(tmp_path):
+    input_file = create_test_file(_TIMESTAMP_1, tmp_path, "input")
+    producer = _new_cat_node([input_file], str(tmp_path / "a"), True)
+    consumer_1 = _new_cat_node(
+        [str(tmp_path / "a")], str(tmp_path / "b"), False, producer
+    )
+    consumer_2 = _new_cat_node(
+        [str(tmp_path / "a")], str(tmp_path / "c"), False, producer
+    )
+
+    nodegraph = NodeGraph([consumer_1, consumer_2])
+
+    assert nodegraph.get_stream_consumer(producer) is None
+
+
+def test_nodegraph__streams__not_chained(tmp_path):
+    input_file = create_test_file(_TIMESTAMP_1, tmp_path, "input")
+    node_1 = _new_cat_node([input_file], str(tmp_path / "a"), True)
+    node_2 = _new_cat_node([str(tmp_path / "a")], str(tmp_path / "b"), True, node_1)
+    node_3 = _new_cat_node([str(tmp_path / "b")], str(tmp_path / "c"), False, node_2)
+
+    nodegraph = NodeGraph([node_3])
+
+    assert nodegraph.get_stream_consumer(node_1) is node_2
+    assert nodegraph.get_stream_consumer(node_2) is None
+
+
+def test_nodegraph__streams__missing_streamed_file(tmp_path):
+    input_file = create_test_file(_TIMESTAMP_1, tmp_path, "input")
+    output_file = create_test_file(_TIMESTAMP_2, tmp_path, "output")
+    producer = _new_cat_node([input_file], str(tmp_path / "a"), True)
+    consumer = _new_cat_node([str(tmp_path / "a")], output_file, False, producer)
+
+    nodegraph = NodeGraph([consumer])
+    assert nodegraph.get_node_state(producer) == nodegraph.DONE
+    assert nodegraph.get_node_state(consumer) == nodegraph.DONE
+
+    # The input of the producer is newer than the output of the consumer
+    os.utime(input_file, (_TIMESTAMP_2 + 1, _TIMESTAMP_2 + 1))
+
+    nodegraph = NodeGraph([consumer])
+    assert nodegraph.get_node_state(producer) == nodegraph.RUNABLE
+    assert nodegraph.get_node_state(consumer) == nodegraph.OUTDATED
+
+
+def test_nodegraph__streams__producer_rerun_for_consumer(tmp_path):
+    input_file_1 = create_test_file(_TIMESTAMP_1, tmp_path, "input_1")
+    input_file_2 = create_test_file(_TIMESTAMP_1, tmp_path, "input_2")
+    output_file = create_test_file(_TIMESTAMP_2, tmp_path, "output")
+    producer_1 = _new_cat_node([input_file_1], str(tmp_path / "a"), True)
+    producer_2 = _new_cat_node([input_file_2], str(tmp_path / "b"), True)
+    consumer = _new_cat_node(
+        [str(tmp_path / "a"), str(tmp_path / "b")],
+        output_file,
+        dependencies=[producer_1, producer_2],
+    )
+
+    # Re-running the consumer requires both streamed files
+    os.utime(input_file_2, (_TIMESTAMP_2 + 1, _TIMESTAMP_2 + 1))
+
+    nodegraph = NodeGraph([consumer])
+    assert nodegraph.get_node_state(producer_1) == nodegraph.RUNABLE
+    assert nodegraph.get_node_state(producer_2) == nodegraph.RUNABLE
+    assert nodegraph.get_node_state(consumer) == nodegraph.OUTDATED
+
+
+###############################################################################
+###############################################################################
+# FileStatusIndex
+
+
+def _new_indexed_folder(tmp_path):
+    root = tmp_path / "files"
+    root.mkdir()
+    filename = create_test_file(_TIMESTAMP_1, root, "file")
+    os.utime(str(root), (_TIMESTAMP_1, _TIMESTAMP_1))
+
+    return str(root), filename, str(tmp_path / "index.sqlite3")
+
+
+def test_file_status_index__missing_files(tmp_path):
+    _, filename, index_file = _new_indexed_folder(tmp_path)
+    with FileStatusIndex(index_file) as index:
+        cache = index.new_cache()
+        assert cache.files_exist((filename,))
+        assert cache.missing_files((filename + ".missing",)) == [filename + ".missing"]
+        assert not cache.files_exist((str(tmp_path / "missing" / "file"),))
+
+
+def test_file_status_index__persistent(tmp_path):
+    _, filename, index_file = _new_indexed_folder(tmp_path)
+    with FileStatusIndex(index_file) as index:
+        cache = index.new_cache()
+        assert cache.files_exist((filename,))
+        assert cache.missing_files((filename + ".missing",))
+
+    with FileStatusIndex(index_file) as index:
+        with patch("os.lstat", side_effect=AssertionError("stat called")):
+            cache = index.new_cache()
+            assert cache.files_exist((filename,))
+            assert cache.missing_files((filename + ".missing",))
+
+
+def test_file_status_index__changed_directory(tmp_path):
+    root, filename, index_file = _new_indexed_folder(tmp_path)
+    with FileStatusIndex(index_file) as index:
+        assert index.new_cache().missing_files((filename + ".new",))
+
+    create_test_file(_TIMESTAMP_2, root, "file.new")
+    os.remove(filename)
+    os.utime(root, (_TIMESTAMP_2, _TIMESTAMP_2))
+
+    with FileStatusIndex(index_file) as index:
+        cache = index.new_cache()
+        assert not cache.files_exist((filename,))
+        assert cache.files_exist((filename + ".new",))
+
+
+def test_file_status_index__recently_changed_directory(tmp_path):
+    root, filename, index_file = _new_indexed_folder(tmp_path)
+    os.utime(root)
+    with FileStatusIndex(index_file) as index:
+        assert index.new_cache().files_exist((filename,))
+
+    # Directory is re-listed, since it may have changed since it was indexed
+    os.remove(filename)
+    with FileStatusIndex(index_file) as index:
+        assert not index.new_cache().files_exist((filename,))
+
+
+def test_file_status_index__symlinks_not_indexed(tmp_path):
+    root, filename, index_file = _new_indexed_folder(tmp_path)
+    target_1 = create_test_file(_TIMESTAMP_1, tmp_path, "target_1")
+    target_2 = create_test_file(_TIMESTAMP_2, tmp_path, "target_2")
+    link = os.path.join(root, "link")
+    os.symlink(target_1, link)
+    os.utime(root, (_TIMESTAMP_1, _TIMESTAMP_1))
+
+    with FileStatusIndex(index_file) as index:
+        cache = index.new_cache()
+        assert not cache.are_files_outdated((link,), (filename,))
+
+    os.remove(target_1)
+    os.rename(target_2, target_1)
+
+    with FileStatusIndex(index_file) as index:
+        cache = index.new_cache()
+        assert cache.are_files_outdated((link,), (filename,))
+
+
+def test_file_status_index__completed_node(tmp_path):
+    root, filename, index_file = _new_indexed_folder(tmp_path)
+    input_file = create_test_file(_TIMESTAMP_2, tmp_path, "input")
+    with FileStatusIndex(index_file) as index:
+        cache = index.new_cache()
+        assert cache.are_files_outdated((input_file,), (filename,))
+        cache.set_completed((input_file,), (filename,))
+        assert not index.new_cache().are_files_outdated((input_file,), (filename,))
+
+    with FileStatusIndex(index_file) as index:
+        cache = index.new_cache()
+        assert not cache.are_files_outdated((input_file,), (filename,))
+
+    with open(input_file, "w") as handle:
+        handle.write("modified")
+    os.utime(input_file, (_TIMESTAMP_2, _TIMESTAMP_2))
+
+    with FileStatusIndex(index_file) as index:
+        cache = index.new_cache()
+        assert cache.are_files_outdated((input_file,), (filename,))
+
+
+def test_file_status_index__completed_node_refreshes_output(tmp_path):
+    root, filename, index_file = _new_indexed_folder(tmp_path)
+    input_file = create_test_file(_TIMESTAMP_2, root, "input")
+    os.utime(root, (_TIMESTAMP_1, _TIMESTAMP_1))
+    with FileStatusIndex(index_file) as index:
+        assert index.new_cache().are_files_outdated((input_file,), (filename,))
+
+        # Overwriting a file does not change the mtime of the directory
+        create_test_file(_TIMESTAMP_2 + 1, root, "file")
+        os.utime(root, (_TIMESTAMP_1, _TIMESTAMP_1))
+
+        assert index.new_cache().are_files_outdated((input_file,), (filename,))
+        index.new_cache().set_completed((input_file,), (filename,))
+
+    with FileStatusIndex(index_file) as index:
+        with patch("os.lstat", side_effect=AssertionError("stat called")):
+            cache = index.new_cache()
+            assert not cache.are_files_outdated((input_file,), (filename,))
@@ -0,0 +1,532 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2020 Mikkel Schubert <MikkelSch@gmail.com>
+#
+# Permission is herby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+import argparse
+import json
+import os
+import sys
+
+from unittest.mock import Mock
+
+import pytest
+
+import paleomix.common.versions as versions
+
+from paleomix.atomiccmd.command import AtomicCmd
+from paleomix.node import CommandNode, Node, NodeError
+from paleomix.nodegraph import NodeGraph
+from paleomix.pipeline import Pypeline, _RunableQueue, _calculate_priorities
+from paleomix.resourcelog import ResourceLog
+
+
+class _RecordingNode(Node):
+    """Node that records its description in a log file when it is run."""
+
+    def __init__(self, logfile, description, threads=1, memory=0, dependencies=()):
+        self._logfile = str(logfile)
+        self._input_file = logfile.parent / "input.txt"
+        self._input_file.touch()
+        self._output_file = logfile.parent / ("%s.txt" % (description,))
+
+        Node.__init__(
+            self,
+            description=description,
+            threads=threads,
+            memory=memory,
+            input_files=[str(self._input_file)],
+            output_files=[str(self._output_file)],
+            dependencies=dependencies,
+        )
+
+    def _run(self, _config, _temp):
+        with open(self._logfile, "a") as handle:
+            handle.write("%s\n" % (self,))
+
+        self._output_file.touch()
+
+
+class _FailingNode(_RecordingNode):
+    def _run(self, config, temp):
+        _RecordingNode._run(self, config, temp)
+
+        raise NodeError("node failed")
+
+
+def _new_streamed_nodes(tmp_path, producer_call=("cat",), consumer_call=("cat",)):
+    input_file = tmp_path / "input.txt"
+    if not input_file.exists():
+        input_file.write_text("ACGT" * 100000)
+
+    streamed_file = str(tmp_path / "streamed.txt")
+    producer = CommandNode(
+        AtomicCmd(
+            producer_call + ("%(IN_FILE)s",),
+            IN_FILE=str(input_file),
+            OUT_STDOUT=streamed_file,
+        ),
+        description="producer",
+        streamable_files=[streamed_file],
+    )
+
+    consumer = CommandNode(
+        AtomicCmd(
+            consumer_call + ("%(IN_FILE)s",),
+            IN_FILE=streamed_file,
+            OUT_STDOUT=str(tmp_path / "output.txt"),
+        ),
+        description="consumer",
+        dependencies=producer,
+    )
+
+    return producer, consumer
+
+
+def _new_pipeline(tmp_path, file_index=None, resource_log=None, timeline=None):
+    config = argparse.Namespace(temp_root=str(tmp_path / "temp"))
+    (tmp_path / "temp").mkdir(exist_ok=True)
+
+    return Pypeline(
+        config, file_index=file_index, resource_log=resource_log, timeline=timeline
+    )
+
+
+def _read_log(logfile):
+    if not logfile.exists():
+        return []
+
+    return logfile.read_text().split()
+
+
+###############################################################################
+###############################################################################
+# Pypeline: run
+
+
+def test_pypeline__run__empty(tmp_path):
+    pipeline = _new_pipeline(tmp_path)
+
+    assert pipeline.run(max_threads=2)
+
+
+def test_pypeline__run__invalid_max_threads(tmp_path):
+    pipeline = _new_pipeline(tmp_path)
+
+    with pytest.raises(ValueError):
+        pipeline.run(max_threads=0)
+
+
+@pytest.mark.parametrize("max_threads", (1, 2, 4))
+def test_pypeline__run__dependencies_run_first(tmp_path, max_threads):
+    logfile = tmp_path / "log.txt"
+    leaves = [_RecordingNode(logfile, "leaf_%i" % (idx,)) for idx in range(5)]
+    middle = _RecordingNode(logfile, "middle", dependencies=leaves[:3])
+    top = _RecordingNode(logfile, "top", dependencies=[middle] + leaves[3:])
+
+    pipeline = _new_pipeline(tmp_path)
+    pipeline.add_nodes(top)
+
+    assert pipeline.run(max_threads=max_threads)
+
+    log = _read_log(logfile)
+    assert sorted(log) == sorted(
+        ["leaf_%i" % (idx,) for idx in range(5)] + ["middle", "top"]
+    )
+    assert log.index("middle") > max(log.index("leaf_%i" % (idx,)) for idx in range(3))
+    assert log[-1] == "top"
+
+
+def test_pypeline__run__long_chain(tmp_path):
+    logfile = tmp_path / "log.txt"
+    node = None
+    for idx in range(20):
+        node = _RecordingNode(logfile, "node_%02i" % (idx,), dependencies=node)
+
+    pipeline = _new_pipeline(tmp_path)
+    pipeline.add_nodes(node)
+
+    assert pipeline.run(max_threads=4)
+    assert _read_log(logfile) == ["node_%02i" % (idx,) for idx in range(20)]
+
+
+def test_pypeline__run__threads_exceeding_max_threads(tmp_path):
+    logfile = tmp_path / "log.txt"
+    node_1 = _RecordingNode(logfile, "node_1", threads=4)
+    node_2 = _RecordingNode(logfile, "node_2", threads=4, dependencies=node_1)
+
+    pipeline = _new_pipeline(tmp_path)
+    pipeline.add_nodes(node_2)
+
+    assert pipeline.run(max_threads=2)
+    assert _read_log(logfile) == ["node_1", "node_2"]
+
+
+def test_pypeline__run__invalid_max_memory(tmp_path):
+    pipeline = _new_pipeline(tmp_path)
+
+    with pytest.raises(ValueError):
+        pipeline.run(max_threads=1, max_memory=0)
+
+
+def test_pypeline__run__memory_exceeding_max_memory(tmp_path):
+    logfile = tmp_path / "log.txt"
+    node_1 = _RecordingNode(logfile, "node_1", memory=2048)
+    node_2 = _RecordingNode(logfile, "node_2", memory=2048, dependencies=node_1)
+
+    pipeline = _new_pipeline(tmp_path)
+    pipeline.add_nodes(node_2)
+
+    assert pipeline.run(max_threads=2, max_memory=1024)
+    assert _read_log(logfile) == ["node_1", "node_2"]
+
+
+def test_pypeline__start_new_tasks__memory_limits_concurrency(tmp_path):
+    logfile = tmp_path / "log.txt"
+    nodes = [
+        _RecordingNode(logfile, "node_%i" % (idx,), memory=1024) for idx in range(4)
+    ]
+    nodegraph = NodeGraph(nodes)
+    runable = _RunableQueue(_calculate_priorities(nodegraph))
+    for node in nodes:
+        runable.push(node)
+
+    running = {}
+    pipeline = _new_pipeline(tmp_path)
+    pipeline._start_new_tasks(runable, running, {}, nodegraph, 4, 2048, Mock())
+
+    assert len(running) == 2
+    assert len(runable) == 2
+
+
+def test_pypeline__run__failed_node_blocks_dependents(tmp_path):
+    logfile = tmp_path / "log.txt"
+    failing = _FailingNode(logfile, "failing")
+    independent = _RecordingNode(logfile, "independent")
+    dependent = _RecordingNode(logfile, "dependent", dependencies=failing)
+
+    pipeline = _new_pipeline(tmp_path)
+    pipeline.add_nodes(dependent, independent)
+
+    assert not pipeline.run(max_threads=1)
+    assert sorted(_read_log(logfile)) == ["failing", "independent"]
+
+
+def test_pypeline__run__dry_run(tmp_path):
+    logfile = tmp_path / "log.txt"
+    node = _RecordingNode(logfile, "node")
+
+    pipeline = _new_pipeline(tmp_path)
+    pipeline.add_nodes(node)
+
+    assert pipeline.run(max_threads=1, dry_run=True)
+    assert _read_log(logfile) == []
+
+
+def test_pypeline__run__file_index(tmp_path):
+    logfile = tmp_path / "log.txt"
+    file_index = tmp_path / "index.sqlite3"
+    node_1 = _RecordingNode(logfile, "node_1")
+    node_2 = _RecordingNode(logfile, "node_2", dependencies=node_1)
+
+    pipeline = _new_pipeline(tmp_path, file_index=str(file_index))
+    pipeline.add_nodes(node_2)
+
+    assert pipeline.run(max_threads=1)
+    assert _read_log(logfile) == ["node_1", "node_2"]
+    assert file_index.exists()
+
+    pipeline = _new_pipeline(tmp_path, file_index=str(file_index))
+    pipeline.add_nodes(node_2)
+
+    assert pipeline.run(max_threads=1)
+    assert _read_log(logfile) == ["node_1", "node_2"]
+    assert set(pipeline.list_output_files().values()) == {NodeGraph.DONE}
+
+
+def test_pypeline__run__resource_log(tmp_path):
+    resource_log = tmp_path / "resources.jsonl"
+    node_1 = _RecordingNode(tmp_path / "log.txt", "node_1")
+    node_2 = CommandNode(
+        AtomicCmd(
+            ("cat", "%(IN_FILE)s"),
+            IN_FILE=str(tmp_path / "node_1.txt"),
+            OUT_STDOUT=str(tmp_path / "output.txt"),
+        ),
+        description="node_2",
+        dependencies=node_1,
+    )
+
+    pipeline = _new_pipeline(tmp_path, resource_log=str(resource_log))
+    pipeline.add_nodes(node_2)
+
+    assert pipeline.run(max_threads=1)
+
+    records = ResourceLog(str(resource_log)).read()
+    assert sorted(records) == [("CommandNode", "node_2"), ("_RecordingNode", "node_1")]
+    assert records[("_RecordingNode", "node_1")]["commands"] == []
+    (usage,) = records[("CommandNode", "node_2")]["commands"]
+    assert usage["command"] == "cat"
+
+
+def test_pypeline__run__timeline(tmp_path):
+    timeline = tmp_path / "timeline.json"
+    _, consumer = _new_streamed_nodes(tmp_path)
+    node = _RecordingNode(tmp_path / "log.txt", "node", threads=2)
+
+    pipeline = _new_pipeline(tmp_path, timeline=str(timeline))
+    pipeline.add_nodes(consumer, node)
+
+    assert pipeline.run(max_threads=2)
+
+    events = json.loads(timeline.read_text())
+    spans = sorted(
+        (event["name"], event["args"]["threads"])
+        for event in events
+        if event["ph"] == "X" and event["tid"] == 0
+    )
+    assert spans == [("consumer", 1), ("node", 2), ("producer", 1)]
+
+    commands = [
+        event["name"] for event in events if event["ph"] == "X" and event["tid"] > 0
+    ]
+    assert commands == ["cat", "cat"]
+
+    threads = [
+        event["args"]["running"] for event in events if event["name"] == "Threads"
+    ]
+    assert threads[-1] == 0
+    assert max(threads) == 2
+
+
+def test_pypeline__run__critical_path_first(tmp_path):
+    logfile = tmp_path / "log.txt"
+    leaves = [_RecordingNode(logfile, "leaf_%i" % (idx,)) for idx in range(3)]
+    chain = None
+    for idx in range(3):
+        chain = _RecordingNode(logfile, "chain_%i" % (idx,), dependencies=chain)
+
+    pipeline = _new_pipeline(tmp_path)
+    pipeline.add_nodes(leaves, chain)
+
+    assert pipeline.run(max_threads=1)
+
+    log = _read_log(logfile)
+    assert log[:2] == ["chain_0", "chain_1"]
+    assert sorted(log[2:]) == ["chain_2", "leaf_0", "leaf_1", "leaf_2"]
+
+
+def test_pypeline__run__dry_run__deep_chain(tmp_path):
+    logfile = tmp_path / "log.txt"
+    node = None
+    for idx in range(sys.getrecursionlimit() * 2):
+        node = _RecordingNode(logfile, "node_%i" % (idx,), dependencies=node)
+
+    pipeline = _new_pipeline(tmp_path)
+    pipeline.add_nodes(node)
+
+    assert pipeline.list_input_files() == {str(tmp_path / "input.txt")}
+    assert pipeline.run(max_threads=4, dry_run=True)
+
+
+###############################################################################
+###############################################################################
+# Pypeline: streamed files
+
+
+def test_pypeline__run__streamed_files(tmp_path):
+    _, consumer = _new_streamed_nodes(tmp_path)
+
+    pipeline = _new_pipeline(tmp_path)
+    pipeline.add_nodes(consumer)
+
+    assert pipeline.run(max_threads=2)
+    assert (tmp_path / "output.txt").read_text() == "ACGT" * 100000
+    assert not os.path.lexists(str(tmp_path / "streamed.txt"))
+    assert not os.listdir(str(tmp_path / "temp"))
+
+    # Both nodes are up-to-date despite the streamed file not existing
+    nodegraph = NodeGraph([consumer])
+    assert nodegraph.get_state_counts()[nodegraph.DONE] == 2
+
+
+def test_pypeline__run__streamed_files__resource_log(tmp_path):
+    resource_log = tmp_path / "resources.jsonl"
+    _, consumer = _new_streamed_nodes(tmp_path)
+
+    pipeline = _new_pipeline(tmp_path, resource_log=str(resource_log))
+    pipeline.add_nodes(consumer)
+
+    assert pipeline.run(max_threads=2)
+    assert sorted(ResourceLog(str(resource_log)).read()) == [
+        ("CommandNode", "consumer"),
+        ("CommandNode", "producer"),
+    ]
+
+
+def test_pypeline__run__streamed_files__insufficient_threads(tmp_path):
+    _, consumer = _new_streamed_nodes(tmp_path)
+
+    pipeline = _new_pipeline(tmp_path)
+    pipeline.add_nodes(consumer)
+
+    assert pipeline.run(max_threads=1)
+    assert (tmp_path / "output.txt").read_text() == "ACGT" * 100000
+    assert (tmp_path / "streamed.txt").read_text() == "ACGT" * 100000
+
+
+def test_pypeline__run__streamed_files__rerun_producer(tmp_path):
+    _, consumer = _new_streamed_nodes(tmp_path)
+
+    pipeline = _new_pipeline(tmp_path)
+    pipeline.add_nodes(consumer)
+    assert pipeline.run(max_threads=2)
+
+    # The streamed file must be re-created in order to re-run the consumer
+    (tmp_path / "output.txt").unlink()
+    nodegraph = NodeGraph([consumer])
+    assert nodegraph.get_state_counts()[nodegraph.RUNABLE] == 1
+    assert nodegraph.get_state_counts()[nodegraph.QUEUED] == 1
+
+    assert pipeline.run(max_threads=2)
+    assert (tmp_path / "output.txt").read_text() == "ACGT" * 100000
+
+
+@pytest.mark.parametrize(
+    "producer_call, consumer_call",
+    (
+        (("sh", "-c", "cat $0; exit 1"), ("cat",)),
+        (("cat",), ("sh", "-c", "exit 1")),
+        (("sh", "-c", "exit 1"), ("sh", "-c", "exit 1")),
+    ),
+)
+def test_pypeline__run__streamed_files__failures(
+    tmp_path, producer_call, consumer_call
+):
+    _, consumer = _new_streamed_nodes(tmp_path, producer_call, consumer_call)
+
+    pipeline = _new_pipeline(tmp_path)
+    pipeline.add_nodes(consumer)
+
+    assert not pipeline.run(max_threads=2)
+    assert not os.path.lexists(str(tmp_path / "output.txt"))
+    assert not os.path.lexists(str(tmp_path / "streamed.txt"))
+
+
+###############################################################################
+###############################################################################
+# Pypeline: list_output_files / print_required_executables
+
+
+def test_pypeline__list_output_files__no_nodegraph(tmp_path, monkeypatch):
+    logfile = tmp_path / "log.txt"
+    node_1 = _RecordingNode(logfile, "node_1")
+    node_2 = _RecordingNode(logfile, "node_2", dependencies=node_1)
+    requirement = Mock(side_effect=AssertionError("requirement was checked"))
+    node_2.requirements = frozenset([requirement])
+    (tmp_path / "node_1.txt").touch()
+
+    pipeline = _new_pipeline(tmp_path)
+    pipeline.add_nodes(node_2)
+
+    monkeypatch.setattr("paleomix.pipeline.NodeGraph.__init__", None)
+    assert pipeline.list_output_files() == {
+        str(tmp_path / "node_1.txt"): NodeGraph.DONE,
+        str(tmp_path / "node_2.txt"): None,
+    }
+    assert not requirement.called
+
+
+def test_pypeline__print_required_executables(tmp_path):
+    requirement_1 = versions.Requirement(
+        call=(lambda: "v1.2",), search=r"v(\d+)\.(\d+)", checks=versions.Any(), name="a"
+    )
+    requirement_2 = versions.Requirement(
+        call=(lambda: "unknown",), search=r"v(\d+)", checks=versions.Any(), name="b"
+    )
+
+    node_1 = Node(description="node_1", requirements=[requirement_1])
+    node_2 = Node(description="node_2", requirements=[requirement_2])
+
+    pipeline = _new_pipeline(tmp_path)
+    pipeline.add_nodes(node_1, node_2)
+
+    lines = []
+    pipeline.print_required_executables(lines.append)
+    assert [line.split()[:2] for line in lines] == [
+        ["Executable", "Version"],
+        ["a", "v1.2"],
+        ["b", "UNKNOWN"],
+    ]
+
+
+###############################################################################
+###############################################################################
+# _RunableQueue
+
+
+def test_runable_queue__remove():
+    nodes = [Node(description=str(idx)) for idx in range(3)]
+    queue = _RunableQueue(dict.fromkeys(nodes, 1))
+    for node in nodes:
+        queue.push(node)
+
+    queue.remove(nodes[0])
+
+    assert len(queue) == 2
+    assert nodes[0] not in queue
+    assert nodes[1] in queue
+    assert [queue.pop(), queue.pop()] == nodes[1:]
+    assert not queue
+
+
+###############################################################################
+###############################################################################
+# _calculate_priorities
+
+
+def test_calculate_priorities__longest_downstream_path():
+    node_a = Node(description="a")
+    node_b = Node(description="b", dependencies=node_a)
+    node_c = Node(description="c", dependencies=node_b, threads=4)
+    node_d = Node(description="d", dependencies=node_a)
+    nodegraph = NodeGraph([node_c, node_d])
+
+    assert _calculate_priorities(nodegraph) == {
+        node_a: 6,
+        node_b: 5,
+        node_c: 4,
+        node_d: 1,
+    }
+
+
+def test_calculate_priorities__runtimes():
+    node_a = Node(description="a")
+    node_b = Node(description="b", dependencies=node_a)
+    node_c = Node(description="c", dependencies=node_a)
+    nodegraph = NodeGraph([node_b, node_c])
+    runtimes = {node_a: 2.0, node_c: 10.0}
+
+    # Nodes without a runtime are assumed to take the median runtime
+    assert _calculate_priorities(nodegraph, runtimes) == {
+        node_a: 12.0,
+        node_b: 6.0,
+        node_c: 10.0,
+    }
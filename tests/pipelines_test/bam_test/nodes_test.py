@@ -0,0 +1,147 @@
+import fcntl
+import os
+import threading
+
+from types import SimpleNamespace
+
+import pytest
+
+from paleomix.node import Node
+from paleomix.pipelines.bam.nodes import CopyReferenceNode, SharedIndexNode
+
+
+class _TouchNode(Node):
+    def __init__(self, input_file, output_file):
+        self.calls = 0
+
+        Node.__init__(
+            self,
+            description="touch",
+            input_files=(input_file,),
+            output_files=(output_file,),
+        )
+
+    def _run(self, _config, _temp):
+        self.calls += 1
+        (output_file,) = self.output_files
+        with open(output_file, "w") as handle:
+            handle.write("ACGT\n")
+
+
+class _OtherTouchNode(_TouchNode):
+    pass
+
+
+@pytest.fixture
+def input_file(tmp_path):
+    filename = tmp_path / "input.fasta"
+    filename.write_text(">chr1\nACGT\n")
+
+    return str(filename)
+
+
+@pytest.fixture
+def config(tmp_path):
+    (tmp_path / "temp").mkdir()
+
+    return SimpleNamespace(temp_root=str(tmp_path / "temp"))
+
+
+def _lock(filename):
+    handle = open(filename, "a")
+    fcntl.flock(handle, fcntl.LOCK_EX)
+
+    return handle
+
+
+def _run_in_thread(node, config):
+    result = {}
+    thread = threading.Thread(
+        target=lambda: result.update(record=node.run(config)), daemon=True
+    )
+    thread.start()
+
+    return thread, result
+
+
+########################################################################################
+# CopyReferenceNode
+
+
+def test_copy_reference_node(tmp_path, config):
+    input_file = tmp_path / "hg19.fa"
+    input_file.write_text(">chr1\nACGT\n")
+    output_file = tmp_path / "index" / "reference.fasta"
+    output_file.parent.mkdir()
+
+    node = CopyReferenceNode(input_file=str(input_file), output_file=str(output_file))
+    assert node.input_files == frozenset([str(input_file)])
+    assert node.output_files == frozenset([str(output_file)])
+
+    node.run(config)
+
+    assert output_file.read_text() == ">chr1\nACGT\n"
+    assert not os.path.samefile(str(input_file), str(output_file))
+    assert os.listdir(config.temp_root) == []
+
+
+########################################################################################
+# SharedIndexNode
+
+
+def test_shared_index_node__mirrors_node(tmp_path, input_file):
+    node = _TouchNode(input_file, str(tmp_path / "index" / "output.txt"))
+    shared_node = SharedIndexNode(node, folder=str(tmp_path / "index"))
+
+    assert str(shared_node) == str(node)
+    assert shared_node.output_files == node.output_files
+    assert shared_node.threads == node.threads
+
+
+def test_shared_index_node__run(tmp_path, config, input_file):
+    folder = tmp_path / "index"
+    node = _TouchNode(input_file, str(folder / "output.txt"))
+
+    record = SharedIndexNode(node, folder=str(folder)).run(config)
+
+    assert record is not None
+    assert node.calls == 1
+    assert (folder / "output.txt").read_text() == "ACGT\n"
+
+
+def test_shared_index_node__skipped_if_created_while_waiting(
+    tmp_path, config, input_file
+):
+    folder = tmp_path / "index"
+    folder.mkdir()
+    node = _TouchNode(input_file, str(folder / "output.txt"))
+    shared_node = SharedIndexNode(node, folder=str(folder))
+
+    with _lock(str(folder / "._TouchNode.lock")):
+        thread, result = _run_in_thread(shared_node, config)
+        thread.join(0.1)
+        assert thread.is_alive()
+
+        # Output created by another pipeline while the lock is held
+        (folder / "output.txt").write_text("TGCA\n")
+
+    thread.join(5)
+    assert not thread.is_alive()
+    assert result == {"record": None}
+    assert node.calls == 0
+    assert (folder / "output.txt").read_text() == "TGCA\n"
+
+
+def test_shared_index_node__locks_per_node_type(tmp_path, config, input_file):
+    folder = tmp_path / "index"
+    folder.mkdir()
+    node = _OtherTouchNode(input_file, str(folder / "output.txt"))
+    shared_node = SharedIndexNode(node, folder=str(folder))
+
+    with _lock(str(folder / "._TouchNode.lock")):
+        thread, result = _run_in_thread(shared_node, config)
+        thread.join(5)
+
+        assert not thread.is_alive()
+        assert result["record"] is not None
+        assert node.calls == 1
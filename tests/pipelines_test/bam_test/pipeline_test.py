@@ -0,0 +1,91 @@
+import hashlib
+import os
+
+from types import SimpleNamespace
+
+import pytest
+
+import paleomix.common.validationcache as validationcache
+
+from paleomix.node import Node
+from paleomix.pipelines.bam.nodes import SharedIndexNode
+from paleomix.pipelines.bam.pipeline import (
+    _build_index_nodes,
+    _get_shared_index_folder,
+)
+
+
+_SEQUENCE = ">chr1\nACGTACGT\n"
+_CHECKSUM = hashlib.sha256(_SEQUENCE.encode("ascii")).hexdigest()
+
+
+@pytest.fixture(autouse=True)
+def disable_validation_cache(monkeypatch):
+    monkeypatch.setattr(validationcache, "_CACHE_FILENAME", None)
+
+
+@pytest.fixture
+def reference(tmp_path):
+    filename = tmp_path / "hg19.fa"
+    filename.write_text(_SEQUENCE)
+
+    return str(filename)
+
+
+########################################################################################
+# _get_shared_index_folder
+
+
+def test_get_shared_index_folder__no_cache(reference):
+    config = SimpleNamespace(index_cache=None)
+
+    assert _get_shared_index_folder(config, reference) is None
+
+
+def test_get_shared_index_folder__missing_reference(tmp_path):
+    config = SimpleNamespace(index_cache=str(tmp_path / "cache"))
+    reference = str(tmp_path / "missing.fasta")
+
+    assert _get_shared_index_folder(config, reference) is None
+
+
+def test_get_shared_index_folder__checksum(tmp_path, reference):
+    config = SimpleNamespace(index_cache=str(tmp_path / "cache"))
+    folder = os.path.join(str(tmp_path / "cache"), _CHECKSUM)
+
+    assert _get_shared_index_folder(config, reference) == folder
+
+
+def test_get_shared_index_folder__independent_of_filename(tmp_path, reference):
+    config = SimpleNamespace(index_cache=str(tmp_path / "cache"))
+    other_reference = tmp_path / "hg19.fasta"
+    other_reference.write_text(_SEQUENCE)
+
+    assert _get_shared_index_folder(config, reference) == _get_shared_index_folder(
+        config, str(other_reference)
+    )
+
+
+########################################################################################
+# _build_index_nodes
+
+
+def test_build_index_nodes__no_cache(reference):
+    config = SimpleNamespace(index_cache=None)
+
+    prefix, nodes = _build_index_nodes(config, reference, Node())
+
+    assert prefix == reference
+    assert not any(isinstance(node, SharedIndexNode) for node in nodes)
+
+
+def test_build_index_nodes__cache_uses_fixed_name(tmp_path, reference):
+    config = SimpleNamespace(index_cache=str(tmp_path / "cache"))
+    folder = os.path.join(str(tmp_path / "cache"), _CHECKSUM)
+
+    prefix, nodes = _build_index_nodes(config, reference, Node())
+
+    assert prefix == os.path.join(folder, "reference.fasta")
+    assert all(isinstance(node, SharedIndexNode) for node in nodes)
+    for node in nodes:
+        assert all(fpath.startswith(folder) for fpath in node.output_files)
@@ -0,0 +1,167 @@
+import collections
+import io
+import random
+import tarfile
+
+import pysam
+import pytest
+
+import paleomix.pipelines.zonkey.build_tped as build_tped
+import paleomix.pipelines.zonkey.genotypes as genotypes
+
+
+# Sites are deliberately not sorted by position
+_GENOTYPES = """Chrom\tPos\tRef\tS1;S2;S3
+chr1\t7\tA\tARG
+chr1\t3\tC\tCYT
+chr1\t8\tG\tKGT
+chr1\t15\tT\tTCY
+chr1\t30\tA\tAAA
+chr2\t4\tA\tAMC
+chr2\t1\tT\tTWA
+chr2\t10\tC\tSCG
+"""
+
+
+def _record(start, cigar, sequence):
+    record = pysam.AlignedSegment()
+    record.reference_start = start
+    record.cigarstring = cigar
+    record.query_sequence = sequence
+
+    return record
+
+
+_RECORDS = {
+    "chr1": [
+        _record(1, "10M", "ACGTACGTAC"),
+        _record(5, "3M1D4M", "GGGTTTT"),
+        _record(6, "2M", "TG"),
+        _record(12, "5M", "AANAA"),
+        _record(13, "5M", "CCCCC"),
+        _record(14, "1M", "T"),
+    ],
+    "chr2": [
+        _record(0, "10M", "TTTTTTTTTT"),
+        _record(3, "2M2I3M", "ACGGTAC"),
+        _record(9, "2M", "GA"),
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def disable_genotypes_cache(monkeypatch):
+    monkeypatch.setattr(genotypes, "_CACHE_DIR", None)
+
+
+def _write_database(tmp_path, binary):
+    table = tmp_path / genotypes.TEXT_FILENAME
+    table.write_text(_GENOTYPES)
+
+    filename = str(tmp_path / "database.tar")
+    with tarfile.open(filename, "w") as tar_handle:
+        if binary:
+            with table.open() as handle:
+                store = genotypes.GenotypeStore.from_text(handle)
+
+            table = tmp_path / genotypes.BINARY_FILENAME
+            genotypes.write_genotypes(store, str(table))
+
+        tar_handle.add(str(table), table.name)
+
+    return filename
+
+
+def _build_tped(filename):
+    random.seed(12345)
+    statistics = collections.defaultdict(int)
+    out_incl_ts = io.StringIO()
+    out_excl_ts = io.StringIO()
+
+    with build_tped.GenotypeReader(filename) as reader:
+        assert reader.samples == ["S1", "S2", "S3"]
+
+        for contig, sites in reader:
+            records = set()
+            for pos, line, nucleotides in sites.process(_RECORDS[contig], statistics):
+                build_tped.process_record(
+                    contig,
+                    pos,
+                    line,
+                    nucleotides,
+                    statistics=statistics,
+                    records=records,
+                    out_incl_ts=out_incl_ts,
+                    out_excl_ts=out_excl_ts,
+                )
+
+    return out_incl_ts.getvalue(), out_excl_ts.getvalue(), dict(statistics)
+
+
+# Output of the line-based 'GenotypeSites' implementation used prior to the
+# binary genotypes table, for the genotypes and records above
+_EXPECTED_INCL_TS = """chr1 chrchr1_3 0 3 C C C T T T C C
+chr1 chrchr1_8 0 8 G T G G T T G G
+chr1 chrchr1_15 0 15 T T C C C T T T
+chr2 chrchr2_1 0 1 T T A T A A T T
+chr2 chrchr2_4 0 4 A A A C C C A A
+chr2 chrchr2_10 0 10 C G C C G G G G
+"""
+
+_EXPECTED_EXCL_TS = """chr1 chrchr1_8 0 8 G T G G T T G G
+chr2 chrchr2_1 0 1 T T A T A A T T
+chr2 chrchr2_4 0 4 A A A C C C A A
+chr2 chrchr2_10 0 10 C G C C G G G G
+"""
+
+_EXPECTED_STATISTICS = {
+    "n_reads": 9,
+    "n_reads_used": 8,
+    "n_sites_incl_ts": 6,
+    "n_sites_excl_ts": 4,
+}
+
+
+@pytest.mark.parametrize("binary", (False, True))
+def test_build_tped__same_as_line_based_implementation(tmp_path, binary):
+    filename = _write_database(tmp_path, binary=binary)
+
+    assert _build_tped(filename) == (
+        _EXPECTED_INCL_TS,
+        _EXPECTED_EXCL_TS,
+        _EXPECTED_STATISTICS,
+    )
+
+
+def test_genotype_sites__no_records(tmp_path):
+    filename = _write_database(tmp_path, binary=True)
+    statistics = collections.defaultdict(int)
+
+    with build_tped.GenotypeReader(filename) as reader:
+        for _, sites in reader:
+            assert list(sites.process([], statistics)) == []
+
+    assert statistics == {"n_reads": 0, "n_reads_used": 0}
+
+
+def test_genotype_sites__records_past_last_site(tmp_path):
+    filename = _write_database(tmp_path, binary=True)
+    records = [_record(40, "5M", "ACGTA"), _record(50, "5M", "ACGTA")]
+    statistics = collections.defaultdict(int)
+
+    with build_tped.GenotypeReader(filename) as reader:
+        _, sites = next(iter(reader))
+
+        assert list(sites.process(records, statistics)) == []
+
+    assert statistics == {"n_reads": 1, "n_reads_used": 0}
+
+
+def test_genotype_reader__closes_store(tmp_path):
+    filename = _write_database(tmp_path, binary=True)
+
+    with build_tped.GenotypeReader(filename) as reader:
+        mapping = reader._store._mapping
+        assert not mapping.closed
+
+    assert mapping.closed
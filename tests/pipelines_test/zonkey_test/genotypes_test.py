@@ -0,0 +1,326 @@
+import io
+import os
+import tarfile
+
+from unittest.mock import patch
+
+import numpy
+import pytest
+
+import paleomix.pipelines.zonkey.genotypes as genotypes
+
+from paleomix.pipelines.zonkey.genotypes import GenotypeError, GenotypeStore
+
+
+_GENOTYPES = """Chrom\tPos\tRef\tS1;S2
+chr1\t20\tA\tAR
+chr1\t5\tC\tCY
+chr1\t12\tG\tKG
+chr2\t3\tT\tTC
+chr3\t8\tA\tMA
+chr3\t1\tC\tCS
+"""
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    dirname = str(tmp_path / "cache")
+    monkeypatch.setattr(genotypes, "_CACHE_DIR", dirname)
+
+    return dirname
+
+
+def _from_text(text=_GENOTYPES):
+    return GenotypeStore.from_text(io.StringIO(text))
+
+
+def _describe(store):
+    result = []
+    for contig in store.contigs:
+        sites = []
+        for row, position in zip(store.rows(contig), store.positions(contig)):
+            sites.append((int(position), store.reference(row), store.genotypes(row)))
+
+        result.append((contig, sites))
+
+    return store.samples, result
+
+
+def _add_file(tar_handle, filename, data):
+    info = tarfile.TarInfo(filename)
+    info.size = len(data)
+    tar_handle.addfile(info, io.BytesIO(data))
+
+
+def _write_database(filename, binary=True, text=True):
+    with tarfile.open(filename, "w") as tar_handle:
+        # Files preceding the table, so that the table is located at an offset
+        _add_file(tar_handle, "settings.yaml", b"Format: 1\n")
+        _add_file(tar_handle, "contigs.txt", b"ID\tSize\n" * 100)
+
+        if binary:
+            handle = io.BytesIO()
+            _from_text().to_file(handle)
+            _add_file(tar_handle, genotypes.BINARY_FILENAME, handle.getvalue())
+
+        if text:
+            _add_file(tar_handle, genotypes.TEXT_FILENAME, _GENOTYPES.encode("ascii"))
+
+    return filename
+
+
+########################################################################################
+# GenotypeStore
+
+
+def test_genotype_store__from_text():
+    store = _from_text()
+
+    assert len(store) == 6
+    assert _describe(store) == (
+        ("S1", "S2"),
+        [
+            ("chr1", [(5, "C", "CY"), (12, "G", "KG"), (20, "A", "AR")]),
+            ("chr2", [(3, "T", "TC")]),
+            ("chr3", [(1, "C", "CS"), (8, "A", "MA")]),
+        ],
+    )
+
+
+def test_genotype_store__from_text__empty_table():
+    store = _from_text("Chrom\tPos\tRef\tS1;S2\n")
+
+    assert len(store) == 0
+    assert store.samples == ("S1", "S2")
+    assert store.contigs == ()
+
+
+def test_genotype_store__from_text__duplicate_samples():
+    with pytest.raises(GenotypeError, match="Duplicate sample"):
+        _from_text("Chrom\tPos\tRef\tS1;S1\n")
+
+
+def test_genotype_store__from_text__malformed_line():
+    with pytest.raises(GenotypeError, match="Malformed line 2"):
+        _from_text("Chrom\tPos\tRef\tS1;S2\nchr1\t5\tC\tCYT\n")
+
+
+def test_genotype_store__from_text__contigs_not_grouped():
+    with pytest.raises(GenotypeError, match="not grouped"):
+        _from_text("Chrom\tPos\tRef\tS1\nchr1\t1\tA\tA\nchr2\t1\tA\tA\nchr1\t2\tA\tA\n")
+
+
+def test_genotype_store__text_to_binary_roundtrip(tmp_path):
+    store = _from_text()
+    filename = str(tmp_path / "genotypes.bin")
+    genotypes.write_genotypes(store, filename)
+
+    with GenotypeStore.from_file(filename) as copy:
+        assert _describe(copy) == _describe(store)
+
+
+def test_genotype_store__empty_roundtrip(tmp_path):
+    store = _from_text("Chrom\tPos\tRef\tS1;S2\n")
+    filename = str(tmp_path / "genotypes.bin")
+    genotypes.write_genotypes(store, filename)
+
+    with GenotypeStore.from_file(filename) as copy:
+        assert _describe(copy) == (("S1", "S2"), [])
+
+
+def test_genotype_store__from_file_at_offset(tmp_path):
+    handle = io.BytesIO()
+    handle.write(b"X" * 1536)
+    _from_text().to_file(handle)
+    handle.write(b"Y" * 100)
+
+    filename = tmp_path / "genotypes.bin"
+    filename.write_bytes(handle.getvalue())
+
+    with GenotypeStore.from_file(str(filename), 1536) as store:
+        assert _describe(store) == _describe(_from_text())
+
+
+def test_genotype_store__from_file__not_a_table(tmp_path):
+    filename = tmp_path / "genotypes.bin"
+    filename.write_bytes(b"ZONKEY" * 100)
+
+    with pytest.raises(GenotypeError, match="not a binary genotypes table"):
+        GenotypeStore.from_file(str(filename))
+
+
+def test_genotype_store__close(tmp_path):
+    filename = str(tmp_path / "genotypes.bin")
+    genotypes.write_genotypes(_from_text(), filename)
+
+    store = GenotypeStore.from_file(filename)
+    mapping = store._mapping
+    assert not mapping.closed
+
+    store.close()
+    assert mapping.closed
+
+    # Closing is idempotent
+    store.close()
+
+
+def test_genotype_store__find():
+    store = _from_text()
+
+    # First and last sites on each contig
+    assert store.reference(store.find("chr1", 5)) == "C"
+    assert store.reference(store.find("chr1", 20)) == "A"
+    assert store.genotypes(store.find("chr2", 3)) == "TC"
+    assert store.genotypes(store.find("chr3", 1)) == "CS"
+    assert store.genotypes(store.find("chr3", 8)) == "MA"
+
+    # Positions without sites, including positions of sites on other contigs
+    assert store.find("chr1", 4) is None
+    assert store.find("chr1", 21) is None
+    assert store.find("chr1", 3) is None
+    assert store.find("chr2", 5) is None
+    assert store.find("chr2", 20) is None
+    assert store.find("chr3", 12) is None
+    assert store.find("chr4", 1) is None
+
+
+def test_genotype_store__positions_and_rows():
+    store = _from_text()
+
+    assert store.contigs == ("chr1", "chr2", "chr3")
+    assert store.rows("chr1") == range(0, 3)
+    assert store.rows("chr2") == range(3, 4)
+    assert store.rows("chr3") == range(4, 6)
+    assert store.positions("chr1").tolist() == [5, 12, 20]
+    assert store.positions("chr2").tolist() == [3]
+    assert store.positions("chr3").tolist() == [1, 8]
+
+
+def test_genotype_store__mismatched_arrays():
+    positions = numpy.array([1, 2], dtype=numpy.uint32)
+    references = numpy.array([65, 65], dtype=numpy.uint8)
+    matrix = numpy.array([[65], [65]], dtype=numpy.uint8)
+
+    with pytest.raises(GenotypeError):
+        GenotypeStore(["S1"], [("chr1", 3)], positions, references, matrix)
+
+    with pytest.raises(GenotypeError):
+        GenotypeStore(["S1", "S2"], [("chr1", 2)], positions, references, matrix)
+
+
+########################################################################################
+# open_genotypes
+
+
+def test_open_genotypes__binary_table_in_database(tmp_path, cache_dir):
+    filename = _write_database(str(tmp_path / "database.tar"))
+
+    with tarfile.open(filename) as tar_handle:
+        offset = tar_handle.getmember(genotypes.BINARY_FILENAME).offset_data
+        assert offset > 0
+
+    expected = _describe(_from_text())
+    with patch.object(GenotypeStore, "from_text") as from_text:
+        with genotypes.open_genotypes(filename) as store:
+            assert _describe(store) == expected
+
+    from_text.assert_not_called()
+    assert not os.path.exists(cache_dir)
+
+
+def test_open_genotypes__text_table_is_cached(tmp_path, cache_dir):
+    filename = _write_database(str(tmp_path / "database.tar"), binary=False)
+
+    with genotypes.open_genotypes(filename) as store:
+        assert _describe(store) == _describe(_from_text())
+
+    (cache_file,) = os.listdir(cache_dir)
+
+    # The cached table is used on subsequent runs
+    expected = _describe(_from_text())
+    with patch.object(GenotypeStore, "from_text") as from_text:
+        with genotypes.open_genotypes(filename) as store:
+            assert _describe(store) == expected
+
+    from_text.assert_not_called()
+    assert os.listdir(cache_dir) == [cache_file]
+
+
+def test_open_genotypes__cache_invalidated_when_database_changes(tmp_path, cache_dir):
+    filename = _write_database(str(tmp_path / "database.tar"), binary=False)
+    with genotypes.open_genotypes(filename):
+        pass
+
+    (cache_file,) = os.listdir(cache_dir)
+
+    # Database is modified, changing the size and mtime of the file
+    with tarfile.open(filename, "a") as tar_handle:
+        _add_file(tar_handle, "README", b"Updated database\n")
+    stats = os.stat(filename)
+    os.utime(filename, ns=(stats.st_atime_ns, stats.st_mtime_ns + 10 ** 9))
+
+    expected = _describe(_from_text())
+    with patch.object(GenotypeStore, "from_text", wraps=GenotypeStore.from_text) as m:
+        with genotypes.open_genotypes(filename) as store:
+            assert _describe(store) == expected
+
+    m.assert_called_once()
+    assert len(os.listdir(cache_dir)) == 2
+    assert cache_file in os.listdir(cache_dir)
+
+
+def test_open_genotypes__corrupt_cache_is_replaced(tmp_path, cache_dir):
+    filename = _write_database(str(tmp_path / "database.tar"), binary=False)
+    with genotypes.open_genotypes(filename):
+        pass
+
+    (cache_file,) = os.listdir(cache_dir)
+    cache_file = os.path.join(cache_dir, cache_file)
+    with open(cache_file, "r+b") as handle:
+        handle.truncate(os.path.getsize(cache_file) - 4)
+
+    with genotypes.open_genotypes(filename) as store:
+        assert _describe(store) == _describe(_from_text())
+
+    with genotypes.GenotypeStore.from_file(cache_file) as store:
+        assert _describe(store) == _describe(_from_text())
+
+
+def test_open_genotypes__cache_disabled(tmp_path, cache_dir):
+    genotypes.set_cache_dir(None)
+    filename = _write_database(str(tmp_path / "database.tar"), binary=False)
+
+    with genotypes.open_genotypes(filename) as store:
+        assert _describe(store) == _describe(_from_text())
+
+    assert not os.path.exists(cache_dir)
+
+
+def test_open_genotypes__no_table(tmp_path):
+    filename = _write_database(str(tmp_path / "database.tar"), False, False)
+
+    with pytest.raises(GenotypeError, match="does not contain required file"):
+        genotypes.open_genotypes(filename)
+
+
+########################################################################################
+# read_samples
+
+
+@pytest.mark.parametrize("binary, text", ((True, False), (False, True)))
+def test_read_samples(tmp_path, cache_dir, binary, text):
+    filename = _write_database(str(tmp_path / "database.tar"), binary, text)
+
+    with tarfile.open(filename) as tar_handle:
+        assert genotypes.read_samples(tar_handle) == ("S1", "S2")
+
+    # Text tables are not converted when only reading the list of samples
+    assert not os.path.exists(cache_dir)
+
+
+def test_read_samples__no_table(tmp_path):
+    filename = _write_database(str(tmp_path / "database.tar"), False, False)
+
+    with tarfile.open(filename) as tar_handle:
+        with pytest.raises(GenotypeError, match="does not contain required file"):
+            genotypes.read_samples(tar_handle)
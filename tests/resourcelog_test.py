@@ -0,0 +1,155 @@
+import json
+
+from paleomix.node import Node
+from paleomix.resourcelog import ResourceLog
+
+
+def _new_node(tmp_path, description):
+    input_file = tmp_path / "input.txt"
+    input_file.touch()
+
+    return Node(description=description, input_files=[str(input_file)])
+
+
+def _new_usage(command, **kwargs):
+    usage = {
+        "command": command,
+        "wall_time": 1.0,
+        "user_time": 1.0,
+        "system_time": 0.5,
+        "max_rss": 1024 ** 2,
+        "bytes_read": 1024,
+        "bytes_written": 2048,
+    }
+    usage.update(kwargs)
+
+    return usage
+
+
+###############################################################################
+###############################################################################
+# add / read
+
+
+def test_resourcelog__add(tmp_path):
+    filename = tmp_path / "log" / "resources.jsonl"
+    node = _new_node(tmp_path, "my node")
+    log = ResourceLog(str(filename))
+
+    log.add(node, {"wall_time": 2.5, "commands": [_new_usage("ls")]})
+
+    (record,) = map(json.loads, filename.read_text().splitlines())
+    assert record["node"] == "my node"
+    assert record["class"] == "Node"
+    assert record["threads"] == 1
+    assert record["wall_time"] == 2.5
+    assert record["commands"] == [_new_usage("ls")]
+
+
+def test_resourcelog__read__missing_file(tmp_path):
+    assert ResourceLog(str(tmp_path / "resources.jsonl")).read() == {}
+
+
+def test_resourcelog__read__latest_records(tmp_path):
+    log = ResourceLog(str(tmp_path / "resources.jsonl"))
+    node_1 = _new_node(tmp_path, "node 1")
+    node_2 = _new_node(tmp_path, "node 2")
+
+    log.add(node_1, {"wall_time": 1.0, "commands": []})
+    log.add(node_2, {"wall_time": 2.0, "commands": []})
+    log.add(node_1, {"wall_time": 3.0, "commands": []})
+
+    records = log.read()
+    assert sorted(records) == [("Node", "node 1"), ("Node", "node 2")]
+    assert records[("Node", "node 1")]["wall_time"] == 3.0
+    assert records[("Node", "node 2")]["wall_time"] == 2.0
+
+
+def test_resourcelog__read__malformed_records(tmp_path):
+    filename = tmp_path / "resources.jsonl"
+    log = ResourceLog(str(filename))
+    log.add(_new_node(tmp_path, "node"), {"wall_time": 1.0, "commands": []})
+    with filename.open("a") as handle:
+        handle.write('{"truncated": \n[]\n{"node": "foo"}\n')
+
+    assert list(log.read()) == [("Node", "node")]
+
+
+###############################################################################
+###############################################################################
+# runtimes
+
+
+def test_resourcelog__runtimes__empty_log(tmp_path):
+    log = ResourceLog(str(tmp_path / "resources.jsonl"))
+
+    assert log.runtimes([_new_node(tmp_path, "node")]) == {}
+
+
+def test_resourcelog__runtimes__median_for_new_nodes(tmp_path):
+    log = ResourceLog(str(tmp_path / "resources.jsonl"))
+    nodes = [_new_node(tmp_path, "node %i" % (idx,)) for idx in range(4)]
+    for (node, wall_time) in zip(nodes, (1.0, 2.0, 9.0)):
+        log.add(node, {"wall_time": wall_time, "commands": []})
+
+    assert log.runtimes(nodes) == {
+        nodes[0]: 1.0,
+        nodes[1]: 2.0,
+        nodes[2]: 9.0,
+        nodes[3]: 2.0,
+    }
+
+
+class _OtherNode(Node):
+    pass
+
+
+def test_resourcelog__runtimes__median_for_same_class(tmp_path):
+    log = ResourceLog(str(tmp_path / "resources.jsonl"))
+    input_file = tmp_path / "input.txt"
+    input_file.touch()
+
+    nodes = [_new_node(tmp_path, "node %i" % (idx,)) for idx in range(3)]
+    other_nodes = [
+        _OtherNode(description="other %i" % (idx,), input_files=[str(input_file)])
+        for idx in range(3)
+    ]
+
+    for (node, wall_time) in zip(nodes, (1.0, 2.0)):
+        log.add(node, {"wall_time": wall_time, "commands": []})
+    for (node, wall_time) in zip(other_nodes, (100.0, 200.0)):
+        log.add(node, {"wall_time": wall_time, "commands": []})
+
+    runtimes = log.runtimes(nodes + other_nodes)
+    assert runtimes[nodes[2]] == 1.5
+    assert runtimes[other_nodes[2]] == 150.0
+
+
+###############################################################################
+###############################################################################
+# summarize
+
+
+def test_resourcelog__summarize(tmp_path):
+    log = ResourceLog(str(tmp_path / "resources.jsonl"))
+    node_1 = _new_node(tmp_path, "node 1")
+    node_2 = _new_node(tmp_path, "node 2")
+
+    log.add(node_1, {"wall_time": 1.0, "commands": [_new_usage("ls", max_rss=1)]})
+    log.add(
+        node_2,
+        {
+            "wall_time": 2.0,
+            "commands": [
+                _new_usage("samtools sort", wall_time=3600.0),
+                _new_usage("ls", max_rss=None, bytes_read=None),
+            ],
+        },
+    )
+
+    assert [line.split() for line in log.summarize()] == [
+        ["Runs", "Wall", "User", "System", "MaxRSS", "Read", "Written", "Command"],
+        ["2", "0:00:02", "0:00:02", "0:00:01", "1", "1K", "4K", "ls"],
+        ["1", "1:00:00", "0:00:01", "0:00:00", "1M", "1K", "2K", "samtools", "sort"],
+        ["3", "1:00:02", "0:00:03", "0:00:02", "1M", "2K", "6K", "*"],
+    ]
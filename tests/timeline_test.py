@@ -0,0 +1,143 @@
+import json
+
+from paleomix.node import Node
+from paleomix.timeline import Timeline
+
+
+def _new_node(tmp_path, description, threads=1):
+    input_file = tmp_path / "input.txt"
+    input_file.touch()
+
+    return Node(description=description, threads=threads, input_files=[str(input_file)])
+
+
+def _read_events(filename, phase=None):
+    with open(str(filename)) as handle:
+        events = json.load(handle)
+
+    return [event for event in events if phase is None or event["ph"] == phase]
+
+
+def test_timeline__empty(tmp_path):
+    filename = tmp_path / "timeline.json"
+    with Timeline(str(filename)):
+        pass
+
+    assert _read_events(filename) == [
+        {
+            "name": "process_name",
+            "ph": "M",
+            "pid": 0,
+            "tid": 0,
+            "args": {"name": "Pipeline"},
+        }
+    ]
+
+
+def test_timeline__node_spans(tmp_path):
+    filename = tmp_path / "timeline.json"
+    node = _new_node(tmp_path, "my node", threads=3)
+    with Timeline(str(filename)) as timeline:
+        timeline.node_started(node)
+        timeline.node_finished(node)
+
+    (span,) = _read_events(filename, "X")
+    assert span["name"] == "my node"
+    assert (span["pid"], span["tid"]) == (1, 0)
+    assert span["args"] == {"threads": 3, "memory": 0}
+    assert span["ts"] >= 0
+    assert span["dur"] >= 0
+
+
+def test_timeline__node_spans__error(tmp_path):
+    filename = tmp_path / "timeline.json"
+    node = _new_node(tmp_path, "my node")
+    with Timeline(str(filename)) as timeline:
+        timeline.node_started(node)
+        timeline.node_finished(node, error=ValueError("oops"))
+
+    (span,) = _read_events(filename, "X")
+    assert span["args"]["error"] == "ValueError: oops"
+
+
+def test_timeline__command_spans(tmp_path):
+    filename = tmp_path / "timeline.json"
+    node = _new_node(tmp_path, "my node")
+    with Timeline(str(filename)) as timeline:
+        start_time = timeline._start_time
+        record = {
+            "start_time": start_time + 1.0,
+            "wall_time": 3.0,
+            "commands": [
+                {"command": "cat", "start_time": start_time + 1.5, "wall_time": 1.0},
+                {"command": "gzip", "start_time": start_time + 1.5, "wall_time": 2.0},
+            ],
+        }
+
+        timeline.node_started(node)
+        timeline.node_finished(node, record)
+
+    spans = [
+        (event["name"], event["tid"], event["ts"], event["dur"])
+        for event in _read_events(filename, "X")
+    ]
+    assert spans == [
+        ("my node", 0, 1000000, 3000000),
+        ("cat", 1, 1500000, 1000000),
+        ("gzip", 2, 1500000, 2000000),
+    ]
+
+    tracks = [
+        (event["pid"], event["tid"], event["args"]["name"])
+        for event in _read_events(filename, "M")
+        if event["name"] == "thread_name"
+    ]
+    assert tracks == [(1, 0, "Nodes"), (1, 1, "Command 1"), (1, 2, "Command 2")]
+
+
+def test_timeline__slots_are_reused(tmp_path):
+    filename = tmp_path / "timeline.json"
+    node_1 = _new_node(tmp_path, "node 1")
+    node_2 = _new_node(tmp_path, "node 2")
+    node_3 = _new_node(tmp_path, "node 3")
+    node_4 = _new_node(tmp_path, "node 4")
+
+    with Timeline(str(filename)) as timeline:
+        timeline.node_started(node_1)
+        timeline.node_started(node_2)
+        timeline.node_started(node_3)
+        timeline.node_finished(node_2)
+        timeline.node_finished(node_1)
+        timeline.node_started(node_4)
+        timeline.node_finished(node_3)
+        timeline.node_finished(node_4)
+
+    slots = {event["name"]: event["pid"] for event in _read_events(filename, "X")}
+    assert slots == {"node 1": 1, "node 2": 2, "node 3": 3, "node 4": 1}
+
+
+def test_timeline__counters(tmp_path):
+    filename = tmp_path / "timeline.json"
+    with Timeline(str(filename)) as timeline:
+        timeline.set_counters(running_threads=4, queued_nodes=7)
+
+    counters = [
+        (event["name"], event["pid"], event["args"])
+        for event in _read_events(filename, "C")
+    ]
+    assert counters == [
+        ("Threads", 0, {"running": 4}),
+        ("Nodes", 0, {"queued": 7}),
+    ]
+
+
+def test_timeline__unterminated_trace(tmp_path):
+    filename = tmp_path / "timeline.json"
+    timeline = Timeline(str(filename))
+    timeline.set_counters(running_threads=1, queued_nodes=0)
+    timeline._handle.close()
+
+    # Viewers accept traces in which the closing bracket is missing
+    text = filename.read_text()
+    assert not text.rstrip().endswith("]")
+    assert len(json.loads(text + "]")) == 3
@@ -0,0 +1,85 @@
+import random
+
+import pysam
+import pytest
+
+import paleomix.tools.coverage as coverage
+import paleomix.tools.coverage_depths as coverage_depths
+import paleomix.tools.depths as depths
+
+
+_READGROUPS = [
+    {"ID": "rg1", "SM": "sample1", "LB": "library1"},
+    {"ID": "rg2", "SM": "sample1", "LB": "library2"},
+    {"ID": "rg3", "SM": "sample2", "LB": "library3"},
+]
+
+
+def _write_random_bam(filename, seed, contigs):
+    rng = random.Random(seed)
+    header = {
+        "HD": {"VN": "1.0", "SO": "coordinate"},
+        "SQ": [{"SN": name, "LN": length} for name, length in contigs],
+        "RG": _READGROUPS,
+    }
+
+    records = []
+    for idx in range(500):
+        tid = rng.randrange(len(contigs))
+        cigar = [(0, rng.randint(1, 50)), (rng.choice((1, 2, 3)), 5), (0, 10)]
+
+        record = pysam.AlignedSegment()
+        record.query_name = rng.choice(("read_%i", "M_read_%i")) % (idx,)
+        record.query_sequence = "A" * sum(n for op, n in cigar if op in (0, 1))
+        record.flag = rng.choice((0, 0x1 | 0x40, 0x1 | 0x80))
+        record.reference_id = tid
+        record.reference_start = rng.randrange(contigs[tid][1])
+        record.cigartuples = cigar
+        if rng.random() < 0.9:
+            record.set_tag("RG", rng.choice(("rg1", "rg2", "rg3", "rg4")))
+        records.append(record)
+
+    records.sort(key=lambda record: (record.reference_id, record.reference_start))
+    with pysam.AlignmentFile(str(filename), "wb", header=header) as handle:
+        for record in records:
+            handle.write(record)
+
+    pysam.index(str(filename))
+
+    return str(filename)
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("threads", ("1", "3"))
+@pytest.mark.parametrize(
+    "args", ([], ["--max-contigs", "1"], ["--ignore-readgroups"], ["--regions-file"])
+)
+def test_coverage_depths__matches_separate_tools(tmp_path, seed, threads, args):
+    contigs = (("chr1", 2000), ("chr2", 500), ("chr3", 100))
+    filename = _write_random_bam(tmp_path / "input.bam", seed, contigs)
+
+    if args == ["--regions-file"]:
+        regions = tmp_path / "regions.bed"
+        regions.write_text("chr1\t10\t300\tfoo\nchr1\t200\t900\nchr2\t0\t500\tfoo\n")
+        args = args + [str(regions)]
+
+    cov_expected = tmp_path / "expected.coverage"
+    assert coverage.main([filename, str(cov_expected)] + args) == 0
+    depths_expected = tmp_path / "expected.depths"
+    assert depths.main([filename, str(depths_expected)] + args) == 0
+
+    cov_output = tmp_path / "output.coverage"
+    depths_output = tmp_path / "output.depths"
+    argv = [filename, str(cov_output), str(depths_output), "--threads", threads]
+    assert coverage_depths.main(argv + args) == 0
+
+    assert cov_output.read_text() == cov_expected.read_text()
+    assert depths_output.read_text() == depths_expected.read_text()
+
+
+def test_coverage_depths__default_filenames(tmp_path):
+    filename = _write_random_bam(tmp_path / "input.bam", 0, (("chr1", 1000),))
+
+    assert coverage_depths.main([filename]) == 0
+    assert (tmp_path / "input.coverage").exists()
+    assert (tmp_path / "input.depths").exists()
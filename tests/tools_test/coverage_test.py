@@ -0,0 +1,108 @@
+import multiprocessing.pool
+import random
+
+import pysam
+import pytest
+
+import paleomix.tools.coverage as coverage
+
+_READGROUPS = [
+    {"ID": "rg1", "SM": "sample1", "LB": "library1"},
+    {"ID": "rg2", "SM": "sample2", "LB": "library2"},
+]
+
+
+def _write_random_bam(filename, seed, contigs):
+    rng = random.Random(seed)
+    header = {
+        "HD": {"VN": "1.0", "SO": "coordinate"},
+        "SQ": [{"SN": name, "LN": length} for name, length in contigs],
+        "RG": _READGROUPS,
+    }
+
+    records = []
+    for idx in range(500):
+        tid = rng.randrange(len(contigs))
+        cigar = [(0, rng.randint(1, 50)), (rng.choice((1, 2)), 5), (0, 10)]
+
+        record = pysam.AlignedSegment()
+        record.query_name = rng.choice(("read_%i", "M_read_%i")) % (idx,)
+        record.query_sequence = "A" * sum(n for op, n in cigar if op in (0, 1))
+        record.flag = rng.choice((0, 0x1 | 0x40, 0x1 | 0x80))
+        record.reference_id = tid
+        record.reference_start = rng.randrange(contigs[tid][1])
+        record.cigartuples = cigar
+        record.set_tag("RG", rng.choice(("rg1", "rg2", "rg3")))
+        records.append(record)
+
+    records.sort(key=lambda record: (record.reference_id, record.reference_start))
+    with pysam.AlignmentFile(str(filename), "wb", header=header) as handle:
+        for record in records:
+            handle.write(record)
+
+    pysam.index(str(filename))
+
+    return str(filename)
+
+
+def _run_coverage(tmp_path, filename, *args):
+    output = tmp_path / "output.txt"
+    assert (
+        coverage.main([filename, str(output), "--overwrite-output"] + list(args)) == 0
+    )
+
+    return output.read_text()
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("args", ([], ["--max-contigs", "1"], ["--regions-file"]))
+def test_coverage__threads(tmp_path, seed, args):
+    contigs = (("chr1", 2000), ("chr2", 500), ("chr3", 100), ("chr4", 1000))
+    filename = _write_random_bam(tmp_path / "input.bam", seed, contigs)
+
+    if args == ["--regions-file"]:
+        regions = tmp_path / "regions.bed"
+        regions.write_text("chr1\t10\t300\tfoo\nchr1\t200\t900\nchr2\t0\t500\tfoo\n")
+        args = args + [str(regions)]
+
+    expected = _run_coverage(tmp_path, filename, *args)
+    assert _run_coverage(tmp_path, filename, "--threads", "3", *args) == expected
+
+
+_count_regions = coverage.count_regions
+
+
+def _unsorted_count_regions(handle, args, regions, timer):
+    if any(region.contig == "chr2" for region in regions):
+        # Equivalent to finding unsorted records in the shard
+        return None
+
+    return _count_regions(handle, args, regions, timer)
+
+
+def test_coverage__threads__unsorted_input(tmp_path, monkeypatch):
+    contigs = (("chr1", 2000), ("chr2", 500), ("chr3", 100), ("chr4", 1000))
+    filename = _write_random_bam(tmp_path / "input.bam", 1234, contigs)
+
+    calls = []
+    join = multiprocessing.pool.Pool.join
+    terminate = multiprocessing.pool.Pool.terminate
+    monkeypatch.setattr(
+        multiprocessing.pool.Pool,
+        "join",
+        lambda pool: calls.append("join") or join(pool),
+    )
+    monkeypatch.setattr(
+        multiprocessing.pool.Pool,
+        "terminate",
+        lambda pool: calls.append("terminate") or terminate(pool),
+    )
+    monkeypatch.setattr(coverage, "count_regions", _unsorted_count_regions)
+
+    output = tmp_path / "output.txt"
+    argv = [filename, str(output), "--threads", "2"]
+    assert coverage.main(argv) == 1
+
+    # Workers are shut down gracefully when results are not fully consumed
+    assert calls == ["join"]
+    assert not output.exists()
@@ -0,0 +1,261 @@
+import collections
+import io
+import random
+
+import pysam
+import pytest
+
+import paleomix.tools.depths as depths
+
+from paleomix.common.bamfiles import BAMRegionsIter
+from paleomix.tools.bam_stats.common import parse_arguments
+
+
+_READGROUPS = [
+    {"ID": "rg1", "SM": "sample1", "LB": "library1"},
+    {"ID": "rg2", "SM": "sample1", "LB": "library2"},
+    {"ID": "rg3", "SM": "sample2", "LB": "library3"},
+]
+
+
+def _write_bam(filename, records, contigs=(("chr1", 1000),), readgroups=()):
+    header = {
+        "HD": {"VN": "1.0", "SO": "coordinate"},
+        "SQ": [{"SN": name, "LN": length} for name, length in contigs],
+    }
+    if readgroups:
+        header["RG"] = list(readgroups)
+
+    with pysam.AlignmentFile(str(filename), "wb", header=header) as handle:
+        records = sorted(records, key=lambda it: it[:2])
+        for idx, (tid, pos, cigar, readgroup) in enumerate(records):
+            record = pysam.AlignedSegment()
+            record.query_name = "read_%i" % (idx,)
+            record.query_sequence = "A" * sum(
+                count for op, count in cigar if op in (0, 1, 4, 7, 8)
+            )
+            record.reference_id = tid
+            record.reference_start = pos
+            record.cigartuples = cigar
+            if readgroup is not None:
+                record.set_tag("RG", readgroup)
+
+            handle.write(record)
+
+    return str(filename)
+
+
+def _random_records(rng, contigs, nreads, readgroups):
+    records = []
+    for _ in range(nreads):
+        tid = rng.randrange(len(contigs))
+        cigar = [(0, rng.randint(1, 50))]
+        for _ in range(rng.randint(0, 2)):
+            cigar.append((rng.choice((1, 2, 3)), rng.randint(1, 10)))
+            cigar.append((rng.choice((0, 7, 8)), rng.randint(1, 50)))
+        if rng.random() < 0.2:
+            cigar.insert(0, (4, rng.randint(1, 10)))
+
+        readgroup = rng.choice([rg["ID"] for rg in readgroups] + [None, "unknown"])
+        records.append((tid, rng.randrange(contigs[tid][1]), cigar, readgroup))
+
+    return records
+
+
+def _run_depths(tmp_path, filename, *args):
+    output = tmp_path / "output.txt"
+    assert depths.main([filename, str(output), "--overwrite-output"] + list(args)) == 0
+
+    return output.read_text()
+
+
+def _naive_depths(filename, *args):
+    """Reference implementation counting the depth at every position."""
+    args = parse_arguments([filename, "-"] + list(args), ".depths")
+    args.regions = None
+
+    handle = io.StringIO()
+    with pysam.AlignmentFile(filename) as bamfile:
+        totals = depths.build_totals_dict(args, bamfile)
+        rg_to_smlbid, smlbid_to_smlb = depths.build_rg_to_smlbid_keys(args, bamfile)
+
+        for region in BAMRegionsIter(bamfile):
+            if region.name is None:
+                break
+            elif bamfile.nreferences > args.max_contigs:
+                region.name = "<Genome>"
+
+            counts = collections.defaultdict(collections.Counter)
+            for _, records in region:
+                for record in records:
+                    key = rg_to_smlbid.get(args.get_readgroup_func(record))
+                    if key is None:
+                        key = rg_to_smlbid[None]
+
+                    for start, end in record.get_blocks():
+                        for position in range(start, min(end, region.end)):
+                            counts[position][smlbid_to_smlb[key]] += 1
+
+            for site in counts.values():
+                depth_per_key = collections.Counter()
+                for (sm_key, lb_key), count in site.items():
+                    for key in set(
+                        id(totals[key])
+                        for key in (
+                            ("*", "*", "*"),
+                            (sm_key, "*", "*"),
+                            (sm_key, "*", region.name),
+                            (sm_key, lb_key, "*"),
+                            (sm_key, lb_key, region.name),
+                        )
+                    ):
+                        depth_per_key[key] += count
+
+                for key, depth in depth_per_key.items():
+                    for counts_dict in totals.values():
+                        if id(counts_dict) == key:
+                            counts_dict[depth] += 1
+                            break
+
+        if not args.ignore_readgroups:
+            if not any(value for (key, _, _), value in totals.items() if key == "<NA>"):
+                for key in list(totals):
+                    if key[0] == "<NA>":
+                        totals.pop(key)
+
+        args.outfile = "-"
+        lengths = depths.collect_references(args, bamfile)
+        handle.write(depths._HEADER)
+        handle.write("\n")
+        for line in depths.build_table(args.target_name, totals, lengths):
+            handle.write("\t".join(map(str, line)))
+            handle.write("\n")
+
+    return handle.getvalue()
+
+
+###############################################################################
+###############################################################################
+# Depth histograms
+
+
+def test_depths__simple(tmp_path):
+    filename = _write_bam(
+        tmp_path / "input.bam",
+        [(0, 10, [(0, 10)], None), (0, 15, [(0, 5), (2, 5), (0, 5)], None)],
+        contigs=(("chr1", 100),),
+    )
+
+    output = _run_depths(tmp_path, filename)
+    rows = [line.split("\t") for line in output.split("\n")]
+    rows = {tuple(row[1:4]): row[4:9] for row in rows if row[0] == "input.bam"}
+
+    # 15 positions with depth >= 1 and 5 positions with depth >= 2
+    expected = ["100", "NA", "0.1500", "0.0500", "0.0000"]
+    assert rows == {
+        ("*", "*", "*"): expected,
+        ("*", "*", "chr1"): expected,
+        ("<NA>", "*", "*"): expected,
+        ("<NA>", "*", "chr1"): expected,
+        ("<NA>", "<NA>", "*"): expected,
+        ("<NA>", "<NA>", "chr1"): expected,
+    }
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("args", ([], ["--ignore-readgroups"], ["--max-contigs", "1"]))
+def test_depths__matches_naive_implementation(tmp_path, seed, args):
+    rng = random.Random(seed)
+    contigs = (("chr1", 2000), ("chr2", 500), ("chr3", 100))
+    records = _random_records(rng, contigs, 500, _READGROUPS)
+    filename = _write_bam(tmp_path / "input.bam", records, contigs, _READGROUPS)
+
+    assert _run_depths(tmp_path, filename, *args) == _naive_depths(filename, *args)
+
+
+@pytest.mark.parametrize("window_size", (1, 7, 2 ** 16))
+@pytest.mark.parametrize("buffered_blocks", (1, 13, 2 ** 16))
+def test_depths__independent_of_window_size(
+    tmp_path, monkeypatch, window_size, buffered_blocks
+):
+    monkeypatch.setattr(depths, "_WINDOW_SIZE", window_size)
+    monkeypatch.setattr(depths, "_MAX_BUFFERED_BLOCKS", buffered_blocks)
+
+    rng = random.Random(window_size + buffered_blocks)
+    contigs = (("chr1", 2000), ("chr2", 500))
+    records = _random_records(rng, contigs, 250, _READGROUPS)
+    filename = _write_bam(tmp_path / "input.bam", records, contigs, _READGROUPS)
+
+    assert _run_depths(tmp_path, filename) == _naive_depths(filename)
+
+
+def test_depths__regions(tmp_path):
+    filename = _write_bam(
+        tmp_path / "input.bam",
+        [(0, 0, [(0, 50)], None), (0, 20, [(0, 50)], None)],
+        contigs=(("chr1", 100),),
+    )
+    pysam.index(filename)
+
+    regions = tmp_path / "regions.bed"
+    regions.write_text("chr1\t10\t30\tfoo\nchr1\t60\t80\tbar\n")
+
+    output = _run_depths(tmp_path, filename, "--regions-file", str(regions))
+    rows = [line.split("\t") for line in output.split("\n")]
+    rows = {row[3]: row[4:8] for row in rows if row[0] == "input.bam"}
+
+    assert rows == {
+        "*": ["40", "NA", "0.7500", "0.2500"],
+        "bar": ["20", "NA", "0.5000", "0.0000"],
+        "foo": ["20", "NA", "1.0000", "0.5000"],
+    }
+
+
+def test_depths__unsorted_input(tmp_path):
+    filename = _write_bam(tmp_path / "input.bam", [])
+    with pysam.AlignmentFile(filename) as handle:
+        header = handle.header.to_dict()
+
+    with pysam.AlignmentFile(filename, "wb", header=header) as handle:
+        for pos in (100, 50):
+            record = pysam.AlignedSegment()
+            record.query_name = "read"
+            record.query_sequence = "ACGT"
+            record.reference_id = 0
+            record.reference_start = pos
+            record.cigartuples = [(0, 4)]
+            handle.write(record)
+
+    output = tmp_path / "output.txt"
+    assert depths.main([filename, str(output)]) == 1
+    assert not output.exists()
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("args", ([], ["--max-contigs", "1"], ["--regions-file"]))
+def test_depths__threads(tmp_path, seed, args):
+    rng = random.Random(seed)
+    contigs = (("chr1", 2000), ("chr2", 500), ("chr3", 100), ("chr4", 1000))
+    records = _random_records(rng, contigs, 500, _READGROUPS)
+    filename = _write_bam(tmp_path / "input.bam", records, contigs, _READGROUPS)
+    pysam.index(filename)
+
+    if args == ["--regions-file"]:
+        regions = tmp_path / "regions.bed"
+        regions.write_text(
+            "chr1\t10\t300\tfoo\nchr1\t200\t900\nchr2\t0\t500\tfoo\nchr4\t5\t10\n"
+        )
+        args = args + [str(regions)]
+
+    expected = _run_depths(tmp_path, filename, *args)
+    assert _run_depths(tmp_path, filename, "--threads", "3", *args) == expected
+
+
+def test_depths__threads_without_index(tmp_path):
+    rng = random.Random(12345)
+    contigs = (("chr1", 2000), ("chr2", 500))
+    records = _random_records(rng, contigs, 250, _READGROUPS)
+    filename = _write_bam(tmp_path / "input.bam", records, contigs, _READGROUPS)
+
+    expected = _run_depths(tmp_path, filename)
+    assert _run_depths(tmp_path, filename, "--threads", "3") == expected
@@ -0,0 +1,276 @@
+import io
+import multiprocessing.pool
+import os
+import random
+import subprocess
+import sys
+
+from types import SimpleNamespace
+
+import pysam
+import pytest
+
+import paleomix.main
+import paleomix.tools.rmdup_collapsed as rmdup_collapsed
+
+from paleomix.tools.rmdup_collapsed import unclipped_alignment_coordinates
+
+_CONTIGS = (("chr1", 2000), ("chr2", 500), ("chr3", 100), ("chr4", 1000))
+
+
+def _new_record(name, tid, pos, cigar, flag=0, qualities=True):
+    record = pysam.AlignedSegment()
+    record.query_name = name
+    record.flag = flag
+    record.reference_id = tid
+    record.reference_start = pos
+    record.cigartuples = cigar
+    record.query_sequence = "A" * sum(
+        count for op, count in cigar if op in (0, 1, 4, 7, 8)
+    )
+    if not cigar:
+        record.query_sequence = "ACGT"
+    if qualities:
+        record.query_qualities = [30] * len(record.query_sequence)
+
+    return record
+
+
+def _write_bam(filename, records, contigs=_CONTIGS, index=True):
+    header = {
+        "HD": {"VN": "1.0", "SO": "coordinate"},
+        "SQ": [{"SN": name, "LN": length} for name, length in contigs],
+    }
+
+    with pysam.AlignmentFile(str(filename), "wb", header=header) as handle:
+        for record in records:
+            handle.write(record)
+
+    if index:
+        pysam.index(str(filename))
+
+    return str(filename)
+
+
+def _random_records(rng, nreads, contigs=_CONTIGS):
+    records = []
+    for idx in range(nreads):
+        tid = rng.randrange(len(contigs))
+        pos = rng.randrange(contigs[tid][1] - 50)
+        if records and rng.random() < 0.3:
+            # Duplicate (position) of a recent read
+            other = records[rng.randrange(max(0, len(records) - 10), len(records))]
+            tid, pos = other.reference_id, other.reference_start
+
+        cigar = [(0, rng.randint(20, 50))]
+        if rng.random() < 0.2:
+            cigar.insert(0, (4, rng.randint(1, 5)))
+        if rng.random() < 0.2:
+            cigar.append((4, rng.randint(1, 5)))
+
+        flag = rng.choice((0, 0x10))
+        if rng.random() < 0.05:
+            flag |= 0x4
+
+        record = _new_record("read_%i" % (idx,), tid, pos, cigar, flag)
+        record.query_qualities = [rng.randrange(40) for _ in record.query_qualities]
+        if rng.random() < 0.1:
+            record.set_tag("XP", rng.randint(1, 5))
+
+        records.append(record)
+
+    records.sort(key=lambda record: (record.reference_id, record.reference_start))
+    for idx in range(5):
+        records.append(_new_record("unmapped_%i" % (idx,), -1, -1, [], 0x4))
+
+    return records
+
+
+def _run_rmdup(filename, *args, stdin=None, returncode=0, env=None):
+    command = [sys.executable, paleomix.main.__file__, "rmdup_collapsed"]
+    command.extend(args)
+    if filename is not None:
+        command.append(filename)
+
+    proc = subprocess.run(
+        command, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env
+    )
+    assert proc.returncode == returncode, proc.stderr
+
+    return proc.stdout
+
+
+def _read_records(tmp_path, data):
+    filename = tmp_path / "output.bam"
+    filename.write_bytes(data)
+
+    with pysam.AlignmentFile(str(filename)) as handle:
+        return [record.to_string() for record in handle]
+
+
+###############################################################################
+###############################################################################
+# unclipped_alignment_coordinates
+
+
+def test_unclipped_alignment_coordinates__unique_keys():
+    keys = {}
+    for start in range(3):
+        for clipped in range(3):
+            for length in range(1, 4):
+                for flag in (0, 0x10):
+                    cigar = [(4, clipped), (0, length)] if clipped else [(0, length)]
+                    record = _new_record("read", 0, start, cigar, flag)
+                    key, end = unclipped_alignment_coordinates(record)
+
+                    assert end == start + length
+                    keys.setdefault(key, set()).add((start - clipped, end, flag))
+
+    assert all(len(values) == 1 for values in keys.values())
+
+
+###############################################################################
+###############################################################################
+# rmdup_collapsed
+
+
+def test_rmdup_collapsed__marks_duplicates(tmp_path):
+    records = [
+        _new_record("read_1", 0, 10, [(0, 10)]),
+        _new_record("read_2", 0, 10, [(0, 10)]),
+        _new_record("read_3", 0, 10, [(0, 10)], flag=0x10),
+        _new_record("read_4", 0, 12, [(4, 2), (0, 8)]),
+        _new_record("read_5", 1, 10, [(0, 10)]),
+    ]
+    records[1].query_qualities = [40] * 10
+    filename = _write_bam(tmp_path / "input.bam", records)
+
+    result = {}
+    for line in _read_records(tmp_path, _run_rmdup(filename)):
+        fields = line.split("\t")
+        result[fields[0]] = (int(fields[1]) & 0x400, fields[11:])
+
+    assert result == {
+        "read_1": (0x400, []),
+        "read_2": (0, ["XP:i:3"]),
+        "read_3": (0, ["XP:i:1"]),
+        "read_4": (0x400, []),
+        "read_5": (0, ["XP:i:1"]),
+    }
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("args", ([], ["--remove-duplicates"]))
+def test_rmdup_collapsed__threads(tmp_path, seed, args):
+    rng = random.Random(seed)
+    filename = _write_bam(tmp_path / "input.bam", _random_records(rng, 500))
+
+    expected = _read_records(tmp_path, _run_rmdup(filename, *args))
+    result = _run_rmdup(filename, "--threads", "3", *args)
+
+    assert _read_records(tmp_path, result) == expected
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_rmdup_collapsed__threads_without_qualities(tmp_path, seed):
+    rng = random.Random(seed)
+    records = _random_records(rng, 500)
+    for record in records:
+        record.query_qualities = None
+    filename = _write_bam(tmp_path / "input.bam", records)
+
+    expected = _read_records(tmp_path, _run_rmdup(filename, "--seed", "1234"))
+    result = _run_rmdup(filename, "--seed", "1234", "--threads", "3")
+
+    assert _read_records(tmp_path, result) == expected
+
+
+def test_rmdup_collapsed__threads_with_stdin(tmp_path):
+    rng = random.Random(12345)
+    filename = _write_bam(tmp_path / "input.bam", _random_records(rng, 250))
+    expected = _run_rmdup(filename)
+
+    with open(filename, "rb") as handle:
+        result = _run_rmdup(None, "--threads", "3", stdin=handle)
+
+    assert _read_records(tmp_path, result) == _read_records(tmp_path, expected)
+
+
+def test_rmdup_collapsed__threads_with_temp_dir(tmp_path):
+    rng = random.Random(23456)
+    filename = _write_bam(tmp_path / "input.bam", _random_records(rng, 250))
+    expected = _run_rmdup(filename)
+
+    temp_dir = tmp_path / "temp"
+    temp_dir.mkdir()
+    system_temp_dir = tmp_path / "system_temp"
+    system_temp_dir.mkdir()
+
+    env = dict(os.environ)
+    env["TMPDIR"] = str(system_temp_dir)
+    result = _run_rmdup(
+        filename, "--threads", "3", "--temp-dir", str(temp_dir), env=env
+    )
+
+    assert _read_records(tmp_path, result) == _read_records(tmp_path, expected)
+    assert os.listdir(str(temp_dir)) == []
+    assert os.listdir(str(system_temp_dir)) == []
+
+
+_process_contig = rmdup_collapsed._process_contig
+
+
+def _failing_process_contig(task):
+    returncode, filename = _process_contig(task)
+    _, _, idx, _ = task
+    if idx == 1:
+        return 1, filename
+
+    return returncode, filename
+
+
+def test_process_parallel__failing_worker(tmp_path, monkeypatch):
+    rng = random.Random(34567)
+    filename = _write_bam(tmp_path / "input.bam", _random_records(rng, 250))
+    args = rmdup_collapsed.parse_args([filename, "--threads", "2"])
+    args.temp_dir = str(tmp_path / "temp")
+    os.mkdir(args.temp_dir)
+
+    joined = []
+    join = multiprocessing.pool.Pool.join
+    monkeypatch.setattr(
+        multiprocessing.pool.Pool, "join", lambda pool: joined.append(join(pool))
+    )
+    monkeypatch.setattr(rmdup_collapsed, "_process_contig", _failing_process_contig)
+    monkeypatch.setattr(sys, "stdout", SimpleNamespace(buffer=io.BytesIO()))
+
+    with pysam.AlignmentFile(filename) as infile:
+        assert rmdup_collapsed.process_parallel(args, infile) == 1
+
+    # Workers are shut down gracefully and temporary files are removed
+    assert joined == [None]
+    assert os.listdir(args.temp_dir) == []
+
+
+@pytest.mark.parametrize("threads", ("1", "3"))
+def test_rmdup_collapsed__compression_level(tmp_path, threads):
+    rng = random.Random(54321)
+    filename = _write_bam(tmp_path / "input.bam", _random_records(rng, 500))
+
+    expected = _run_rmdup(filename)
+    uncompressed = _run_rmdup(
+        filename, "--compression-level", "0", "--threads", threads
+    )
+
+    assert len(uncompressed) > len(expected)
+    assert _read_records(tmp_path, uncompressed) == _read_records(tmp_path, expected)
+
+
+def test_rmdup_collapsed__unsorted_input(tmp_path):
+    records = [
+        _new_record("read_1", 0, 100, [(0, 10)]),
+        _new_record("read_2", 0, 50, [(0, 10)]),
+    ]
+    filename = _write_bam(tmp_path / "input.bam", records, index=False)
+
+    _run_rmdup(filename, returncode=1)
@@ -0,0 +1,118 @@
+import gzip
+
+import pytest
+
+import paleomix.tools.split_fastq as split_fastq
+
+
+def _records(nreads, name="read"):
+    return ["@%s_%i\nACGT\n+\nIIII\n" % (name, idx) for idx in range(nreads)]
+
+
+def _write_fastq(tmp_path, records, name="reads.fq.gz"):
+    filename = tmp_path / name
+    filename.write_bytes(gzip.compress("".join(records).encode("utf-8")))
+
+    return str(filename)
+
+
+def _read_records(filename):
+    with gzip.open(filename, "rt") as handle:
+        lines = handle.readlines()
+
+    return ["".join(lines[idx : idx + 4]) for idx in range(0, len(lines), 4)]
+
+
+def _output_files(tmp_path, nchunks, name="chunk"):
+    return [str(tmp_path / ("%s_%i.fq.gz" % (name, idx))) for idx in range(nchunks)]
+
+
+###############################################################################
+###############################################################################
+# split_fastq_file
+
+
+def test_split_fastq_file__round_robin_blocks(tmp_path):
+    records = _records(10)
+    filename = _write_fastq(tmp_path, records)
+    output_files = _output_files(tmp_path, 3)
+
+    counts = split_fastq.split_fastq_file(filename, output_files, block_size=2)
+
+    assert counts == [4, 4, 2]
+
+    assert _read_records(output_files[0]) == records[0:2] + records[6:8]
+    assert _read_records(output_files[1]) == records[2:4] + records[8:10]
+    assert _read_records(output_files[2]) == records[4:6]
+
+
+def test_split_fastq_file__more_chunks_than_records(tmp_path):
+    records = _records(2)
+    filename = _write_fastq(tmp_path, records)
+    output_files = _output_files(tmp_path, 4)
+
+    counts = split_fastq.split_fastq_file(filename, output_files, block_size=1)
+
+    assert counts == [1, 1, 0, 0]
+    assert _read_records(output_files[2]) == []
+    assert _read_records(output_files[3]) == []
+
+
+def test_split_fastq_file__uncompressed_input(tmp_path):
+    records = _records(5)
+    filename = tmp_path / "reads.fq"
+    filename.write_text("".join(records))
+    output_files = _output_files(tmp_path, 2)
+
+    split_fastq.split_fastq_file(str(filename), output_files, block_size=1)
+
+    assert _read_records(output_files[0]) == records[0::2]
+    assert _read_records(output_files[1]) == records[1::2]
+
+
+def test_split_fastq_file__pairs_split_identically(tmp_path):
+    records_1 = _records(25, "mate1")
+    records_2 = _records(25, "mate2")
+    filename_1 = _write_fastq(tmp_path, records_1, "reads_1.fq.gz")
+    filename_2 = _write_fastq(tmp_path, records_2, "reads_2.fq.gz")
+    output_files_1 = _output_files(tmp_path, 3, "mate1")
+    output_files_2 = _output_files(tmp_path, 3, "mate2")
+
+    split_fastq.split_fastq_file(filename_1, output_files_1, block_size=4)
+    split_fastq.split_fastq_file(filename_2, output_files_2, block_size=4)
+
+    for (chunk_1, chunk_2) in zip(output_files_1, output_files_2):
+        names_1 = [record.split("\n")[0] for record in _read_records(chunk_1)]
+        names_2 = [record.split("\n")[0] for record in _read_records(chunk_2)]
+
+        assert [name.replace("mate1", "mate2") for name in names_1] == names_2
+
+
+def test_split_fastq_file__invalid_block_size(tmp_path):
+    filename = _write_fastq(tmp_path, _records(1))
+
+    with pytest.raises(ValueError):
+        split_fastq.split_fastq_file(filename, _output_files(tmp_path, 1), 0)
+
+
+###############################################################################
+###############################################################################
+# main
+
+
+def test_main(tmp_path):
+    records = _records(9)
+    filename = _write_fastq(tmp_path, records)
+    output_files = _output_files(tmp_path, 2)
+
+    assert split_fastq.main([filename] + output_files + ["--block-size", "3"]) == 0
+    assert _read_records(output_files[0]) == records[0:3] + records[6:9]
+    assert _read_records(output_files[1]) == records[3:6]
+
+
+def test_main__invalid_block_size(tmp_path, capsys):
+    filename = _write_fastq(tmp_path, _records(1))
+    output_files = _output_files(tmp_path, 1)
+
+    assert split_fastq.main([filename] + output_files + ["--block-size", "0"]) == 1
+    assert "--block-size must be at least 1" in capsys.readouterr().err
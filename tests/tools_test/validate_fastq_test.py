@@ -0,0 +1,197 @@
+import gzip
+import json
+import random
+
+import pytest
+
+import paleomix.common.validationcache as validationcache
+import paleomix.tools.validate_fastq as validate_fastq
+
+from paleomix.common.formats.fastq import FASTQ, FASTQError, FASTQualities
+
+
+def _random_fastq(rng, nreads, offset=33):
+    lines = []
+    for idx in range(nreads):
+        length = rng.randint(0, 50)
+        meta = " meta" if rng.random() < 0.5 else ""
+        sequence = "".join(rng.choice("ACGTN") for _ in range(length))
+        qualities = "".join(chr(offset + rng.randint(0, 40)) for _ in range(length))
+
+        lines.extend(("@read_%i%s" % (idx, meta), sequence, "+", qualities))
+
+    return "\n".join(lines) + "\n"
+
+
+def _write_file(tmp_path, text, name="reads.fq"):
+    filename = tmp_path / name
+    if name.endswith(".gz"):
+        filename.write_bytes(gzip.compress(text.encode("utf-8")))
+    else:
+        filename.write_bytes(text.encode("utf-8"))
+
+    return str(filename)
+
+
+def _parse_fastq_file(filename):
+    """Reference implementation using the FASTQ parser."""
+    qualities = FASTQualities()
+    nreads = nnts = 0
+    for record in FASTQ.from_file(filename):
+        qualities.update(record)
+        nreads += 1
+        nnts += len(record.sequence)
+
+    return nreads, nnts, qualities.offsets()
+
+
+def _validate_fastq_file(filename):
+    nreads, nnts, qualities = validate_fastq.validate_fastq_file(filename)
+
+    return nreads, nnts, qualities.offsets()
+
+
+###############################################################################
+###############################################################################
+# validate_fastq_file
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("block_size", (1, 17, 2 ** 20))
+@pytest.mark.parametrize("name", ("reads.fq", "reads.fq.gz"))
+def test_validate_fastq_file__matches_parser(
+    tmp_path, monkeypatch, seed, block_size, name
+):
+    monkeypatch.setattr(validate_fastq, "_BLOCK_SIZE", block_size)
+    rng = random.Random(seed)
+    filename = _write_file(tmp_path, _random_fastq(rng, 100), name)
+
+    result = _validate_fastq_file(filename)
+
+    assert result == _parse_fastq_file(filename)
+    assert result[0] == 100
+
+
+def test_validate_fastq_file__empty_file(tmp_path):
+    filename = _write_file(tmp_path, "")
+
+    assert _validate_fastq_file(filename) == (0, 0, FASTQualities.MISSING)
+
+
+@pytest.mark.parametrize(
+    "text",
+    (
+        # Windows line endings
+        "@foo\r\nACGT\r\n+\r\nIIII\r\n",
+        # Missing trailing newline
+        "@foo\nACGT\n+\nIIII",
+        # Trailing whitespace is ignored
+        "@foo\nACGT \n+\nIIII\t\n",
+        # Reading stops at the first empty line
+        "@foo\nACGT\n+\nIIII\n\n@bar\nAC\n+\nII",
+        # Non-ASCII characters
+        "@foo\nACGTé\n+\nIIIII\n",
+    ),
+)
+def test_validate_fastq_file__special_cases(tmp_path, text):
+    filename = _write_file(tmp_path, text)
+
+    assert _validate_fastq_file(filename) == _parse_fastq_file(filename)
+
+
+@pytest.mark.parametrize(
+    "text, message",
+    (
+        ("@foo\nACGT\n+\nIIII\nfoo\n", "Invalid FASTQ header: 'foo'"),
+        ("@foo\nACGT\n+\nIIII\n@bar\nAC\n", "Partial FASTQ record: '@bar'"),
+        ("@foo\nACGT\n-\nIIII\n", "Invalid FASTQ separator for '@foo'"),
+        ("@foo\nACGT\n+\nIII\n", "Sequence length does not match qualities length"),
+        ("@\nACGT\n+\nIIII\n", "FASTQ name must be a non-empty string"),
+        ("@ foo\nACGT\n+\nIIII\n", "FASTQ name must be a non-empty string"),
+    ),
+)
+def test_validate_fastq_file__invalid_records(tmp_path, text, message):
+    filename = _write_file(tmp_path, _random_fastq(random.Random(1), 10) + text)
+
+    with pytest.raises(FASTQError, match=message):
+        _parse_fastq_file(filename)
+
+    with pytest.raises(FASTQError, match=message):
+        _validate_fastq_file(filename)
+
+
+###############################################################################
+###############################################################################
+# main
+
+
+def test_main__statistics(tmp_path, capsys):
+    rng = random.Random(12345)
+    filename_1 = _write_file(tmp_path, _random_fastq(rng, 10), "reads_1.fq")
+    filename_2 = _write_file(tmp_path, _random_fastq(rng, 20), "reads_2.fq.gz")
+
+    assert validate_fastq.main([filename_1, filename_2, "--collapsed"]) == 0
+
+    nts = _parse_fastq_file(filename_1)[1] + _parse_fastq_file(filename_2)[1]
+    assert json.loads(capsys.readouterr().out) == {
+        "filenames": [filename_1, filename_2],
+        "seq_retained_reads": 30,
+        "seq_retained_nts": nts,
+        "seq_collapsed": 30,
+    }
+
+
+@pytest.mark.parametrize("threads", ("1", "3"))
+def test_main__threads(tmp_path, capsys, threads):
+    rng = random.Random(54321)
+    filenames = []
+    for idx in range(3):
+        text = _random_fastq(rng, 25)
+        filenames.append(_write_file(tmp_path, text, "reads_%i.fq" % (idx,)))
+
+    assert validate_fastq.main(filenames + ["--threads", threads]) == 0
+    assert json.loads(capsys.readouterr().out)["seq_retained_reads"] == 75
+
+
+@pytest.mark.parametrize("threads", ("1", "3"))
+def test_main__errors_reported_in_order(tmp_path, threads):
+    filenames = [
+        _write_file(tmp_path, _random_fastq(random.Random(1), 10), "reads_1.fq"),
+        _write_file(tmp_path, "@foo\nACGT\n+\nIII\n", "reads_2.fq"),
+        _write_file(tmp_path, "@foo\nACGT\n-\nIIII\n", "reads_3.fq"),
+    ]
+
+    with pytest.raises(FASTQError, match="Sequence length does not match"):
+        validate_fastq.main(filenames + ["--threads", threads])
+
+
+def test_main__wrong_offset(tmp_path, capsys):
+    rng = random.Random(1)
+    filename = _write_file(tmp_path, _random_fastq(rng, 100, offset=64))
+
+    assert validate_fastq.main([filename, "--offset", "33"]) == 1
+    assert "wrong quality score offset (64)" in capsys.readouterr().err
+
+
+def test_main__no_empty(tmp_path, capsys):
+    filename = _write_file(tmp_path, "")
+
+    assert validate_fastq.main([filename]) == 0
+    assert validate_fastq.main([filename, "--no-empty"]) == 1
+    assert "FASTQ file is empty." in capsys.readouterr().err
+
+
+def test_main__cached_results(tmp_path, monkeypatch, capsys):
+    cache_filename = str(tmp_path / "cache.sqlite")
+    monkeypatch.setattr(validationcache, "_CACHE_FILENAME", cache_filename)
+    filename = _write_file(tmp_path, _random_fastq(random.Random(1), 10))
+
+    assert validate_fastq.main([filename]) == 0
+    expected = json.loads(capsys.readouterr().out)
+
+    def _fail(filename):
+        raise AssertionError("file should not be validated")
+
+    monkeypatch.setattr(validate_fastq, "validate_fastq_file", _fail)
+    assert validate_fastq.main([filename]) == 0
+    assert json.loads(capsys.readouterr().out) == expected